@@ -0,0 +1,95 @@
+# benchmarks/bench_batching.py
+"""
+generation requests and wall-clock time for a repo of many small types: one request per class vs
+batched multi-class prompts, against the Ollama stub with a fixed per-request overhead
+(prompt processing and model scheduling on a real server).
+
+    python -m benchmarks.bench_batching --classes 120 --latency 0.3 --batch 6
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from testgen.generator import (
+    agenerate_nunit_test_class, agenerate_nunit_test_batch, batch_section, estimate_tokens, PROMPT_TOKEN_BUDGET
+)
+from testgen.ollama_client import OllamaClient
+from testgen.ollama_stub import OllamaStub
+
+NAMESPACE = "GeneratedTests"
+
+def small_classes(n):
+    """
+    DTO-, record- and options-like classes, the kind a typical service repo has dozens of.
+    """
+    kinds = [
+        lambda i: (f"OrderDto{i}", f"public record OrderDto{i}(Guid Id, string Name, decimal Total);"),
+        lambda i: (f"Options{i}", f"public class Options{i}\n{{\n    public int Retries {{ get; set; }} = 3;\n"
+                                  f"    public string Url {{ get; set; }} = \"\";\n}}"),
+        lambda i: (f"Endpoint{i}", f"public class Endpoint{i}\n{{\n    public static string Route => \"/api/v1/items/{i}\";\n}}"),
+    ]
+    classes = []
+    for i in range(n):
+        name, source = kinds[i % len(kinds)](i)
+        classes.append({"ClassName": name, "NamespaceName": "Synthetic", "FullSourceCode": source,
+                        "ClassSourceCode": source, "UsingDirectivesInFile": ["using System;"]})
+    return classes
+
+def plan_batches(classes, max_classes, token_budget):
+    batches, current, tokens = [], [], 0
+    for cls in classes:
+        cost = estimate_tokens(batch_section(cls, NAMESPACE))
+        if current and (len(current) >= max_classes or tokens + cost > token_budget):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(cls)
+        tokens += cost
+    return batches + ([current] if current else [])
+
+async def _single(url, classes, inflight):
+    async with OllamaClient(url, max_inflight=inflight) as client:
+        codes = await asyncio.gather(*(agenerate_nunit_test_class(c, "bench", NAMESPACE, client) for c in classes))
+    return sum(code is not None for code in codes)
+
+async def _batched(url, batches, inflight):
+    async with OllamaClient(url, max_inflight=inflight) as client:
+        results = await asyncio.gather(*(agenerate_nunit_test_batch(b, "bench", NAMESPACE, client) for b in batches))
+    return sum(code is not None for codes in results for code in codes.values())
+
+def bench(mode, classes, latency, inflight, batch_size):
+    with OllamaStub(latency_sec=latency) as stub:
+        start = time.perf_counter()
+        if mode == "single":
+            ok = asyncio.run(_single(stub.url, classes, inflight))
+        else:
+            ok = asyncio.run(_batched(stub.url, plan_batches(classes, batch_size, PROMPT_TOKEN_BUDGET), inflight))
+        wall = time.perf_counter() - start
+        return {"mode": mode, "requests": stub.requests, "tests_generated": ok, "wall_sec": round(wall, 3)}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--classes", type=int, default=120)
+    ap.add_argument("--latency", type=float, default=0.3, help="seconds of stub overhead per request")
+    ap.add_argument("--inflight", type=int, default=4, help="concurrent requests (MAX_INFLIGHT_REQUESTS)")
+    ap.add_argument("--batch", type=int, default=6, help="classes per batched prompt (MAX_BATCH_CLASSES)")
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    args = ap.parse_args(argv)
+
+    classes = small_classes(args.classes)
+    results = [bench(mode, classes, args.latency, args.inflight, args.batch) for mode in ("single", "batched")]
+    single, batched = results
+    saved = single["requests"] - batched["requests"]
+
+    if args.json:
+        print(json.dumps({"benchmark": "batching", "results": results, "calls_saved": saved}))
+    else:
+        print(f"{'mode':>8}  {'requests':>8}  {'tests':>5}  {'wall s':>7}")
+        for r in results:
+            print(f"{r['mode']:>8}  {r['requests']:>8}  {r['tests_generated']:>5}  {r['wall_sec']:>7}")
+        print(f"calls saved: {saved}, wall-clock {single['wall_sec']}s -> {batched['wall_sec']}s")
+    return results
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,113 @@
+# benchmarks/bench_cache.py
+"""
+lookups and inserts per second of the test cache under N concurrent workers:
+one shared connection committing every row (the old setup) vs CacheStore (WAL, per-thread
+readers, one group-committing writer).
+
+    python -m benchmarks.bench_cache --workers 1 8 32 --ops 2000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from testgen.cache import CacheStore, init_cache, cache_test, get_cached_test
+
+MODEL = "bench-model"
+CODE = "public class FooTests { }\n" * 40
+
+class _LockedConnection:
+    """
+    the old setup: one connection shared by every worker, serialised by a lock, commit per row.
+    """
+
+    def __init__(self, db_path):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            return _Rows(self._conn.execute(sql, params).fetchall())
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+class _Rows:
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = len(rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+def _run(conn, workers, ops, flush):
+    def insert(i):
+        cache_test(conn, f"src/File{i}.cs::Class{i}", f"hash{i}", MODEL, CODE)
+
+    def lookup(i):
+        get_cached_test(conn, f"src/File{i}.cs::Class{i}", f"hash{i}", MODEL)
+
+    with ThreadPoolExecutor(max_workers=workers) as exe:
+        start = time.perf_counter()
+        list(exe.map(insert, range(ops)))
+        flush()
+        t_insert = time.perf_counter() - start
+        start = time.perf_counter()
+        list(exe.map(lookup, range(ops)))
+        t_lookup = time.perf_counter() - start
+    return {"inserts_per_sec": round(ops / t_insert, 1), "lookups_per_sec": round(ops / t_lookup, 1)}
+
+def bench(workers, ops, root):
+    legacy_db = os.path.join(root, f"legacy_{workers}.db")
+    conn = init_cache(legacy_db)
+    conn.execute("PRAGMA journal_mode=DELETE")  # the old rollback-journal default
+    conn.close()
+    legacy = _LockedConnection(legacy_db)
+    try:
+        legacy_res = _run(legacy, workers, ops, flush=lambda: None)
+    finally:
+        legacy.close()
+
+    store = CacheStore(os.path.join(root, f"store_{workers}.db"))
+    try:
+        store_res = _run(store, workers, ops, flush=store.flush)
+    finally:
+        store.close()
+    return {"workers": workers, "ops": ops, "shared_connection": legacy_res, "cache_store": store_res}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--ops", type=int, default=1000, help="inserts (then lookups) per worker count")
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    args = ap.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="testgen_bench_cache_")
+    try:
+        results = [bench(w, args.ops, root) for w in args.workers]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"benchmark": "cache", "results": results}))
+    else:
+        print(f"{'workers':>7}  {'shared inserts/s':>16}  {'store inserts/s':>15}  "
+              f"{'shared lookups/s':>16}  {'store lookups/s':>15}")
+        for r in results:
+            print(f"{r['workers']:>7}  {r['shared_connection']['inserts_per_sec']:>16}  "
+                  f"{r['cache_store']['inserts_per_sec']:>15}  {r['shared_connection']['lookups_per_sec']:>16}  "
+                  f"{r['cache_store']['lookups_per_sec']:>15}")
+    return results
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
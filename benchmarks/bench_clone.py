@@ -0,0 +1,107 @@
+# benchmarks/bench_clone.py
+"""
+clone wall time and bytes fetched per clone strategy, against a local bare repository (served over
+file://, so partial clones behave as they do against a real remote and no network is needed). the
+origin holds a synthetic C# repository plus binary assets rewritten in every commit, the kind of
+history `--depth`, `--filter=blob:none` and sparse checkouts avoid downloading. each strategy makes
+a cold clone, then updates it after one more commit is pushed; mirror strategies share one mirror.
+
+    python -m benchmarks.bench_clone --files 300 --commits 10 --asset-mb 2
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import logging
+import tempfile
+import subprocess
+
+from testgen.repo import CloneStrategy, sync_repo
+from benchmarks.synthetic_repo import generate_synthetic_repo
+
+def _git(cwd, *args):
+    subprocess.run(["git", "-C", cwd, "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+                   check=True, capture_output=True)
+
+def build_origin(work_dir, files, commits, asset_mb):
+    """
+    a bare repository with `commits` commits, each editing a few sources and replacing the assets.
+    returns (origin path, working copy used to push more commits).
+    """
+    src = os.path.join(work_dir, "src")
+    paths = generate_synthetic_repo(src, files=files)
+    _git(src, "init", "-q", "-b", "main")
+    assets = os.path.join(src, "assets")
+    os.makedirs(assets)
+    for n in range(commits):
+        for idx in range(4):
+            with open(os.path.join(assets, f"image{idx}.bin"), "wb") as f:
+                f.write(os.urandom(int(asset_mb * 1024 * 1024 / 4)))
+        with open(paths[n % len(paths)], "a", encoding="utf-8") as f:
+            f.write(f"\n// revision {n}\n")
+        _git(src, "add", "-A")
+        _git(src, "commit", "-q", "-m", f"revision {n}")
+    origin = os.path.join(work_dir, "origin.git")
+    subprocess.run(["git", "clone", "-q", "--bare", src, origin], check=True, capture_output=True)
+    _git(origin, "config", "uploadpack.allowFilter", "true")
+    return origin, src, paths
+
+def _push_commit(src, origin, path):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n// one more edit\n")
+    _git(src, "commit", "-q", "-am", "one more edit")
+    _git(src, "push", "-q", origin, "main")
+
+def strategies(mirror_dir):
+    return [
+        CloneStrategy(),
+        CloneStrategy(depth=1),
+        CloneStrategy(blobless=True),
+        CloneStrategy(blobless=True, sparse=True),
+        CloneStrategy(mirror_dir=mirror_dir),
+        CloneStrategy(mirror_dir=mirror_dir, sparse=True),
+        CloneStrategy(mirror_dir=mirror_dir, link="worktree", sparse=True),
+    ]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=300)
+    ap.add_argument("--commits", type=int, default=10)
+    ap.add_argument("--asset-mb", type=float, default=2.0, help="binary assets rewritten by every commit")
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    args = ap.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix="testgen_clone_")
+    results = []
+    try:
+        origin, src, paths = build_origin(work_dir, args.files, args.commits, args.asset_mb)
+        mirror_dir = os.path.join(work_dir, "mirrors")
+        clones = []
+        for strategy in strategies(mirror_dir):
+            target = os.path.join(work_dir, "clones", strategy.name)
+            _, report = sync_repo(target, origin, "main", strategy)
+            clones.append((strategy, target))
+            results.append({"strategy": strategy.name, "action": "clone", "seconds": round(report.wall_sec, 3),
+                            "bytes_fetched": report.bytes_fetched, "checkout_bytes": report.checkout_bytes})
+        _push_commit(src, origin, paths[0])
+        for strategy, target in clones:
+            _, report = sync_repo(target, origin, "main", strategy)
+            results.append({"strategy": strategy.name, "action": "update", "seconds": round(report.wall_sec, 3),
+                            "bytes_fetched": report.bytes_fetched, "checkout_bytes": report.checkout_bytes})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"benchmark": "clone", "params": vars(args), "results": results}))
+    else:
+        print("the first mirror strategy's clone includes creating the mirror; later ones reuse it")
+        print(f"{'strategy':<34} {'action':<7} {'seconds':>8} {'MB fetched':>11} {'MB checkout':>12}")
+        for r in results:
+            print(f"{r['strategy']:<34} {r['action']:<7} {r['seconds']:>8.3f} "
+                  f"{r['bytes_fetched'] / 1e6:>11.2f} {r['checkout_bytes'] / 1e6:>12.2f}")
+    return results
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
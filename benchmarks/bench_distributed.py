@@ -0,0 +1,72 @@
+# benchmarks/bench_distributed.py
+"""
+generation wall time with 1, 2, 4... worker processes on this host, each against its own Ollama stub
+(one inference box each) and generating `--inflight` classes at once, all fed by one coordinator.
+
+    python -m benchmarks.bench_distributed --classes 48 --latency 0.3 --workers 1 2 4
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import subprocess
+from contextlib import ExitStack
+
+from testgen.distributed import Coordinator
+from testgen.ollama_stub import OllamaStub
+from benchmarks.bench_batching import small_classes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS = {"model": "m", "namespace": "GeneratedTests", "stream": False, "warm": False}
+
+def bench(workers, classes, latency, inflight):
+    with ExitStack() as stack:
+        stubs = [stack.enter_context(OllamaStub(latency_sec=latency)) for _ in range(workers)]
+        coordinator = Coordinator(port=0, settings=SETTINGS)
+        stack.callback(coordinator.stop)
+        coordinator.start()
+        procs = [subprocess.Popen(
+            [sys.executable, "run.py", "worker", "--coordinator", coordinator.url, "--ollama-url", stub.url,
+             "--inflight", str(inflight), "--id", f"w{n}"],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ) for n, stub in enumerate(stubs)]
+
+        async def go():
+            return await asyncio.gather(*(coordinator.submit("class", cls=c) for c in classes))
+
+        started = time.perf_counter()
+        codes = asyncio.run(go())
+        wall = time.perf_counter() - started
+        coordinator.stop()
+        for proc in procs:
+            proc.wait(timeout=30)
+        per_worker = {name: int(counts.get("done", 0)) for name, counts in coordinator.workers.items()}
+    return {"workers": workers, "tests_generated": sum(code is not None for code in codes),
+            "wall_sec": round(wall, 3), "per_worker": per_worker}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--classes", type=int, default=48)
+    ap.add_argument("--latency", type=float, default=0.3, help="stub seconds per request")
+    ap.add_argument("--inflight", type=int, default=2, help="classes each worker generates at once")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    args = ap.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    classes = small_classes(args.classes)
+    results = [bench(n, classes, args.latency, args.inflight) for n in args.workers]
+    if args.json:
+        print(json.dumps({"benchmark": "distributed", "params": vars(args), "results": results}))
+    else:
+        print(f"{'workers':>7} {'tests':>6} {'wall s':>8}  classes per worker")
+        for r in results:
+            print(f"{r['workers']:>7} {r['tests_generated']:>6} {r['wall_sec']:>8.3f}  "
+                  + " ".join(str(n) for _, n in sorted(r["per_worker"].items())))
+    return results
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,281 @@
+# benchmarks/bench_e2e.py
+"""
+end-to-end throughput on a synthetic C# repository against the Ollama stub: discovery, extraction,
+cache probe, generation dispatch, writing, the staged pipeline (cold and fully cached) and
+`run.main` itself (cold, no-op and incremental after an edit). every result is one JSON object, so
+runs of different versions can be compared; `--output results.jsonl` appends it to a file.
+
+extraction and `run.main` need `dotnet` on PATH and are reported as skipped without it; the other
+parts read the synthetic files' class info back with `describe_synthetic_file` instead.
+
+    python -m benchmarks.bench_e2e --files 200 --latency 0.05 --json
+    python -m benchmarks.bench_e2e --only pipeline writing --output bench.jsonl
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import run
+from testgen.repo import find_cs_files
+from testgen.cache import CacheStore, cache_test, lookup_cached_test
+from testgen.extractor import ensure_extractor_tool, ExtractorPool
+from testgen.generator import agenerate_nunit_test_class, PROMPT_VERSION
+from testgen.ollama_client import OllamaClient
+from testgen.ollama_stub import OllamaStub
+from testgen.stats import RunStats
+from testgen.writer import write_test_file, init_nunit_project
+from benchmarks.synthetic_repo import generate_synthetic_repo, describe_synthetic_file
+
+MODEL = "bench-model"
+PARTS = ["discovery", "extraction", "cache_probe", "generation", "writing", "pipeline", "run_main"]
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else None
+
+def bench_discovery(repo_root, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        files = list(find_cs_files(repo_root))
+    wall = (time.perf_counter() - start) / repeat
+    return {"files": len(files), "seconds": round(wall, 4), "files_per_sec": _rate(len(files), wall)}
+
+def bench_extraction(files, extractor_dll, workers):
+    start = time.perf_counter()
+    with ExtractorPool(extractor_dll, size=workers) as pool:
+        with ThreadPoolExecutor(max_workers=workers) as exe:
+            classes = sum(len(r) for r in exe.map(pool.extract, files))
+    wall = time.perf_counter() - start
+    return {"files": len(files), "classes": classes, "workers": workers, "seconds": round(wall, 3),
+            "files_per_sec": _rate(len(files), wall)}
+
+def bench_cache_probe(work_dir, classes):
+    cache = CacheStore(os.path.join(work_dir, "probe.db"))
+    try:
+        keys = [(f"{os.path.basename(c['FilePath'])}::{c['ClassName']}", run.class_source_hash(c)) for c in classes]
+        for key, src_hash in keys:
+            cache_test(cache, key, src_hash, MODEL, f"public class {key.split('::')[1]}Tests {{ }}\n" * 20,
+                       prompt_version=PROMPT_VERSION)
+        cache.flush()
+        start = time.perf_counter()
+        hits = sum(lookup_cached_test(cache, key, h, MODEL, PROMPT_VERSION)[0] is not None for key, h in keys)
+        hit_wall = time.perf_counter() - start
+        start = time.perf_counter()
+        for key, _ in keys:
+            lookup_cached_test(cache, key, "changed", MODEL, PROMPT_VERSION)
+        miss_wall = time.perf_counter() - start
+    finally:
+        cache.close()
+    return {"lookups": len(keys), "hits": hits, "hit_lookups_per_sec": _rate(len(keys), hit_wall),
+            "miss_lookups_per_sec": _rate(len(keys), miss_wall)}
+
+def bench_generation(stub, classes, inflight):
+    async def dispatch():
+        async with OllamaClient(stub.url, max_inflight=inflight) as client:
+            return await asyncio.gather(*(
+                agenerate_nunit_test_class(c, MODEL, run.TEST_PROJECT_NAME, client) for c in classes
+            ))
+
+    requests_before = stub.requests
+    start = time.perf_counter()
+    codes = asyncio.run(dispatch())
+    wall = time.perf_counter() - start
+    return {"classes": len(classes), "requests": stub.requests - requests_before, "inflight": inflight,
+            "generated": sum(c is not None for c in codes), "seconds": round(wall, 3),
+            "classes_per_sec": _rate(len(classes), wall)}
+
+def bench_writing(work_dir, repo_root, files, classes_by_file):
+    proj = os.path.join(work_dir, "write_bench")
+    code = lambda c: f"using NUnit.Framework;\n\nnamespace GeneratedTests;\n\npublic class {c['ClassName']}Tests {{ }}\n"
+    result = {"files": len(files)}
+    for label in ("cold", "unchanged"):
+        start = time.perf_counter()
+        written = sum(write_test_file(proj, f, repo_root, [code(c) for c in classes_by_file[f]]) is not None
+                      for f in files)
+        wall = time.perf_counter() - start
+        result[label] = {"written": written, "seconds": round(wall, 3), "files_per_sec": _rate(len(files), wall)}
+    shutil.rmtree(proj, ignore_errors=True)
+    return result
+
+def bench_pipeline(work_dir, repo_root, stub, classes_by_file):
+    """
+    the run.py pipeline, with the synthetic class info standing in for extraction.
+    """
+    extract = lambda f: classes_by_file.get(os.path.abspath(f), [])
+    test_proj_dir = os.path.join(work_dir, "pipeline_tests")
+    cache = CacheStore(os.path.join(work_dir, "pipeline.db"))
+    result = {}
+    try:
+        for label in ("cold", "cached"):
+            stats = RunStats()
+            requests_before = stub.requests
+
+            async def go():
+                async with OllamaClient(stub.url, max_inflight=run.MAX_INFLIGHT_REQUESTS) as client:
+                    pipeline = run.build_pipeline(test_proj_dir, repo_root, extract, cache, client, stats)
+                    await pipeline.run([repo_root])
+                    return pipeline
+
+            pipeline = asyncio.run(go())
+            cache.flush()  # run.py closes the store between runs; the cached pass must see every row
+            result[label] = {
+                "seconds": round(pipeline.wall_sec, 3),
+                "requests": stub.requests - requests_before,
+                "classes": int(stats.counter("tests.written")),
+                "cache_hits": int(stats.counter("cache.hits")),
+                "files_written": int(stats.counter("tests.files_written")),
+                "stages": {s.name: {"items_in": s.items_in, "busy_sec": round(s.busy_sec, 3),
+                                    "utilisation": round(s.utilisation, 3), "errors": s.errors}
+                           for s in pipeline.stages},
+            }
+    finally:
+        cache.close()
+    return result
+
+def bench_run_main(work_dir, repo_root, stub, edit_fraction, run_tests):
+    """
+    `run.main` as a user runs it: cold, again with nothing changed, and after editing some files.
+    the extractor and the test project are built first, so package restores are not timed.
+    """
+    out = os.path.join(work_dir, "run_output")
+    _configure_run(out, repo_root, stub.url, RUN_TESTS=run_tests)
+    ensure_extractor_tool(out)
+    init_nunit_project(out, run.TEST_PROJECT_NAME)
+    result = {}
+    for label in ("cold", "noop", "incremental"):
+        if label == "incremental":
+            result["edited_files"] = _edit_and_commit(repo_root, edit_fraction)
+        requests_before = stub.requests
+        start = time.perf_counter()
+        run.main(["run"])
+        result[label] = {"seconds": round(time.perf_counter() - start, 3), "requests": stub.requests - requests_before}
+    return result
+
+def _configure_run(output_dir, repo_url, ollama_url, **overrides):
+    settings = dict(
+        OUTPUT_DIR=output_dir, REPO_CLONE_DIR=os.path.join(output_dir, "repo_clone"), REPO_URL=repo_url,
+        BRANCH="main", OLLAMA_URL=ollama_url, OLLAMA_MODEL=MODEL, GENERATION_BACKEND="http", COMPILE_CHECK=None,
+        CACHE_MAINTENANCE=False, INCREMENTAL=True, FORCE_REGENERATE=False, DRY_RUN=False,
+    )
+    settings.update(overrides)
+    for name, value in settings.items():
+        setattr(run, name, value)
+
+def _init_git(repo_root):
+    git = lambda *args: subprocess.run(["git", "-C", repo_root, *args], check=True, capture_output=True)
+    git("init", "-q")
+    git("checkout", "-q", "-b", "main")
+    git("add", "-A")
+    git("-c", "user.name=bench", "-c", "user.email=bench@example.com", "commit", "-q", "-m", "synthetic repo")
+
+def _edit_and_commit(repo_root, fraction):
+    files = sorted(find_cs_files(repo_root))
+    edited = files[::max(1, round(1 / fraction))] if fraction > 0 else []
+    for path in edited:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text.replace("return input;", "return input; // edited", 1))
+    subprocess.run(["git", "-C", repo_root, "-c", "user.name=bench", "-c", "user.email=bench@example.com",
+                    "commit", "-q", "-am", "edit"], check=True, capture_output=True)
+    return len(edited)
+
+def _version():
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        rev = subprocess.run(["git", "-C", here, "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        rev = None
+    return {"revision": rev, "prompt_version": PROMPT_VERSION, "python": platform.python_version()}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--classes-per-file", type=int, default=2)
+    ap.add_argument("--methods-per-class", type=int, default=4)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds of stub overhead per request")
+    ap.add_argument("--token-latency", type=float, default=0.0, help="seconds per streamed stub token")
+    ap.add_argument("--inflight", type=int, default=run.MAX_INFLIGHT_REQUESTS, help="concurrent generation requests")
+    ap.add_argument("--workers", type=int, default=run.EXTRACTOR_WORKERS, help="extractor workers")
+    ap.add_argument("--edit-fraction", type=float, default=0.1, help="share of files edited before the incremental run")
+    ap.add_argument("--run-tests", action="store_true", help="let run.main build and run the generated tests")
+    ap.add_argument("--only", nargs="+", choices=PARTS, help="run only these parts")
+    ap.add_argument("--output", help="append the result as one JSON line to this file")
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    ap.add_argument("--verbose", action="store_true", help="keep the tool's INFO logging")
+    args = ap.parse_args(argv)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    parts = args.only or PARTS
+    has_dotnet = shutil.which("dotnet") is not None
+    run.MAX_INFLIGHT_REQUESTS = args.inflight
+    run.STAGE_WORKERS = {**run.STAGE_WORKERS, "generate": args.inflight}
+    run.OLLAMA_MODEL = MODEL
+
+    work_dir = tempfile.mkdtemp(prefix="testgen_e2e_")
+    repo_root = os.path.join(work_dir, "repo")
+    results = {}
+    try:
+        generate_synthetic_repo(repo_root, files=args.files, classes_per_file=args.classes_per_file,
+                                methods_per_class=args.methods_per_class)
+        files = sorted(os.path.abspath(f) for f in find_cs_files(repo_root))
+        classes_by_file = {f: describe_synthetic_file(f) for f in files}
+        classes = [c for f in files for c in classes_by_file[f]]
+
+        with OllamaStub(latency_sec=args.latency, token_latency_sec=args.token_latency) as stub:
+            for part in parts:
+                if part in ("extraction", "run_main") and not has_dotnet:
+                    results[part] = {"skipped": "dotnet is not on PATH"}
+                    continue
+                started = time.perf_counter()
+                if part == "discovery":
+                    results[part] = bench_discovery(repo_root)
+                elif part == "extraction":
+                    dll = ensure_extractor_tool(os.path.join(work_dir, "extractor"))[0]
+                    results[part] = bench_extraction(files, dll, args.workers)
+                elif part == "cache_probe":
+                    results[part] = bench_cache_probe(work_dir, classes)
+                elif part == "generation":
+                    results[part] = bench_generation(stub, classes, args.inflight)
+                elif part == "writing":
+                    results[part] = bench_writing(work_dir, repo_root, files, classes_by_file)
+                elif part == "pipeline":
+                    results[part] = bench_pipeline(work_dir, repo_root, stub, classes_by_file)
+                elif part == "run_main":
+                    _init_git(repo_root)
+                    results[part] = bench_run_main(work_dir, repo_root, stub, args.edit_fraction, args.run_tests)
+                logging.getLogger(__name__).info(f"{part} took {time.perf_counter() - started:.2f}s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "e2e",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "version": _version(),
+        "params": {"files": args.files, "classes_per_file": args.classes_per_file,
+                   "methods_per_class": args.methods_per_class, "classes": len(classes), "latency": args.latency,
+                   "token_latency": args.token_latency, "inflight": args.inflight},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report) + "\n")
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for part, res in results.items():
+            print(f"{part:>12}: {json.dumps(res)}")
+    return report
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
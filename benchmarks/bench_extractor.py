@@ -0,0 +1,75 @@
+# benchmarks/bench_extractor.py
+"""
+files/second of the Roslyn extractor: one `dotnet` process per file vs warm server workers.
+
+    python -m benchmarks.bench_extractor --files 200 --workers 2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from testgen.repo import find_cs_files
+from testgen.extractor import ensure_extractor_tool, extract_classes_info_from_cs_file, ExtractorPool
+from benchmarks.synthetic_repo import generate_synthetic_repo
+
+def bench_per_process(files, extractor_dll, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as exe:
+        classes = sum(len(r) for r in exe.map(lambda f: extract_classes_info_from_cs_file(f, extractor_dll), files))
+    return time.perf_counter() - start, classes
+
+def bench_server(files, extractor_dll, workers):
+    start = time.perf_counter()
+    with ExtractorPool(extractor_dll, size=workers) as pool:
+        with ThreadPoolExecutor(max_workers=workers) as exe:
+            classes = sum(len(r) for r in exe.map(pool.extract, files))
+    return time.perf_counter() - start, classes
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--classes-per-file", type=int, default=2)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--per-process-limit", type=int, default=50,
+                    help="only time this many files in per-process mode (it is slow)")
+    ap.add_argument("--extractor-dll", help="use an already built extractor instead of building one")
+    ap.add_argument("--output-dir", default=os.path.abspath("generated_tests_output"))
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    args = ap.parse_args(argv)
+
+    dll = args.extractor_dll or ensure_extractor_tool(args.output_dir)[0]
+    root = tempfile.mkdtemp(prefix="testgen_bench_")
+    try:
+        generate_synthetic_repo(root, files=args.files, classes_per_file=args.classes_per_file)
+        files = sorted(find_cs_files(root))
+        sample = files[:args.per_process_limit]
+
+        t_proc, c_proc = bench_per_process(sample, dll, args.workers)
+        t_srv, c_srv = bench_server(files, dll, args.workers)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    result = {
+        "benchmark": "extractor",
+        "workers": args.workers,
+        "per_process": {"files": len(sample), "classes": c_proc, "seconds": round(t_proc, 3),
+                        "files_per_sec": round(len(sample) / t_proc, 2)},
+        "server": {"files": len(files), "classes": c_srv, "seconds": round(t_srv, 3),
+                   "files_per_sec": round(len(files) / t_srv, 2)},
+    }
+    result["speedup"] = round(result["server"]["files_per_sec"] / result["per_process"]["files_per_sec"], 2)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"per-process: {result['per_process']['files_per_sec']:>8} files/s  ({len(sample)} files)")
+        print(f"server     : {result['server']['files_per_sec']:>8} files/s  ({len(files)} files)")
+        print(f"speedup    : {result['speedup']}x")
+    return result
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,168 @@
+# benchmarks/bench_warm.py
+"""
+time to first token of class prompts sent one after the other, as before and after `ModelSession`:
+
+  * cold: the old layout (class name first, shared instructions and few-shot example after it),
+    no keep_alive, so a model left idle longer than the server's keep-alive is loaded again;
+  * pinned: the same prompts, but the model is preloaded and pinned with keep_alive -1;
+  * warm: pinned, prompts start with the shared prefix, and the session warms it first.
+
+against the Ollama stub, which models load time, the server's idle keep-alive and per-token prompt
+evaluation past a cached prefix; `--idle` seconds between classes stand for extraction and compile
+checks. `--url` runs it against a real server instead (e.g. a small CPU model: `--model qwen2.5:0.5b`).
+
+    python -m benchmarks.bench_warm --classes 12 --load 1.5 --idle 0.3 --keep-alive 0.25
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+import statistics
+
+from testgen.generator import PROMPT_PREFIX, _build_prompt, prompt_prefix
+from testgen.model_session import ModelSession
+from testgen.ollama_client import OllamaClient
+from testgen.ollama_stub import OllamaStub
+from benchmarks.synthetic_repo import describe_synthetic_file, generate_synthetic_repo
+
+NAMESPACE = "GeneratedTests"
+
+# the kind of example a team pins to show its test conventions
+FEW_SHOT = """Example of a test class in our conventions:
+```csharp
+using NUnit.Framework;
+using Moq;
+
+namespace GeneratedTests;
+
+[TestFixture]
+public class PriceCalculatorTests
+{
+    private Mock<ITaxTable> _taxes = null!;
+    private PriceCalculator _calculator = null!;
+
+    [SetUp]
+    public void SetUp()
+    {
+        _taxes = new Mock<ITaxTable>();
+        _taxes.Setup(t => t.RateFor("NL")).Returns(0.21m);
+        _calculator = new PriceCalculator(_taxes.Object);
+    }
+
+    [Test]
+    public void Gross_WithKnownCountry_AddsTax()
+    {
+        // Arrange
+        var net = 100m;
+
+        // Act
+        var gross = _calculator.Gross(net, "NL");
+
+        // Assert
+        Assert.That(gross, Is.EqualTo(121m));
+    }
+
+    [Test]
+    public void Gross_WithNegativeAmount_Throws()
+    {
+        Assert.Throws<ArgumentOutOfRangeException>(() => _calculator.Gross(-1m, "NL"));
+    }
+}
+```"""
+
+def class_prompts(n, few_shot):
+    with tempfile.TemporaryDirectory(prefix="testgen_warm_") as root:
+        classes = [c for path in generate_synthetic_repo(root, files=(n + 1) // 2) for c in describe_synthetic_file(path)]
+    return [_build_prompt(c, NAMESPACE, few_shot, token_budget=None) for c in classes[:n]]
+
+def class_first(prompt, few_shot):
+    # what the prompt looked like before: the class-specific part, then the shared part
+    prefix = prompt_prefix(few_shot)
+    return prompt[len(prefix):].lstrip("\n") + "\n" + prefix
+
+async def first_token(client, model, prompt):
+    started = time.monotonic()
+    stream = client.stream_generate(model, prompt, options={"num_predict": 1})
+    try:
+        async for _ in stream:
+            return time.monotonic() - started
+    finally:
+        await stream.aclose()
+
+async def bench(mode, url, model, prompts, few_shot, idle, warm_requests):
+    keep_alive = None if mode == "cold" else -1
+    async with OllamaClient(url, keep_alive=keep_alive) as client:
+        # start from an unloaded model
+        await client.generate(model, "", keep_alive=0)
+        session = ModelSession(client, model, few_shot, warm_requests=warm_requests if mode == "warm" else 0,
+                               keep_alive_after=0)
+        started = time.monotonic()
+        if mode != "cold":
+            await session.ready()
+        setup = time.monotonic() - started
+        ttfts = []
+        for prompt in prompts:
+            ttfts.append(await first_token(client, model, prompt))
+            await asyncio.sleep(idle)
+        await session.close()
+    return {
+        "mode": mode, "setup_sec": round(setup, 3), "first_ttft_sec": round(ttfts[0], 3),
+        "median_ttft_sec": round(statistics.median(ttfts), 3), "max_ttft_sec": round(max(ttfts), 3),
+        "total_ttft_sec": round(sum(ttfts), 3),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--classes", type=int, default=12)
+    ap.add_argument("--load", type=float, default=1.5, help="stub: seconds to load the model")
+    ap.add_argument("--keep-alive", type=float, default=0.25, help="stub: seconds an idle model stays loaded")
+    ap.add_argument("--prompt-token-latency", type=float, default=0.002, help="stub: seconds per evaluated token")
+    ap.add_argument("--idle", type=float, default=0.3, help="seconds between two classes")
+    ap.add_argument("--warm-requests", type=int, default=1)
+    ap.add_argument("--no-few-shot", action="store_true", help="leave the few-shot example out of the prefix")
+    ap.add_argument("--url", help="a real Ollama server instead of the stub")
+    ap.add_argument("--model", default="qwen2.5:0.5b")
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    args = ap.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    few_shot = None if args.no_few_shot else FEW_SHOT
+    prompts = class_prompts(args.classes, few_shot)
+    legacy = [class_first(p, few_shot) for p in prompts]
+    prefix = prompt_prefix(few_shot)
+    stub = None
+    if not args.url:
+        stub = OllamaStub(load_sec=args.load, default_keep_alive_sec=args.keep_alive,
+                          prompt_token_latency_sec=args.prompt_token_latency).start()
+    url = args.url or stub.url
+    results = []
+    try:
+        for mode, batch in (("cold", legacy), ("pinned", legacy), ("warm", prompts)):
+            loads = stub.loads if stub else 0
+            evaluated = stub.prompt_tokens_evaluated if stub else 0
+            result = asyncio.run(bench(mode, url, args.model, batch, few_shot, args.idle, args.warm_requests))
+            if stub:
+                result["loads"] = stub.loads - loads
+                result["prompt_tokens_evaluated"] = stub.prompt_tokens_evaluated - evaluated
+            results.append(result)
+    finally:
+        if stub:
+            stub.stop()
+
+    if args.json:
+        print(json.dumps({"benchmark": "warm", "params": vars(args), "prefix_tokens": len(prefix) // 4,
+                          "results": results}))
+    else:
+        print(f"{args.classes} classes, shared prefix of ~{len(prefix) // 4} tokens "
+              f"(instructions {len(PROMPT_PREFIX) // 4}), {args.idle}s between classes")
+        print(f"{'mode':<8} {'setup s':>8} {'1st TTFT':>9} {'median':>8} {'max':>8} {'sum TTFT':>9} {'loads':>6}")
+        for r in results:
+            print(f"{r['mode']:<8} {r['setup_sec']:>8.3f} {r['first_ttft_sec']:>9.3f} {r['median_ttft_sec']:>8.3f} "
+                  f"{r['max_ttft_sec']:>8.3f} {r['total_ttft_sec']:>9.3f} {r.get('loads', ''):>6}")
+    return results
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
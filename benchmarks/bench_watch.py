@@ -0,0 +1,123 @@
+# benchmarks/bench_watch.py
+"""
+latency from saving an edited source file to its regenerated test file being written, with
+`run.py watch` against re-running the pipeline over the whole tree for every edit (the old developer
+loop, without the clone, extractor build and `dotnet new` a real `python run.py` adds on top).
+
+against the Ollama stub (which models load time and the server's idle keep-alive), on a synthetic
+repo whose classes are all cached before the edits start; each edit changes one class.
+
+    python -m benchmarks.bench_watch --files 200 --edits 5 --latency 0.5 --load 1.5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+import statistics
+
+import run
+from testgen.cache import CacheStore
+from testgen.discovery import Discovery
+from testgen.ollama_stub import OllamaStub
+from testgen.stats import RunStats
+from benchmarks.synthetic_repo import describe_synthetic_file, generate_synthetic_repo
+
+def edit(path, n):
+    # a changed method body: the class's source hash changes, its neighbours' do not
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace("return ", f"return {n} + 0 * ", 1))
+
+async def wait_for_change(stats, done, timeout=60):
+    # the stub answers with the same tests for an edited class, so the file's content may not change
+    deadline = time.monotonic() + timeout
+    while stats.counter("watch.changes") <= done:
+        if time.monotonic() > deadline:
+            raise RuntimeError("the edit was not picked up")
+        await asyncio.sleep(0.01)
+
+async def bench_rerun(root, proj, conn, targets):
+    latencies = []
+    for n, target in enumerate(targets):
+        started = time.monotonic()
+        edit(target, n)
+        await run.run_pipeline(proj, root, [root], describe_synthetic_file, conn, RunStats(), discovery=Discovery(root))
+        latencies.append(time.monotonic() - started)
+    return latencies
+
+async def bench_watch(root, proj, conn, targets, poll):
+    run.WATCH_INOTIFY = not poll
+    stats = RunStats()
+    daemon = asyncio.create_task(run.watch_changes(
+        root, proj, None, describe_synthetic_file, conn, stats, Discovery(root), run_tests=False
+    ))
+    await asyncio.sleep(0.5)  # started, model loaded and warm
+    latencies = []
+    try:
+        for n, target in enumerate(targets):
+            started = time.monotonic()
+            edit(target, n + 1000)
+            await wait_for_change(stats, n)
+            latencies.append(time.monotonic() - started)
+            if stats.counter("generation.requests") != n + 1:
+                raise RuntimeError("an edit of one class should regenerate only that class")
+    finally:
+        daemon.cancel()
+        try:
+            await daemon
+        except asyncio.CancelledError:
+            pass
+    return latencies
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--edits", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.5, help="stub seconds per request")
+    ap.add_argument("--load", type=float, default=1.5, help="stub: seconds to load the model")
+    ap.add_argument("--keep-alive", type=float, default=1.0, help="stub: seconds an idle model stays loaded")
+    ap.add_argument("--json", action="store_true", help="print a machine-readable result line")
+    args = ap.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="testgen_watch_") as tmp, \
+            OllamaStub(latency_sec=args.latency, load_sec=args.load, default_keep_alive_sec=args.keep_alive) as stub:
+        root, proj = os.path.join(tmp, "repo"), os.path.join(tmp, "GeneratedTests")
+        files = generate_synthetic_repo(root, files=args.files)
+        run.OLLAMA_URL, run.GENERATION_BACKEND, run.COMPILE_CHECK, run.OUTPUT_DIR = stub.url, "http", None, tmp
+        run.MODEL_KEEP_ALIVE_AFTER = None  # a rerun leaves the model to the server's keep-alive
+        targets = files[::max(1, len(files) // args.edits)][:args.edits]
+        conn = CacheStore(os.path.join(tmp, "test_cache.db"))
+        try:
+            asyncio.run(run.run_pipeline(proj, root, [root], describe_synthetic_file, conn, RunStats(),
+                                         discovery=Discovery(root)))
+            for mode in ("rerun", "watch", "watch-poll"):
+                loads = stub.loads
+                if mode == "rerun":
+                    latencies = asyncio.run(bench_rerun(root, proj, conn, targets))
+                else:
+                    latencies = asyncio.run(bench_watch(root, proj, conn, targets, poll=mode == "watch-poll"))
+                results.append({
+                    "mode": mode, "median_sec": round(statistics.median(latencies), 3),
+                    "max_sec": round(max(latencies), 3), "loads": stub.loads - loads,
+                })
+        finally:
+            conn.close()
+
+    if args.json:
+        print(json.dumps({"benchmark": "watch", "params": vars(args), "results": results}))
+    else:
+        print(f"{args.files} files, {args.edits} edits of one class each: seconds from save to written test file")
+        print(f"{'mode':<11} {'median':>7} {'max':>7} {'loads':>6}")
+        for r in results:
+            print(f"{r['mode']:<11} {r['median_sec']:>7.3f} {r['max_sec']:>7.3f} {r['loads']:>6}")
+    return results
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
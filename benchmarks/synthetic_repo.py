@@ -0,0 +1,127 @@
+# benchmarks/synthetic_repo.py
+"""
+deterministic generator for synthetic C# repositories used by the benchmarks.
+"""
+import os
+import re
+import random
+import argparse
+from typing import Any, Dict, List
+
+TYPES = ["int", "string", "bool", "decimal", "DateTime", "Guid"]
+
+_CLASS_BLOCK_RE = re.compile(r"^public class (\w+)\n\{\n.*?^\}\n", re.M | re.S)
+_METHOD_RE = re.compile(r"^    public (\w+) (\w+)\((.*?)\)\n    \{\n.*?^    \}\n", re.M | re.S)
+_CTOR_RE = re.compile(r"^    public \w+\((.*?)\)", re.M)
+
+def generate_synthetic_repo(
+    root: str,
+    files: int = 200,
+    classes_per_file: int = 2,
+    methods_per_class: int = 4,
+    projects: int = 4,
+    seed: int = 42,
+) -> List[str]:
+    """
+    write `files` .cs files spread over `projects` project folders under `root`.
+    every class takes a constructor dependency on a class from another file so that
+    cross-file type resolution is exercised. returns the written file paths.
+    """
+    rnd = random.Random(seed)
+    written = []
+    for i in range(files):
+        project = f"Project{i % projects}"
+        folder = os.path.join(root, "src", project, f"Area{(i // projects) % 8}")
+        os.makedirs(folder, exist_ok=True)
+        csproj = os.path.join(root, "src", project, f"{project}.csproj")
+        if not os.path.isfile(csproj):
+            with open(csproj, "w", encoding="utf-8") as f:
+                f.write('<Project Sdk="Microsoft.NET.Sdk">\n  <PropertyGroup>\n'
+                        '    <TargetFramework>net8.0</TargetFramework>\n  </PropertyGroup>\n</Project>\n')
+        path = os.path.join(folder, f"Service{i}.cs")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_render_file(rnd, i, project, files, projects, classes_per_file, methods_per_class))
+        written.append(path)
+    return written
+
+def _render_file(rnd, index, project, files, projects, classes_per_file, methods_per_class) -> str:
+    lines = [
+        "using System;",
+        "using System.Collections.Generic;",
+        "using System.Linq;",
+        "",
+        f"namespace Synthetic.{project};",
+        "",
+    ]
+    for c in range(classes_per_file):
+        name = f"Service{index}_{c}"
+        dep_index = rnd.randrange(files)
+        dep = f"Synthetic.Project{dep_index % projects}.Service{dep_index}_0"
+        lines += [
+            f"public class {name}",
+            "{",
+            f"    private readonly {dep}? _dep;",
+            f"    private readonly List<string> _log = new();",
+            "",
+            f"    public {name}({dep}? dep)",
+            "    {",
+            "        _dep = dep;",
+            "    }",
+            "",
+        ]
+        for m in range(methods_per_class):
+            t = rnd.choice(TYPES)
+            lines += [
+                f"    public {t} Operation{m}({t} input, int count)",
+                "    {",
+                "        if (count < 0) throw new ArgumentOutOfRangeException(nameof(count));",
+                f"        _log.Add($\"Operation{m}:{{input}}\");",
+                "        return input;",
+                "    }",
+                "",
+            ]
+        lines += ["}", ""]
+    return "\n".join(lines)
+
+def describe_synthetic_file(path: str) -> List[Dict[str, Any]]:
+    """
+    the class info the Roslyn extractor reports for a file written by `generate_synthetic_repo`,
+    read back with regexes (the files have one fixed layout), for benchmarks that run without dotnet.
+    """
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    namespace = re.search(r"^namespace ([\w.]+);", source, re.M).group(1)
+    usings = re.findall(r"^using [\w.]+;", source, re.M)
+    classes = []
+    for block in _CLASS_BLOCK_RE.finditer(source):
+        text = block.group(0)
+        ctor = _CTOR_RE.search(text)
+        methods = [{
+            "Name": m.group(2), "ReturnType": m.group(1), "Parameters": m.group(3).split(", "),
+            "Signature": f"public {m.group(1)} {m.group(2)}({m.group(3)})", "IsStatic": False, "IsAbstract": False,
+            "IsAsync": False, "SourceCode": m.group(0).rstrip("\n"),
+        } for m in _METHOD_RE.finditer(text)]
+        classes.append({
+            "FilePath": path, "ClassName": block.group(1), "NamespaceName": namespace, "PublicMethods": methods,
+            "FullSourceCode": source, "UsingDirectivesInFile": usings, "IsStatic": False, "IsAbstract": False,
+            "Constructors": [{"Signature": ctor.group(0).strip(), "Parameters": [ctor.group(1)]}] if ctor else [],
+            "Dependencies": [ctor.group(1).split("?")[0]] if ctor else [],
+            "ClassSourceCode": text.rstrip("\n"), "ReferencedTypes": [],
+        })
+    return classes
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a synthetic C# repository.")
+    ap.add_argument("root")
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--classes-per-file", type=int, default=2)
+    ap.add_argument("--methods-per-class", type=int, default=4)
+    ap.add_argument("--projects", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+    paths = generate_synthetic_repo(args.root, args.files, args.classes_per_file,
+                                    args.methods_per_class, args.projects, args.seed)
+    print(f"wrote {len(paths)} files under {args.root}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,50 @@
 # run.py
 import os
+import sys
+import time
+import asyncio
 import logging
+import argparse
 import tempfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 
-from testgen.repo import get_repo, find_cs_files
-from testgen.cache import init_cache, compute_sha256_hash, get_cached_test, cache_test
-from testgen.extractor import ensure_extractor_tool, extract_classes_info_from_cs_file
-from testgen.generator import generate_nunit_test_class
-from testgen.writer import init_nunit_project, write_test_file, run_and_verify_tests
+from testgen.repo import sync_repo, CloneStrategy, find_cs_files, diff_cs_files, recently_changed_files
+from testgen.cache import (
+    CacheStore, init_cache, find_resumable_run, compute_sha256_hash, lookup_cached_test, cache_test,
+    get_last_processed_sha, set_last_processed_sha, move_cached_file_keys, delete_cached_file_keys,
+    purge_stale_extractions, evict_cached_keys, replace_test_results, get_test_class_durations,
+    get_test_class_sources, get_failing_source_keys, quarantine_test_classes, get_quarantined_test_classes,
+    release_quarantine, has_cached_test, record_generation_time, get_generation_times
+)
+from testgen.cache_maint import maintain_cache
+from testgen.extractor import (
+    ensure_extractor_tool, extract_classes_info_from_cs_file, extract_project, group_classes_by_file, ExtractorPool,
+    ExtractionCache, ExtractionError
+)
+from testgen.generator import (
+    generate_nunit_test_class, agenerate_nunit_test_class, astream_nunit_test_class, agenerate_nunit_test_batch,
+    arepair_nunit_test_class, validate_test_code, batch_section, estimate_tokens, PROMPT_VERSION
+)
+from testgen.compile_check import (
+    CompileChecker, format_diagnostics, merge_references, project_package_references, project_global_usings,
+    source_project_references
+)
+from testgen.ollama_client import OllamaClient
+from testgen.model_session import ModelSession
+from testgen.distributed import Coordinator, Worker
+from testgen.stats import RunStats
+from testgen.tracing import Tracer, set_tracer, span, annotate, write_prometheus_textfile
+from testgen.pipeline import Pipeline, Stage
+from testgen.method_tests import MethodParts
+from testgen.execution import run_test_shards
+from testgen.watch import open_watcher, debounced, RESCAN
+from testgen.discovery import Discovery, DEFAULT_EXCLUDE
+from testgen.scheduling import CostModel, estimate_file, order_longest_first, predict_makespan
+from testgen.journal import RunJournal, config_hash, run_is_active, describe_runs, format_run_status
+from testgen.writer import (
+    init_nunit_project, write_test_file, remove_test_file, move_test_file, remove_orphaned_test_files,
+    generated_test_files
+)
 
 # ------------- CONFIGURATION -------------
 REPO_URL = "https://github.com/anuraj/MinimalApi"
@@ -18,72 +54,1084 @@ OLLAMA_MODEL = "qwen2.5:7b"
 TEST_PROJECT_NAME = "GeneratedTests"
 FORCE_REGENERATE = False
 DRY_RUN = False          # <── set True to preview but not write or run
-MAX_WORKERS = 1 # setting to test 1 for initial tetsing to process one .cs file creation at a time
+# keep a persistent clone and only process .cs files changed since the last fully processed commit
+INCREMENTAL = True
+REPO_CLONE_DIR = os.path.join(OUTPUT_DIR, "repo_clone")
+# how the repo is fetched. CLONE_MIRROR_DIR keeps a bare mirror of every remote, shared by all runs
+# and repos (None: clone straight from the remote), and the working tree borrows its objects with
+# CLONE_LINK "reference" (git clone --reference) or "worktree" (git worktree add). CLONE_DEPTH = 1
+# fetches only the tip commit (incremental runs then usually fall back to full runs), CLONE_BLOBLESS
+# makes a partial clone that downloads file contents as they are checked out, and CLONE_SPARSE checks
+# out only .cs and project files
+CLONE_MIRROR_DIR = os.path.join(os.path.expanduser("~"), ".cache", "testgen", "mirrors")
+CLONE_LINK = "reference"
+CLONE_DEPTH = None
+CLONE_BLOBLESS = False
+CLONE_SPARSE = True
+# which files get tests: those `git ls-files` lists (so .gitignore holds) minus DISCOVERY_EXCLUDE globs
+# (designer, source-generator and assembly-info files, EF Core model snapshots), files outside
+# DISCOVERY_INCLUDE (empty: all), generated files (<auto-generated> header, [GeneratedCode]), EF Core
+# migrations and test projects. tests generated earlier for such files are removed; the compile
+# check still sees every source
+DISCOVERY_INCLUDE = ()
+DISCOVERY_EXCLUDE = DEFAULT_EXCLUDE
+SKIP_GENERATED_FILES = True
+SKIP_TEST_PROJECTS = True
+# "server": warm `dotnet <extractor> --server` workers, "project": one shared compilation over all
+# files (resolves types across files), "process": one `dotnet` process per file
+EXTRACTION_MODE = "server"
+EXTRACTOR_WORKERS = 2
+EXTRACTION_CACHE = True  # reuse extractor output for unchanged files (stat check, then content hash)
+# "http": async client on the Ollama REST API, "cli": `ollama run` per class, "distributed": see below
+GENERATION_BACKEND = "http"
+OLLAMA_URL = "http://localhost:11434"
+MAX_INFLIGHT_REQUESTS = 4  # concurrent generation requests sent to Ollama
+GENERATION_TIMEOUT_SEC = 300
+STREAM_GENERATION = True  # validate tokens as they stream and cancel clearly unusable completions
+PROMPT_TOKEN_BUDGET = 3000  # estimated tokens per class prompt; the least useful context is dropped to fit
+# the model stays loaded for the whole run: it is loaded before the first generation request (a run
+# with every test cached never loads it) and MODEL_KEEP_ALIVE goes with every request (-1: until the
+# run ends, else seconds or a duration such as "30m"). WARM_MODEL also sends the prefix every prompt
+# shares (generator.PROMPT_PREFIX) once per in-flight request, so the server reuses its KV cache.
+# after the run the model gets MODEL_KEEP_ALIVE_AFTER (Ollama's usual idle timeout; 0 unloads it,
+# None keeps MODEL_KEEP_ALIVE)
+MODEL_KEEP_ALIVE = -1
+WARM_MODEL = True
+MODEL_KEEP_ALIVE_AFTER = "5m"
+# GENERATION_BACKEND = "distributed": the run becomes a coordinator. it still discovers, extracts,
+# probes the cache, compile-checks, caches and writes, but its generation requests (classes, batches,
+# repairs) are served at COORDINATOR_HOST:COORDINATOR_PORT to workers on the inference boxes, each
+# generating against its own Ollama: `python run.py worker --coordinator http://build-host:8765
+# --ollama-url http://localhost:11434`. a worker renews its lease on a task while it works on it; a
+# task whose lease runs out for COORDINATOR_LEASE_SEC (the worker died) goes to another worker, up to
+# COORDINATOR_MAX_ATTEMPTS times. COORDINATOR_INFLIGHT tasks are out at once, for all workers together.
+# COORDINATOR_TOKEN (or $TESTGEN_COORDINATOR_TOKEN) is a shared secret the workers must send
+COORDINATOR_HOST = "127.0.0.1"  # "0.0.0.0" to accept workers on other machines
+COORDINATOR_PORT = 8765
+COORDINATOR_LEASE_SEC = 60
+COORDINATOR_MAX_ATTEMPTS = 3
+COORDINATOR_INFLIGHT = 16
+COORDINATOR_TOKEN = os.environ.get("TESTGEN_COORDINATOR_TOKEN")
+WORKER_INFLIGHT = MAX_INFLIGHT_REQUESTS
+# "class": one cached test class per class; "method": tests cached per public method, so editing a
+# method regenerates only its tests, which are merged back into the class skeleton
+GENERATION_GRANULARITY = "class"
+# pack classes whose prompt section is under SMALL_CLASS_TOKENS (DTOs, records, options) into one
+# prompt of up to BATCH_TOKEN_BUDGET tokens / MAX_BATCH_CLASSES classes (http backend only);
+# classes the batched answer gets wrong are retried on their own
+BATCH_SMALL_CLASSES = True
+SMALL_CLASS_TOKENS = 400
+BATCH_TOKEN_BUDGET = PROMPT_TOKEN_BUDGET
+MAX_BATCH_CLASSES = 6
+# compile each generated test class in memory against the sources, their projects' packages and the
+# test project's packages before it is cached or written: "advisory" only logs the errors, "repair"
+# sends them back to the model (up to COMPILE_REPAIR_ATTEMPTS times, http backend), "reject" drops
+# the class, None skips the check. while the sources themselves do not compile (unrestored projects),
+# errors are advisory whatever the mode
+COMPILE_CHECK = "advisory"
+COMPILE_CHECK_RESTORE = False  # `dotnet restore` source projects without restore output first
+COMPILE_CHECK_WORKERS = 1
+COMPILE_REPAIR_ATTEMPTS = 1
+# independently sized worker pools per pipeline stage; generation keeps MAX_INFLIGHT_REQUESTS busy
+STAGE_WORKERS = {
+    "extract": EXTRACTOR_WORKERS,
+    "probe": 2,
+    "batch": 1,
+    "generate": MAX_INFLIGHT_REQUESTS,
+    "validate": 2,  # compile checks and repair requests happen here
+    "write": 1,  # must stay 1: it gathers the classes of each source file into one test file
+}
+STAGE_QUEUE_SIZE = 32  # bounded queues between stages give backpressure
+# order in which source files enter the pipeline: "longest_first" predicts each file's generation
+# time (from the classes' earlier generation times, else their method counts; cached classes are
+# nearly free) and starts the longest ones first, so no big file is left for the end; "walk" keeps
+# os.walk order. files touched by the last PRIORITIZE_RECENT_COMMITS commits go before all others
+SCHEDULING = "longest_first"
+PRIORITIZE_RECENT_COMMITS = 20
+# the generated tests run as TEST_SHARDS concurrent `dotnet test` processes, balanced by the
+# durations recorded in test_cache.db. a failing test class is traced back to the class it tests:
+# "regenerate" drops its cached tests so the next run generates them again (and quarantines it if
+# the fresh tests fail too), "quarantine" excludes it from later test runs, None only reports it
+RUN_TESTS = True
+TEST_SHARDS = 4
+ON_TEST_FAILURE = "regenerate"
+# `python run.py watch --path <working tree>` is a daemon for the edit loop: it keeps the extractor,
+# test_cache.db and the model warm, and when .cs files are saved (inotify, else polling every
+# WATCH_POLL_SEC) it regenerates the classes of just those files and builds and runs just their
+# test classes. a burst of saves is one change once nothing changed for WATCH_DEBOUNCE_SEC, but
+# never waits longer than WATCH_MAX_DELAY_SEC. WATCH_CATCH_UP first brings the whole tree up to date
+WATCH_DEBOUNCE_SEC = 0.3
+WATCH_MAX_DELAY_SEC = 2.0
+WATCH_POLL_SEC = 1.0
+WATCH_INOTIFY = True
+WATCH_RUN_TESTS = RUN_TESTS
+WATCH_CATCH_UP = False
+# per-run instrumentation: TRACING records a span for every stage, file, class, Ollama request,
+# SQLite commit and dotnet call and writes them to TRACE_FILE as a Chrome trace (chrome://tracing,
+# ui.perfetto.dev) or OTLP/JSON ("otlp"); METRICS_FILE gets the run's counters and latency
+# histograms in the Prometheus text format (node_exporter textfile collector). None disables it
+TRACING = False
+TRACE_FORMAT = "chrome"
+TRACE_FILE = os.path.join(OUTPUT_DIR, "trace.json")
+METRICS_FILE = os.path.join(OUTPUT_DIR, "testgen.prom")
+# every run keeps a journal of its files and classes in test_cache.db. a run that dies is resumed by
+# the next one on the same commit and settings (a non-incremental run keeps its clone for that):
+# written files are skipped, failed classes are retried up to RESUME_MAX_ATTEMPTS times in total.
+# `python run.py status` shows the progress of the current and latest runs
+RESUME_RUNS = True
+RESUME_MAX_ATTEMPTS = 3
+# test_cache.db upkeep after every run (or on demand: `python run.py cache-maint`)
+CACHE_MAINTENANCE = True
+CACHE_MAX_AGE_DAYS = 90              # evict tests neither generated nor reused for this long (None: keep)
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # LRU-evict down to this many bytes of cached tests (None: no budget)
+CACHE_KEEP_OTHER_MODELS = False      # keep tests generated by models other than OLLAMA_MODEL
+CACHE_COMPRESSION = None             # None, "zlib" or "zstd" (needs `zstandard`) for stored test code
+CACHE_VACUUM_INTERVAL_DAYS = 7
 # ------------------------------------------------
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
-def main():
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate NUnit tests for a C# repository with a local LLM.")
+    sub = ap.add_subparsers(dest="command")
+    sub.add_parser("run", help="clone, extract, generate and run tests (default)")
+    maint = sub.add_parser("cache-maint", help="evict, re-encode and compact test_cache.db")
+    maint.add_argument("--max-age-days", type=float, default=CACHE_MAX_AGE_DAYS)
+    maint.add_argument("--max-bytes", type=int, default=CACHE_MAX_BYTES)
+    maint.add_argument("--drop-other-models", action="store_true", default=not CACHE_KEEP_OTHER_MODELS)
+    maint.add_argument("--keep-other-models", dest="drop_other_models", action="store_false")
+    maint.add_argument("--compression", choices=["none", "zlib", "zstd"], default=CACHE_COMPRESSION or "none")
+    maint.add_argument("--vacuum", action="store_true", help="VACUUM even if it is not due")
+    status = sub.add_parser("status", help="show the progress of the current and latest runs")
+    status.add_argument("--runs", type=int, default=3, help="how many runs to show")
+    status.add_argument("--json", action="store_true")
+    worker = sub.add_parser("worker", help="generate tests for a distributed run with this machine's Ollama")
+    worker.add_argument("--coordinator", default=f"http://{COORDINATOR_HOST}:{COORDINATOR_PORT}")
+    worker.add_argument("--ollama-url", default=OLLAMA_URL)
+    worker.add_argument("--inflight", type=int, default=WORKER_INFLIGHT, help="tasks generated at once")
+    worker.add_argument("--id", help="worker name in the coordinator's report (default host:pid)")
+    worker.add_argument("--token", default=COORDINATOR_TOKEN, help="the coordinator's shared secret "
+                        "(default: COORDINATOR_TOKEN, i.e. $TESTGEN_COORDINATOR_TOKEN)")
+    worker.add_argument("--forever", action="store_true", help="wait for the next run instead of exiting")
+    worker.add_argument("--connect-timeout", type=float, default=60.0,
+                        help="seconds to wait for the coordinator to come up")
+    watch_cmd = sub.add_parser("watch", help="regenerate and test the classes of .cs files as they are saved")
+    watch_cmd.add_argument("--path", default=".", help="local working tree to watch (default: current directory)")
+    watch_cmd.add_argument("--catch-up", action="store_true", default=WATCH_CATCH_UP,
+                           help="bring the whole tree up to date before waiting for changes")
+    watch_cmd.add_argument("--no-tests", dest="run_tests", action="store_false", default=WATCH_RUN_TESTS,
+                           help="write the test files but do not build and run them")
+    args = ap.parse_args(argv)
+
+    if args.command == "cache-maint":
+        maintain_cache(
+            os.path.join(OUTPUT_DIR, "test_cache.db"),
+            max_age_days=args.max_age_days,
+            max_bytes=args.max_bytes,
+            keep_models=[OLLAMA_MODEL] if args.drop_other_models else None,
+            compression=None if args.compression == "none" else args.compression,
+            vacuum_interval_days=CACHE_VACUUM_INTERVAL_DAYS,
+            force_vacuum=args.vacuum,
+        )
+        return
+    if args.command == "status":
+        show_status(args.runs, args.json)
+        return
+    if args.command == "worker":
+        sys.exit(Worker(args.coordinator, args.ollama_url, args.inflight, args.id, args.token,
+                        args.forever, args.connect_timeout).run())
+    if args.command == "watch":
+        watch(args.path, args.catch_up, args.run_tests)
+        return
+    run()
+
+def show_status(limit=3, as_json=False) -> None:
+    cache_db = os.path.join(OUTPUT_DIR, "test_cache.db")
+    if not os.path.isfile(cache_db):
+        print("No runs recorded yet")
+        return
+    conn = init_cache(cache_db)
+    try:
+        runs = describe_runs(conn, REPO_URL, BRANCH, limit=limit)
+    finally:
+        conn.close()
+    if as_json:
+        import json
+        print(json.dumps(runs, indent=2))
+        return
+    if not runs:
+        print(f"No runs recorded for {REPO_URL}@{BRANCH}")
+    for run_info in runs:
+        print("\n".join(format_run_status(run_info)))
+
+def run():
     # inintal preparation
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     cache_db = os.path.join(OUTPUT_DIR, "test_cache.db")
-    cache_conn = init_cache(cache_db, allow_threads=True)
+    cache_conn = CacheStore(cache_db)
+    stats = RunStats()
+    tracer = Tracer(enabled=TRACING)
+    set_tracer(tracer)
 
-    tmp_repo = tempfile.mkdtemp(prefix="testgen_repo_")
+    previous = find_resumable_run(cache_conn, REPO_URL, BRANCH) if RESUME_RUNS and not DRY_RUN else None
+    if previous and run_is_active(previous):
+        logger.error(f"Run {previous['run_id']} (pid {previous['pid']}) is still in progress; "
+                     f"see `python run.py status`")
+        cache_conn.close()
+        return
+    if INCREMENTAL:
+        tmp_repo = REPO_CLONE_DIR
+    elif previous and previous["clone_dir"] and os.path.isdir(previous["clone_dir"]):
+        tmp_repo = previous["clone_dir"]  # the unfinished run's clone
+    else:
+        tmp_repo = tempfile.mkdtemp(prefix="testgen_repo_")
+    extractor_pool = None
+    checker = None
+    journal = None
+    completed = False
+    run_status = "interrupted"
+    seen_since = None  # start of a clean full run: every live cache row was touched after it
     try:
-        # 1 clone
-        get_repo(tmp_repo, REPO_URL, BRANCH)
+        # 1 clone (or update the persistent clone)
+        with span("git.sync", repo=REPO_URL, branch=BRANCH):
+            strategy = CloneStrategy(CLONE_MIRROR_DIR, CLONE_LINK, CLONE_DEPTH, CLONE_BLOBLESS, CLONE_SPARSE)
+            repo, clone_report = sync_repo(tmp_repo, REPO_URL, BRANCH, strategy)
+            stats.observe(f"clone.{clone_report.action}_sec", clone_report.wall_sec)
+            stats.incr("clone.bytes_fetched", clone_report.bytes_fetched)
+            head_sha = repo.head.commit.hexsha
+        discovery = Discovery(
+            tmp_repo, DISCOVERY_INCLUDE, DISCOVERY_EXCLUDE, SKIP_GENERATED_FILES, SKIP_TEST_PROJECTS
+        )
+        if RESUME_RUNS and not DRY_RUN:
+            settings = config_hash(
+                model=OLLAMA_MODEL, prompt=PROMPT_VERSION, granularity=GENERATION_GRANULARITY,
+                project=TEST_PROJECT_NAME, force=FORCE_REGENERATE, incremental=INCREMENTAL
+            )
+            journal = RunJournal.open(
+                cache_conn, REPO_URL, BRANCH, head_sha, settings, tmp_repo, RESUME_MAX_ATTEMPTS, previous
+            )
         # 2 build extractor
-        extractor_dll, _ = ensure_extractor_tool(OUTPUT_DIR)
-        # 3 init test project
-        test_proj_dir = init_nunit_project(OUTPUT_DIR, TEST_PROJECT_NAME)
+        with span("extractor.ensure"):
+            extractor_dll, _ = ensure_extractor_tool(OUTPUT_DIR)
+        extraction_cache = None
+        if EXTRACTION_CACHE:
+            extraction_cache = ExtractionCache(cache_conn, stats=stats)
+            purge_stale_extractions(cache_conn, extraction_cache.version)
+        if EXTRACTION_MODE == "project":
+            cs_files = list(find_cs_files(tmp_repo))
+            # the shared compilation needs every file, so it only runs if something is not cached
+            by_file = {}
+            if not (extraction_cache and all(extraction_cache.lookup(f, count=False)[0] is not None for f in cs_files)):
+                with span("extractor.project", files=len(cs_files)):
+                    try:
+                        by_file = group_classes_by_file(extract_project(extractor_dll, cs_files=cs_files))
+                    except ExtractionError as e:
+                        logger.error(f"{e}; no file is extracted in this run")
 
-        # 4 process all .cs files in parallel
-        futures = []
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as exe:
-            for csf in find_cs_files(tmp_repo):
-                futures.append(exe.submit(process_file, test_proj_dir, csf, tmp_repo, extractor_dll, cache_conn))
+            def extract(f):
+                # a file the project extractor failed on must raise, or the cache would take it for one without classes
+                classes = by_file.get(os.path.abspath(f))
+                if classes is None:
+                    raise ExtractionError(f"the project extractor did not extract {f}")
+                return classes
+        elif EXTRACTION_MODE == "server":
+            extractor_pool = ExtractorPool(extractor_dll, size=EXTRACTOR_WORKERS)
+            extract = partial(extractor_pool.extract, strict=True)
+        else:
+            extract = partial(extract_classes_info_from_cs_file, extractor_dll=extractor_dll, strict=True)
+        if extraction_cache:
+            extract = extraction_cache.wrap(extract)
+        # 3 init test project
+        with span("test_project.init"):
+            test_proj_dir = init_nunit_project(OUTPUT_DIR, TEST_PROJECT_NAME)
+        if COMPILE_CHECK:
+            checker = new_compile_checker(extractor_dll, tmp_repo, test_proj_dir, stats)
 
-            for fut in as_completed(futures):
-                success = fut.result()
-                if not success:
-                    logger.warning("One file processing failed; see logs above.")
+        # 4 discover -> extract -> probe -> batch -> generate -> validate -> write, as a staged pipeline
+        inputs = [tmp_repo]
+        if INCREMENTAL and not FORCE_REGENERATE:
+            inputs = plan_incremental_inputs(repo, tmp_repo, head_sha, test_proj_dir, cache_conn, stats)
+        full_run = inputs == [tmp_repo]
+        predicted = None
+        if SCHEDULING == "longest_first":
+            inputs, predicted = schedule_inputs(
+                inputs, repo, tmp_repo, extraction_cache, cache_conn, stats, discovery
+            )
+        run_started = time.time()
+        generated = {}  # test class name -> (source key, generated in this run)
+        untestable = set()  # source files without any testable class left
+        with span("pipeline", inputs=len(inputs)):
+            asyncio.run(run_pipeline(
+                test_proj_dir, tmp_repo, inputs, extract, cache_conn, stats, checker, generated, untestable, journal,
+                discovery
+            ))
+        if predicted is not None:
+            actual = time.time() - run_started
+            stats.incr("schedule.actual_makespan_sec", actual)
+            logger.info(f"Pipeline took {actual:.1f}s against a predicted {predicted:.1f}s")
+        # tests generated before a file was excluded (e.g. EF Core migrations) go too
+        for rel in generated_test_files(test_proj_dir).values():
+            if discovery.check(os.path.join(tmp_repo, rel)):
+                untestable.add(rel)
+        report_discovery(discovery, stats)
+        stats.incr("tests.files_removed", len(remove_orphaned_test_files(
+            test_proj_dir, tmp_repo, untestable, dry_run=DRY_RUN
+        )))
+        failures = sum(stats.counter(c) for c in ("generation.failed", "validation.rejected", "pipeline.errors"))
+        if INCREMENTAL and not DRY_RUN:
+            if failures:
+                logger.warning(f"{int(failures)} classes failed; keeping the previous commit as the incremental base")
+            else:
+                set_last_processed_sha(cache_conn, REPO_URL, BRANCH, head_sha)
+        if full_run and not failures and not (journal and journal.resumed):
+            seen_since = run_started
+        completed = True
+        run_status = "incomplete" if failures else "completed"
 
         # 5 run tests
-        run_and_verify_tests(test_proj_dir, dry_run=DRY_RUN)
+        if RUN_TESTS:
+            with span("tests", shards=TEST_SHARDS):
+                run_generated_tests(test_proj_dir, cache_conn, generated, stats, journal)
+
+    finally:
+        if journal:
+            journal.finish(run_status)
+        if extractor_pool:
+            extractor_pool.close()
+        if checker:
+            checker.close()
+        cache_conn.close()
+        if CACHE_MAINTENANCE and completed and not DRY_RUN:
+            with span("cache.maintenance"):
+                run_cache_maintenance(cache_db, stats, seen_since)
+        if not INCREMENTAL:
+            if journal and run_status != "completed":
+                logger.info(f"keeping the repo clone {tmp_repo} to resume the run")
+            else:
+                logger.info("cleaning up repo clone")
+                import shutil
+                shutil.rmtree(tmp_repo, ignore_errors=True)
+        for line in stats.summary_lines():
+            logger.info(f"[summary] {line}")
+        export_run_metrics(stats, tracer)
 
+def watch(path, catch_up=WATCH_CATCH_UP, run_tests=WATCH_RUN_TESTS) -> None:
+    """
+    the edit loop on a local working tree: set up the extractor, test_cache.db, the test project and
+    the model once, then regenerate and test the classes of every batch of saved .cs files until
+    interrupted. the tree is used as it is (no clone, no incremental base, no run journal).
+    """
+    root = os.path.abspath(path)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    cache_conn = CacheStore(os.path.join(OUTPUT_DIR, "test_cache.db"))
+    stats = RunStats()
+    tracer = Tracer(enabled=TRACING)
+    set_tracer(tracer)
+    extractor_pool = None
+    try:
+        discovery = Discovery(root, DISCOVERY_INCLUDE, DISCOVERY_EXCLUDE, SKIP_GENERATED_FILES, SKIP_TEST_PROJECTS)
+        with span("extractor.ensure"):
+            extractor_dll, _ = ensure_extractor_tool(OUTPUT_DIR)
+        # a few files at a time: the warm extractor servers, whatever EXTRACTION_MODE says
+        extractor_pool = ExtractorPool(extractor_dll, size=EXTRACTOR_WORKERS)
+        extract = partial(extractor_pool.extract, strict=True)
+        if EXTRACTION_CACHE:
+            extraction_cache = ExtractionCache(cache_conn, stats=stats)
+            purge_stale_extractions(cache_conn, extraction_cache.version)
+            extract = extraction_cache.wrap(extract)
+        with span("test_project.init"):
+            test_proj_dir = init_nunit_project(OUTPUT_DIR, TEST_PROJECT_NAME)
+        asyncio.run(watch_changes(root, test_proj_dir, extractor_dll, extract, cache_conn, stats, discovery,
+                                  catch_up, run_tests))
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
     finally:
+        if extractor_pool:
+            extractor_pool.close()
         cache_conn.close()
-        logger.info("cleaning up repo clone")
-        import shutil
-        shutil.rmtree(tmp_repo, ignore_errors=True)
-
-def process_file(test_proj_dir, cs_file, repo_root, extractor_dll, cache_conn) -> bool:
-    """
-    extract classes --> then generate or fetch from cache --> write test file
-    returns True if at least one test was written
-    """
-    wrote_any = False
-    infos = extract_classes_info_from_cs_file(cs_file, extractor_dll)
-    for cls in infos:
-        key = f"{os.path.relpath(cs_file, repo_root)}::{cls['ClassName']}"
-        src_hash = compute_sha256_hash(cls["FullSourceCode"])
-
-        code = None
-        if not FORCE_REGENERATE:
-            code = get_cached_test(cache_conn, key, src_hash, OLLAMA_MODEL)
-        if code:
-            logger.info(f"cache hit for {cls['ClassName']}")
+        for line in stats.summary_lines():
+            logger.info(f"[summary] {line}")
+        export_run_metrics(stats, tracer)
+
+async def watch_changes(root, test_proj_dir, extractor_dll, extract, cache_conn, stats, discovery, catch_up=False,
+                        run_tests=True) -> None:
+    # one client and model session for every change; a distributed run starts its coordinator per change
+    generation = open_generation(stats) if GENERATION_BACKEND != "distributed" else None
+    watcher = open_watcher(root, ignore=[OUTPUT_DIR], poll_sec=WATCH_POLL_SEC, use_inotify=WATCH_INOTIFY)
+    checker = None
+    restore = True  # the first build restores packages, later ones skip that
+    try:
+        if generation:
+            await generation[1].ready()
+        changed = {RESCAN} if catch_up else set()
+        logger.info(f"Watching {root} for .cs changes ({type(watcher).__name__}); Ctrl+C to stop")
+        while True:
+            # short waits, so the thread is free again soon after Ctrl+C
+            changed = changed or await asyncio.to_thread(
+                debounced, watcher, WATCH_DEBOUNCE_SEC, WATCH_MAX_DELAY_SEC, 1.0
+            )
+            if not changed:
+                continue
+            started = time.monotonic()
+            with span("watch.change", files=len(changed)):
+                inputs, removed = forget_changes(changed, root, test_proj_dir, cache_conn, discovery)
+                generated = {}
+                untestable = set()
+                if checker and RESCAN in changed:
+                    checker.close()  # events were lost, so which of its sources are stale is unknown
+                    checker = None
+                if checker:
+                    # its workers re-parse just the edited files; deletions count too
+                    await asyncio.to_thread(checker.update, changed)
+                if inputs:
+                    if COMPILE_CHECK and not checker:
+                        checker = new_compile_checker(extractor_dll, root, test_proj_dir, stats)
+                    await run_pipeline(
+                        test_proj_dir, root, inputs, extract, cache_conn, stats, checker, generated, untestable,
+                        discovery=discovery, generation=generation
+                    )
+                for rel in untestable:
+                    removed += remove_test_file(test_proj_dir, rel, dry_run=DRY_RUN) is not None
+                written = time.monotonic() - started
+                fresh = sum(is_new for _, is_new in generated.values())
+                logger.info(f"[watch] {len(changed)} changed files: {fresh} of {len(generated)} classes generated, "
+                            f"{removed} test files removed in {written:.1f}s")
+                stats.observe("watch.write_sec", written)
+                # every test class of a changed file runs: its tests may be cached, the code under test is not
+                if run_tests and generated:
+                    await asyncio.to_thread(
+                        run_generated_tests, test_proj_dir, cache_conn, generated, stats, only=list(generated),
+                        restore=restore
+                    )
+                    restore = False
+                    stats.observe("watch.test_sec", time.monotonic() - started - written)
+            stats.incr("watch.changes")
+            changed = set()
+    finally:
+        watcher.close()
+        if checker:
+            checker.close()
+        if generation:
+            await generation[1].close()
+            await generation[1].client.close()
+
+def forget_changes(changed, root, test_proj_dir, cache_conn, discovery):
+    """
+    turn a batch of changed paths into pipeline inputs. deleted files lose their test files and
+    cache rows; RESCAN (lost events) makes the whole tree the input. returns (inputs, files removed).
+    """
+    if RESCAN in changed:
+        discovery.forget(discovery.list_files(root))
+        return [root], len(remove_orphaned_test_files(test_proj_dir, root, dry_run=DRY_RUN))
+    discovery.forget(changed)
+    removed = 0
+    for path in sorted(p for p in changed if not os.path.isfile(p)):
+        rel = os.path.relpath(path, root)
+        removed += remove_test_file(test_proj_dir, rel, dry_run=DRY_RUN) is not None
+        if not DRY_RUN:
+            delete_cached_file_keys(cache_conn, rel)
+    return sorted(p for p in changed if os.path.isfile(p)), removed
+
+def export_run_metrics(stats, tracer) -> None:
+    try:
+        if tracer.enabled and TRACE_FILE:
+            tracer.write_trace(TRACE_FILE, TRACE_FORMAT)
+            logger.info(f"Wrote {len(tracer.spans)} spans to {TRACE_FILE}")
+        if METRICS_FILE:
+            write_prometheus_textfile(METRICS_FILE, stats, tracer)
+    except OSError as e:
+        logger.error(f"Could not export run metrics: {e}")
+
+def run_cache_maintenance(cache_db, stats, seen_since) -> None:
+    try:
+        report = maintain_cache(
+            cache_db,
+            max_age_days=CACHE_MAX_AGE_DAYS,
+            max_bytes=CACHE_MAX_BYTES,
+            keep_models=None if CACHE_KEEP_OTHER_MODELS else [OLLAMA_MODEL],
+            seen_since=seen_since,
+            compression=CACHE_COMPRESSION,
+            vacuum_interval_days=CACHE_VACUUM_INTERVAL_DAYS,
+        )
+    except Exception as e:
+        logger.error(f"Cache maintenance failed: {e}")
+        return
+    for reason in ("unseen", "expired", "other_models", "over_budget"):
+        if report[reason]:
+            stats.incr(f"cache.evicted[{reason}]", report[reason])
+    stats.incr("cache.reclaimed_bytes", report["reclaimed_bytes"])
+
+def run_generated_tests(test_proj_dir, cache_conn, generated, stats, journal=None, only=None, restore=True) -> None:
+    """
+    run the test project (or just the test classes in `only`) in duration-balanced shards, record
+    every test's outcome and duration against the class it tests, and act on failures as
+    ON_TEST_FAILURE says.
+    """
+    report = run_test_shards(
+        test_proj_dir, shards=TEST_SHARDS, durations=get_test_class_durations(cache_conn),
+        quarantined=get_quarantined_test_classes(cache_conn), dry_run=DRY_RUN, only=only, restore=restore
+    )
+    if report is None or not report.build_ok:
+        return
+    for outcome, counter in (("Passed", "tests.passed"), ("Failed", "tests.failed"), ("NotExecuted", "tests.skipped")):
+        stats.incr(counter, report.count(outcome))
+    for wall in report.shard_wall_sec:
+        stats.observe("tests.shard_wall_sec", wall)
+
+    # generated test classes are named `<Class>Tests`; older ones are known from earlier runs
+    sources = {name.rsplit(".", 1)[-1]: key for name, key in get_test_class_sources(cache_conn).items()}
+    sources.update({name: key for name, (key, _) in generated.items()})
+    source_of = lambda test_class: sources.get(test_class.rsplit(".", 1)[-1])
+    previously_failing = set(get_failing_source_keys(cache_conn))
+    replace_test_results(
+        cache_conn, dict.fromkeys(report.test_classes + [o.test_class for o in report.outcomes]),
+        [(o.name, o.test_class, source_of(o.test_class), o.outcome, o.duration_sec, o.message) for o in report.outcomes]
+    )
+
+    evict, quarantine = [], []
+    for test_class, failed in sorted(report.failures_by_class().items()):
+        key = source_of(test_class)
+        first_line = (failed[0].message or "").strip().split("\n")[0]
+        logger.error(f"{len(failed)} tests of {test_class} failed (source: {key or 'unknown'}), "
+                     f"e.g. {failed[0].name}: {first_line}")
+        if not key or not ON_TEST_FAILURE:
+            continue
+        fresh = generated.get(test_class.rsplit(".", 1)[-1], (None, False))[1]
+        if ON_TEST_FAILURE == "regenerate" and not (fresh and key in previously_failing):
+            evict.append(key)
+        else:
+            quarantine.append((test_class, key, f"{len(failed)} failed: {failed[0].name}"))
+    if evict:
+        evict_cached_keys(cache_conn, evict)
+        stats.incr("tests.evicted_classes", len(evict))
+        if journal:
+            journal.reopen_files(key.split("::", 1)[0] for key in evict)
+        logger.info(f"{len(evict)} classes with failing tests will be generated again on the next run"
+                    + (" (or save)" if only is not None else ""))
+    if quarantine:
+        quarantine_test_classes(cache_conn, quarantine)
+        stats.incr("tests.quarantined_classes", len(quarantine))
+        logger.warning(f"Quarantined {len(quarantine)} test classes: {', '.join(c for c, _, _ in quarantine)}")
+
+def report_discovery(discovery, stats) -> None:
+    for reason, (files, classes) in discovery.report.skipped.items():
+        stats.incr(f"discovery.skipped_files[{reason}]", files)
+        stats.incr(f"discovery.skipped_classes[{reason}]", classes)
+    for line in discovery.report.lines():
+        logger.info(f"[discovery] skipped {line}")
+
+def expand_input(path, discovery=None) -> list:
+    """
+    the source files of a pipeline input: a directory is listed, an explicit file (incremental
+    runs) passes through; both go through `discovery`'s rules if given.
+    """
+    if os.path.isdir(path):
+        return discovery.discover(path) if discovery else list(find_cs_files(path))
+    return discovery.filter([path]) if discovery else [path]
+
+def schedule_inputs(inputs, repo, repo_root, extraction_cache, cache_conn, stats, discovery=None):
+    """
+    expand the inputs to source files and order them as SCHEDULING says. returns (files, predicted
+    makespan in seconds); the prediction of os.walk order is logged next to it.
+    """
+    files = [f for path in inputs for f in expand_input(path, discovery)]
+    model = CostModel(get_generation_times(cache_conn))
+    recent = set(recently_changed_files(repo, PRIORITIZE_RECENT_COMMITS)) if PRIORITIZE_RECENT_COMMITS else set()
+    if len(recent) >= len(files):
+        recent = set()  # e.g. the initial import is among the recent commits: nothing stands out
+    work = []
+    for cs_file in files:
+        rel = os.path.relpath(cs_file, repo_root)
+        classes = extraction_cache.lookup(cs_file, count=False)[0] if extraction_cache else None
+        known = None
+        if classes is not None:
+            known = [(key, len(cls.get("PublicMethods") or []), not FORCE_REGENERATE and has_cached_test(
+                cache_conn, key, class_source_hash(cls), OLLAMA_MODEL, PROMPT_VERSION
+            )) for cls in classes for key in [f"{rel}::{cls['ClassName']}"]]
+        item = estimate_file(cs_file, model, known, rel)
+        item.priority = int(rel.replace(os.sep, "/") in recent)
+        stats.incr(f"schedule.files[{item.basis}]")
+        work.append(item)
+    ordered = order_longest_first(work)
+    workers = STAGE_WORKERS["generate"]
+    predicted = predict_makespan([w.cost_sec for w in ordered], workers)
+    walk_order = predict_makespan([w.cost_sec for w in work], workers)
+    stats.incr("schedule.predicted_makespan_sec", predicted)
+    stats.incr("schedule.walk_order_makespan_sec", walk_order)
+    logger.info(f"Scheduled {len(ordered)} files ({sum(w.priority > 0 for w in ordered)} recently changed first), "
+                f"predicted makespan {predicted:.1f}s (os.walk order: {walk_order:.1f}s)")
+    if ordered:
+        logger.info(f"Longest: {', '.join(f'{os.path.relpath(w.path, repo_root)} ~{w.cost_sec:.0f}s' for w in ordered[:3])}")
+    return [w.path for w in ordered], predicted
+
+def plan_incremental_inputs(repo, repo_root, head_sha, test_proj_dir, cache_conn, stats) -> list:
+    """
+    turn the git diff since the last processed commit into pipeline inputs. deleted files lose
+    their test files and cache rows, renamed files take both with them before being re-checked.
+    falls back to the whole tree when there is no usable base commit.
+    """
+    last_sha = get_last_processed_sha(cache_conn, REPO_URL, BRANCH)
+    changes = diff_cs_files(repo, last_sha, head_sha) if last_sha else None
+    if changes is None:
+        logger.info("No previous run recorded for this repo; processing every file")
+        return [repo_root]
+    logger.info(f"Incremental run {last_sha[:12]}..{head_sha[:12]}: {changes}")
+    for rel in changes.deleted:
+        remove_test_file(test_proj_dir, rel, dry_run=DRY_RUN)
+        if not DRY_RUN:
+            delete_cached_file_keys(cache_conn, rel)
+        stats.incr("incremental.deleted")
+    for old, new in changes.renamed:
+        move_test_file(test_proj_dir, old, new, dry_run=DRY_RUN)
+        if not DRY_RUN:
+            move_cached_file_keys(cache_conn, old, new)
+        stats.incr("incremental.renamed")
+    stats.incr("incremental.changed", len(changes.changed))
+    rels = changes.changed + [new for _, new in changes.renamed]
+    if ON_TEST_FAILURE == "regenerate":
+        # files with failing tests whose cached tests were dropped after the last test run
+        failing = [key.split("::", 1)[0] for key in get_failing_source_keys(cache_conn)]
+        retry = [rel for rel in dict.fromkeys(failing)
+                 if rel not in rels and os.path.isfile(os.path.join(repo_root, rel))]
+        stats.incr("incremental.retried", len(retry))
+        rels += retry
+    # renamed files may also have been edited; their moved cache rows make this cheap if not
+    return [os.path.join(repo_root, rel) for rel in rels]
+
+def class_source_hash(cls) -> str:
+    """
+    hash of what the prompt is built from, so editing one class of a file leaves its neighbours cached.
+    """
+    parts = [cls.get("ClassSourceCode") or cls["FullSourceCode"], *cls.get("UsingDirectivesInFile", [])]
+    parts += [ref["Signature"] for ref in cls.get("ReferencedTypes", [])]
+    return compute_sha256_hash("\n".join(parts))
+
+class WorkItem:
+    """
+    one class on its way through the pipeline.
+    """
+    __slots__ = ("cs_file", "cls", "key", "src_hash", "position", "code", "cached", "parts")
+
+    def __init__(self, cs_file, cls, key, src_hash, position=(0, 1)):
+        self.cs_file = cs_file
+        self.cls = cls
+        self.key = key
+        self.src_hash = src_hash
+        self.position = position  # (index, count) among the classes of its source file
+        self.code = None
+        self.cached = False
+        self.parts = None  # MethodParts in method granularity
+
+    def __repr__(self):
+        return f"WorkItem({self.key})"
+
+class WorkBatch:
+    """
+    small classes sharing one generation request.
+    """
+    __slots__ = ("items", "tokens")
+
+    def __init__(self):
+        self.items = []
+        self.tokens = 0
+
+    @property
+    def cached(self):
+        return False  # only classes that need generating are batched
+
+    def __repr__(self):
+        return f"WorkBatch({', '.join(item.key for item in self.items)})"
+
+async def run_pipeline(
+    test_proj_dir, repo_root, inputs, extract, cache_conn, stats, checker=None, generated=None, untestable=None,
+    journal=None, discovery=None, generation=None
+) -> None:
+    """
+    run the pipeline over `inputs`. `generation` is a (client, session) pair from `open_generation`
+    that outlives the run (watch mode); without it the run opens its own and closes it at the end.
+    """
+    remote = start_coordinator(stats) if GENERATION_BACKEND == "distributed" else None
+    # workers load the model on their own servers
+    owned = generation is None and not remote
+    client, session = generation or (open_generation(stats) if owned else (None, None))
+    pipeline = build_pipeline(
+        test_proj_dir, repo_root, extract, cache_conn, client, stats, checker, generated, untestable, journal,
+        discovery, session, remote
+    )
+    try:
+        await pipeline.run(inputs)
+    finally:
+        if owned:
+            await session.close()
+            await session.client.close()
+        if remote:
+            remote.stop()
+            for line in remote.report_lines():
+                logger.info(f"[coordinator] {line}")
+        stats.incr("pipeline.errors", sum(stage.errors for stage in pipeline.stages))
+        for line in pipeline.report_lines():
+            logger.info(f"[pipeline] {line}")
+
+def open_generation(stats):
+    """
+    the Ollama client generation uses (None for the `ollama run` backend) and the session that
+    loads and warms the model. the `ollama run` backend talks to the same server, so its model is
+    loaded over the API too.
+    """
+    client = OllamaClient(
+        OLLAMA_URL, max_inflight=MAX_INFLIGHT_REQUESTS, keep_alive=MODEL_KEEP_ALIVE
+    ) if GENERATION_BACKEND == "http" else None
+    session = ModelSession(
+        client or OllamaClient(OLLAMA_URL, keep_alive=MODEL_KEEP_ALIVE), OLLAMA_MODEL,
+        warm_requests=MAX_INFLIGHT_REQUESTS if WARM_MODEL else 0, keep_alive_after=MODEL_KEEP_ALIVE_AFTER, stats=stats
+    )
+    return client, session
+
+def new_compile_checker(extractor_dll, repo_root, test_proj_dir, stats) -> CompileChecker:
+    # the test project's packages win over the sources' other versions of the same assembly
+    references = merge_references(
+        project_package_references(test_proj_dir), source_project_references(repo_root, restore=COMPILE_CHECK_RESTORE)
+    )
+    return CompileChecker(
+        extractor_dll, os.path.join(OUTPUT_DIR, "compile_check"), find_cs_files(repo_root), references,
+        global_usings=project_global_usings(test_proj_dir), workers=COMPILE_CHECK_WORKERS, stats=stats
+    )
+
+def start_coordinator(stats) -> Coordinator:
+    # what every worker needs to generate exactly as this run would
+    settings = dict(
+        model=OLLAMA_MODEL, namespace=TEST_PROJECT_NAME, stream=STREAM_GENERATION, timeout_sec=GENERATION_TIMEOUT_SEC,
+        token_budget=PROMPT_TOKEN_BUDGET, keep_alive=MODEL_KEEP_ALIVE, keep_alive_after=MODEL_KEEP_ALIVE_AFTER,
+        warm=WARM_MODEL,
+    )
+    coordinator = Coordinator(
+        COORDINATOR_HOST, COORDINATOR_PORT, settings, lease_sec=COORDINATOR_LEASE_SEC,
+        max_attempts=COORDINATOR_MAX_ATTEMPTS, token=COORDINATOR_TOKEN, stats=stats
+    ).start()
+    logger.info(f"generation waits for workers: python run.py worker --coordinator {coordinator.url} "
+                f"--ollama-url <their Ollama>")
+    return coordinator
+
+def build_pipeline(
+    test_proj_dir, repo_root, extract, cache_conn, client, stats, checker=None, generated=None, untestable=None,
+    journal=None, discovery=None, session=None, remote=None
+) -> Pipeline:
+    """
+    each stage gets its own worker pool (STAGE_WORKERS) and a bounded input queue, so .NET-bound
+    extraction overlaps LLM-bound generation and a slow stage pushes back on the ones before it.
+    with a `journal`, files and classes a resumed run already finished (or gave up on) are skipped.
+    with a `remote` coordinator, generation requests go to its workers instead of `client`.
+    """
+    def discover(path):
+        files = expand_input(path, discovery)
+        if journal:
+            todo = [f for f in files if journal.wants_file(os.path.relpath(f, repo_root))]
+            stats.incr("journal.files_skipped", len(files) - len(todo))
+            files = todo
+        return files
+
+    def extract_classes(cs_file):
+        # an attempt counts from here, not from discovery: a crash only costs the files under way
+        if journal:
+            journal.begin_file(os.path.relpath(cs_file, repo_root))
+        items = []
+        classes = extract(cs_file)
+        for idx, cls in enumerate(classes):
+            key = f"{os.path.relpath(cs_file, repo_root)}::{cls['ClassName']}"
+            items.append(WorkItem(cs_file, cls, key, class_source_hash(cls), (idx, len(classes))))
+            if journal:
+                journal.class_seen(key)
+        if not items:
+            logger.warning(f"No testable classes in {cs_file}")
+            if untestable is not None:
+                untestable.add(os.path.relpath(cs_file, repo_root))
+            if journal:
+                journal.file_written(os.path.relpath(cs_file, repo_root))
+        return items
+
+    def probe(item):
+        if journal and journal.gave_up(item.key):
+            stats.incr("journal.gave_up")
+            return None
+        # what a resumed run already generated is reused even when regenerating everything
+        force = FORCE_REGENERATE and not (journal and journal.is_done(item.key))
+        if GENERATION_GRANULARITY == "method":
+            item.parts = MethodParts(item.key, item.cls, PROMPT_VERSION)
+            if not force:
+                stats.incr("methods.cached", item.parts.probe(cache_conn, OLLAMA_MODEL))
+            if item.parts.complete:
+                item.code = item.parts.merged()
+        elif not force:
+            item.code, reused = lookup_cached_test(cache_conn, item.key, item.src_hash, OLLAMA_MODEL, PROMPT_VERSION)
+            if reused:
+                stats.incr("cache.content_reuse")
+        item.cached = item.code is not None
+        annotate(cache="hit" if item.cached else "miss")
+        if item.cached:
+            logger.info(f"cache hit for {item.cls['ClassName']}")
+            stats.incr("cache.hits")
+            if journal:
+                journal.class_done(item.key, cached=True)
+        return item
+
+    pending = WorkBatch()  # small classes waiting for their batch to fill up
+
+    async def batch(item):
+        # the batch stage has one worker and runs on the event loop, so `pending` needs no lock
+        nonlocal pending
+        cost = estimate_tokens(batch_section(item.cls, TEST_PROJECT_NAME))
+        if not (client or remote) or not BATCH_SMALL_CLASSES or item.parts or cost > SMALL_CLASS_TOKENS:
+            return [item]
+        out = []
+        name = item.cls["ClassName"]
+        if (len(pending.items) >= MAX_BATCH_CLASSES or pending.tokens + cost > BATCH_TOKEN_BUDGET
+                or any(other.cls["ClassName"] == name for other in pending.items)):
+            out = flush_batch()
+        pending.items.append(item)
+        pending.tokens += cost
+        return out
+
+    def flush_batch():
+        nonlocal pending
+        ready, pending = pending, WorkBatch()
+        if len(ready.items) > 1:
+            return [ready]
+        return ready.items
+
+    # identical classes met in the same run (copies in two projects) share one generation
+    inflight = {}
+
+    async def generate(work):
+        if isinstance(work, WorkBatch):
+            done = await _generate_batch(work)
+        else:
+            done = [await _shared(work, _generate_one)]
+        return [item for item in done if item is not None]
+
+    async def _shared(item, produce):
+        content = (item.src_hash, item.cls["ClassName"])
+        if content in inflight:
+            item.code = await inflight[content]
+            if item.code is None:
+                return _failed(item)
+            logger.info(f"reusing the test generated for an identical copy of {item.cls['ClassName']}")
+            stats.incr("cache.content_reuse")
+            return item
+        inflight[content] = asyncio.get_running_loop().create_future()
+        try:
+            item.code = await produce(item)
+        finally:
+            inflight[content].set_result(item.code)
+        if item.code is None:
+            return _failed(item)
+        return item
+
+    def _failed(item):
+        # copies that waited on a failed generation failed too, so a resumed run retries them
+        stats.incr("generation.failed")
+        if journal:
+            journal.class_failed(item.key, "generation failed")
+        return None
+
+    async def _generate_one(item):
+        started = time.monotonic()
+        code = await (_generate_methods(item) if item.parts else _request(item))
+        if code is not None:
+            _record_time(item, time.monotonic() - started)
+        return code
+
+    def _record_time(item, seconds):
+        # what the scheduler predicts the next run's cost of this class from
+        record_generation_time(cache_conn, item.key, seconds, len(item.cls.get("PublicMethods") or []))
+
+    async def _generate_batch(work):
+        names = ", ".join(item.cls["ClassName"] for item in work.items)
+        logger.info(f"generating tests for {len(work.items)} small classes in one request: {names}")
+        stats.incr("generation.requests")
+        stats.incr("batch.requests")
+        stats.incr("batch.classes", len(work.items))
+        if session:
+            await session.ready()
+        started = time.monotonic()
+        classes = [item.cls for item in work.items]
+        if remote:
+            codes = await remote.submit("batch", classes=classes) or {}
+        else:
+            codes = await agenerate_nunit_test_batch(
+                classes, OLLAMA_MODEL, TEST_PROJECT_NAME, client, timeout_sec=GENERATION_TIMEOUT_SEC, stats=stats
+            )
+        served = sum(code is not None for code in codes.values())
+        for item in work.items:
+            if codes.get(item.cls["ClassName"]) is not None:
+                _record_time(item, (time.monotonic() - started) / max(1, served))
+        stats.incr("batch.calls_saved", max(0, served - 1))
+
+        async def settle(item):
+            code = codes.get(item.cls["ClassName"])
+            if code is not None:
+                return code
+            stats.incr("batch.fallbacks")
+            return await _request(item)
+
+        return await asyncio.gather(*(_shared(item, settle) for item in work.items))
+
+    async def _generate_methods(item):
+        parts = item.parts
+        if parts.skeleton is None:
+            # no usable skeleton (new class, or its fields/constructors changed): generate it all, then split
+            code = await _request(item)
+            if code is None:
+                return None
+            if not parts.absorb_class(code):
+                logger.error(f"Could not split the generated tests of {item.key} into methods")
+                return None
+            stats.incr("methods.generated", len(parts.names))
+            return parts.merged()
+        fixture = parts.merged()
+        missing = parts.missing
+        logger.info(f"regenerating tests of {len(missing)}/{len(parts.names)} methods of {item.cls['ClassName']}")
+        results = await asyncio.gather(*(_request(item, focus_method=name, fixture=fixture) for name in missing))
+        for name, code in zip(missing, results):
+            if code is None:
+                return None
+            if not parts.absorb_method(name, code):
+                logger.error(f"Could not read the tests generated for {item.key}.{name}")
+                return None
+        stats.incr("methods.generated", len(missing))
+        return parts.merged()
+
+    async def _request(item, focus_method=None, fixture=None):
+        target = f"{item.cls['ClassName']}.{focus_method}" if focus_method else item.cls["ClassName"]
+        logger.info(f"generating test for {target}")
+        stats.incr("generation.requests")
+        options = dict(token_budget=PROMPT_TOKEN_BUDGET, focus_method=focus_method, fixture=fixture)
+        if session:
+            await session.ready()
+        if remote:
+            return await remote.submit("class", cls=item.cls, focus_method=focus_method, fixture=fixture)
+        if client and STREAM_GENERATION:
+            return await astream_nunit_test_class(
+                item.cls, OLLAMA_MODEL, TEST_PROJECT_NAME, client, timeout_sec=GENERATION_TIMEOUT_SEC, stats=stats,
+                **options
+            )
+        if client:
+            return await agenerate_nunit_test_class(
+                item.cls, OLLAMA_MODEL, TEST_PROJECT_NAME, client, timeout_sec=GENERATION_TIMEOUT_SEC, stats=stats,
+                **options
+            )
+        return await asyncio.to_thread(
+            generate_nunit_test_class, item.cls, OLLAMA_MODEL, TEST_PROJECT_NAME, timeout_sec=GENERATION_TIMEOUT_SEC,
+            keep_alive=MODEL_KEEP_ALIVE, **options
+        )
+
+    async def validate(item):
+        problem = validate_test_code(item.code, item.cls["ClassName"])
+        if problem:
+            logger.error(f"Rejected generated test for {item.key}: {problem}")
+            stats.incr("validation.rejected")
+            if journal:
+                journal.class_failed(item.key, problem)
+            return None
+        if checker and not await _compiles(item):
+            if journal:
+                journal.class_failed(item.key, "does not compile")
+            return None
+        if item.parts:
+            item.parts.store(cache_conn, OLLAMA_MODEL, compression=CACHE_COMPRESSION)
+        else:
+            cache_test(
+                cache_conn, item.key, item.src_hash, OLLAMA_MODEL, item.code,
+                compression=CACHE_COMPRESSION, prompt_version=PROMPT_VERSION
+            )
+        if journal:
+            journal.class_done(item.key)
+        return item
+
+    async def _compiles(item):
+        # in-memory compile check; with COMPILE_CHECK = "repair" failing code goes back to the model
+        # and with "reject" it is dropped. errors are only logged in "advisory" mode, and in any mode
+        # while the sources have errors of their own: then the test is not to blame
+        name = f"{item.cls['ClassName']}Tests"
+        for attempt in range(COMPILE_REPAIR_ATTEMPTS + 1):
+            errors = await asyncio.to_thread(checker.check, item.code, name)
+            if errors is None:
+                # the checker is unavailable: the final `dotnet build` is still there
+                stats.incr("compile.unchecked")
+                return True
+            stats.incr("compile.checked")
+            if not errors:
+                if attempt:
+                    stats.incr("compile.repaired")
+                return True
+            logger.warning(f"Generated test for {item.key} has {len(errors)} compile errors:\n"
+                           f"{format_diagnostics(errors, limit=5)}")
+            if COMPILE_CHECK == "advisory" or checker.source_errors:
+                stats.incr("compile.advisory")
+                return True
+            if COMPILE_CHECK != "repair" or not (client or remote) or attempt == COMPILE_REPAIR_ATTEMPTS:
+                break
+            logger.info(f"requesting a repair of the test for {item.cls['ClassName']}")
+            stats.incr("generation.requests")
+            stats.incr("compile.repair_requests")
+            if remote:
+                code = await remote.submit("repair", cls=item.cls, test_code=item.code, diagnostics=errors)
+            else:
+                code = await arepair_nunit_test_class(
+                    item.cls, item.code, errors, OLLAMA_MODEL, TEST_PROJECT_NAME, client,
+                    timeout_sec=GENERATION_TIMEOUT_SEC, token_budget=PROMPT_TOKEN_BUDGET, stats=stats
+                )
+            if code is None or (item.parts and not item.parts.absorb_class(code)):
+                break
+            item.code = item.parts.merged() if item.parts else code
+        logger.error(f"Rejected generated test for {item.key}: it does not compile")
+        stats.incr("compile.rejected")
+        stats.incr("validation.rejected")
+        return False
+
+    # classes of a source file wait here until all of them are through, then share one test file
+    file_items = {}
+
+    def write(item):
+        done = file_items.setdefault(item.cs_file, {})
+        done[item.position[0]] = item
+        if len(done) == item.position[1]:
+            _write_file(item.cs_file, file_items.pop(item.cs_file))
+            if journal:
+                journal.file_written(os.path.relpath(item.cs_file, repo_root))
+        if generated is not None:
+            generated[f"{item.cls['ClassName']}Tests"] = (item.key, not item.cached)
+        if not item.cached and not DRY_RUN:
+            release_quarantine(cache_conn, item.key)
+        return item
+
+    def flush_files():
+        # files some of whose classes failed: write the ones that made it, so stale tests of the
+        # failed classes cannot break the build (the incremental base stays put, they are retried)
+        for cs_file in list(file_items):
+            _write_file(cs_file, file_items.pop(cs_file))
+        return []
+
+    def _write_file(cs_file, done):
+        codes = [done[idx].code for idx in sorted(done)]
+        if write_test_file(test_proj_dir, cs_file, repo_root, codes, dry_run=DRY_RUN):
+            stats.incr("tests.files_written")
         else:
-            logger.info(f"generating test for {cls['ClassName']}")
-            code = generate_nunit_test_class(cls, OLLAMA_MODEL, TEST_PROJECT_NAME)
-            if code:
-                cache_test(cache_conn, key, src_hash, OLLAMA_MODEL, code)
-        if code:
-            write_test_file(test_proj_dir, cs_file, repo_root, code, dry_run=DRY_RUN)
-            wrote_any = True
-    return wrote_any
+            stats.incr("tests.files_unchanged")
+        stats.incr("tests.written", len(codes))
+
+    is_cached = lambda item: item.cached
+    return Pipeline([
+        Stage("discover", discover, workers=1, fan_out=True),
+        Stage("extract", extract_classes, workers=STAGE_WORKERS["extract"], queue_size=STAGE_QUEUE_SIZE, fan_out=True),
+        Stage("probe", probe, workers=STAGE_WORKERS["probe"], queue_size=STAGE_QUEUE_SIZE),
+        Stage("batch", batch, workers=STAGE_WORKERS["batch"], queue_size=STAGE_QUEUE_SIZE, fan_out=True,
+              skip=is_cached, flush=flush_batch),
+        Stage("generate", generate, workers=COORDINATOR_INFLIGHT if remote else STAGE_WORKERS["generate"],
+              queue_size=STAGE_QUEUE_SIZE, fan_out=True, skip=is_cached),
+        Stage("validate", validate, workers=STAGE_WORKERS["validate"], queue_size=STAGE_QUEUE_SIZE, skip=is_cached),
+        Stage("write", write, workers=STAGE_WORKERS["write"], queue_size=STAGE_QUEUE_SIZE, flush=flush_files),
+    ])
 
 if __name__ == "__main__":
     main()
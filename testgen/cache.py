@@ -1,8 +1,15 @@
 # testgen/cache.py
+import time
+import zlib
+import queue
 import sqlite3
 import hashlib
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -11,40 +18,678 @@ def init_cache(db_path: str, allow_threads: bool = True) -> sqlite3.Connection:
     Initialize or open an SQLite cache. 
     If allow_threads, we disable same-thread check for ThreadPoolExecutor.
     """
-    conn = sqlite3.connect(db_path, check_same_thread=not allow_threads)
+    conn = _connect(db_path, check_same_thread=not allow_threads)
+    _create_schema(conn)
+    return conn
+
+class CacheStore:
+    """
+    cache backend for many concurrent workers. the database runs in WAL mode, every thread
+    reads through its own connection (readers never block each other or the writer), and all
+    writes go through one writer thread that group-commits whatever is queued, so N inserts
+    cost one fsync instead of N. accepted wherever the cache functions take a connection.
+    the connections of threads that have exited (e.g. a finished pipeline's stage pools) are
+    closed whenever a new thread opens one, so short-lived pools do not pile them up.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 256, flush_interval_sec: float = 0.05):
+        self.db_path = db_path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_sec
+        schema_conn = _connect(db_path)
+        _create_schema(schema_conn)
+        schema_conn.close()
+        self._local = threading.local()
+        self._conns: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._conns_lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[Optional[str], Sequence[Any], Optional[Future]]]" = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="cache-writer", daemon=True)
+        self._writer.start()
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """
+        run a read on this thread's connection. queued writes become visible once committed (see `flush`).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _connect(self.db_path)
+            self._local.conn = conn
+            with self._conns_lock:
+                dead = [t for t in self._conns if not t.is_alive()]
+                stale = [self._conns.pop(t) for t in dead]
+                self._conns[threading.current_thread()] = conn
+            for old in stale:
+                old.close()
+        return conn.execute(sql, params)
+
+    @property
+    def open_connections(self) -> int:
+        with self._conns_lock:
+            return len(self._conns)
+
+    def execute_write(self, sql: str, params: Sequence[Any] = (), wait: bool = False) -> Optional[int]:
+        """
+        queue a write for the writer thread. with `wait`, block until it is committed and return its rowcount.
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("CacheStore is closed")
+        fut: Optional[Future] = Future() if wait else None
+        self._queue.put((sql, params, fut))
+        return fut.result() if fut else None
+
+    def flush(self) -> None:
+        """
+        block until every write queued so far is committed.
+        """
+        fut: Future = Future()
+        self._queue.put((None, (), fut))
+        fut.result()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put((_STOP, (), None))
+        self._writer.join()
+        with self._conns_lock:
+            conns, self._conns = list(self._conns.values()), {}
+        for conn in conns:
+            conn.close()
+
+    def _write_loop(self) -> None:
+        conn = _connect(self.db_path, check_same_thread=True)
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self._flush_interval
+                while len(batch) < self._batch_size and batch[-1][0] is not _STOP:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._commit_batch(conn, batch)
+                if batch[-1][0] is _STOP:
+                    return
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch) -> None:
+        writes = [op for op in batch if op[0] is not None and op[0] is not _STOP]
+        results: List[Union[int, BaseException]] = []
+        try:
+            with span("sqlite.commit", writes=len(writes)), conn:
+                results = [conn.execute(sql, params).rowcount for sql, params, _ in writes]
+        except sqlite3.Error as e:
+            # one bad statement must not lose the rest of the group: retry them one by one
+            logger.error(f"Group commit of {len(writes)} writes failed ({e}); retrying individually")
+            results = []
+            for sql, params, _ in writes:
+                try:
+                    with conn:
+                        results.append(conn.execute(sql, params).rowcount)
+                except sqlite3.Error as err:
+                    logger.error(f"Failed to write cache: {err}")
+                    results.append(err)
+        for (_, _, fut), res in zip(writes, results):
+            if fut is None:
+                continue
+            if isinstance(res, BaseException):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
+        for op in batch:
+            if op[0] is None and op[2] is not None:
+                op[2].set_result(None)
+
+_STOP = "__stop__"
+
+CacheConn = Union[sqlite3.Connection, CacheStore]
+
+def _connect(db_path: str, check_same_thread: bool = False) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _write(conn: CacheConn, sql: str, params: Sequence[Any] = (), wait: bool = False) -> Optional[int]:
+    """
+    run one write statement: queued on a CacheStore (waiting for the commit only if asked),
+    or executed and committed right away on a plain connection.
+    """
+    if isinstance(conn, CacheStore):
+        return conn.execute_write(sql, params, wait=wait)
+    cur = conn.execute(sql, params)
+    conn.commit()
+    return cur.rowcount
+
+def _create_schema(conn: sqlite3.Connection) -> None:
     conn.execute("""
         CREATE TABLE IF NOT EXISTS test_cache (
             key TEXT PRIMARY KEY,
             source_hash TEXT,
             model_name TEXT,
             generated_code TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_access REAL
+        )
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(test_cache)")}
+    if "last_access" not in columns:
+        # databases from before eviction existed: treat the write time as the last access
+        conn.execute("ALTER TABLE test_cache ADD COLUMN last_access REAL")
+        conn.execute("UPDATE test_cache SET last_access = CAST(strftime('%s', timestamp) AS REAL)")
+    if "content_key" not in columns:
+        conn.execute("ALTER TABLE test_cache ADD COLUMN content_key TEXT")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS generated_tests (
+            content_key TEXT PRIMARY KEY,
+            source_hash TEXT,
+            model_name TEXT,
+            prompt_version TEXT,
+            generated_code TEXT,
+            last_access REAL
+        )
+    """)
+    _migrate_inline_tests(conn)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache_meta (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_state (
+            repo_url TEXT,
+            branch TEXT,
+            last_sha TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (repo_url, branch)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            content_hash TEXT,
+            extractor_version TEXT,
+            classes_json TEXT
         )
     """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_extraction_content ON extraction_cache (content_hash, extractor_version)"
+    )
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS test_results (
+            test_name TEXT PRIMARY KEY,
+            test_class TEXT,
+            source_key TEXT,
+            outcome TEXT,
+            duration_sec REAL,
+            message TEXT,
+            updated_at REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_test_results_class ON test_results (test_class)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quarantined_tests (
+            test_class TEXT PRIMARY KEY,
+            source_key TEXT,
+            reason TEXT,
+            since REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS generation_times (
+            key TEXT PRIMARY KEY,
+            seconds REAL,
+            methods INTEGER,
+            updated_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            repo_url TEXT,
+            branch TEXT,
+            head_sha TEXT,
+            config_hash TEXT,
+            clone_dir TEXT,
+            status TEXT,
+            host TEXT,
+            pid INTEGER,
+            resumes INTEGER DEFAULT 0,
+            started_at REAL,
+            updated_at REAL,
+            finished_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_files (
+            run_id TEXT,
+            rel_path TEXT,
+            state TEXT,
+            attempts INTEGER DEFAULT 0,
+            updated_at REAL,
+            PRIMARY KEY (run_id, rel_path)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_items (
+            run_id TEXT,
+            key TEXT,
+            state TEXT,
+            attempts INTEGER DEFAULT 0,
+            error TEXT,
+            updated_at REAL,
+            PRIMARY KEY (run_id, key)
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_test_cache_lookup ON test_cache (key, source_hash, model_name)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_test_cache_access ON test_cache (last_access)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_test_cache_content ON test_cache (content_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_generated_tests_access ON generated_tests (last_access)")
     conn.commit()
-    return conn
+
+def _migrate_inline_tests(conn: sqlite3.Connection) -> None:
+    """
+    move code stored in path-keyed rows (older databases) into the content-addressed table.
+    """
+    rows = conn.execute(
+        "SELECT key, source_hash, model_name, generated_code, last_access FROM test_cache "
+        "WHERE content_key IS NULL AND generated_code IS NOT NULL"
+    ).fetchall()
+    for key, source_hash, model_name, code, last_access in rows:
+        ckey = content_key(key, source_hash, model_name, LEGACY_PROMPT_VERSION)
+        conn.execute("""
+            INSERT OR IGNORE INTO generated_tests
+                (content_key, source_hash, model_name, prompt_version, generated_code, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (ckey, source_hash, model_name, LEGACY_PROMPT_VERSION, code, last_access))
+        conn.execute("UPDATE test_cache SET content_key=?, generated_code=NULL WHERE key=?", (ckey, key))
+    if rows:
+        logger.info(f"Moved {len(rows)} cached tests to the content-addressed table")
+
+# prompt version of tests cached before the prompt was versioned
+LEGACY_PROMPT_VERSION = "1"
+
+_ZLIB_MARKER = b"zlib:"
+_ZSTD_MARKER = b"zstd:"
+
+def encode_code(code: str, compression: Optional[str] = None) -> Union[str, bytes]:
+    """
+    value stored in `generated_code`: the text itself, or a marker-prefixed compressed blob.
+    "zstd" needs the optional `zstandard` package and falls back to zlib without it.
+    """
+    if not compression:
+        return code
+    data = code.encode("utf-8")
+    if compression == "zstd":
+        try:
+            import zstandard
+            return _ZSTD_MARKER + zstandard.ZstdCompressor(level=10).compress(data)
+        except ImportError:
+            logger.warning("zstandard is not installed; compressing the cache with zlib instead")
+    elif compression != "zlib":
+        raise ValueError(f"unknown cache compression {compression!r}")
+    return _ZLIB_MARKER + zlib.compress(data, 9)
+
+def decode_code(value: Union[str, bytes, None]) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if value.startswith(_ZLIB_MARKER):
+        return zlib.decompress(value[len(_ZLIB_MARKER):]).decode("utf-8")
+    if value.startswith(_ZSTD_MARKER):
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(value[len(_ZSTD_MARKER):]).decode("utf-8")
+    return value.decode("utf-8")
 
 def compute_sha256_hash(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def get_cached_test(conn: sqlite3.Connection, key: str, source_hash: str, model_name: str) -> Optional[str]:
-    row = conn.execute(
-        "SELECT generated_code FROM test_cache WHERE key=? AND source_hash=? AND model_name=?",
-        (key, source_hash, model_name)
-    ).fetchone()
-    if row:
+def compute_file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def content_key(key: str, source_hash: str, model_name: str, prompt_version: str) -> str:
+    """
+    address of a generated test: the same class in the same source, model and prompt always give
+    the same test, wherever the file lives. `key` is `relpath::ClassName`; only the class name counts,
+    as a source hash may cover a whole file (older rows hash FullSourceCode) and so several classes.
+    """
+    class_name = key.rsplit("::", 1)[-1]
+    return compute_sha256_hash(f"{source_hash}:{class_name}:{model_name}:{prompt_version}")
+
+def lookup_cached_test(
+    conn: CacheConn, key: str, source_hash: str, model_name: str, prompt_version: str = LEGACY_PROMPT_VERSION
+) -> Tuple[Optional[str], bool]:
+    """
+    (code, reused) for a class. the test is found by content, wherever the class lives; `reused`
+    is true when it was generated for another path (a moved, renamed or duplicated class), in
+    which case `key` is indexed to it.
+    """
+    ckey = content_key(key, source_hash, model_name, prompt_version)
+    with span("sqlite.lookup", key=key) as s:
+        row = conn.execute("SELECT generated_code FROM generated_tests WHERE content_key=?", (ckey,)).fetchone()
+        s.set(hit=row is not None)
+    if not row:
+        logger.debug(f"Cache MISS for key={key}")
+        return None, False
+    indexed = conn.execute("SELECT content_key FROM test_cache WHERE key=?", (key,)).fetchone()
+    reused = not indexed or indexed[0] != ckey
+    now = time.time()
+    _write(conn, "UPDATE generated_tests SET last_access=? WHERE content_key=?", (now, ckey))
+    if reused:
+        logger.info(f"Cache HIT by content for key={key}")
+        _index_test(conn, key, source_hash, model_name, ckey, now)
+    else:
         logger.info(f"Cache HIT for key={key}")
-        return row[0]
-    logger.debug(f"Cache MISS for key={key}")
-    return None
+        _write(conn, "UPDATE test_cache SET last_access=? WHERE key=?", (now, key))
+    return decode_code(row[0]), reused
+
+def has_cached_test(
+    conn: CacheConn, key: str, source_hash: str, model_name: str, prompt_version: str = LEGACY_PROMPT_VERSION
+) -> bool:
+    """
+    whether a lookup would hit, without touching access times.
+    """
+    ckey = content_key(key, source_hash, model_name, prompt_version)
+    return conn.execute("SELECT 1 FROM generated_tests WHERE content_key=?", (ckey,)).fetchone() is not None
+
+def get_cached_test(
+    conn: CacheConn, key: str, source_hash: str, model_name: str, prompt_version: str = LEGACY_PROMPT_VERSION
+) -> Optional[str]:
+    return lookup_cached_test(conn, key, source_hash, model_name, prompt_version)[0]
 
-def cache_test(conn: sqlite3.Connection, key: str, source_hash: str, model_name: str, generated_code: str) -> None:
+def cache_test(
+    conn: CacheConn, key: str, source_hash: str, model_name: str, generated_code: str,
+    compression: Optional[str] = None, prompt_version: str = LEGACY_PROMPT_VERSION
+) -> None:
+    ckey = content_key(key, source_hash, model_name, prompt_version)
+    now = time.time()
     try:
-        conn.execute("""
-            INSERT OR REPLACE INTO test_cache (key, source_hash, model_name, generated_code)
-            VALUES (?, ?, ?, ?)
-        """, (key, source_hash, model_name, generated_code))
-        conn.commit()
+        _write(conn, """
+            INSERT OR REPLACE INTO generated_tests
+                (content_key, source_hash, model_name, prompt_version, generated_code, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (ckey, source_hash, model_name, prompt_version, encode_code(generated_code, compression), now))
+        _index_test(conn, key, source_hash, model_name, ckey, now)
         logger.info(f"Cached test for key={key}")
     except sqlite3.Error as e:
         logger.error(f"Failed to write cache: {e}")
+
+def _index_test(conn: CacheConn, key: str, source_hash: str, model_name: str, ckey: str, now: float) -> None:
+    _write(conn, """
+        INSERT OR REPLACE INTO test_cache (key, source_hash, model_name, content_key, last_access)
+        VALUES (?, ?, ?, ?, ?)
+    """, (key, source_hash, model_name, ckey, now))
+
+def record_generation_time(conn: CacheConn, key: str, seconds: float, methods: int) -> None:
+    """
+    how long generating (and checking) the tests of a class took, for scheduling later runs.
+    """
+    _write(conn, "INSERT OR REPLACE INTO generation_times (key, seconds, methods, updated_at) VALUES (?, ?, ?, ?)",
+           (key, seconds, methods, time.time()))
+
+def get_generation_times(conn: CacheConn) -> Dict[str, Tuple[float, int]]:
+    rows = conn.execute("SELECT key, seconds, methods FROM generation_times").fetchall()
+    return {key: (seconds, methods) for key, seconds, methods in rows}
+
+def get_last_processed_sha(conn: CacheConn, repo_url: str, branch: str) -> Optional[str]:
+    row = conn.execute(
+        "SELECT last_sha FROM run_state WHERE repo_url=? AND branch=?", (repo_url, branch)
+    ).fetchone()
+    return row[0] if row else None
+
+def set_last_processed_sha(conn: CacheConn, repo_url: str, branch: str, sha: str) -> None:
+    _write(conn, """
+        INSERT OR REPLACE INTO run_state (repo_url, branch, last_sha, timestamp)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    """, (repo_url, branch, sha), wait=True)
+    logger.info(f"Recorded last processed commit {sha[:12]} for {repo_url}@{branch}")
+
+def move_cached_file_keys(conn: CacheConn, old_rel_path: str, new_rel_path: str) -> int:
+    """
+    re-key every cached class of a renamed source file (`old::Class` -> `new::Class`).
+    """
+    prefix = f"{old_rel_path}::"
+    for table in ("test_results", "quarantined_tests"):
+        _write(conn, f"UPDATE {table} SET source_key = ? || substr(source_key, ?) WHERE substr(source_key, 1, ?) = ?",
+               (f"{new_rel_path}::", len(prefix) + 1, len(prefix), prefix))
+    _write(conn, "UPDATE OR REPLACE generation_times SET key = ? || substr(key, ?) WHERE substr(key, 1, ?) = ?",
+           (f"{new_rel_path}::", len(prefix) + 1, len(prefix), prefix))
+    return _write(
+        conn,
+        "UPDATE OR REPLACE test_cache SET key = ? || substr(key, ?) WHERE substr(key, 1, ?) = ?",
+        (f"{new_rel_path}::", len(prefix) + 1, len(prefix), prefix),
+        wait=True
+    )
+
+def delete_cached_file_keys(conn: CacheConn, rel_path: str) -> int:
+    prefix = f"{rel_path}::"
+    for table in ("test_results", "quarantined_tests"):
+        _write(conn, f"DELETE FROM {table} WHERE substr(source_key, 1, ?) = ?", (len(prefix), prefix))
+    _write(conn, "DELETE FROM generation_times WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+    return _write(conn, "DELETE FROM test_cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix), wait=True)
+
+def evict_cached_keys(conn: CacheConn, keys: Iterable[str]) -> int:
+    """
+    forget the generated tests of these classes (`relpath::Class`, with their per-method rows), by
+    content as well, so the next run generates them again instead of finding them elsewhere.
+    """
+    removed = 0
+    for key in keys:
+        match = "key = ? OR substr(key, 1, ?) = ?"
+        params = (key, len(key) + 1, f"{key}.")
+        _write(conn, f"DELETE FROM generated_tests WHERE content_key IN (SELECT content_key FROM test_cache WHERE {match})",
+               params)
+        removed += _write(conn, f"DELETE FROM test_cache WHERE {match}", params, wait=True)
+    return removed
+
+def replace_test_results(
+    conn: CacheConn, test_classes: Iterable[str],
+    results: Iterable[Tuple[str, str, Optional[str], str, float, Optional[str]]]
+) -> None:
+    """
+    store the latest outcome of every test of `test_classes`, replacing what an earlier run
+    recorded for them. a result is (test_name, test_class, source_key, outcome, duration_sec, message).
+    """
+    now = time.time()
+    for test_class in test_classes:
+        _write(conn, "DELETE FROM test_results WHERE test_class=?", (test_class,))
+    for row in results:
+        _write(conn, """
+            INSERT OR REPLACE INTO test_results
+                (test_name, test_class, source_key, outcome, duration_sec, message, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (*row, now))
+    if isinstance(conn, CacheStore):
+        conn.flush()
+
+def get_test_class_durations(conn: CacheConn) -> Dict[str, float]:
+    """
+    seconds each test class took in its last run, for balancing test shards.
+    """
+    rows = conn.execute("SELECT test_class, SUM(duration_sec) FROM test_results GROUP BY test_class").fetchall()
+    return {test_class: total or 0.0 for test_class, total in rows}
+
+def get_test_class_sources(conn: CacheConn) -> Dict[str, str]:
+    """
+    test class -> `relpath::Class` of the class it tests, as recorded by earlier runs.
+    """
+    rows = conn.execute(
+        "SELECT DISTINCT test_class, source_key FROM test_results WHERE source_key IS NOT NULL"
+    ).fetchall()
+    return dict(rows)
+
+def get_failing_source_keys(conn: CacheConn) -> List[str]:
+    """
+    classes whose tests failed in the last run and are not quarantined.
+    """
+    rows = conn.execute("""
+        SELECT DISTINCT source_key FROM test_results
+        WHERE outcome = 'Failed' AND source_key IS NOT NULL
+          AND test_class NOT IN (SELECT test_class FROM quarantined_tests)
+    """).fetchall()
+    return [row[0] for row in rows]
+
+def quarantine_test_classes(conn: CacheConn, classes: Iterable[Tuple[str, Optional[str], str]]) -> None:
+    """
+    exclude test classes from later test runs; each entry is (test_class, source_key, reason).
+    """
+    now = time.time()
+    for test_class, source_key, reason in classes:
+        _write(conn, "INSERT OR REPLACE INTO quarantined_tests (test_class, source_key, reason, since) VALUES (?, ?, ?, ?)",
+               (test_class, source_key, reason, now))
+
+def get_quarantined_test_classes(conn: CacheConn) -> List[str]:
+    return [row[0] for row in conn.execute("SELECT test_class FROM quarantined_tests").fetchall()]
+
+def release_quarantine(conn: CacheConn, source_key: str) -> None:
+    """
+    the tests of this class were generated again: let them run again.
+    """
+    _write(conn, "DELETE FROM quarantined_tests WHERE source_key=?", (source_key,))
+
+# runs that did not finish cleanly and may be resumed
+RESUMABLE_RUN_STATES = ("running", "interrupted", "incomplete")
+_RUN_COLUMNS = ("run_id", "repo_url", "branch", "head_sha", "config_hash", "clone_dir", "status", "host", "pid",
+                "resumes", "started_at", "updated_at", "finished_at")
+
+def start_run(
+    conn: CacheConn, run_id: str, repo_url: str, branch: str, head_sha: str, config_hash: str,
+    clone_dir: str, host: str, pid: int
+) -> None:
+    now = time.time()
+    _write(conn, f"""
+        INSERT INTO runs ({", ".join(_RUN_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, 'running', ?, ?, 0, ?, ?, NULL)
+    """, (run_id, repo_url, branch, head_sha, config_hash, clone_dir, host, pid, now, now), wait=True)
+
+def resume_run(conn: CacheConn, run_id: str, host: str, pid: int) -> None:
+    _write(conn, """
+        UPDATE runs SET status='running', host=?, pid=?, resumes=resumes+1, updated_at=?, finished_at=NULL
+        WHERE run_id=?
+    """, (host, pid, time.time(), run_id), wait=True)
+
+def set_run_status(conn: CacheConn, run_id: str, status: str, finished: bool = False) -> None:
+    now = time.time()
+    _write(conn, "UPDATE runs SET status=?, updated_at=?, finished_at=? WHERE run_id=?",
+           (status, now, now if finished else None, run_id))
+
+def touch_run(conn: CacheConn, run_id: str) -> None:
+    _write(conn, "UPDATE runs SET updated_at=? WHERE run_id=?", (time.time(), run_id))
+
+def get_runs(conn: CacheConn, repo_url: Optional[str] = None, branch: Optional[str] = None,
+             limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    the latest runs, newest first, optionally of one repo and branch.
+    """
+    where, params = "", ()
+    if repo_url is not None:
+        where, params = "WHERE repo_url=? AND branch=?", (repo_url, branch)
+    rows = conn.execute(
+        f"SELECT {', '.join(_RUN_COLUMNS)} FROM runs {where} ORDER BY started_at DESC LIMIT ?", (*params, limit)
+    ).fetchall()
+    return [dict(zip(_RUN_COLUMNS, row)) for row in rows]
+
+def find_resumable_run(conn: CacheConn, repo_url: str, branch: str) -> Optional[Dict[str, Any]]:
+    latest = get_runs(conn, repo_url, branch, limit=1)
+    return latest[0] if latest and latest[0]["status"] in RESUMABLE_RUN_STATES else None
+
+def set_run_file_state(conn: CacheConn, run_id: str, rel_path: str, state: str, attempt: bool = False) -> None:
+    _write(conn, """
+        INSERT INTO run_files (run_id, rel_path, state, attempts, updated_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (run_id, rel_path) DO UPDATE
+            SET state=excluded.state, attempts=attempts+excluded.attempts, updated_at=excluded.updated_at
+    """, (run_id, rel_path, state, int(attempt), time.time()))
+
+def set_run_item_state(
+    conn: CacheConn, run_id: str, key: str, state: str, error: Optional[str] = None, attempt: bool = False
+) -> None:
+    _write(conn, """
+        INSERT INTO run_items (run_id, key, state, attempts, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (run_id, key) DO UPDATE
+            SET state=excluded.state, attempts=attempts+excluded.attempts, error=excluded.error,
+                updated_at=excluded.updated_at
+    """, (run_id, key, state, int(attempt), error, time.time()))
+
+def get_run_file_states(conn: CacheConn, run_id: str) -> Dict[str, Tuple[str, int]]:
+    rows = conn.execute("SELECT rel_path, state, attempts FROM run_files WHERE run_id=?", (run_id,)).fetchall()
+    return {rel: (state, attempts) for rel, state, attempts in rows}
+
+def get_run_item_states(conn: CacheConn, run_id: str) -> Dict[str, Tuple[str, int]]:
+    rows = conn.execute("SELECT key, state, attempts FROM run_items WHERE run_id=?", (run_id,)).fetchall()
+    return {key: (state, attempts) for key, state, attempts in rows}
+
+def count_run_states(conn: CacheConn, run_id: str) -> Dict[str, Dict[str, int]]:
+    """
+    {"files": {state: n}, "items": {state: n}} of one run.
+    """
+    counts: Dict[str, Dict[str, int]] = {}
+    for kind, table in (("files", "run_files"), ("items", "run_items")):
+        rows = conn.execute(f"SELECT state, COUNT(*) FROM {table} WHERE run_id=? GROUP BY state", (run_id,))
+        counts[kind] = dict(rows.fetchall())
+    return counts
+
+def prune_runs(conn: CacheConn, keep: int) -> int:
+    """
+    drop the journals of all but the latest `keep` runs.
+    """
+    stale = [row[0] for row in conn.execute(
+        "SELECT run_id FROM runs ORDER BY started_at DESC LIMIT -1 OFFSET ?", (keep,)
+    ).fetchall()]
+    for run_id in stale:
+        for table in ("run_files", "run_items", "runs"):
+            _write(conn, f"DELETE FROM {table} WHERE run_id=?", (run_id,))
+    return len(stale)
+
+def get_cached_extraction_by_stat(
+    conn: CacheConn, path: str, mtime_ns: int, size: int, extractor_version: str
+) -> Optional[Tuple[str, str]]:
+    """
+    (content_hash, classes_json) if `path` is unchanged since it was extracted by this extractor version.
+    """
+    row = conn.execute(
+        "SELECT content_hash, classes_json FROM extraction_cache "
+        "WHERE path=? AND mtime_ns=? AND size=? AND extractor_version=?",
+        (path, mtime_ns, size, extractor_version)
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+def get_cached_extraction_by_hash(conn: CacheConn, content_hash: str, extractor_version: str) -> Optional[str]:
+    row = conn.execute(
+        "SELECT classes_json FROM extraction_cache WHERE content_hash=? AND extractor_version=? LIMIT 1",
+        (content_hash, extractor_version)
+    ).fetchone()
+    return row[0] if row else None
+
+def cache_extraction(
+    conn: CacheConn, path: str, mtime_ns: int, size: int,
+    content_hash: str, extractor_version: str, classes_json: str
+) -> None:
+    try:
+        _write(conn, """
+            INSERT OR REPLACE INTO extraction_cache (path, mtime_ns, size, content_hash, extractor_version, classes_json)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (path, mtime_ns, size, content_hash, extractor_version, classes_json))
+    except sqlite3.Error as e:
+        logger.error(f"Failed to write extraction cache: {e}")
+
+def purge_stale_extractions(conn: CacheConn, extractor_version: str) -> int:
+    """
+    drop extraction results produced by any other extractor build.
+    """
+    removed = _write(conn, "DELETE FROM extraction_cache WHERE extractor_version != ?", (extractor_version,), wait=True)
+    if removed:
+        logger.info(f"Extractor changed; dropped {removed} cached extraction results")
+    return removed
@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+from .cache import init_cache, encode_code, decode_code
+
+logger = logging.getLogger(__name__)
+
+# bytes a generated test accounts for against the budget
+_ROW_BYTES = "length(CAST(content_key AS BLOB)) + length(CAST(generated_code AS BLOB))"
+_DELETE_CHUNK = 500
+_FRAGMENTATION_VACUUM_RATIO = 0.25
+
+def cache_size_bytes(db_path: str) -> int:
+    """
+    on-disk size of the cache database including its WAL and shared-memory files.
+    """
+    return sum(os.path.getsize(p) for p in (db_path, f"{db_path}-wal", f"{db_path}-shm") if os.path.exists(p))
+
+def payload_bytes(conn: sqlite3.Connection) -> int:
+    return conn.execute(f"SELECT COALESCE(SUM({_ROW_BYTES}), 0) FROM generated_tests").fetchone()[0]
+
+def evict_older_than(conn: sqlite3.Connection, max_age_days: float, now: Optional[float] = None) -> int:
+    """
+    drop tests that were neither generated nor served from the cache for `max_age_days`.
+    """
+    cutoff = (now if now is not None else time.time()) - max_age_days * 86400
+    cur = conn.execute("DELETE FROM generated_tests WHERE COALESCE(last_access, 0) < ?", (cutoff,))
+    _drop_dangling_keys(conn)
+    return cur.rowcount
+
+def evict_other_models(conn: sqlite3.Connection, keep_models: Iterable[str]) -> int:
+    keep = list(keep_models)
+    marks = ",".join("?" * len(keep))
+    cur = conn.execute(f"DELETE FROM generated_tests WHERE model_name NOT IN ({marks})", keep)
+    conn.execute(f"DELETE FROM test_cache WHERE model_name NOT IN ({marks})", keep)
+    _drop_dangling_keys(conn)
+    return cur.rowcount
+
+def prune_unseen(conn: sqlite3.Connection, since: float) -> int:
+    """
+    drop paths and tests not touched since `since`, the start of a full run: their classes no longer exist.
+    """
+    conn.execute("DELETE FROM test_cache WHERE COALESCE(last_access, 0) < ?", (since,))
+    cur = conn.execute("DELETE FROM generated_tests WHERE COALESCE(last_access, 0) < ?", (since,))
+    _drop_dangling_keys(conn)
+    return cur.rowcount
+
+def evict_to_budget(conn: sqlite3.Connection, max_bytes: int) -> int:
+    """
+    drop least recently used tests until the cached payload fits in `max_bytes`.
+    """
+    total = 0
+    victims: List[str] = []
+    rows = conn.execute(f"SELECT content_key, {_ROW_BYTES} FROM generated_tests ORDER BY last_access DESC, content_key")
+    for ckey, size in rows:
+        total += size or 0
+        if total > max_bytes:
+            victims.append(ckey)
+    _delete_tests(conn, victims)
+    _drop_dangling_keys(conn)
+    return len(victims)
+
+def recompress(conn: sqlite3.Connection, compression: Optional[str]) -> int:
+    """
+    re-encode stored tests to match `compression` (None stores plain text).
+    """
+    wanted = "text" if compression else "blob"
+    rows = conn.execute(
+        "SELECT content_key, generated_code FROM generated_tests WHERE typeof(generated_code) = ?", (wanted,)
+    ).fetchall()
+    conn.executemany(
+        "UPDATE generated_tests SET generated_code=? WHERE content_key=?",
+        [(encode_code(decode_code(code), compression), ckey) for ckey, code in rows]
+    )
+    conn.commit()
+    return len(rows)
+
+def vacuum_if_due(conn: sqlite3.Connection, interval_days: Optional[float], force: bool = False) -> bool:
+    """
+    VACUUM when forced, when the last one is older than `interval_days`, or when a quarter
+    of the file is free pages. the time of the last VACUUM lives in `cache_meta`.
+    """
+    now = time.time()
+    row = conn.execute("SELECT value FROM cache_meta WHERE name='last_vacuum'").fetchone()
+    last = float(row[0]) if row else 0.0
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    due = force or (pages and free / pages >= _FRAGMENTATION_VACUUM_RATIO)
+    if interval_days is not None and now - last >= interval_days * 86400:
+        due = True
+    if not due:
+        return False
+    conn.execute("VACUUM")
+    conn.execute("INSERT OR REPLACE INTO cache_meta (name, value) VALUES ('last_vacuum', ?)", (str(now),))
+    conn.commit()
+    return True
+
+def maintain_cache(
+    db_path: str,
+    max_age_days: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    keep_models: Optional[Iterable[str]] = None,
+    seen_since: Optional[float] = None,
+    compression: Optional[str] = None,
+    vacuum_interval_days: Optional[float] = 7,
+    force_vacuum: bool = False,
+) -> Dict[str, int]:
+    """
+    run every configured maintenance step on the cache database and return how many rows
+    each step evicted plus the bytes reclaimed on disk. must not run while a CacheStore
+    on the same database is open.
+    """
+    bytes_before = cache_size_bytes(db_path)
+    conn = init_cache(db_path, allow_threads=False)
+    try:
+        report = {"expired": 0, "other_models": 0, "unseen": 0, "over_budget": 0}
+        if seen_since is not None:
+            report["unseen"] = prune_unseen(conn, seen_since)
+        if max_age_days is not None:
+            report["expired"] = evict_older_than(conn, max_age_days)
+        if keep_models is not None:
+            report["other_models"] = evict_other_models(conn, keep_models)
+        report["recompressed"] = recompress(conn, compression)
+        if max_bytes is not None:
+            report["over_budget"] = evict_to_budget(conn, max_bytes)
+        report["vacuumed"] = int(vacuum_if_due(conn, vacuum_interval_days, force=force_vacuum))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        report["rows"] = conn.execute("SELECT COUNT(*) FROM generated_tests").fetchone()[0]
+        report["payload_bytes"] = payload_bytes(conn)
+    finally:
+        conn.close()
+    report["bytes_before"] = bytes_before
+    report["bytes_after"] = cache_size_bytes(db_path)
+    report["reclaimed_bytes"] = max(0, bytes_before - report["bytes_after"])
+    evicted = report["expired"] + report["other_models"] + report["unseen"] + report["over_budget"]
+    logger.info(
+        f"Cache maintenance: evicted {evicted} tests ({report['unseen']} unseen, {report['expired']} expired, "
+        f"{report['other_models']} other models, {report['over_budget']} over budget), "
+        f"re-encoded {report['recompressed']}, vacuumed={bool(report['vacuumed'])}, "
+        f"reclaimed {report['reclaimed_bytes']} bytes ({report['bytes_before']} -> {report['bytes_after']})"
+    )
+    return report
+
+def _delete_tests(conn: sqlite3.Connection, content_keys: List[str]) -> None:
+    for i in range(0, len(content_keys), _DELETE_CHUNK):
+        chunk = content_keys[i:i + _DELETE_CHUNK]
+        conn.execute(f"DELETE FROM generated_tests WHERE content_key IN ({','.join('?' * len(chunk))})", chunk)
+    conn.commit()
+
+def _drop_dangling_keys(conn: sqlite3.Connection) -> None:
+    # path index rows whose test was evicted
+    conn.execute(
+        "DELETE FROM test_cache WHERE content_key NOT IN (SELECT content_key FROM generated_tests) "
+        "OR content_key IS NULL"
+    )
+    conn.commit()
@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import shutil
+import logging
+import subprocess
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .discovery import is_test_project
+from .extractor import ExtractorPool
+from .stats import RunStats
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# what `<ImplicitUsings>enable</ImplicitUsings>` adds for Microsoft.NET.Sdk projects
+SDK_IMPLICIT_USINGS = [
+    "System", "System.Collections.Generic", "System.IO", "System.Linq", "System.Net.Http",
+    "System.Threading", "System.Threading.Tasks",
+]
+
+_USING_ITEM_RE = re.compile(r"<Using\s+Include=\"([\w.]+)\"\s*/>")
+
+class CompileChecker:
+    """
+    compiles generated test classes in memory, next to the repository's sources and with the test
+    project's package references, on warm `dotnet <extractor> --check-server` workers. the sources
+    are parsed once per worker; a check then only binds the test class, so it takes milliseconds
+    instead of a `dotnet build` of the whole test project. edited sources are swapped in with
+    `update`. safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        extractor_dll: str,
+        work_dir: str,
+        source_files: Iterable[str],
+        references: Iterable[str],
+        global_usings: str = "",
+        workers: int = 1,
+        request_timeout_sec: int = 60,
+        stats: Optional[RunStats] = None,
+        command: Optional[Sequence[str]] = None,
+    ):
+        os.makedirs(work_dir, exist_ok=True)
+        sources = [os.path.abspath(f) for f in source_files]
+        if global_usings:
+            usings_file = os.path.join(work_dir, "GlobalUsings.g.cs")
+            with open(usings_file, "w", encoding="utf-8") as f:
+                f.write(global_usings)
+            sources.append(usings_file)
+        self._sources = dict.fromkeys(sources)
+        self._references = list(references)
+        self._manifest = os.path.join(work_dir, "manifest.json")
+        self._write_manifest()
+        self._pool = ExtractorPool(
+            extractor_dll, size=workers, request_timeout_sec=request_timeout_sec,
+            command=command or ["dotnet", extractor_dll, "--check-server", self._manifest]
+        )
+        self._stats = stats
+        self.source_errors = 0  # declaration errors of the sources themselves, from the first check
+
+    def __enter__(self) -> "CompileChecker":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def check(self, code: str, name: str = "GeneratedTest") -> Optional[List[Dict[str, Any]]]:
+        """
+        compile errors in `code` (dicts with Id, Line, Column, Message), [] if it compiles,
+        or None if the check itself failed.
+        """
+        with span("compile.check", test_class=name) as s:
+            resp = self._pool.request(json.dumps({"Name": name, "Code": code}))
+            s.set(errors=len((resp or {}).get("Diagnostics") or []))
+        if resp is None:
+            return None
+        if not resp.get("Ok"):
+            logger.error(f"Compile check failed for {name}: {resp.get('Error', '').strip()[:500]}")
+            return None
+        source_errors = resp.get("SourceErrors") or 0
+        if source_errors and not self.source_errors:
+            logger.warning(f"The sources have {source_errors} declaration errors (unresolved references?); "
+                           "compile errors are only advisory until they are fixed")
+        self.source_errors = source_errors
+        if self._stats:
+            self._stats.observe("compile.check_ms", resp.get("ElapsedMs", 0))
+        return resp.get("Diagnostics") or []
+
+    def update(self, paths: Iterable[str]) -> None:
+        """
+        re-read edited, new and deleted source files: running workers swap just their syntax trees,
+        workers started later parse the updated manifest.
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        for path in paths:
+            if os.path.isfile(path):
+                self._sources.setdefault(path)
+            else:
+                self._sources.pop(path, None)
+        self._write_manifest()
+        with span("compile.update", files=len(paths)):
+            replies = self._pool.broadcast(json.dumps({"Update": paths}))
+        # a worker that died on it (None) was restarted from the manifest, so it is current too
+        for resp in replies:
+            if resp is not None and not resp.get("Ok"):
+                logger.error(f"Compile check worker failed to update: {resp.get('Error', '').strip()[:500]}")
+
+    def close(self) -> None:
+        self._pool.close()
+
+    def _write_manifest(self) -> None:
+        with open(self._manifest, "w", encoding="utf-8") as f:
+            json.dump({"SourceFiles": list(self._sources), "References": self._references}, f)
+
+def format_diagnostics(diagnostics: List[Dict[str, Any]], limit: int = 10) -> str:
+    lines = [f"{d['Id']} (line {d['Line']}): {d['Message']}" for d in diagnostics[:limit]]
+    if len(diagnostics) > limit:
+        lines.append(f"... and {len(diagnostics) - limit} more")
+    return "\n".join(lines)
+
+def project_package_references(project_dir: str) -> List[str]:
+    """
+    compile-time assemblies of the test project's packages (NUnit, Moq, ...), read from the
+    `obj/project.assets.json` that `dotnet restore` leaves behind. missing files are skipped.
+    """
+    assets_path = os.path.join(project_dir, "obj", "project.assets.json")
+    references = _assets_references(assets_path)
+    if references is None:
+        logger.warning(f"No usable restore output at {assets_path}; compile checks run without package references")
+        return []
+    if not references:
+        logger.warning(f"No package assemblies found for {project_dir}; run `dotnet restore` on it")
+    return references
+
+def source_project_references(repo_root: str, restore: bool = False) -> List[str]:
+    """
+    compile-time assemblies of the repository's own (non-test) projects: their packages and
+    shared frameworks (e.g. Microsoft.AspNetCore.App of Web SDK projects), read from each project's
+    `obj/project.assets.json`. with `restore`, a project without one is restored first.
+    """
+    references: List[str] = []
+    unresolved = []
+    for csproj in _source_projects(repo_root):
+        assets_path = os.path.join(os.path.dirname(csproj), "obj", "project.assets.json")
+        if restore and not os.path.isfile(assets_path):
+            _restore(csproj)
+        found = _assets_references(assets_path)
+        if found is None:
+            unresolved.append(os.path.relpath(csproj, repo_root))
+            continue
+        references += [r for r in found if r not in references]
+    if unresolved:
+        logger.warning(f"Not restored, so their packages are missing from compile checks: {', '.join(unresolved)}")
+    return references
+
+def merge_references(*groups: Iterable[str]) -> List[str]:
+    """
+    one reference per assembly file name, the first group winning (two versions of one assembly
+    would make every check fail with CS1703).
+    """
+    merged: Dict[str, str] = {}
+    for group in groups:
+        for path in group:
+            merged.setdefault(os.path.basename(path).lower(), path)
+    return list(merged.values())
+
+def _source_projects(repo_root: str) -> List[str]:
+    projects = []
+    for root, dirs, files in os.walk(repo_root):
+        dirs[:] = sorted(d for d in dirs if d not in ("bin", "obj") and not d.startswith("."))
+        projects += [os.path.join(root, f) for f in sorted(files) if f.endswith(".csproj")]
+    return [p for p in projects if not is_test_project(p)]
+
+def _restore(csproj: str) -> None:
+    with span("dotnet.restore", project=csproj) as s:
+        try:
+            proc = subprocess.run(["dotnet", "restore", csproj, "--nologo"], capture_output=True, text=True,
+                                  timeout=600)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Could not restore {csproj}: {e}")
+            return
+        s.set(exit_code=proc.returncode)
+    if proc.returncode != 0:
+        logger.warning(f"Could not restore {csproj}:\n{proc.stdout[-2000:]}{proc.stderr[-2000:]}")
+
+def _assets_references(assets_path: str) -> Optional[List[str]]:
+    # package and shared-framework assemblies of the first target framework; None if not restored
+    try:
+        with open(assets_path, encoding="utf-8") as f:
+            assets = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    folders = list(assets.get("packageFolders") or {})
+    libraries = assets.get("libraries") or {}
+    references = []
+    for tfm, target in (assets.get("targets") or {}).items():
+        for lib, info in target.items():
+            lib_path = (libraries.get(lib) or {}).get("path")
+            if not lib_path:
+                continue
+            for asset in info.get("compile") or {}:
+                if asset.endswith("/_._"):
+                    continue
+                found = next((os.path.join(folder, lib_path, asset) for folder in folders
+                              if os.path.isfile(os.path.join(folder, lib_path, asset))), None)
+                if found and found not in references:
+                    references.append(found)
+        tfm = tfm.split("/")[0]  # "net8.0/linux-x64" targets a runtime of net8.0
+        framework = ((assets.get("project") or {}).get("frameworks") or {}).get(tfm) or {}
+        for name in framework.get("frameworkReferences") or {}:
+            # the checker's own runtime already provides Microsoft.NETCore.App
+            if name != "Microsoft.NETCore.App":
+                references += [r for r in _framework_reference_assemblies(name, tfm) if r not in references]
+        break  # one target framework is enough
+    return references
+
+def _framework_reference_assemblies(name: str, tfm: str) -> List[str]:
+    """
+    reference assemblies of a shared framework from the SDK's targeting packs,
+    `<dotnet root>/packs/<name>.Ref/<newest version for tfm>/ref/<tfm>/*.dll`.
+    """
+    dotnet = shutil.which("dotnet")
+    root = os.environ.get("DOTNET_ROOT") or (os.path.dirname(os.path.realpath(dotnet)) if dotnet else None)
+    if not root:
+        return []
+    pack = os.path.join(root, "packs", f"{name}.Ref")
+    major = re.match(r"net(\d+)", tfm)
+    try:
+        versions = [v for v in os.listdir(pack) if not major or v.split(".")[0] == major.group(1)]
+    except OSError:
+        logger.warning(f"No targeting pack for {name} under {root}; its types are missing from compile checks")
+        return []
+    versions.sort(key=lambda v: [int(p) if p.isdigit() else 0 for p in re.split(r"[.-]", v)])
+    ref_dir = os.path.join(pack, versions[-1], "ref", tfm) if versions else ""
+    try:
+        return sorted(os.path.join(ref_dir, f) for f in os.listdir(ref_dir) if f.endswith(".dll"))
+    except OSError:
+        return []
+
+def project_global_usings(project_dir: str) -> str:
+    """
+    the global usings the SDK would generate for the test project: implicit usings (if enabled)
+    plus its `<Using Include="..."/>` items.
+    """
+    name = os.path.basename(os.path.normpath(project_dir))
+    try:
+        with open(os.path.join(project_dir, f"{name}.csproj"), encoding="utf-8") as f:
+            csproj = f.read()
+    except OSError:
+        return ""
+    namespaces = SDK_IMPLICIT_USINGS[:] if re.search(r"<ImplicitUsings>\s*enable\s*<", csproj) else []
+    namespaces += [ns for ns in _USING_ITEM_RE.findall(csproj) if ns not in namespaces]
+    return "".join(f"global using global::{ns};\n" for ns in namespaces)
@@ -0,0 +1,290 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# where test methods are put back into a class skeleton
+TESTS_PLACEHOLDER = "// <generated-test-methods>"
+
+_TEST_ATTR_RE = re.compile(r"\[\s*(?:NUnit\.Framework\.)?(?:Test|TestCase|TestCaseSource|Theory)\b")
+_ATTRIBUTE_RE = re.compile(r"\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]")
+_METHOD_NAME_RE = re.compile(r"\b(\w+)\s*(?:<[^<>()]*>)?\s*\(")
+_CLASS_RE = re.compile(r"\bclass\s+(\w+)")
+_USING_LINE_RE = re.compile(r"^\s*(?:global\s+)?using\s+(?:static\s+)?[\w.]+(?:\s*=\s*[\w.<>, ]+)?\s*;\s*$")
+_FILE_NAMESPACE_RE = re.compile(r"^\s*namespace\s+([\w.]+)\s*;[ \t]*\n?", re.M)
+
+class Member:
+    """
+    one top-level member of a class body; `start`/`end` index the class text, leading comments and attributes included.
+    """
+    __slots__ = ("start", "end", "text", "name", "is_test")
+
+    def __init__(self, start: int, end: int, text: str):
+        self.start = start
+        self.end = end
+        self.text = text
+        header = _ATTRIBUTE_RE.sub(" ", _strip_comments(text.split("{", 1)[0]))
+        m = _METHOD_NAME_RE.search(header)
+        self.name = m.group(1) if m else None
+        self.is_test = bool(self.name) and bool(_TEST_ATTR_RE.search(text.split("{", 1)[0]))
+
+    def __repr__(self):
+        return f"Member({self.name}, test={self.is_test})"
+
+def find_class_body(code: str, class_name: Optional[str] = None) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of the body of the first class (or of `class_name`): the index right after its
+    `{` and the index of its closing `}`. None if there is no complete class.
+    """
+    in_code = {i for i, _ in _code_chars(code, 0, len(code))}
+    for m in _CLASS_RE.finditer(code):
+        if class_name and m.group(1) != class_name:
+            continue
+        if m.start() in in_code:
+            open_idx = _next_code_char(code, m.end(), "{")
+            if open_idx is None:
+                return None
+            close_idx = _matching_brace(code, open_idx)
+            return (open_idx + 1, close_idx) if close_idx is not None else None
+    return None
+
+def class_members(code: str, body: Tuple[int, int]) -> List[Member]:
+    """
+    split a class body into members: fields and expression-bodied members end at `;`, blocks at
+    their closing `}` (a property initialiser `{ get; set; } = x;` runs on to its `;`).
+    """
+    start, end = body
+    members: List[Member] = []
+    member_start = None
+    depth = 0
+    for i, ch in _code_chars(code, start, end):
+        if member_start is None:
+            if ch.isspace():
+                continue
+            member_start = _leading_trivia_start(code, members[-1].end if members else start, i)
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                nxt = _next_code_char(code, i + 1)
+                if nxt is None or code[nxt] not in "=;":
+                    members.append(Member(member_start, i + 1, code[member_start:i + 1]))
+                    member_start = None
+        elif ch == ";" and depth == 0:
+            members.append(Member(member_start, i + 1, code[member_start:i + 1]))
+            member_start = None
+    return members
+
+def split_test_class(
+    code: str, method_names: Iterable[str], class_name: Optional[str] = None
+) -> Optional[Tuple[str, Dict[str, List[str]]]]:
+    """
+    cut a generated test class into a skeleton and the test methods of each tested method.
+    a test belongs to the longest method name it starts with (`Add_...`, `AddRange_...`); tests
+    matching no method (constructor tests, ...) stay in the skeleton. the removed tests are
+    replaced by TESTS_PLACEHOLDER. None if the class cannot be parsed.
+    """
+    body = find_class_body(code, class_name)
+    if body is None:
+        return None
+    names = sorted(set(method_names), key=len, reverse=True)
+    groups: Dict[str, List[str]] = {name: [] for name in names}
+    removed: List[Member] = []
+    for member in class_members(code, body):
+        if not member.is_test:
+            continue
+        owner = next((n for n in names if member.name == n or member.name.startswith(n + "_")), None)
+        if owner is None:
+            continue
+        groups[owner].append(_dedent(member.text))
+        removed.append(member)
+
+    parts = []
+    pos = 0
+    for member in removed:
+        parts.append(code[pos:member.start].rstrip(" \t"))
+        pos = member.end
+    skeleton = "".join(parts) + code[pos:body[1]].rstrip() + f"\n\n    {TESTS_PLACEHOLDER}\n" + code[body[1]:]
+    return _collapse_blank_lines(skeleton), groups
+
+def extract_test_methods(code: str, class_name: Optional[str] = None) -> List[str]:
+    """
+    every test method of a generated class, whatever it is named.
+    """
+    body = find_class_body(code, class_name)
+    if body is None:
+        return []
+    return [_dedent(m.text) for m in class_members(code, body) if m.is_test]
+
+def merge_test_class(skeleton: str, tests: Iterable[str]) -> str:
+    """
+    put test methods back into a skeleton from `split_test_class`.
+    """
+    block = "\n\n".join(_indent(t.strip("\n")) for t in tests if t.strip())
+    if TESTS_PLACEHOLDER not in skeleton:
+        raise ValueError("skeleton has no test placeholder")
+    line_start = skeleton.rfind("\n", 0, skeleton.index(TESTS_PLACEHOLDER)) + 1
+    line_end = skeleton.index(TESTS_PLACEHOLDER) + len(TESTS_PLACEHOLDER)
+    return skeleton[:line_start] + block + skeleton[line_end:]
+
+def combine_compilation_units(units: Sequence[str]) -> str:
+    """
+    one .cs file holding several generated test files: their using directives merged up front,
+    file-scoped namespaces kept if they all agree and turned into blocks if not.
+    """
+    if len(units) == 1:
+        return units[0]
+    usings: List[str] = []
+    parts = []
+    for unit in units:
+        unit_usings, namespace, body = _split_compilation_unit(unit)
+        usings += [u for u in unit_usings if u not in usings]
+        parts.append((namespace, body.strip("\n")))
+    # global usings have to come before the others
+    usings.sort(key=lambda u: not u.startswith("global "))
+    namespaces = {namespace for namespace, _ in parts}
+    if len(namespaces) == 1 and None not in namespaces:
+        body = f"namespace {namespaces.pop()};\n\n" + "\n\n".join(b for _, b in parts)
+    else:
+        body = "\n\n".join(b if ns is None else f"namespace {ns}\n{{\n{_indent(b)}\n}}" for ns, b in parts)
+    return "\n".join(usings) + ("\n\n" if usings else "") + body + "\n"
+
+def _split_compilation_unit(code: str) -> Tuple[List[str], Optional[str], str]:
+    # (leading using directives, file-scoped namespace or None, the rest)
+    lines = code.strip("\ufeff").split("\n")
+    usings, rest = [], []
+    for idx, line in enumerate(lines):
+        if _USING_LINE_RE.match(line):
+            usings.append(" ".join(line.split()))
+        elif line.strip() and not line.lstrip().startswith("//"):
+            rest += lines[idx:]
+            break
+        else:
+            rest.append(line)
+    body = "\n".join(rest)
+    m = _FILE_NAMESPACE_RE.search(body)
+    if m and not _strip_comments(body[:m.start()]).strip():
+        return usings, m.group(1), body[:m.start()] + body[m.end():]
+    return usings, None, body
+
+# ---------------- scanning ----------------
+
+def _code_chars(code: str, start: int, end: int):
+    """
+    yield (index, char) for characters outside comments, strings and char literals.
+    """
+    i = start
+    while i < end:
+        ch = code[i]
+        two = code[i:i + 2]
+        if two == "//":
+            nl = code.find("\n", i)
+            i = end if nl == -1 else nl
+            continue
+        if two == "/*":
+            close = code.find("*/", i + 2)
+            i = end if close == -1 else close + 2
+            continue
+        if ch == '"' or (ch in "@$" and '"' in code[i + 1:i + 3]):
+            i = _skip_string(code, i)
+            continue
+        if ch == "'":
+            i = _skip_char_literal(code, i)
+            continue
+        yield i, ch
+        i += 1
+
+def _skip_string(code: str, i: int) -> int:
+    prefix_end = i
+    while code[prefix_end] in "@$":
+        prefix_end += 1
+    prefix = code[i:prefix_end]
+    if code.startswith('"""', prefix_end):
+        # raw string literal: closed by as many quotes as opened it
+        n = len(code[prefix_end:]) - len(code[prefix_end:].lstrip('"'))
+        close = code.find('"' * n, prefix_end + n)
+        return len(code) if close == -1 else close + n
+    j = prefix_end + 1
+    verbatim = "@" in prefix
+    interp_depth = 0
+    while j < len(code):
+        c = code[j]
+        if "$" in prefix and c == "{":
+            if code.startswith("{{", j) and interp_depth == 0:
+                j += 2
+                continue
+            interp_depth += 1
+        elif "$" in prefix and c == "}" and interp_depth:
+            interp_depth -= 1
+        elif interp_depth and c == '"':
+            j = _skip_string(code, j)
+            continue
+        elif verbatim and c == '"':
+            if code.startswith('""', j):
+                j += 2
+                continue
+            return j + 1
+        elif not verbatim and c == "\\":
+            j += 2
+            continue
+        elif c == '"':
+            return j + 1
+        elif c == "\n" and not verbatim:
+            return j
+        j += 1
+    return j
+
+def _skip_char_literal(code: str, i: int) -> int:
+    j = i + 1
+    while j < len(code) and code[j] != "'":
+        j += 2 if code[j] == "\\" else 1
+        if j - i > 12:  # not a char literal after all
+            return i + 1
+    return j + 1
+
+def _next_code_char(code: str, start: int, wanted: Optional[str] = None) -> Optional[int]:
+    for i, ch in _code_chars(code, start, len(code)):
+        if ch.isspace():
+            continue
+        if wanted is None or ch == wanted:
+            return i
+        if ch in ";}":
+            return None
+    return None
+
+def _matching_brace(code: str, open_idx: int) -> Optional[int]:
+    depth = 0
+    for i, ch in _code_chars(code, open_idx, len(code)):
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+def _leading_trivia_start(code: str, floor: int, idx: int) -> int:
+    # comments directly above a member belong to it; the scan skipped them, so walk back line by line
+    line_start = code.rfind("\n", floor, idx) + 1 or floor
+    while line_start > floor:
+        prev_start = code.rfind("\n", floor, line_start - 1) + 1 or floor
+        prev = code[prev_start:line_start].strip()
+        if prev.startswith("//") or prev.startswith("/*") or prev.startswith("*") or prev.endswith("*/"):
+            line_start = prev_start
+        else:
+            break
+    return max(line_start, floor)
+
+def _strip_comments(text: str) -> str:
+    return re.sub(r"//[^\n]*|/\*.*?\*/", " ", text, flags=re.S)
+
+def _dedent(text: str) -> str:
+    lines = text.split("\n")
+    indents = [len(l) - len(l.lstrip()) for l in lines if l.strip()]
+    cut = min(indents) if indents else 0
+    return "\n".join(l[cut:] if l.strip() else "" for l in lines)
+
+def _indent(text: str, prefix: str = "    ") -> str:
+    return "\n".join(prefix + l if l.strip() else "" for l in text.split("\n"))
+
+def _collapse_blank_lines(text: str) -> str:
+    return re.sub(r"\n[ \t]*\n(?:[ \t]*\n)+", "\n\n", text)
@@ -0,0 +1,312 @@
+import os
+import re
+import logging
+import threading
+import subprocess
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# files tooling writes: designers, source generators, assembly attributes, EF Core model snapshots
+DEFAULT_EXCLUDE = (
+    "**/*.Designer.cs", "**/*.designer.cs", "**/*.g.cs", "**/*.g.i.cs", "**/*.generated.cs",
+    "**/*.AssemblyAttributes.cs", "**/AssemblyInfo.cs", "**/*ModelSnapshot.cs",
+)
+EXCLUDED_DIRS = ("bin", "obj", ".git")
+HEADER_BYTES = 2048  # where `<auto-generated>` markers are looked for
+
+_AUTO_GENERATED_RE = re.compile(r"<\s*auto-?generated", re.I)
+_GENERATED_CODE_RE = re.compile(r"\[\s*(?:global::)?(?:System\.CodeDom\.Compiler\.)?GeneratedCode(?:Attribute)?\s*\(")
+_MIGRATION_RE = re.compile(r"\[\s*Migration\s*\(|:\s*(?:Microsoft\.EntityFrameworkCore\.Migrations\.)?Migration\b")
+_TYPE_RE = re.compile(r"\b(?:class|record|struct|interface|enum)\s+\w+")
+_TEST_PROJECT_RE = re.compile(
+    r"Microsoft\.NET\.Test\.Sdk|\"(?:NUnit|xunit|MSTest\.TestFramework|xunit\.v3)\"|<IsTestProject>\s*true", re.I
+)
+
+def glob_to_regex(pattern: str) -> Pattern[str]:
+    """
+    a path glob (`**` crosses directories, `*` and `?` do not) as a regex on `/`-separated relative paths.
+    """
+    out, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            out += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            out += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            out += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            out += "[" + pattern[i + 1:end].replace("!", "^", 1) + "]"
+            i = end + 1
+        else:
+            out += re.escape(pattern[i])
+            i += 1
+    return re.compile(f"^{out}$")
+
+class _IgnoreRules:
+    """
+    the patterns of one .gitignore, matched against paths relative to its directory.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self.rules: List[Tuple[Pattern[str], bool, bool]] = []  # (regex, negated, directories only)
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            line = line[1:] if negated else line
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            self.rules.append((glob_to_regex(line.lstrip("/") if anchored else f"**/{line}"), negated, dir_only))
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        # the last matching pattern decides; None if none matches
+        verdict = None
+        for regex, negated, dir_only in self.rules:
+            if (not dir_only or is_dir) and regex.match(rel_path):
+                verdict = not negated
+        return verdict
+
+class DiscoveryReport:
+    """
+    files and classes left out by discovery, per reason.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.listed = 0
+        self.skipped: Dict[str, List[int]] = {}  # reason -> [files, classes]
+
+    def add(self, reason: str, classes: int) -> None:
+        with self._lock:
+            entry = self.skipped.setdefault(reason, [0, 0])
+            entry[0] += 1
+            entry[1] += classes
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            return [f"{reason}: {files} files, {classes} classes"
+                    for reason, (files, classes) in sorted(self.skipped.items(), key=lambda kv: -kv[1][0])]
+
+class Discovery:
+    """
+    which .cs files of a repository get tests. files come from `git ls-files` (tracked plus untracked,
+    .gitignore honoured), or from a directory walk that reads the .gitignore files itself. a file is
+    skipped if it matches an `exclude` glob or misses every `include` glob (relative `/` paths), if
+    it is generated (`<auto-generated>` header, `[GeneratedCode]` on every type), an EF Core migration,
+    or belongs to a test project. verdicts are kept, so a file is read once per run.
+    """
+
+    def __init__(self, repo_root: str, include: Sequence[str] = (), exclude: Sequence[str] = DEFAULT_EXCLUDE,
+                 skip_generated: bool = True, skip_test_projects: bool = True, use_git: bool = True):
+        self.repo_root = os.path.abspath(repo_root)
+        self.include = [(p, glob_to_regex(p)) for p in include]
+        self.exclude = [(p, glob_to_regex(p)) for p in exclude]
+        self.skip_generated = skip_generated
+        self.skip_test_projects = skip_test_projects
+        self.use_git = use_git
+        self.report = DiscoveryReport()
+        self._verdicts: Dict[str, Optional[str]] = {}
+        self._test_projects: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def discover(self, path: Optional[str] = None) -> List[str]:
+        """
+        the files under `path` (default: the repo root) that get tests, as absolute paths.
+        """
+        return self.filter(self.list_files(path))
+
+    def filter(self, paths: Iterable[str]) -> List[str]:
+        return [p for p in paths if self.check(p) is None]
+
+    def check(self, path: str) -> Optional[str]:
+        """
+        why `path` gets no tests, or None if it does. the first verdict on a file is counted in `report`.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._verdicts:
+                return self._verdicts[path]
+        reason, classes = self._judge(path)
+        with self._lock:
+            if path in self._verdicts:
+                return self._verdicts[path]
+            self._verdicts[path] = reason
+        if reason:
+            self.report.add(reason, classes)
+        return reason
+
+    def forget(self, paths: Iterable[str]) -> None:
+        """
+        drop the verdicts on `paths` (files edited since), so they are judged again.
+        """
+        with self._lock:
+            for path in paths:
+                self._verdicts.pop(os.path.abspath(path), None)
+
+    def list_files(self, path: Optional[str] = None) -> List[str]:
+        path = os.path.abspath(path or self.repo_root)
+        files = self._git_files(path) if self.use_git else None
+        if files is None:
+            files = list(self._walk(path))
+        self.report.listed += len(files)
+        return files
+
+    # ---------------- listing ----------------
+
+    def _git_files(self, path: str) -> Optional[List[str]]:
+        listed = _git_ls(path, "--cached", "--others", "--exclude-standard")
+        if listed is None:
+            return None
+        ignored = _git_ls(path, "--others", "--ignored", "--exclude-standard") or []
+        for rel in ignored:
+            if self._source_path(rel):
+                self.report.add("gitignored", self._count_types(os.path.join(path, rel)))
+        # a sparse checkout lists files that are not on disk
+        return [os.path.join(path, rel) for rel in dict.fromkeys(listed)
+                if self._source_path(rel) and os.path.isfile(os.path.join(path, rel))]
+
+    def _walk(self, top: str):
+        stack = [(top, [])]
+        while stack:
+            directory, ignores = stack.pop()
+            ignores = ignores + [(directory, _read_gitignore(directory))]
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if is_dir and (entry.name in EXCLUDED_DIRS or entry.name.startswith(".")):
+                    continue
+                if not is_dir and not entry.name.endswith(".cs"):
+                    continue
+                if _ignored(entry.path, is_dir, ignores):
+                    for path in _cs_files_under(entry.path) if is_dir else [entry.path]:
+                        self.report.add("gitignored", self._count_types(path))
+                    continue
+                if is_dir:
+                    stack.append((entry.path, ignores))
+                else:
+                    yield entry.path
+
+    @staticmethod
+    def _source_path(rel: str) -> bool:
+        parts = rel.split("/")
+        return rel.endswith(".cs") and not any(p in EXCLUDED_DIRS or p.startswith(".") for p in parts[:-1])
+
+    # ---------------- rules ----------------
+
+    def _judge(self, path: str) -> Tuple[Optional[str], int]:
+        rel = os.path.relpath(path, self.repo_root).replace(os.sep, "/")
+        for pattern, regex in self.exclude:
+            if regex.match(rel):
+                return f"excluded {pattern}", self._count_types(path)
+        if self.include and not any(regex.match(rel) for _, regex in self.include):
+            return "not included", self._count_types(path)
+        if not (self.skip_generated or self.skip_test_projects):
+            return None, 0
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return None, 0
+        types = len(_TYPE_RE.findall(text))
+        if self.skip_generated:
+            if _AUTO_GENERATED_RE.search(text[:HEADER_BYTES]):
+                return "auto-generated header", types
+            marked = len(_GENERATED_CODE_RE.findall(text))
+            if marked and marked >= types:
+                return "[GeneratedCode]", types
+            if _MIGRATION_RE.search(text):
+                return "EF Core migration", types
+        if self.skip_test_projects and self._in_test_project(os.path.dirname(path)):
+            return "test project", types
+        return None, 0
+
+    def _in_test_project(self, directory: str) -> bool:
+        # the nearest directory with a .csproj decides
+        seen = []
+        result = False
+        while True:
+            with self._lock:
+                known = self._test_projects.get(directory)
+            if known is not None:
+                result = known
+                break
+            seen.append(directory)
+            try:
+                projects = [e.path for e in os.scandir(directory) if e.name.endswith(".csproj") and e.is_file()]
+            except OSError:
+                projects = []
+            if projects:
+                result = any(is_test_project(p) for p in projects)
+                break
+            parent = os.path.dirname(directory)
+            if directory == self.repo_root or parent == directory or not directory.startswith(self.repo_root):
+                break
+            directory = parent
+        with self._lock:
+            for d in seen:
+                self._test_projects[d] = result
+        return result
+
+    @staticmethod
+    def _count_types(path: str) -> int:
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                return len(_TYPE_RE.findall(f.read()))
+        except OSError:
+            return 0
+
+def is_test_project(csproj: str) -> bool:
+    try:
+        with open(csproj, encoding="utf-8", errors="replace") as f:
+            return bool(_TEST_PROJECT_RE.search(f.read()))
+    except OSError:
+        return False
+
+def _git_ls(path: str, *options: str) -> Optional[List[str]]:
+    try:
+        proc = subprocess.run(
+            ["git", "-C", path, "ls-files", "-z", *options, "--", "*.cs"], capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return [rel for rel in proc.stdout.split("\0") if rel]
+
+def _cs_files_under(directory: str) -> List[str]:
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS and not d.startswith(".")]
+        found += [os.path.join(root, f) for f in files if f.endswith(".cs")]
+    return found
+
+def _read_gitignore(directory: str) -> Optional[_IgnoreRules]:
+    try:
+        with open(os.path.join(directory, ".gitignore"), encoding="utf-8", errors="replace") as f:
+            return _IgnoreRules(f)
+    except OSError:
+        return None
+
+def _ignored(path: str, is_dir: bool, ignores: List[Tuple[str, Optional[_IgnoreRules]]]) -> bool:
+    # deeper .gitignore files override shallower ones
+    verdict = False
+    for base, rules in ignores:
+        if rules is None:
+            continue
+        match = rules.match(os.path.relpath(path, base).replace(os.sep, "/"), is_dir)
+        if match is not None:
+            verdict = match
+    return verdict
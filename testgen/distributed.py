@@ -0,0 +1,449 @@
+"""
+generation spread over several machines: the run is the coordinator, and every inference box runs a worker
+that generates against its own Ollama.
+
+    python run.py worker --coordinator http://build-host:8765 --ollama-url http://localhost:11434
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional
+
+from .generator import (
+    agenerate_nunit_test_class, astream_nunit_test_class, agenerate_nunit_test_batch, arepair_nunit_test_class,
+    PROMPT_TOKEN_BUDGET
+)
+from .model_session import ModelSession
+from .ollama_client import DEFAULT_OLLAMA_URL, OllamaClient
+from .stats import RunStats
+from .tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+LEASE_SEC = 60.0        # a lease not renewed for this long belongs to a dead or hung worker
+POLL_WAIT_SEC = 5.0     # how long a lease request waits for work before the worker asks again
+TOKEN_HEADER = "X-Testgen-Token"
+TASK_KINDS = ("class", "batch", "repair")
+
+class _Task:
+    __slots__ = ("task_id", "kind", "args", "future", "loop", "attempts", "worker", "deadline", "queued_at")
+
+    def __init__(self, kind: str, args: Dict[str, Any], future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.task_id = uuid.uuid4().hex
+        self.kind = kind
+        self.args = args
+        self.future = future
+        self.loop = loop
+        self.attempts = 0
+        self.worker: Optional[str] = None
+        self.deadline = 0.0
+        self.queued_at = time.monotonic()
+
+class Coordinator:
+    """
+    hands generation tasks to workers over HTTP. `submit` queues a task and waits for its result;
+    workers long-poll `POST /lease` for the next task and must renew it (`/heartbeat`) within
+    `lease_sec` while they work on it, then `POST /result`. a task whose lease runs out (the worker died
+    or hangs) or whose worker reports an error goes back to the front of the queue, up to `max_attempts`
+    leases; after that its result is None, as for a failed local generation. the first result for a
+    task wins, so a slow worker coming back after its lease was taken over does no harm.
+    `settings` (model, namespace, prompt options) are served at `GET /settings`, so every worker
+    generates the same way. with `token` set, requests must carry it in the X-Testgen-Token header.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, settings: Optional[Dict[str, Any]] = None,
+                 lease_sec: float = LEASE_SEC, max_attempts: int = 3, token: Optional[str] = None,
+                 stats: Optional[RunStats] = None):
+        self.settings = dict(settings or {})
+        self.lease_sec = lease_sec
+        self.max_attempts = max(1, max_attempts)
+        self.token = token
+        self.stats = stats
+        self.workers: Dict[str, Dict[str, float]] = {}  # worker -> counters
+        self._pending: Deque[_Task] = deque()
+        self._leased: Dict[str, _Task] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stopped = threading.Event()  # wakes the lease reaper
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "Coordinator":
+        for target in (lambda: self._server.serve_forever(poll_interval=0.05), self._reap):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"coordinator listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        # workers asking for work from now on are told the run is over
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            tasks = list(self._pending) + list(self._leased.values())
+            self._pending.clear()
+            self._leased.clear()
+            self._cond.notify_all()
+        self._stopped.set()
+        for task in tasks:
+            _resolve(task, None)
+        self._server.shutdown()
+        self._server.server_close()
+
+    async def submit(self, kind: str, **args: Any) -> Any:
+        """
+        run one task on a worker: "class" (cls, focus_method, fixture) and "repair" (cls, test_code,
+        diagnostics) give the test code, "batch" (classes) gives class name -> code. None if it failed.
+        """
+        if kind not in TASK_KINDS:
+            raise ValueError(f"unknown task kind {kind!r}")
+        loop = asyncio.get_running_loop()
+        task = _Task(kind, args, loop.create_future(), loop)
+        with self._cond:
+            if self._closed:
+                return None
+            self._pending.append(task)
+            self._cond.notify()
+        try:
+            result = await task.future
+        except asyncio.CancelledError:
+            with self._cond:
+                if task in self._pending:
+                    self._pending.remove(task)
+                self._leased.pop(task.task_id, None)
+            raise
+        annotate(worker=task.worker, attempts=task.attempts)
+        return result
+
+    def report_lines(self) -> List[str]:
+        with self._cond:
+            workers = {name: dict(counts) for name, counts in self.workers.items()}
+        return [f"worker {name}: " + " ".join(f"{k}={_fmt(v)}" for k, v in sorted(counts.items()))
+                for name, counts in sorted(workers.items())]
+
+    # ---------------- called from the HTTP threads ----------------
+
+    def _lease(self, worker: str, wait_sec: float) -> Optional[_Task]:
+        deadline = time.monotonic() + wait_sec
+        with self._cond:
+            self.workers.setdefault(worker, {})
+            while not self._pending and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._closed:
+                raise _Closed()
+            task = self._pending.popleft()
+            task.attempts += 1
+            task.worker = worker
+            task.deadline = time.monotonic() + self.lease_sec
+            self._leased[task.task_id] = task
+            self._count(worker, "leased")
+        if self.stats:
+            self.stats.observe("distributed.queue_wait_sec", time.monotonic() - task.queued_at)
+        return task
+
+    def _heartbeat(self, worker: str, task_id: str) -> bool:
+        with self._cond:
+            task = self._leased.get(task_id)
+            if task is None or task.worker != worker:
+                return False  # done, cancelled or handed to another worker: the worker can stop
+            task.deadline = time.monotonic() + self.lease_sec
+            return True
+
+    def _complete(self, worker: str, task_id: str, result: Any, error: Optional[str]) -> None:
+        with self._cond:
+            task = self._leased.get(task_id)
+            if task is None:
+                # a worker whose lease ran out still finished first: take its result
+                task = next((t for t in self._pending if t.task_id == task_id), None)
+                if task is None or error:
+                    return  # finished by another worker in the meantime, or already queued again
+                self._pending.remove(task)
+            elif error and task.worker != worker:
+                return  # the lease went to another worker, which is still on it
+            else:
+                del self._leased[task_id]
+            task.worker = worker
+            if error:
+                self._count(worker, "errors")
+                logger.warning(f"worker {worker} failed on a {task.kind} task: {error}")
+                self._retry(task)
+                return
+            self._count(worker, "done" if result is not None else "failed")
+        if self.stats:
+            self.stats.incr(f"distributed.tasks[{worker}]")
+        _resolve(task, result)
+
+    def _count(self, worker: str, key: str) -> None:
+        # under the lock
+        counts = self.workers.setdefault(worker, {})
+        counts[key] = counts.get(key, 0) + 1
+
+    def _retry(self, task: _Task) -> None:
+        # under the lock: put the task back in front, unless it has had all its leases
+        if task.attempts < self.max_attempts:
+            task.queued_at = time.monotonic()
+            self._pending.appendleft(task)
+            self._cond.notify()
+            if self.stats:
+                self.stats.incr("distributed.retried")
+            return
+        logger.error(f"giving up on a {task.kind} task after {task.attempts} leases")
+        if self.stats:
+            self.stats.incr("distributed.gave_up")
+        _resolve(task, None)
+
+    def _reap(self) -> None:
+        while not self._stopped.wait(min(1.0, self.lease_sec / 4)):
+            with self._cond:
+                now = time.monotonic()
+                for task in [t for t in self._leased.values() if t.deadline < now]:
+                    del self._leased[task.task_id]
+                    logger.warning(f"lease of worker {task.worker} on a {task.kind} task expired")
+                    self._count(task.worker, "expired")
+                    if self.stats:
+                        self.stats.incr("distributed.lease_expired")
+                    self._retry(task)
+
+class _Closed(Exception):
+    pass
+
+def _resolve(task: _Task, result: Any) -> None:
+    def settle():
+        if not task.future.done():
+            task.future.set_result(result)
+    try:
+        task.loop.call_soon_threadsafe(settle)
+    except RuntimeError:
+        pass  # the run's loop is gone
+
+def _make_handler(coordinator: Coordinator):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            logger.debug(fmt % args)
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path == "/settings":
+                self._send_json(200, coordinator.settings)
+            elif self.path == "/status":
+                with coordinator._cond:
+                    body = {"pending": len(coordinator._pending), "leased": len(coordinator._leased),
+                            "workers": {k: dict(v) for k, v in coordinator.workers.items()}}
+                self._send_json(200, body)
+            else:
+                self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid JSON"})
+                return
+            worker = str(payload.get("worker") or self.client_address[0])
+            if self.path == "/lease":
+                try:
+                    task = coordinator._lease(worker, min(float(payload.get("wait", POLL_WAIT_SEC)), 30.0))
+                except _Closed:
+                    self._send_json(410, {"error": "the run is over"})
+                    return
+                if task is None:
+                    self._send_json(200, {"task": None})
+                else:
+                    self._send_json(200, {"task": task.task_id, "kind": task.kind, "args": task.args,
+                                          "lease_sec": coordinator.lease_sec})
+            elif self.path == "/heartbeat":
+                self._send_json(200, {"ok": coordinator._heartbeat(worker, payload.get("task"))})
+            elif self.path == "/result":
+                coordinator._complete(worker, payload.get("task"), payload.get("result"), payload.get("error"))
+                self._send_json(200, {"ok": True})
+            else:
+                self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+        def _authorized(self) -> bool:
+            if coordinator.token and self.headers.get(TOKEN_HEADER) != coordinator.token:
+                self._send_json(403, {"error": "missing or wrong token"})
+                return False
+            return True
+
+        def _send_json(self, status: int, obj: Any) -> None:
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            try:
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    return Handler
+
+async def run_task(kind: str, args: Dict[str, Any], client: OllamaClient, settings: Dict[str, Any],
+                   stats: Optional[RunStats] = None) -> Any:
+    """
+    what a worker does with a task: the same generator call the run would make with a local client.
+    """
+    model = settings["model"]
+    namespace = settings["namespace"]
+    timeout_sec = settings.get("timeout_sec", 300)
+    budget = settings.get("token_budget", PROMPT_TOKEN_BUDGET)
+    if kind == "class":
+        generate = astream_nunit_test_class if settings.get("stream", True) else agenerate_nunit_test_class
+        return await generate(
+            args["cls"], model, namespace, client, timeout_sec=timeout_sec, stats=stats, token_budget=budget,
+            focus_method=args.get("focus_method"), fixture=args.get("fixture")
+        )
+    if kind == "batch":
+        return await agenerate_nunit_test_batch(args["classes"], model, namespace, client, timeout_sec=timeout_sec,
+                                                stats=stats)
+    if kind == "repair":
+        return await arepair_nunit_test_class(
+            args["cls"], args["test_code"], args["diagnostics"], model, namespace, client, timeout_sec=timeout_sec,
+            token_budget=budget, stats=stats
+        )
+    raise ValueError(f"unknown task kind {kind!r}")
+
+class Worker:
+    """
+    leases tasks from a coordinator, `inflight` at a time, and generates them against its own Ollama.
+    it loads and warms the run's model before taking work (a worker whose Ollama cannot load it
+    takes none), renews each lease while the task runs and drops the task if the coordinator says
+    it went elsewhere. it exits when the coordinator's run is over, or, with `forever`, waits for the next run.
+    """
+
+    def __init__(self, coordinator_url: str, ollama_url: str = DEFAULT_OLLAMA_URL, inflight: int = 2,
+                 worker_id: Optional[str] = None, token: Optional[str] = None, forever: bool = False,
+                 connect_timeout_sec: float = 60.0):
+        self.coordinator_url = coordinator_url.rstrip("/")
+        self.ollama_url = ollama_url
+        self.inflight = max(1, inflight)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.token = token
+        self.forever = forever
+        self.connect_timeout_sec = connect_timeout_sec
+        self.stats = RunStats()
+        self.completed = 0
+
+    def run(self) -> int:
+        return asyncio.run(self.arun())
+
+    async def arun(self) -> int:
+        while True:
+            settings = await self._settings()
+            if settings is None:
+                logger.error(f"coordinator {self.coordinator_url} is not reachable")
+                return 1
+            client = OllamaClient(self.ollama_url, max_inflight=self.inflight, keep_alive=settings.get("keep_alive"))
+            session = ModelSession(client, settings["model"], warm_requests=self.inflight if settings.get("warm") else 0,
+                                   keep_alive_after=settings.get("keep_alive_after"), stats=self.stats)
+            try:
+                if not await session.ready():
+                    logger.error(f"{self.ollama_url} could not load {settings['model']}; not taking work")
+                    return 1
+                logger.info(f"worker {self.worker_id} generating with {settings['model']} at {self.ollama_url}")
+                await asyncio.gather(*(self._loop(client, settings) for _ in range(self.inflight)))
+            finally:
+                await session.close()
+                await client.close()
+            if not self.forever:
+                return 0
+
+    async def _settings(self) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + self.connect_timeout_sec
+        while True:
+            try:
+                return await self._call("GET", "/settings")
+            except (OSError, urllib.error.URLError) as e:
+                if time.monotonic() >= deadline and not self.forever:
+                    logger.debug(f"giving up on {self.coordinator_url}: {e}")
+                    return None
+            await asyncio.sleep(1.0)
+
+    async def _loop(self, client: OllamaClient, settings: Dict[str, Any]) -> None:
+        while True:
+            try:
+                lease = await self._call("POST", "/lease", {"worker": self.worker_id, "wait": POLL_WAIT_SEC})
+            except _Closed:
+                return
+            except (OSError, urllib.error.URLError) as e:
+                logger.info(f"coordinator unreachable ({e}): the run is over")
+                return
+            if not lease.get("task"):
+                continue
+            await self._work(client, settings, lease)
+
+    async def _work(self, client: OllamaClient, settings: Dict[str, Any], lease: Dict[str, Any]) -> None:
+        task_id = lease["task"]
+        job = asyncio.create_task(run_task(lease["kind"], lease["args"], client, settings, self.stats))
+        interval = max(0.05, float(lease.get("lease_sec", LEASE_SEC)) / 3)
+        while not job.done():
+            await asyncio.wait({job}, timeout=interval)
+            if job.done():
+                break
+            try:
+                renewed = (await self._call("POST", "/heartbeat", {"worker": self.worker_id, "task": task_id}))["ok"]
+            except (OSError, urllib.error.URLError, _Closed):
+                renewed = False
+            if not renewed:
+                job.cancel()  # closes the Ollama connection, so the server stops generating
+                await asyncio.gather(job, return_exceptions=True)
+                return
+        error = None
+        result = None
+        try:
+            result = job.result()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        try:
+            await self._call("POST", "/result", {"worker": self.worker_id, "task": task_id, "result": result,
+                                                 "error": error})
+            self.completed += 1
+        except (OSError, urllib.error.URLError, _Closed) as e:
+            logger.warning(f"could not deliver the result of task {task_id}: {e}")
+
+    async def _call(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._call_sync, method, path, payload)
+
+    def _call_sync(self, method: str, path: str, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.coordinator_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        if self.token:
+            request.add_header(TOKEN_HEADER, self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=POLL_WAIT_SEC + 30) as response:
+                return json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            if e.code == 410:
+                raise _Closed() from e
+            raise
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.1f}"
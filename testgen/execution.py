@@ -0,0 +1,257 @@
+import os
+import re
+import time
+import shutil
+import logging
+import subprocess
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLASS_SEC = 1.0  # assumed duration of a test class that has never run
+_TRX_NS = {"t": "http://microsoft.com/schemas/VisualStudio/TeamTest/2010"}
+_NAMESPACE_RE = re.compile(r"^\s*namespace\s+([\w.]+)", re.M)
+_CLASS_RE = re.compile(r"\bclass\s+(\w+)")
+_EXCLUDED_DIRS = {"bin", "obj", "TestResults"}
+
+class TestOutcome:
+    """
+    result of one test method, as reported in a shard's TRX file.
+    """
+    __slots__ = ("name", "test_class", "outcome", "duration_sec", "message")
+
+    def __init__(self, name: str, test_class: str, outcome: str, duration_sec: float, message: Optional[str] = None):
+        self.name = name
+        self.test_class = test_class
+        self.outcome = outcome  # Passed, Failed, NotExecuted, ...
+        self.duration_sec = duration_sec
+        self.message = message
+
+    def __repr__(self):
+        return f"TestOutcome({self.name}, {self.outcome})"
+
+class TestRunReport:
+    """
+    everything one sharded `dotnet test` run produced.
+    """
+
+    def __init__(self, build_ok: bool, build_output: str = ""):
+        self.build_ok = build_ok
+        self.build_output = build_output
+        self.outcomes: List[TestOutcome] = []
+        self.test_classes: List[str] = []  # classes that were scheduled, whether or not they had tests
+        self.shard_wall_sec: List[float] = []
+        self.crashed_shards = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.build_ok and not self.crashed_shards and not any(o.outcome == "Failed" for o in self.outcomes)
+
+    def count(self, outcome: str) -> int:
+        return sum(o.outcome == outcome for o in self.outcomes)
+
+    def failures_by_class(self) -> Dict[str, List[TestOutcome]]:
+        failed: Dict[str, List[TestOutcome]] = {}
+        for o in self.outcomes:
+            if o.outcome == "Failed":
+                failed.setdefault(o.test_class, []).append(o)
+        return failed
+
+def discover_test_classes(project_dir: str) -> List[str]:
+    """
+    fully qualified names of the classes declared in the test project's files that contain tests.
+    a plain text scan: cheap, and the last shard catches whatever it misses.
+    """
+    classes = []
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if d not in _EXCLUDED_DIRS and not d.startswith(".")]
+        for name in sorted(files):
+            if not name.endswith(".cs"):
+                continue
+            try:
+                with open(os.path.join(root, name), encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+            except OSError:
+                continue
+            if "[Test" not in text:
+                continue
+            ns = _NAMESPACE_RE.search(text)
+            prefix = f"{ns.group(1)}." if ns else ""
+            classes += [prefix + cls for cls in _CLASS_RE.findall(text) if prefix + cls not in classes]
+    return classes
+
+def plan_shards(test_classes: Iterable[str], durations: Dict[str, float], shards: int) -> List[List[str]]:
+    """
+    split test classes into at most `shards` groups of similar total duration: longest first,
+    each into the currently lightest shard. classes without history count as the median known
+    duration (or DEFAULT_CLASS_SEC).
+    """
+    classes = list(dict.fromkeys(test_classes))
+    known = sorted(d for c, d in durations.items() if c in classes)
+    default = known[len(known) // 2] if known else DEFAULT_CLASS_SEC
+    weight = {c: durations.get(c, default) for c in classes}
+    groups: List[List[str]] = [[] for _ in range(max(1, min(shards, len(classes))))]
+    loads = [0.0] * len(groups)
+    for cls in sorted(classes, key=lambda c: (-weight[c], c)):
+        idx = loads.index(min(loads))
+        groups[idx].append(cls)
+        loads[idx] += weight[cls]
+    return groups
+
+def shard_filters(
+    groups: List[List[str]], exclude: Iterable[str] = (), rest: bool = True, known: Iterable[str] = ()
+) -> List[Optional[str]]:
+    """
+    `dotnet test --filter` expressions for the shards: every shard but the last includes its
+    classes, the last runs everything the others do not (so undiscovered classes still run).
+    `exclude` (quarantined classes) is left out everywhere. None means no filter. without `rest`
+    the last shard only includes its own classes too. `known` are further test classes (e.g. those
+    left out by `only`) a shard's filter must not match.
+    """
+    exclude = list(exclude)
+    known = [c for group in groups for c in group] + exclude + list(known)
+    if not rest:
+        return ["|".join(_class_match(c, known) for c in group) for group in groups]
+    filters: List[Optional[str]] = ["|".join(_class_match(c, known) for c in group) for group in groups[:-1]]
+    others = [c for group in groups[:-1] for c in group] + exclude
+    filters.append("&".join(_class_match(c, known, negate=True) for c in others) or None)
+    return filters
+
+def _class_match(test_class: str, known: Iterable[str] = (), negate: bool = False) -> str:
+    """
+    filter term for the tests of `test_class` (negated: for every other test). `~` is a contains
+    match: the trailing dot keeps `FooTests` from matching `FooTestsExtra`, but `FooTests.` still
+    matches `Ns.BarFooTests.M`, so the `known` classes it would also match are carved out again.
+    """
+    pattern = f"{test_class}."
+    clashes = [c for c in dict.fromkeys(known) if c != test_class and pattern in f"{c}."]
+    if negate:
+        terms = [f"FullyQualifiedName!~{pattern}"] + [f"FullyQualifiedName~{c}." for c in clashes]
+        return f"({'|'.join(terms)})" if clashes else terms[0]
+    terms = [f"FullyQualifiedName~{pattern}"] + [f"FullyQualifiedName!~{c}." for c in clashes]
+    return f"({'&'.join(terms)})" if clashes else terms[0]
+
+def parse_trx(path: str) -> List[TestOutcome]:
+    """
+    test outcomes from a Visual Studio TRX results file.
+    """
+    root = ET.parse(path).getroot()
+    class_of = {}
+    for unit in root.iterfind(".//t:TestDefinitions/t:UnitTest", _TRX_NS):
+        method = unit.find("t:TestMethod", _TRX_NS)
+        class_of[unit.get("id")] = method.get("className", "") if method is not None else ""
+    outcomes = []
+    for res in root.iterfind(".//t:Results/t:UnitTestResult", _TRX_NS):
+        test_class = class_of.get(res.get("testId"), "")
+        name = res.get("testName", "")
+        if test_class and not name.startswith(f"{test_class}."):
+            name = f"{test_class}.{name}"
+        message = res.find("t:Output/t:ErrorInfo/t:Message", _TRX_NS)
+        outcomes.append(TestOutcome(
+            name, test_class, res.get("outcome", ""), _parse_duration(res.get("duration")),
+            message.text.strip() if message is not None and message.text else None
+        ))
+    return outcomes
+
+def _parse_duration(value: Optional[str]) -> float:
+    # hh:mm:ss.fffffff
+    if not value:
+        return 0.0
+    try:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return 0.0
+
+def run_test_shards(
+    project_dir: str,
+    shards: int = 4,
+    durations: Optional[Dict[str, float]] = None,
+    quarantined: Iterable[str] = (),
+    configuration: str = "Release",
+    dry_run: bool = False,
+    only: Optional[Iterable[str]] = None,
+    restore: bool = True,
+) -> Optional[TestRunReport]:
+    """
+    build the test project once, then run its test classes as `shards` concurrent `dotnet test`
+    processes (balanced by `durations`, seconds per test class from earlier runs), each writing
+    a TRX file. with `only` (test class names, qualified or not) just those classes run. returns
+    the merged report, or None in dry-run mode.
+    """
+    if dry_run:
+        logger.info("[DRY RUN] Skipping build & test execution")
+        return None
+
+    with span("dotnet.build", project=project_dir) as s:
+        build = subprocess.run(
+            ["dotnet", "build", project_dir, "-c", configuration, "--nologo"] + ([] if restore else ["--no-restore"]),
+            capture_output=True, text=True
+        )
+        s.set(exit_code=build.returncode)
+    if build.returncode != 0:
+        logger.error(f"Build failed:\n{build.stdout}\n{build.stderr}")
+        return TestRunReport(False, build.stdout + build.stderr)
+
+    quarantined = list(quarantined)
+    discovered = discover_test_classes(project_dir)
+    classes = [c for c in discovered if c not in quarantined]
+    if only is not None:
+        wanted = {c.rsplit(".", 1)[-1] for c in only}
+        classes = [c for c in classes if c.rsplit(".", 1)[-1] in wanted]
+        if not classes:
+            logger.info("None of the requested test classes has tests to run")
+            return TestRunReport(True, build.stdout)
+    groups = plan_shards(classes, durations or {}, shards)
+    filters = shard_filters(groups, exclude=quarantined, rest=only is None, known=discovered)
+    results_dir = os.path.join(project_dir, "TestResults", time.strftime("run-%Y%m%d-%H%M%S"))
+    os.makedirs(results_dir, exist_ok=True)
+    logger.info(f"Running {len(classes)} test classes in {len(filters)} shards")
+
+    report = TestRunReport(True, build.stdout)
+    report.test_classes = classes
+    with ThreadPoolExecutor(max_workers=len(filters), thread_name_prefix="dotnet-test") as exe:
+        shard_results = list(exe.map(
+            lambda args: _run_shard(project_dir, configuration, results_dir, *args), enumerate(filters)
+        ))
+    for outcomes, wall, crashed in shard_results:
+        report.outcomes += outcomes
+        report.shard_wall_sec.append(wall)
+        report.crashed_shards += crashed
+    shutil.rmtree(results_dir, ignore_errors=True)
+
+    logger.info(
+        f"Tests: {report.count('Passed')} passed, {report.count('Failed')} failed, "
+        f"{len(report.outcomes) - report.count('Passed') - report.count('Failed')} other, "
+        f"shard wall times {', '.join(f'{w:.1f}s' for w in report.shard_wall_sec)}"
+    )
+    return report
+
+def _run_shard(
+    project_dir: str, configuration: str, results_dir: str, index: int, test_filter: Optional[str]
+) -> Tuple[List[TestOutcome], float, bool]:
+    trx_name = f"shard{index}.trx"
+    cmd = ["dotnet", "test", project_dir, "--no-build", "-c", configuration, "--nologo",
+           "--logger", f"trx;LogFileName={trx_name}", "--results-directory", results_dir]
+    if test_filter:
+        cmd += ["--filter", test_filter]
+    started = time.monotonic()
+    with span("dotnet.test", shard=index) as s:
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        s.set(exit_code=proc.returncode)
+    wall = time.monotonic() - started
+    trx = os.path.join(results_dir, trx_name)
+    try:
+        outcomes = parse_trx(trx) if os.path.isfile(trx) else []
+    except ET.ParseError as e:
+        logger.error(f"Could not read test results of shard {index}: {e}")
+        outcomes = []
+    # a non-zero exit without any failed test means the test host itself failed
+    crashed = proc.returncode != 0 and not any(o.outcome == "Failed" for o in outcomes)
+    if crashed:
+        logger.error(f"Test shard {index} exited with {proc.returncode}:\n{proc.stdout[-2000:]}\n{proc.stderr[-2000:]}")
+    return outcomes, wall, crashed
@@ -1,11 +1,19 @@
 # testgen/extractor.py
 import os
+import queue
 import subprocess
 import json
+import hashlib
 import logging
-from typing import List, Dict, Any, Tuple
+import threading
+from typing import Callable, List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
 
 from .repo import find_cs_files  # for possible future expansion
+from .cache import (
+    compute_file_hash, get_cached_extraction_by_stat, get_cached_extraction_by_hash, cache_extraction
+)
+from .stats import RunStats
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +21,17 @@ EXTRACTOR_DIR_NAME = "RoslynExtractor"
 EXTRACTOR_PROJECT_NAME = "CodeStructureExtractor"
 ROSLYN_CSHARP_VERSION = "4.9.2"
 
+class ExtractionError(Exception):
+    """
+    the extractor failed on a file (as opposed to the file having no testable classes).
+    """
+
+def extractor_version() -> str:
+    """
+    fingerprint of the extractor build; changes whenever the embedded C# source or the Roslyn version does.
+    """
+    return hashlib.sha256((_roslyn_extractor_cs() + ROSLYN_CSHARP_VERSION).encode("utf-8")).hexdigest()[:16]
+
 def ensure_extractor_tool(base_dir: str) -> Tuple[str, str]:
     """
     just a simple scaffolding to build a .NET 8 console tool that uses Roslyn to dump JSON
@@ -25,42 +44,49 @@ def ensure_extractor_tool(base_dir: str) -> Tuple[str, str]:
     csproj = os.path.join(proj_dir, f"{EXTRACTOR_PROJECT_NAME}.csproj")
     dll = os.path.join(proj_dir, "bin", "Release", "net8.0", f"{EXTRACTOR_PROJECT_NAME}.dll")
 
-    if not os.path.isfile(dll):
-        os.makedirs(proj_dir, exist_ok=True)
-        # 1 dotnet new console ...
-        subprocess.run([
-            "dotnet", "new", "console", 
-            "--force", "-n", EXTRACTOR_PROJECT_NAME,
-            "-f", "net8.0", "-o", proj_dir
-        ], check=True)
-        # 2 overwrite Program.cs
-        with open(os.path.join(proj_dir, "Program.cs"), "w", encoding="utf-8") as f:
-            f.write(_roslyn_extractor_cs())
-        # 3 add Roslyn
-        subprocess.run([
-            "dotnet","add", csproj, "package",
-            "Microsoft.CodeAnalysis.CSharp",
-            "--version", ROSLYN_CSHARP_VERSION
-        ], check=True)
+    program_cs = os.path.join(proj_dir, "Program.cs")
+    source = _roslyn_extractor_cs()
+
+    if not os.path.isfile(dll) or _read_text(program_cs) != source:
+        if not os.path.isfile(csproj):
+            os.makedirs(proj_dir, exist_ok=True)
+            # 1 dotnet new console ...
+            subprocess.run([
+                "dotnet", "new", "console", 
+                "--force", "-n", EXTRACTOR_PROJECT_NAME,
+                "-f", "net8.0", "-o", proj_dir
+            ], check=True)
+            # 3 add Roslyn
+            subprocess.run([
+                "dotnet","add", csproj, "package",
+                "Microsoft.CodeAnalysis.CSharp",
+                "--version", ROSLYN_CSHARP_VERSION
+            ], check=True)
+        # 2 overwrite Program.cs (also when the embedded extractor source changed)
+        with open(program_cs, "w", encoding="utf-8") as f:
+            f.write(source)
         # 4) build
-        subprocess.run(["dotnet","build", csproj, "-c","Release"], check=True)
+        with span("dotnet.build_extractor"):
+            subprocess.run(["dotnet","build", csproj, "-c","Release"], check=True)
 
     return dll, csproj
 
-def extract_classes_info_from_cs_file(cs_file: str, extractor_dll: str) -> List[Dict[str, Any]]:
+def extract_classes_info_from_cs_file(cs_file: str, extractor_dll: str, strict: bool = False) -> List[Dict[str, Any]]:
     """
     call the extractor DLL on a single .cs file, parse JSON output.
+    errors are logged and give [], or raise ExtractionError if `strict`.
     """
     if not os.path.isfile(cs_file):
         logger.warning(f"File not found: {cs_file}")
-        return []
-    proc = subprocess.run(
-        ["dotnet", extractor_dll, cs_file],
-        capture_output=True, text=True
-    )
+        return _failed(f"File not found: {cs_file}", strict)
+    with span("extractor.process", file=cs_file):
+        proc = subprocess.run(
+            ["dotnet", extractor_dll, cs_file],
+            capture_output=True, text=True
+        )
     if proc.returncode != 0:
         logger.error(f"Extractor error ({cs_file}): {proc.stderr.strip()}")
-        return []
+        return _failed(f"extractor exited with {proc.returncode} on {cs_file}", strict)
     out = proc.stdout.strip()
     if not out:
         return []
@@ -68,7 +94,321 @@ def extract_classes_info_from_cs_file(cs_file: str, extractor_dll: str) -> List[
         return json.loads(out)
     except json.JSONDecodeError as e:
         logger.error(f"JSON parse failed for {cs_file}: {e}")
-        return []
+        return _failed(f"JSON parse failed for {cs_file}: {e}", strict)
+
+def _failed(message: str, strict: bool) -> List[Dict[str, Any]]:
+    if strict:
+        raise ExtractionError(message)
+    return []
+
+class ExtractionCache:
+    """
+    skips the extractor for files it has already seen. entries are keyed by path with
+    (mtime, size) as a cheap first check, and by content hash + extractor version, so a file
+    that was re-cloned, touched or copied elsewhere is still a hit without running .NET.
+    a new extractor build (C# source or Roslyn version change) invalidates everything.
+    """
+
+    def __init__(self, conn, version: Optional[str] = None, stats: Optional[RunStats] = None):
+        self.conn = conn
+        self.version = version or extractor_version()
+        self.stats = stats
+
+    def lookup(self, cs_file: str, count: bool = True) -> Tuple[Optional[List[Dict[str, Any]]], Tuple[str, int, int, str]]:
+        """
+        returns (classes or None, fingerprint); pass the fingerprint to `store` after extracting.
+        """
+        counter = self._count if count else (lambda name: None)
+        path = os.path.abspath(cs_file)
+        st = os.stat(path)
+        row = get_cached_extraction_by_stat(self.conn, path, st.st_mtime_ns, st.st_size, self.version)
+        if row is not None:
+            counter("extraction.cache_hits_stat")
+            content_hash, classes_json = row
+            return json.loads(classes_json), (path, st.st_mtime_ns, st.st_size, content_hash)
+
+        content_hash = compute_file_hash(path)
+        fingerprint = (path, st.st_mtime_ns, st.st_size, content_hash)
+        classes_json = get_cached_extraction_by_hash(self.conn, content_hash, self.version)
+        if classes_json is None:
+            counter("extraction.cache_misses")
+            return None, fingerprint
+        counter("extraction.cache_hits_hash")
+        classes = _relocate(json.loads(classes_json), path)
+        cache_extraction(self.conn, path, st.st_mtime_ns, st.st_size, content_hash, self.version, json.dumps(classes))
+        return classes, fingerprint
+
+    def store(self, fingerprint: Tuple[str, int, int, str], classes: List[Dict[str, Any]]) -> None:
+        path, mtime_ns, size, content_hash = fingerprint
+        cache_extraction(self.conn, path, mtime_ns, size, content_hash, self.version, json.dumps(classes))
+
+    def wrap(self, extract: Callable[[str], List[Dict[str, Any]]]) -> Callable[[str], List[Dict[str, Any]]]:
+        """
+        cache-through version of an `extract(cs_file)` callable. `extract` should raise on
+        failure (e.g. `strict=True`) so that errors are never cached as "no classes".
+        """
+        def cached_extract(cs_file: str) -> List[Dict[str, Any]]:
+            classes, fingerprint = self.lookup(cs_file)
+            if classes is None:
+                classes = extract(cs_file)
+                self.store(fingerprint, classes)
+            return classes
+        return cached_extract
+
+    def _count(self, name: str) -> None:
+        if self.stats:
+            self.stats.incr(name)
+
+def _relocate(classes: List[Dict[str, Any]], path: str) -> List[Dict[str, Any]]:
+    # same content found under another path: only the path needs fixing up
+    for cls in classes:
+        cls["FilePath"] = path
+    return classes
+
+def extract_project(
+    extractor_dll: str,
+    project_path: Optional[str] = None,
+    cs_files: Optional[Iterable[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    run the extractor once over a whole .csproj/.sln/directory, or over an explicit list of
+    files (e.g. from `find_cs_files`). all syntax trees are parsed in parallel into one shared
+    compilation, so dependency types resolve across files. yields one response per file
+    (Path, Ok, Error, Classes) as they stream in; raises ExtractionError if the extractor fails.
+    """
+    if (project_path is None) == (cs_files is None):
+        raise ValueError("pass exactly one of project_path or cs_files")
+    cmd = ["dotnet", extractor_dll, "--project"]
+    if project_path is not None:
+        cmd.append(project_path)
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if cs_files is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, text=True, encoding="utf-8"
+    )
+    try:
+        if cs_files is not None:
+            # the extractor reads the whole list before it writes anything, so this cannot deadlock
+            proc.stdin.write("".join(os.path.abspath(f) + "\n" for f in cs_files))
+            proc.stdin.close()
+        for line in proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON parse failed for project extractor output: {e}")
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode != 0:
+        raise ExtractionError(f"Project extractor exited with code {proc.returncode}")
+
+def group_classes_by_file(responses: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    the classes of every file the project extractor got through, by absolute path. files it
+    failed on are logged and left out, so a lookup can tell them from files without classes.
+    """
+    by_file: Dict[str, List[Dict[str, Any]]] = {}
+    for resp in responses:
+        if resp.get("Ok"):
+            by_file[os.path.abspath(resp["Path"])] = resp.get("Classes") or []
+        else:
+            logger.error(f"Extractor error ({resp.get('Path')}): {resp.get('Error', '').strip()}")
+    return by_file
+
+class ExtractorPool:
+    """
+    keeps `size` long-lived extractor processes (`dotnet <dll> --server`) alive for a whole run.
+    each request is one file path line on stdin, answered by exactly one JSON line on stdout,
+    so the .NET startup, JIT and Roslyn loading are paid once per worker instead of once per file.
+    safe to share between threads; a worker that dies or hangs is killed and respawned.
+    """
+
+    def __init__(
+        self,
+        extractor_dll: str,
+        size: int = 2,
+        request_timeout_sec: int = 120,
+        command: Optional[Sequence[str]] = None,
+    ):
+        self._command = list(command) if command else ["dotnet", extractor_dll, "--server"]
+        self._timeout = request_timeout_sec
+        self._size = max(1, size)
+        self._idle: "queue.Queue[Optional[subprocess.Popen]]" = queue.Queue()
+        self._procs: List[subprocess.Popen] = []
+        self._spawned = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self) -> "ExtractorPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def extract(self, cs_file: str, strict: bool = False) -> List[Dict[str, Any]]:
+        """
+        same contract as `extract_classes_info_from_cs_file`, served by a warm worker.
+        """
+        if not os.path.isfile(cs_file):
+            logger.warning(f"File not found: {cs_file}")
+            return _failed(f"File not found: {cs_file}", strict)
+        resp = self.request(os.path.abspath(cs_file))
+        if resp is None:
+            return _failed(f"extractor worker failed on {cs_file}", strict)
+        if not resp.get("Ok"):
+            logger.error(f"Extractor error ({cs_file}): {resp.get('Error', '').strip()}")
+            return _failed(f"extractor error on {cs_file}", strict)
+        return resp.get("Classes") or []
+
+    def request(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        send one request line to an idle worker and return its decoded JSON reply,
+        or None if the worker died, timed out or answered garbage.
+        """
+        if self._closed:
+            raise RuntimeError("ExtractorPool is closed")
+        with span("extractor.request", request=line[:200]) as s:
+            try:
+                out, failed = self._roundtrip(line)
+            except ExtractionError as e:
+                logger.error(str(e))
+                out, failed = "", True
+            s.set(reply_bytes=len(out), failed=failed)
+        return None if failed else _decode(out)
+
+    def broadcast(self, line: str) -> List[Optional[Dict[str, Any]]]:
+        """
+        send one request line to every started worker, waiting for the busy ones, and return their
+        decoded replies (None for a worker that failed; it is restarted). workers started later do
+        not get it, so it may only change what a fresh worker would load anyway.
+        """
+        if self._closed:
+            raise RuntimeError("ExtractorPool is closed")
+        with self._lock:
+            started = self._spawned
+        slots = [self._idle.get() for _ in range(started)]
+        replies = []
+        with span("extractor.broadcast", request=line[:200], workers=started):
+            for proc in slots:
+                if proc is None:
+                    self._idle.put(None)
+                    continue
+                try:
+                    out, failed = self._exchange(proc, line)
+                except ExtractionError as e:
+                    logger.error(str(e))
+                    out, failed = "", True
+                replies.append(None if failed else _decode(out))
+        return replies
+
+    def _roundtrip(self, line: str) -> Tuple[str, bool]:
+        return self._exchange(self._acquire(), line)
+
+    def _exchange(self, proc: subprocess.Popen, line: str) -> Tuple[str, bool]:
+        # one request on a worker held by the caller, which goes back to the pool (restarted if it failed)
+        out = ""
+        try:
+            proc.stdin.write(line + "\n")
+            proc.stdin.flush()
+            # a hung Roslyn call is killed so readline() returns EOF instead of blocking forever
+            timer = threading.Timer(self._timeout, proc.kill)
+            timer.start()
+            try:
+                out = proc.stdout.readline()
+            finally:
+                timer.cancel()
+        except (BrokenPipeError, OSError) as e:
+            logger.error(f"Extractor worker pipe error: {e}")
+
+        if not out:
+            logger.error(f"Extractor worker exited or timed out on {line[:200]!r}; restarting it")
+            try:
+                self._idle.put(self._respawn(proc))
+            except ExtractionError as e:
+                logger.error(str(e))
+            return "", True
+        self._idle.put(proc)
+        return out, False
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            procs, self._procs = self._procs, []
+        for proc in procs:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+    def _acquire(self) -> subprocess.Popen:
+        # workers are started on demand, so a run served entirely from cache never starts .NET
+        try:
+            proc = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._spawned < self._size
+                if grow:
+                    self._spawned += 1
+            if grow:
+                logger.info(f"Starting extractor server worker {self._spawned}/{self._size}")
+                return self._start()
+            proc = self._idle.get()
+        # None holds the slot of a worker that could not be started; try again in it
+        return proc if proc is not None else self._start()
+
+    def _start(self) -> subprocess.Popen:
+        # a slot whose worker cannot be started goes back to the pool empty, so no waiter blocks on it forever
+        try:
+            return self._spawn()
+        except OSError as e:
+            self._idle.put(None)
+            raise ExtractionError(f"Could not start an extractor worker: {e}") from e
+
+    def _spawn(self) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            self._command,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding="utf-8", bufsize=1
+        )
+        with self._lock:
+            self._procs.append(proc)
+        return proc
+
+    def _respawn(self, proc: subprocess.Popen) -> subprocess.Popen:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        for stream in (proc.stdin, proc.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        with self._lock:
+            if proc in self._procs:
+                self._procs.remove(proc)
+        return self._start()
+
+def _decode(out: str) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(out)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parse failed for extractor reply: {e}")
+        return None
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
 
 def _roslyn_extractor_cs() -> str:
     # simple c# AST extractor based on Rolsyln. found that Roslyn provides better 
@@ -82,6 +422,7 @@ using System.IO;
 using System.Text.Json;
 using System.Collections.Generic;
 using System.Linq;
+using System.Threading.Tasks;
 using Microsoft.CodeAnalysis;
 using Microsoft.CodeAnalysis.CSharp;
 using Microsoft.CodeAnalysis.CSharp.Syntax;
@@ -98,6 +439,16 @@ public class ClassInfo
     public bool IsStatic { get; set; } = false;
     public bool IsAbstract { get; set; } = false;
     public List<ConstructorInfo> Constructors { get; set; } = new List<ConstructorInfo>();
+    public List<string> Dependencies { get; set; } = new List<string>(); // Resolved types of constructor parameters and fields
+    public string ClassSourceCode { get; set; } = ""; // Just this type's declaration (with its doc comments)
+    public List<TypeSignature> ReferencedTypes { get; set; } = new List<TypeSignature>(); // Source types used in its signatures
+}
+
+public class TypeSignature
+{
+    public string Name { get; set; } = ""; // Fully qualified
+    public string Kind { get; set; } = ""; // class, interface, struct, enum, record
+    public string Signature { get; set; } = ""; // Declaration with public member signatures, no bodies
 }
 
 public class MethodInfo
@@ -109,6 +460,7 @@ public class MethodInfo
     public bool IsStatic { get; set; } = false;
     public bool IsAbstract { get; set; } = false;
     public bool IsAsync { get; set; } = false;
+    public string SourceCode { get; set; } = ""; // The method's declaration and body
 }
 
 public class ConstructorInfo
@@ -117,10 +469,75 @@ public class ConstructorInfo
     public List<string> Parameters { get; set; } = new List<string>();
 }
 
+public class ServerResponse
+{
+    public string Path { get; set; } = "";
+    public bool Ok { get; set; } = false;
+    public string Error { get; set; } = "";
+    public List<ClassInfo> Classes { get; set; } = new List<ClassInfo>();
+}
+
+public class CheckManifest
+{
+    public List<string> SourceFiles { get; set; } = new List<string>(); // Sources under test plus the test project's global usings
+    public List<string> References { get; set; } = new List<string>(); // Test framework assemblies (NUnit, Moq, ...)
+}
+
+public class CheckRequest
+{
+    public string Name { get; set; } = ""; // Label of the checked code, e.g. the test class name
+    public string Code { get; set; } = "";
+    public List<string>? Update { get; set; } = null; // Source files to re-read (edited, new or deleted) instead of checking code
+}
+
+public class CheckDiagnostic
+{
+    public string Id { get; set; } = ""; // e.g. CS0103
+    public int Line { get; set; } = 0;
+    public int Column { get; set; } = 0;
+    public string Message { get; set; } = "";
+}
+
+public class CheckResponse
+{
+    public string Name { get; set; } = "";
+    public bool Ok { get; set; } = false;
+    public string Error { get; set; } = "";
+    public List<CheckDiagnostic> Diagnostics { get; set; } = new List<CheckDiagnostic>(); // Errors in the checked code only
+    public int SourceErrors { get; set; } = 0; // Declaration errors in the sources themselves (e.g. unresolved package types)
+    public long ElapsedMs { get; set; } = 0;
+}
+
 public class Extractor
 {
+    static readonly JsonSerializerOptions JsonOptions = new JsonSerializerOptions { WriteIndented = false, Encoder = System.Text.Encodings.Web.JavaScriptEncoder.UnsafeRelaxedJsonEscaping };
+
     public static void Main(string[] args)
     {
+        if (args.Length > 0 && args[0] == "--server")
+        {
+            RunServer();
+            return;
+        }
+        if (args.Length > 1 && args[0] == "--check-server")
+        {
+            RunCheckServer(args[1]);
+            return;
+        }
+        if (args.Length > 0 && args[0] == "--project")
+        {
+            try
+            {
+                RunProject(args.Length > 1 ? args[1] : null);
+            }
+            catch (Exception ex)
+            {
+                Console.Error.WriteLine($"Error processing project: {ex.ToString()}");
+                Environment.ExitCode = 2;
+            }
+            return;
+        }
+
         var filePath = args.Length > 0 ? args[0] : Console.In.ReadToEnd().Trim();
         if (string.IsNullOrEmpty(filePath) || !File.Exists(filePath))
         {
@@ -129,117 +546,499 @@ public class Extractor
             return;
         }
 
-        var results = new List<ClassInfo>();
         try
         {
-            string code = File.ReadAllText(filePath);
-            SyntaxTree tree = CSharpSyntaxTree.ParseText(code, CSharpParseOptions.Default.WithLanguageVersion(LanguageVersion.Latest));
-            CompilationUnitSyntax root = tree.GetCompilationUnitRoot();
-
-            // Attempt to create a compilation for semantic analysis (helps resolve types more accurately)
-            // This is a minimal compilation, might need more references for complex projects
-            var compilation = CSharpCompilation.Create("ExtractorAssembly")
-                .AddReferences(MetadataReference.CreateFromFile(typeof(object).Assembly.Location)) 
-                .AddSyntaxTrees(tree);
-            SemanticModel semanticModel = compilation.GetSemanticModel(tree);
+            Console.WriteLine(JsonSerializer.Serialize(ExtractFile(filePath), JsonOptions));
+        }
+        catch (Exception ex)
+        {
+            Console.Error.WriteLine($"Error processing file {filePath}: {ex.ToString()}");
+            Environment.ExitCode = 2; // Indicate processing error
+        }
+    }
 
-            var usingDirectivesInFile = root.Usings.Select(u => u.ToString().Trim()).ToList();
+    // Long-lived mode: read one file path per stdin line and answer with exactly one
+    // JSON line per request, so the runtime, JIT and Roslyn load are paid once per worker.
+    static void RunServer()
+    {
+        string? line;
+        while ((line = Console.In.ReadLine()) != null)
+        {
+            var filePath = line.Trim();
+            if (filePath.Length == 0) continue;
 
-            foreach (var typeDeclaration in root.DescendantNodes().OfType<TypeDeclarationSyntax>())
+            var response = new ServerResponse { Path = filePath };
+            try
             {
-                // We are interested in classes, structs, and interfaces for potential test generation context
-                // but primarily focus on generating tests for non-abstract classes.
-                if (!(typeDeclaration is ClassDeclarationSyntax || 
-                      typeDeclaration is StructDeclarationSyntax /*|| 
-                      typeDeclaration is InterfaceDeclarationSyntax*/)) // For now, only classes/structs
+                if (!File.Exists(filePath))
                 {
-                    continue;
+                    response.Error = $"File not found: '{filePath}'";
                 }
+                else
+                {
+                    response.Classes = ExtractFile(filePath);
+                    response.Ok = true;
+                }
+            }
+            catch (Exception ex)
+            {
+                response.Error = ex.ToString();
+            }
+            Console.Out.WriteLine(JsonSerializer.Serialize(response, JsonOptions));
+            Console.Out.Flush();
+        }
+    }
 
-                var declaredSymbol = semanticModel.GetDeclaredSymbol(typeDeclaration);
-                if (declaredSymbol == null) continue;
-
-                string namespaceName = declaredSymbol.ContainingNamespace?.ToDisplayString() ?? "Global";
-                if (declaredSymbol.ContainingNamespace != null && declaredSymbol.ContainingNamespace.IsGlobalNamespace)
+    // Compile-check mode: the sources and test framework references named in the manifest are loaded
+    // into one compilation at startup; every stdin line is then a CheckRequest whose code is compiled
+    // in memory next to them, answered with the errors located in that code, one JSON line each.
+    // A request with Update swaps just the listed files' trees, so edits do not need a restart.
+    static void RunCheckServer(string manifestPath)
+    {
+        var manifest = JsonSerializer.Deserialize<CheckManifest>(File.ReadAllText(manifestPath)) ?? new CheckManifest();
+        var parseOptions = CSharpParseOptions.Default.WithLanguageVersion(LanguageVersion.Latest);
+        var trees = manifest.SourceFiles
+            .Distinct()
+            .AsParallel()
+            .Select(f =>
+            {
+                try
                 {
-                     namespaceName = "Global"; // Explicitly "Global" for clarity
+                    var fullPath = Path.GetFullPath(f);
+                    return CSharpSyntaxTree.ParseText(File.ReadAllText(fullPath), parseOptions, path: fullPath);
                 }
+                catch (Exception ex)
+                {
+                    Console.Error.WriteLine($"Error reading file {f}: {ex.Message}");
+                    return null;
+                }
+            })
+            .Where(t => t != null)
+            .Select(t => t!)
+            .ToList();
+        // a shared framework's reference assemblies also name the runtime's own ones: keep one of each
+        var platformNames = new HashSet<string>(
+            PlatformReferences.Value.Select(r => Path.GetFileName(r.Display ?? "")), StringComparer.OrdinalIgnoreCase);
+        var references = PlatformReferences.Value
+            .Concat(manifest.References
+                .Where(p => File.Exists(p) && !platformNames.Contains(Path.GetFileName(p)))
+                .Select(p => (MetadataReference)MetadataReference.CreateFromFile(p)))
+            .ToList();
+        var compilation = CSharpCompilation.Create(
+            "CompileCheck",
+            trees,
+            references,
+            new CSharpCompilationOptions(OutputKind.DynamicallyLinkedLibrary, nullableContextOptions: NullableContextOptions.Enable));
+        // declaration errors only: cheap, and enough to tell that package types of the sources are missing
+        int sourceErrors = compilation.GetDeclarationDiagnostics().Count(d => d.Severity == DiagnosticSeverity.Error);
 
+        string? line;
+        while ((line = Console.In.ReadLine()) != null)
+        {
+            if (line.Trim().Length == 0) continue;
 
-                var classInfo = new ClassInfo
-                {
-                    FilePath = Path.GetFullPath(filePath),
-                    ClassName = typeDeclaration.Identifier.Text,
-                    NamespaceName = namespaceName,
-                    FullSourceCode = code,
-                    UsingDirectivesInFile = new List<string>(usingDirectivesInFile),
-                    IsStatic = declaredSymbol.IsStatic,
-                    IsAbstract = declaredSymbol.IsAbstract
-                };
-
-                // Get Constructors
-                foreach (var ctorNode in typeDeclaration.Members.OfType<ConstructorDeclarationSyntax>())
+            var watch = System.Diagnostics.Stopwatch.StartNew();
+            var response = new CheckResponse { SourceErrors = sourceErrors };
+            try
+            {
+                var request = JsonSerializer.Deserialize<CheckRequest>(line) ?? new CheckRequest();
+                response.Name = request.Name;
+                if (request.Update != null)
                 {
-                    if (ctorNode.Modifiers.Any(m => m.IsKind(SyntaxKind.PublicKeyword))) // Consider public constructors
+                    var byPath = compilation.SyntaxTrees.GroupBy(t => t.FilePath).ToDictionary(g => g.Key, g => g.First());
+                    foreach (var fullPath in request.Update.Select(Path.GetFullPath).Distinct())
                     {
-                        var ctorParams = ctorNode.ParameterList.Parameters
-                            .Select(p => $"{p.Type?.ToString() ?? "unknown"} {p.Identifier.ValueText}")
-                            .ToList();
-                        classInfo.Constructors.Add(new ConstructorInfo
+                        byPath.TryGetValue(fullPath, out var old);
+                        if (File.Exists(fullPath))
                         {
-                            Parameters = ctorParams,
-                            Signature = $"public {classInfo.ClassName}({string.Join(", ", ctorParams)})"
-                        });
+                            var updated = CSharpSyntaxTree.ParseText(File.ReadAllText(fullPath), parseOptions, path: fullPath);
+                            compilation = old != null ? compilation.ReplaceSyntaxTree(old, updated) : compilation.AddSyntaxTrees(updated);
+                        }
+                        else if (old != null)
+                        {
+                            compilation = compilation.RemoveSyntaxTrees(old);
+                        }
                     }
+                    sourceErrors = compilation.GetDeclarationDiagnostics().Count(d => d.Severity == DiagnosticSeverity.Error);
+                    response.SourceErrors = sourceErrors;
+                }
+                else
+                {
+                    var tree = CSharpSyntaxTree.ParseText(request.Code, parseOptions, path: request.Name + ".cs");
+                    response.Diagnostics = compilation.AddSyntaxTrees(tree)
+                        .GetSemanticModel(tree)
+                        .GetDiagnostics()
+                        .Where(d => d.Severity == DiagnosticSeverity.Error)
+                        .Select(d =>
+                        {
+                            var position = d.Location.GetLineSpan().StartLinePosition;
+                            return new CheckDiagnostic
+                            {
+                                Id = d.Id,
+                                Line = position.Line + 1,
+                                Column = position.Character + 1,
+                                Message = d.GetMessage()
+                            };
+                        })
+                        .ToList();
+                }
+                response.Ok = true;
+            }
+            catch (Exception ex)
+            {
+                response.Error = ex.ToString();
+            }
+            response.ElapsedMs = watch.ElapsedMilliseconds;
+            Console.Out.WriteLine(JsonSerializer.Serialize(response, JsonOptions));
+            Console.Out.Flush();
+        }
+    }
+
+    // Whole-project mode: every file is read and parsed exactly once (in parallel), all trees share
+    // one compilation so types from sibling files resolve, and one ServerResponse per input file is
+    // streamed back as a JSON line as soon as its tree has been analysed; a file that could not be
+    // read or analysed gets Ok = false, so it is never mistaken for a file without classes.
+    static void RunProject(string? projectPath)
+    {
+        List<string> files = projectPath != null ? CollectProjectFiles(projectPath) : ReadFileList(Console.In);
+        var parseOptions = CSharpParseOptions.Default.WithLanguageVersion(LanguageVersion.Latest);
+
+        var parsed = files
+            .Select(Path.GetFullPath)
+            .Distinct()
+            .AsParallel()
+            .AsOrdered()
+            .Select(fullPath =>
+            {
+                var response = new ServerResponse { Path = fullPath };
+                try
+                {
+                    return (response, CSharpSyntaxTree.ParseText(File.ReadAllText(fullPath), parseOptions, path: fullPath));
                 }
+                catch (Exception ex)
+                {
+                    response.Error = $"Error reading file {fullPath}: {ex.Message}";
+                    return (response, (SyntaxTree?)null);
+                }
+            })
+            .ToList();
 
+        var compilation = CSharpCompilation.Create(
+            "ExtractorProject",
+            parsed.Where(p => p.Item2 != null).Select(p => p.Item2!),
+            PlatformReferences.Value,
+            new CSharpCompilationOptions(OutputKind.DynamicallyLinkedLibrary));
 
-                // Get Public Methods
-                foreach (var methodNode in typeDeclaration.Members.OfType<MethodDeclarationSyntax>())
+        var writeLock = new object();
+        Parallel.ForEach(parsed, entry =>
+        {
+            var (response, tree) = entry;
+            if (tree != null)
+            {
+                try
                 {
-                    if (methodNode.Modifiers.Any(m => m.IsKind(SyntaxKind.PublicKeyword)))
+                    response.Classes = ExtractClasses(tree, compilation.GetSemanticModel(tree), tree.FilePath);
+                    response.Ok = true;
+                }
+                catch (Exception ex)
+                {
+                    response.Error = $"Error processing file {tree.FilePath}: {ex.ToString()}";
+                }
+            }
+            var json = JsonSerializer.Serialize(response, JsonOptions);
+            lock (writeLock)
+            {
+                Console.Out.WriteLine(json);
+            }
+        });
+        Console.Out.Flush();
+    }
+
+    // Framework assemblies of the running runtime, so BCL types resolve in the shared compilation.
+    static readonly Lazy<List<MetadataReference>> PlatformReferences = new Lazy<List<MetadataReference>>(() =>
+        ((AppContext.GetData("TRUSTED_PLATFORM_ASSEMBLIES") as string) ?? typeof(object).Assembly.Location)
+            .Split(Path.PathSeparator)
+            .Where(p => p.Length > 0 && !Path.GetFileName(p).StartsWith("Microsoft.CodeAnalysis"))
+            .Select(p => (MetadataReference)MetadataReference.CreateFromFile(p))
+            .ToList());
+
+    static List<string> ReadFileList(TextReader reader)
+    {
+        var files = new List<string>();
+        string? line;
+        while ((line = reader.ReadLine()) != null)
+        {
+            line = line.Trim();
+            if (line.Length > 0) files.Add(line);
+        }
+        return files;
+    }
+
+    // Accepts a .sln, a .csproj or a plain directory and returns the .cs files it compiles
+    // (SDK-style default globbing: everything under the project folder except bin/obj).
+    static List<string> CollectProjectFiles(string path)
+    {
+        if (Directory.Exists(path)) return CollectSourceFiles(path, skipNestedProjects: false);
+
+        if (path.EndsWith(".sln", StringComparison.OrdinalIgnoreCase))
+        {
+            var slnDir = Path.GetDirectoryName(Path.GetFullPath(path)) ?? ".";
+            var projects = File.ReadLines(path)
+                .Where(l => l.StartsWith("Project("))
+                .Select(l => l.Split(',').ElementAtOrDefault(1)?.Trim().Trim('"'))
+                .Where(p => p != null && p.EndsWith(".csproj", StringComparison.OrdinalIgnoreCase))
+                .Select(p => Path.GetFullPath(Path.Combine(slnDir, p!.Replace('\\\\', Path.DirectorySeparatorChar))));
+            return projects.SelectMany(CollectProjectFiles).Distinct().ToList();
+        }
+
+        if (path.EndsWith(".csproj", StringComparison.OrdinalIgnoreCase))
+        {
+            return CollectSourceFiles(Path.GetDirectoryName(Path.GetFullPath(path)) ?? ".", skipNestedProjects: true);
+        }
+
+        throw new ArgumentException($"Not a .sln, .csproj or directory: '{path}'");
+    }
+
+    static List<string> CollectSourceFiles(string projectDir, bool skipNestedProjects)
+    {
+        var files = new List<string>();
+        var pending = new Stack<string>();
+        pending.Push(projectDir);
+        while (pending.Count > 0)
+        {
+            var dir = pending.Pop();
+            files.AddRange(Directory.EnumerateFiles(dir, "*.cs"));
+            foreach (var sub in Directory.EnumerateDirectories(dir))
+            {
+                var name = Path.GetFileName(sub);
+                if (name == "bin" || name == "obj" || name.StartsWith(".")) continue;
+                // a nested project owns its own sources
+                if (skipNestedProjects && Directory.EnumerateFiles(sub, "*.csproj").Any()) continue;
+                pending.Push(sub);
+            }
+        }
+        return files;
+    }
+
+    static List<ClassInfo> ExtractFile(string filePath)
+    {
+        string code = File.ReadAllText(filePath);
+        SyntaxTree tree = CSharpSyntaxTree.ParseText(code, CSharpParseOptions.Default.WithLanguageVersion(LanguageVersion.Latest));
+
+        // Attempt to create a compilation for semantic analysis (helps resolve types more accurately)
+        // This is a minimal compilation, might need more references for complex projects
+        var compilation = CSharpCompilation.Create("ExtractorAssembly")
+            .AddReferences(MetadataReference.CreateFromFile(typeof(object).Assembly.Location)) 
+            .AddSyntaxTrees(tree);
+        SemanticModel semanticModel = compilation.GetSemanticModel(tree);
+        return ExtractClasses(tree, semanticModel, filePath);
+    }
+
+    static List<ClassInfo> ExtractClasses(SyntaxTree tree, SemanticModel semanticModel, string filePath)
+    {
+        var results = new List<ClassInfo>();
+        string code = tree.GetText().ToString();
+        CompilationUnitSyntax root = tree.GetCompilationUnitRoot();
+
+        var usingDirectivesInFile = root.Usings.Select(u => u.ToString().Trim()).ToList();
+
+        foreach (var typeDeclaration in root.DescendantNodes().OfType<TypeDeclarationSyntax>())
+        {
+            // We are interested in classes, structs, and interfaces for potential test generation context
+            // but primarily focus on generating tests for non-abstract classes.
+            if (!(typeDeclaration is ClassDeclarationSyntax || 
+                  typeDeclaration is StructDeclarationSyntax /*|| 
+                  typeDeclaration is InterfaceDeclarationSyntax*/)) // For now, only classes/structs
+            {
+                continue;
+            }
+
+            var declaredSymbol = semanticModel.GetDeclaredSymbol(typeDeclaration);
+            if (declaredSymbol == null) continue;
+
+            string namespaceName = declaredSymbol.ContainingNamespace?.ToDisplayString() ?? "Global";
+            if (declaredSymbol.ContainingNamespace != null && declaredSymbol.ContainingNamespace.IsGlobalNamespace)
+            {
+                 namespaceName = "Global"; // Explicitly "Global" for clarity
+            }
+
+
+            var classInfo = new ClassInfo
+            {
+                FilePath = Path.GetFullPath(filePath),
+                ClassName = typeDeclaration.Identifier.Text,
+                NamespaceName = namespaceName,
+                FullSourceCode = code,
+                ClassSourceCode = typeDeclaration.ToFullString().Trim(),
+                UsingDirectivesInFile = new List<string>(usingDirectivesInFile),
+                IsStatic = declaredSymbol.IsStatic,
+                IsAbstract = declaredSymbol.IsAbstract,
+                Dependencies = CollectDependencies(declaredSymbol),
+                ReferencedTypes = CollectReferencedTypes(declaredSymbol)
+            };
+
+            // Get Constructors
+            foreach (var ctorNode in typeDeclaration.Members.OfType<ConstructorDeclarationSyntax>())
+            {
+                if (ctorNode.Modifiers.Any(m => m.IsKind(SyntaxKind.PublicKeyword))) // Consider public constructors
+                {
+                    var ctorParams = ctorNode.ParameterList.Parameters
+                        .Select(p => $"{p.Type?.ToString() ?? "unknown"} {p.Identifier.ValueText}")
+                        .ToList();
+                    classInfo.Constructors.Add(new ConstructorInfo
                     {
-                        var methodSymbol = semanticModel.GetDeclaredSymbol(methodNode);
-                        if (methodSymbol == null) continue;
-
-                        var parameters = methodNode.ParameterList.Parameters
-                            .Select(p => $"{p.Type?.ToString() ?? "unknown_type"} {p.Identifier.ValueText}")
-                            .ToList();
-                        
-                        string returnType = methodSymbol.ReturnType.ToDisplayString(SymbolDisplayFormat.FullyQualifiedFormat);
-                        string methodName = methodNode.Identifier.ValueText;
-                        
-                        var modifiers = string.Join(" ", methodNode.Modifiers.Select(m => m.Text));
-                        if (!string.IsNullOrWhiteSpace(modifiers)) modifiers += " ";
-
-                        classInfo.PublicMethods.Add(new MethodInfo
-                        {
-                            Name = methodName,
-                            ReturnType = returnType,
-                            Parameters = parameters,
-                            Signature = $"{modifiers}{returnType} {methodName}({string.Join(", ", parameters)})",
-                            IsStatic = methodSymbol.IsStatic,
-                            IsAbstract = methodSymbol.IsAbstract,
-                            IsAsync = methodSymbol.IsAsync
-                        });
-                    }
+                        Parameters = ctorParams,
+                        Signature = $"public {classInfo.ClassName}({string.Join(", ", ctorParams)})"
+                    });
                 }
-                
-                // Add class if it's not abstract (abstract classes cannot be instantiated directly for testing)
-                // Or if it's static (static classes are tested via their static members)
-                if (!classInfo.IsAbstract || classInfo.IsStatic) 
+            }
+
+
+            // Get Public Methods
+            foreach (var methodNode in typeDeclaration.Members.OfType<MethodDeclarationSyntax>())
+            {
+                if (methodNode.Modifiers.Any(m => m.IsKind(SyntaxKind.PublicKeyword)))
                 {
-                    results.Add(classInfo);
+                    var methodSymbol = semanticModel.GetDeclaredSymbol(methodNode);
+                    if (methodSymbol == null) continue;
+
+                    var parameters = methodNode.ParameterList.Parameters
+                        .Select(p => $"{p.Type?.ToString() ?? "unknown_type"} {p.Identifier.ValueText}")
+                        .ToList();
+                    
+                    string returnType = methodSymbol.ReturnType.ToDisplayString(SymbolDisplayFormat.FullyQualifiedFormat);
+                    string methodName = methodNode.Identifier.ValueText;
+                    
+                    var modifiers = string.Join(" ", methodNode.Modifiers.Select(m => m.Text));
+                    if (!string.IsNullOrWhiteSpace(modifiers)) modifiers += " ";
+
+                    classInfo.PublicMethods.Add(new MethodInfo
+                    {
+                        Name = methodName,
+                        ReturnType = returnType,
+                        Parameters = parameters,
+                        Signature = $"{modifiers}{returnType} {methodName}({string.Join(", ", parameters)})",
+                        IsStatic = methodSymbol.IsStatic,
+                        IsAbstract = methodSymbol.IsAbstract,
+                        IsAsync = methodSymbol.IsAsync,
+                        SourceCode = methodNode.ToFullString().Trim()
+                    });
                 }
             }
-            var jsonOptions = new JsonSerializerOptions { WriteIndented = false, Encoder = System.Text.Encodings.Web.JavaScriptEncoder.UnsafeRelaxedJsonEscaping };
-            Console.WriteLine(JsonSerializer.Serialize(results, jsonOptions));
+            
+            // Add class if it's not abstract (abstract classes cannot be instantiated directly for testing)
+            // Or if it's static (static classes are tested via their static members)
+            if (!classInfo.IsAbstract || classInfo.IsStatic) 
+            {
+                results.Add(classInfo);
+            }
         }
-        catch (Exception ex)
+        return results;
+    }
+
+    // Types the class needs to be constructed: public constructor parameters and instance fields.
+    static List<string> CollectDependencies(INamedTypeSymbol symbol)
+    {
+        var types = symbol.InstanceConstructors
+            .Where(c => c.DeclaredAccessibility == Accessibility.Public)
+            .SelectMany(c => c.Parameters.Select(p => p.Type))
+            .Concat(symbol.GetMembers().OfType<IFieldSymbol>()
+                .Where(f => !f.IsStatic && !f.IsImplicitlyDeclared)
+                .Select(f => f.Type));
+        return types
+            .Select(t => t.ToDisplayString(SymbolDisplayFormat.FullyQualifiedFormat))
+            .Distinct()
+            .ToList();
+    }
+
+    static readonly SymbolDisplayFormat MemberFormat = SymbolDisplayFormat.MinimallyQualifiedFormat
+        .WithMemberOptions(SymbolDisplayMemberOptions.IncludeAccessibility | SymbolDisplayMemberOptions.IncludeModifiers |
+                           SymbolDisplayMemberOptions.IncludeType | SymbolDisplayMemberOptions.IncludeParameters |
+                           SymbolDisplayMemberOptions.IncludeRef)
+        .WithParameterOptions(SymbolDisplayParameterOptions.IncludeType | SymbolDisplayParameterOptions.IncludeName |
+                              SymbolDisplayParameterOptions.IncludeParamsRefOut | SymbolDisplayParameterOptions.IncludeDefaultValue);
+
+    // Types declared in the analysed sources that the class uses in its base list or member signatures,
+    // constructor/field dependencies first. Framework types are left out: the model already knows them.
+    static List<TypeSignature> CollectReferencedTypes(INamedTypeSymbol symbol)
+    {
+        var seen = new HashSet<INamedTypeSymbol>(SymbolEqualityComparer.Default);
+        var result = new List<TypeSignature>();
+        void Visit(ITypeSymbol? type)
         {
-            Console.Error.WriteLine($"Error processing file {filePath}: {ex.ToString()}");
-            Environment.ExitCode = 2; // Indicate processing error
+            if (type is IArrayTypeSymbol array) { Visit(array.ElementType); return; }
+            if (type is not INamedTypeSymbol named) return;
+            foreach (var arg in named.TypeArguments) Visit(arg);
+            var definition = named.OriginalDefinition;
+            if (SymbolEqualityComparer.Default.Equals(definition, symbol)) return;
+            if (!definition.Locations.Any(l => l.IsInSource)) return;
+            if (seen.Add(definition)) result.Add(DescribeType(definition));
         }
+        foreach (var ctor in symbol.InstanceConstructors.Where(c => c.DeclaredAccessibility == Accessibility.Public))
+            foreach (var p in ctor.Parameters) Visit(p.Type);
+        foreach (var field in symbol.GetMembers().OfType<IFieldSymbol>().Where(f => !f.IsImplicitlyDeclared)) Visit(field.Type);
+        Visit(symbol.BaseType);
+        foreach (var iface in symbol.Interfaces) Visit(iface);
+        foreach (var member in symbol.GetMembers().Where(m => !m.IsImplicitlyDeclared))
+        {
+            if (member is IMethodSymbol method)
+            {
+                Visit(method.ReturnType);
+                foreach (var p in method.Parameters) Visit(p.Type);
+            }
+            else if (member is IPropertySymbol property)
+            {
+                Visit(property.Type);
+            }
+        }
+        return result;
+    }
+
+    static TypeSignature DescribeType(INamedTypeSymbol type)
+    {
+        string kind = type.TypeKind switch
+        {
+            TypeKind.Interface => "interface",
+            TypeKind.Enum => "enum",
+            TypeKind.Struct => type.IsRecord ? "record struct" : "struct",
+            _ => type.IsRecord ? "record" : "class"
+        };
+        var sb = new System.Text.StringBuilder();
+        if (type.IsStatic) sb.Append("static ");
+        else if (type.IsAbstract && type.TypeKind == TypeKind.Class) sb.Append("abstract ");
+        sb.Append(kind).Append(' ').Append(type.ToDisplayString(SymbolDisplayFormat.MinimallyQualifiedFormat));
+        var bases = type.Interfaces.Select(i => i.ToDisplayString(SymbolDisplayFormat.MinimallyQualifiedFormat)).ToList();
+        if (type.TypeKind == TypeKind.Class && type.BaseType != null && type.BaseType.SpecialType != SpecialType.System_Object)
+            bases.Insert(0, type.BaseType.ToDisplayString(SymbolDisplayFormat.MinimallyQualifiedFormat));
+        if (bases.Count > 0) sb.Append(" : ").Append(string.Join(", ", bases));
+        sb.Append(" {");
+        if (type.TypeKind == TypeKind.Enum)
+        {
+            sb.Append(' ').Append(string.Join(", ", type.GetMembers().OfType<IFieldSymbol>().Select(f => f.Name))).Append(" }");
+        }
+        else
+        {
+            foreach (var member in type.GetMembers())
+            {
+                if (member.IsImplicitlyDeclared) continue;
+                if (type.TypeKind != TypeKind.Interface && member.DeclaredAccessibility != Accessibility.Public) continue;
+                if (member is IMethodSymbol m && m.MethodKind != MethodKind.Ordinary && m.MethodKind != MethodKind.Constructor) continue;
+                if (member is not (IMethodSymbol or IPropertySymbol or IFieldSymbol or IEventSymbol)) continue;
+                sb.Append("\\n    ").Append(member.ToDisplayString(MemberFormat));
+                if (member is IPropertySymbol prop)
+                    sb.Append(prop.SetMethod == null || prop.SetMethod.DeclaredAccessibility != Accessibility.Public ? " { get; }"
+                              : prop.SetMethod.IsInitOnly ? " { get; init; }" : " { get; set; }");
+                else
+                    sb.Append(';');
+            }
+            sb.Append("\\n}");
+        }
+        return new TypeSignature
+        {
+            Name = type.ToDisplayString(SymbolDisplayFormat.FullyQualifiedFormat),
+            Kind = kind,
+            Signature = sb.ToString()
+        };
     }
 }
 """
@@ -1,34 +1,76 @@
 import subprocess
+import asyncio
 import logging
+import time
 import re
-from typing import Dict, Optional
+from contextlib import aclosing
+from typing import Dict, List, Optional
+
+from .ollama_client import OllamaClient, OllamaError
+from .stats import RunStats
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
 EXPECTED_KEYWORDS = ["[TestFixture]", "[Test]"]
 
+MAX_COMPLETION_TOKENS = 4096      # num_predict cap sent to Ollama
+RUNAWAY_COMPLETION_CHARS = 24000  # a single test class never needs more than this
+PROSE_LIMIT_CHARS = 600           # this much text without any code means the model is chatting
+STREAM_COMPLETE = "complete"      # StreamValidator verdict: the test class is done, stop reading
+# part of the content-addressed cache key: bump whenever `_build_prompt` changes what it asks for
+PROMPT_VERSION = "4"
+PROMPT_TOKEN_BUDGET = 3000        # estimated prompt tokens per class; lowest-value context is dropped to fit
+CHARS_PER_TOKEN = 4               # rough ratio for code and English with llama-family tokenizers
+BATCH_COMPLETION_TOKENS_PER_CLASS = 1024  # num_predict headroom per class of a batched prompt
+MAX_REPAIR_DIAGNOSTICS = 20       # compile errors quoted in a repair prompt
+
+# every prompt starts with these same instructions (then the run's few-shot example, if any), and only
+# then names the class: Ollama reuses the KV cache of a prompt prefix it has already evaluated, so
+# this part is not paid for again on every request. nothing class-specific may go in here
+PROMPT_PREFIX = """You are a C# NUnit expert writing unit tests for an existing C# code base.
+Every test class is complete and runnable: its usings, its namespace and the class itself.
+Use [TestFixture], [Test], Arrange, Act and Assert pattern, include setup if needed, meaningful test cases.
+Name every test method <MethodUnderTest>_<Scenario>_<ExpectedResult>.
+"""
+
+_FENCE = "```"
+_CODE_MARKER_RE = re.compile(r"```|\busing\s+[\w.]+\s*;|\bnamespace\s+\w|\bclass\s+\w+|\[Test")
+_CLASS_DECL_RE = re.compile(r"\bclass\s+(\w+)(?=\W)")
+_FENCED_BLOCK_RE = re.compile(r"```[^\n]*\n(.*?)(?:```|\Z)", re.S)
+_FENCE_LINE_RE = re.compile(r"^[ \t]*```[^\n]*$", re.M)
+# first line of every test class in a batched completion: `// === FooTests ===`
+_BATCH_MARKER_RE = re.compile(r"^[ \t]*//[ \t]*=+[ \t]*(\w+)Tests[ \t]*=+[ \t]*$", re.M)
+
 def generate_nunit_test_class(
     class_info: Dict[str, any],
     model_name: str,
     test_project_namespace: str,
     few_shot_example: Optional[str] = None,
-    timeout_sec: int = 300
+    timeout_sec: int = 300,
+    token_budget: Optional[int] = PROMPT_TOKEN_BUDGET,
+    focus_method: Optional[str] = None,
+    fixture: Optional[str] = None,
+    keep_alive: Optional[any] = None
 ) -> Optional[str]:
     """
     call the local Ollama on my machine to generate a full NUnit test class.
     this performs simple keyword validation to ensure that nunit tests are generated and; returns None on failure.
+    `keep_alive` is passed on as `--keepalive`, so the model stays loaded until the next call.
     """
     class_name = class_info["ClassName"]
     namespace = class_info.get("NamespaceName", "")
-    prompt = _build_prompt(class_info, test_project_namespace, few_shot_example)
-    print(prompt)
-    
+    prompt = _build_prompt(
+        class_info, test_project_namespace, few_shot_example, token_budget, focus_method=focus_method, fixture=fixture
+    )
     logger.debug(f"LLM prompt (truncated): {prompt[:500]}…")
     try:
-        proc = subprocess.run(
-            ["ollama", "run", model_name, prompt],
-            capture_output=True, text=True, timeout=timeout_sec, check=True
-        )
+        with span("ollama.cli", model=model_name, target=class_name, prompt_tokens_est=estimate_tokens(prompt)):
+            keep = ["--keepalive", cli_duration(keep_alive)] if keep_alive is not None else []
+            proc = subprocess.run(
+                ["ollama", "run", *keep, model_name, prompt],
+                capture_output=True, text=True, timeout=timeout_sec, check=True
+            )
         code = proc.stdout.strip()
     except FileNotFoundError:
         logger.error("`ollama` CLI not found in PATH.")
@@ -40,30 +82,567 @@ def generate_nunit_test_class(
         logger.error(f"Ollama timed out after {timeout_sec}s")
         return None
 
-    # strip the language markers out
-    code = re.sub(r"^```(?:csharp)?\s*|\s*```$", "", code)
+    return _clean_and_validate(code, class_name)
 
-    # basic validation
-    if f"class {class_name}Tests" not in code:
-        logger.error("LLM output missing expected test-class name.")
+async def agenerate_nunit_test_class(
+    class_info: Dict[str, any],
+    model_name: str,
+    test_project_namespace: str,
+    client: OllamaClient,
+    few_shot_example: Optional[str] = None,
+    timeout_sec: int = 300,
+    token_budget: Optional[int] = PROMPT_TOKEN_BUDGET,
+    stats: Optional[RunStats] = None,
+    focus_method: Optional[str] = None,
+    fixture: Optional[str] = None
+) -> Optional[str]:
+    """
+    same as `generate_nunit_test_class`, but through the Ollama HTTP API on a shared
+    async client, so many classes can be in flight without a process or thread each.
+    cancelling the awaiting task aborts the request.
+    """
+    class_name = class_info["ClassName"]
+    prompt = _build_prompt(
+        class_info, test_project_namespace, few_shot_example, token_budget, stats, focus_method, fixture
+    )
+    logger.debug(f"LLM prompt (truncated): {prompt[:500]}…")
+    try:
+        reply = await client.generate(
+            model_name, prompt, options={"num_predict": MAX_COMPLETION_TOKENS}, timeout_sec=timeout_sec
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Ollama timed out after {timeout_sec}s for {class_name}")
         return None
-    if not all(kw in code for kw in EXPECTED_KEYWORDS):
-        logger.error("LLM output missing NUnit attributes.")
+    except (OllamaError, OSError) as e:
+        logger.error(f"Ollama request failed for {class_name}: {e}")
+        return None
+    return _clean_and_validate(reply.get("response", "").strip(), class_name)
+
+async def astream_nunit_test_class(
+    class_info: Dict[str, any],
+    model_name: str,
+    test_project_namespace: str,
+    client: OllamaClient,
+    few_shot_example: Optional[str] = None,
+    timeout_sec: int = 300,
+    stats: Optional[RunStats] = None,
+    token_budget: Optional[int] = PROMPT_TOKEN_BUDGET,
+    focus_method: Optional[str] = None,
+    fixture: Optional[str] = None
+) -> Optional[str]:
+    """
+    streaming variant of `agenerate_nunit_test_class`: tokens are validated as they arrive and
+    the request is cancelled as soon as the output is clearly unusable (or already complete),
+    so we stop paying for tokens we would throw away. aborts are recorded in `stats`.
+    """
+    class_name = class_info["ClassName"]
+    prompt = _build_prompt(
+        class_info, test_project_namespace, few_shot_example, token_budget, stats, focus_method, fixture
+    )
+    logger.debug(f"LLM prompt (truncated): {prompt[:500]}…")
+    validator = StreamValidator(class_name)
+    verdict = None
+    tokens = 0
+    started = time.monotonic()
+    with span("ollama.stream_generate", model=model_name, target=class_name,
+              prompt_tokens_est=estimate_tokens(prompt)) as s:
+        try:
+            stream = client.stream_generate(
+                model_name, prompt, options={"num_predict": MAX_COMPLETION_TOKENS}, timeout_sec=timeout_sec
+            )
+            async with aclosing(stream):
+                async for msg in stream:
+                    if msg.get("done"):
+                        s.set(prompt_tokens=msg.get("prompt_eval_count"))
+                        break
+                    if not tokens:
+                        s.set(first_token_ms=round((time.monotonic() - started) * 1000, 1))
+                        if stats:
+                            stats.observe("generation.first_token_sec", time.monotonic() - started)
+                    tokens += 1
+                    verdict = validator.feed(msg.get("response", ""))
+                    if verdict:
+                        break
+        except asyncio.TimeoutError:
+            logger.error(f"Ollama timed out after {timeout_sec}s for {class_name}")
+            s.set(error="timeout", completion_tokens=tokens)
+            return None
+        except (OllamaError, OSError) as e:
+            logger.error(f"Ollama request failed for {class_name}: {e}")
+            s.set(error=type(e).__name__, completion_tokens=tokens)
+            return None
+        s.set(completion_tokens=tokens, verdict=verdict)
+    elapsed = time.monotonic() - started
+
+    if stats:
+        stats.incr("generation.completion_tokens", tokens)
+    if verdict and verdict != STREAM_COMPLETE:
+        logger.error(f"Aborted generation for {class_name} after {tokens} tokens / {elapsed:.1f}s: {verdict}")
+        if stats:
+            stats.incr("generation.aborted")
+            stats.incr(f"generation.aborted[{verdict}]")
+            stats.incr("generation.tokens_saved", max(0, MAX_COMPLETION_TOKENS - tokens))
+            stats.observe("generation.time_to_abort_sec", elapsed)
+        return None
+    if verdict == STREAM_COMPLETE and stats:
+        stats.incr("generation.stopped_after_code_block")
+    return _clean_and_validate(validator.text.strip(), class_name)
+
+async def agenerate_nunit_test_batch(
+    classes: List[Dict[str, any]],
+    model_name: str,
+    test_project_namespace: str,
+    client: OllamaClient,
+    timeout_sec: int = 300,
+    stats: Optional[RunStats] = None
+) -> Dict[str, Optional[str]]:
+    """
+    one request for several small classes (distinct names): the completion holds one delimited
+    test class per class, which is split and validated on its own. returns class name -> test
+    code, or None for the classes whose test class is missing or invalid (the caller retries
+    those one by one). a failed request leaves every class None.
+    """
+    names = [c["ClassName"] for c in classes]
+    prompt = build_batch_prompt(classes, test_project_namespace)
+    if stats:
+        stats.observe("prompt.tokens", estimate_tokens(prompt))
+    logger.debug(f"LLM batch prompt (truncated): {prompt[:500]}…")
+    num_predict = max(MAX_COMPLETION_TOKENS, BATCH_COMPLETION_TOKENS_PER_CLASS * len(classes))
+    try:
+        reply = await client.generate(
+            model_name, prompt, options={"num_predict": num_predict}, timeout_sec=timeout_sec
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Ollama timed out after {timeout_sec}s for the batch {', '.join(names)}")
+        return dict.fromkeys(names)
+    except (OllamaError, OSError) as e:
+        logger.error(f"Ollama batch request failed for {', '.join(names)}: {e}")
+        return dict.fromkeys(names)
+    return split_batch_completion(reply.get("response", ""), names)
+
+def split_batch_completion(text: str, class_names: List[str]) -> Dict[str, Optional[str]]:
+    """
+    cut a batched completion at its `// === FooTests ===` markers (fences dropped) and validate
+    each piece. a class without a marker is looked for in a fenced block of its own.
+    """
+    pieces: Dict[str, str] = {}
+    markers = list(_BATCH_MARKER_RE.finditer(text))
+    for m, nxt in zip(markers, markers[1:] + [None]):
+        body = text[m.end():nxt.start() if nxt else len(text)]
+        pieces.setdefault(m.group(1), _FENCE_LINE_RE.sub("", body).strip())
+    blocks = _FENCED_BLOCK_RE.findall(text)
+
+    results: Dict[str, Optional[str]] = {}
+    for name in class_names:
+        code = pieces.get(name)
+        if code is None:
+            code = next((b.strip() for b in blocks
+                         if f"class {name}Tests" in b and len(_CLASS_DECL_RE.findall(b)) == 1), None)
+        problem = validate_test_code(code, name) if code is not None else "missing from the batch"
+        if problem:
+            logger.warning(f"Batched test class for {name} {problem}")
+            code = None
+        results[name] = code
+    return results
+
+async def arepair_nunit_test_class(
+    class_info: Dict[str, any],
+    test_code: str,
+    diagnostics: List[Dict[str, any]],
+    model_name: str,
+    test_project_namespace: str,
+    client: OllamaClient,
+    timeout_sec: int = 300,
+    token_budget: Optional[int] = PROMPT_TOKEN_BUDGET,
+    stats: Optional[RunStats] = None
+) -> Optional[str]:
+    """
+    ask the model to fix the compile errors (`diagnostics` from the compile check) of a generated
+    test class; returns the corrected class, or None if the answer is unusable.
+    """
+    class_name = class_info["ClassName"]
+    prompt = _build_repair_prompt(class_info, test_project_namespace, test_code, diagnostics, token_budget)
+    if stats:
+        stats.observe("prompt.tokens", estimate_tokens(prompt))
+    logger.debug(f"LLM repair prompt (truncated): {prompt[:500]}…")
+    try:
+        reply = await client.generate(
+            model_name, prompt, options={"num_predict": MAX_COMPLETION_TOKENS}, timeout_sec=timeout_sec
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Ollama timed out after {timeout_sec}s repairing {class_name}")
+        return None
+    except (OllamaError, OSError) as e:
+        logger.error(f"Ollama repair request failed for {class_name}: {e}")
         return None
+    return _clean_and_validate(reply.get("response", "").strip(), class_name)
 
+# states of _BraceCounter's lexer
+_CODE, _SLASH, _LINE_COMMENT, _BLOCK_COMMENT, _BLOCK_STAR, _PREFIX, _STRING, _CHAR, _VERBATIM, _VERBATIM_QUOTE = range(10)
+_OVERLAP = 64  # characters of the previous tokens a scan looks back at, for matches split across tokens
+
+class _BraceCounter:
+    """
+    running `{` / `}` depth of C# fed a piece at a time. braces in comments and in string, char and
+    verbatim string literals do not count (raw string literals are not recognised); a string or
+    char literal left open ends with its line, so an apostrophe in prose does not swallow the code.
+    """
+    __slots__ = ("depth", "opened", "negative", "_state", "_escape", "_verbatim")
+
+    def __init__(self):
+        self.depth = 0
+        self.opened = 0
+        self.negative = False  # a `}` closed more than was opened
+        self._state = _CODE
+        self._escape = False
+        self._verbatim = False
+
+    def feed(self, text: str) -> bool:
+        """
+        advance over `text`; True if it closed a brace in code.
+        """
+        closed = False
+        i, n = 0, len(text)
+        while i < n:
+            c = text[i]
+            state = self._state
+            if state == _CODE:
+                if c == "{":
+                    self.depth += 1
+                    self.opened += 1
+                elif c == "}":
+                    self.depth -= 1
+                    closed = True
+                    if self.depth < 0:
+                        self.negative = True
+                elif c == "/":
+                    self._state = _SLASH
+                elif c == '"':
+                    self._state = _STRING
+                elif c == "'":
+                    self._state = _CHAR
+                elif c in "@$":
+                    self._state, self._verbatim = _PREFIX, c == "@"
+            elif state == _SLASH:
+                self._state = _LINE_COMMENT if c == "/" else _BLOCK_COMMENT if c == "*" else _CODE
+                if self._state == _CODE:
+                    continue  # not a comment: the character is code
+            elif state == _LINE_COMMENT:
+                if c == "\n":
+                    self._state = _CODE
+            elif state in (_BLOCK_COMMENT, _BLOCK_STAR):
+                if state == _BLOCK_STAR and c == "/":
+                    self._state = _CODE
+                else:
+                    self._state = _BLOCK_STAR if c == "*" else _BLOCK_COMMENT
+            elif state == _PREFIX:
+                if c in "@$":
+                    self._verbatim = self._verbatim or c == "@"
+                elif c == '"':
+                    self._state = _VERBATIM if self._verbatim else _STRING
+                else:
+                    self._state = _CODE  # e.g. a verbatim identifier
+                    continue
+            elif state in (_STRING, _CHAR):
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == "\n" or c == ('"' if state == _STRING else "'"):
+                    self._state = _CODE
+            elif state == _VERBATIM:
+                if c == '"':
+                    self._state = _VERBATIM_QUOTE
+            elif state == _VERBATIM_QUOTE:
+                # `""` is a quote inside a verbatim string, anything else follows its end
+                self._state = _VERBATIM if c == '"' else _CODE
+                if self._state == _CODE:
+                    continue
+            i += 1
+        return closed
+
+class StreamValidator:
+    """
+    incremental checks on a streamed completion. `feed` each token; it returns None to keep
+    reading, STREAM_COMPLETE once the expected test class is fully emitted, or an abort reason
+    (runaway length, prose-only output, wrong test class name, fence/brace imbalance).
+    tokens are kept as a list and scanned once each (plus a short overlap with the previous ones),
+    and braces are counted by a small C# lexer as they arrive, so feeding a completion is linear.
+    """
+
+    def __init__(
+        self,
+        class_name: str,
+        max_chars: int = RUNAWAY_COMPLETION_CHARS,
+        prose_limit_chars: int = PROSE_LIMIT_CHARS
+    ):
+        self.expected = f"{class_name}Tests"
+        self.max_chars = max_chars
+        self.prose_limit_chars = prose_limit_chars
+        self._pieces: List[str] = []
+        self._length = 0
+        self._tail = ""  # the last _OVERLAP characters
+        self._seen_code = False
+        self._seen_expected = False
+        self._expected_in_block = False
+        self._class_scan_pos = 0
+        self._fence_scan_pos = 0
+        self._fences: List[int] = []
+        # braces of the whole text until a fence opens, then of the fenced block only
+        self._braces = _BraceCounter()
+        self._mode = "unfenced"  # then "info" (the fence's language tag), "block"
+
+    @property
+    def text(self) -> str:
+        if len(self._pieces) > 1:
+            self._pieces = ["".join(self._pieces)]
+        return self._pieces[0] if self._pieces else ""
+
+    def feed(self, piece: str) -> Optional[str]:
+        start = self._length
+        window = self._tail + piece
+        offset = start - len(self._tail)  # position of window[0] in the text
+        self._pieces.append(piece)
+        self._length += len(piece)
+        self._tail = window[-_OVERLAP:]
+        if self._length > self.max_chars:
+            return "runaway length"
+
+        if not self._seen_code:
+            self._seen_code = bool(_CODE_MARKER_RE.search(window))
+            if not self._seen_code and self._length >= self.prose_limit_chars:
+                return "prose-only output"
+
+        idx = window.find(_FENCE, max(0, self._fence_scan_pos - offset))
+        while idx != -1:
+            self._fences.append(offset + idx)
+            self._fence_scan_pos = offset + idx + len(_FENCE)
+            idx = window.find(_FENCE, idx + len(_FENCE))
+        self._fence_scan_pos = max(self._fence_scan_pos, self._length - len(_FENCE) + 1)
+
+        # a declaration only counts once the identifier is terminated by the next character
+        for m in _CLASS_DECL_RE.finditer(window, max(0, self._class_scan_pos - offset)):
+            self._class_scan_pos = offset + m.end()
+            name = m.group(1)
+            if name == self.expected:
+                self._seen_expected = True
+                at = offset + m.start()
+                if self._fences and self._fences[0] < at and (len(self._fences) < 2 or at < self._fences[1]):
+                    self._expected_in_block = True
+            elif name.endswith("Tests") and not self._seen_expected:
+                return "wrong test class name"
+        self._class_scan_pos = max(self._class_scan_pos, self._length - _OVERLAP)
+
+        return self._count_braces(piece, start)
+
+    def _count_braces(self, piece: str, start: int) -> Optional[str]:
+        pos, end = start, start + len(piece)
+        if self._mode == "unfenced":
+            if not self._fences:
+                closed = self._braces.feed(piece)
+                if self._braces.negative:
+                    return "fence/brace imbalance"
+                if closed and self._seen_expected and self._braces.opened and self._braces.depth == 0:
+                    return STREAM_COMPLETE
+                return None
+            self._mode, self._braces = "info", _BraceCounter()
+            pos = max(pos, self._fences[0] + len(_FENCE))
+        if self._mode == "info":
+            newline = piece.find("\n", pos - start)
+            if newline == -1:
+                return None
+            self._mode, pos = "block", start + newline + 1
+        limit = self._fences[1] if len(self._fences) >= 2 else end
+        self._braces.feed(piece[pos - start:max(pos, limit) - start])
+        if len(self._fences) >= 2:
+            return self._closed_block_verdict()
+        return None
+
+    def _closed_block_verdict(self) -> Optional[str]:
+        if self._braces.depth or self._braces.negative:
+            return "fence/brace imbalance"
+        if not self._expected_in_block:
+            return "code block without expected test class"
+        return STREAM_COMPLETE
+
+def _clean_and_validate(code: str, class_name: str) -> Optional[str]:
+    # keep only the code block holding the test class (models like to wrap it in prose)
+    blocks = _FENCED_BLOCK_RE.findall(code)
+    if blocks:
+        code = next((b for b in blocks if f"class {class_name}Tests" in b), blocks[0]).strip()
+
+    problem = validate_test_code(code, class_name)
+    if problem:
+        logger.error(f"LLM output {problem}.")
+        return None
     return code
 
-def _build_prompt(class_info, root_namespace: str, few_shot: Optional[str]) -> str:
-    # more elaborate prompt to be built here; better to insert few_shot examples here rather than a simple prompt like this
-    core = f"""
-You are a C# NUnit expert. Generate a complete, runnable NUnit test CLASS for the following C# class:
-ClassName: {class_info['ClassName']}
+def validate_test_code(code: str, class_name: str) -> Optional[str]:
+    """
+    basic structural checks on a generated test class; returns the problem found, or None if it looks fine.
+    """
+    if f"class {class_name}Tests" not in code:
+        return "missing expected test-class name"
+    if not all(kw in code for kw in EXPECTED_KEYWORDS):
+        return "missing NUnit attributes"
+    if code.count("{") != code.count("}"):
+        return "has unbalanced braces"
+    return None
+
+def cli_duration(keep_alive) -> str:
+    # the API takes seconds, `ollama run --keepalive` a Go duration ("-1s" is forever)
+    return f"{keep_alive}s" if isinstance(keep_alive, (int, float)) else str(keep_alive)
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def prompt_prefix(few_shot: Optional[str] = None) -> str:
+    """
+    the part every prompt of a run starts with: `PROMPT_PREFIX`, then the few-shot example.
+    """
+    return PROMPT_PREFIX + ("\n" + few_shot + "\n---\n" if few_shot else "")
+
+def _build_prompt(
+    class_info,
+    root_namespace: str,
+    few_shot: Optional[str],
+    token_budget: Optional[int] = PROMPT_TOKEN_BUDGET,
+    stats: Optional[RunStats] = None,
+    focus_method: Optional[str] = None,
+    fixture: Optional[str] = None
+) -> str:
+    """
+    prompt for one class: the shared prefix (instructions, few-shot example), then its own
+    declaration plus as much context as fits in `token_budget`. context is added by value
+    (usings, then signatures of the source types it references, in extractor order:
+    constructor/field dependencies first) and whatever does not fit is dropped. the few-shot
+    example goes first as it is part of the prefix the server has cached. a class that alone
+    exceeds the budget is sent as an outline of its public signatures instead of its bodies.
+    with `focus_method`, only tests for that method are asked for, and only its source is sent
+    next to the class outline and the existing test `fixture` the new tests must fit into.
+    """
+    class_name = class_info["ClassName"]
+    task = (f"Write NUnit tests ONLY for the method {focus_method} of the following C# class "
+            "(its other methods are already covered), as a complete test CLASS:"
+            if focus_method else
+            "Generate a complete, runnable NUnit test CLASS for the following C# class:")
+    header = f"""
+{task}
+ClassName: {class_name}
 Namespace: {class_info.get('NamespaceName','Global')}
-FullSource:
-```\n{class_info['FullSourceCode']}\n```
-Your test class must be named {class_info['ClassName']}Tests in namespace {root_namespace}.
-Use [TestFixture], [Test], Arrange, Act and Assert pattern, include setup if needed, meaningful test cases.
 """
+    footer = f"""Your test class must be named {class_name}Tests in namespace {root_namespace}.
+"""
+    if focus_method:
+        focused = [m.get("SourceCode") or m["Signature"] for m in class_info.get("PublicMethods") or []
+                   if m["Name"] == focus_method]
+        source_section = (f"Class outline:\n```\n{_class_outline(class_info)}\n```\n"
+                          f"Method under test:\n```\n" + "\n\n".join(focused) + "\n```\n")
+        if fixture:
+            source_section += ("Existing test class (reuse its fields and setup, do not repeat them or its tests):\n"
+                               f"```\n{fixture}\n```\n")
+    else:
+        source = class_info.get("ClassSourceCode") or class_info["FullSourceCode"]
+        source_section = f"Source:\n```\n{source}\n```\n"
+    budget = token_budget if token_budget is not None else float("inf")
+    if estimate_tokens(PROMPT_PREFIX + header + source_section + footer) > budget:
+        source_section = f"Source outline (bodies omitted to fit the context window):\n```\n{_class_outline(class_info)}\n```\n"
+        if stats:
+            stats.incr("prompt.outlined")
+
+    prefix = PROMPT_PREFIX
     if few_shot:
-        return few_shot + "\n---\n" + core
-    return core
+        if estimate_tokens(prompt_prefix(few_shot) + header + source_section + footer) <= budget:
+            prefix = prompt_prefix(few_shot)
+        elif stats:
+            stats.incr("prompt.dropped[few-shot example]")
+
+    optional = []  # (label, text), most valuable first
+    usings = class_info.get("UsingDirectivesInFile") or []
+    if usings:
+        optional.append(("usings", "Usings in the file:\n" + "\n".join(usings) + "\n"))
+    for ref in class_info.get("ReferencedTypes") or []:
+        optional.append(("referenced type", f"Referenced type {ref['Name'].replace('global::', '')}:\n```\n{ref['Signature']}\n```\n"))
+
+    remaining = budget - estimate_tokens(prefix + header + source_section + footer)
+    kept = []
+    for label, text in optional:
+        cost = estimate_tokens(text)
+        if cost <= remaining:
+            kept.append(text)
+            remaining -= cost
+        elif stats:
+            stats.incr(f"prompt.dropped[{label}]")
+
+    prompt = prefix + header + "".join(kept) + source_section + footer
+    if stats:
+        full_file = f"{PROMPT_PREFIX}{header}FullSource:\n```\n{class_info['FullSourceCode']}\n```\n{footer}"
+        stats.observe("prompt.tokens_full_file", estimate_tokens(full_file))
+        stats.observe("prompt.tokens", estimate_tokens(prompt))
+    return prompt
+
+def _build_repair_prompt(
+    class_info,
+    root_namespace: str,
+    test_code: str,
+    diagnostics: List[Dict[str, any]],
+    token_budget: Optional[int] = PROMPT_TOKEN_BUDGET
+) -> str:
+    """
+    the failing test class, its compile errors and the class under test (outlined if the
+    whole prompt would not fit in `token_budget`).
+    """
+    class_name = class_info["ClassName"]
+    errors = "\n".join(f"{d['Id']} (line {d['Line']}): {d['Message']}" for d in diagnostics[:MAX_REPAIR_DIAGNOSTICS])
+    header = f"""{PROMPT_PREFIX}
+The following NUnit test class for the C# class {class_name} does not compile.
+Compile errors:
+{errors}
+Test class:
+```
+{test_code}
+```
+"""
+    footer = f"""Return the complete corrected test class, still named {class_name}Tests in namespace {root_namespace}.
+Fix only what the errors require; keep the other tests and their names.
+"""
+    source = class_info.get("ClassSourceCode") or class_info["FullSourceCode"]
+    source_section = f"Class under test:\n```\n{source}\n```\n"
+    budget = token_budget if token_budget is not None else float("inf")
+    if estimate_tokens(header + source_section + footer) > budget:
+        source_section = f"Class under test (outline):\n```\n{_class_outline(class_info)}\n```\n"
+    return header + source_section + footer
+
+def build_batch_prompt(classes: List[Dict[str, any]], root_namespace: str) -> str:
+    """
+    prompt asking for one complete test file per class, each introduced by its marker line.
+    """
+    header = f"""{PROMPT_PREFIX}
+Generate a complete, runnable NUnit test CLASS for each of the following {len(classes)} C# classes.
+Answer with one code block per class. The first line of each block must be `// === <ClassName>Tests ===`,
+followed by a complete file: usings, namespace {root_namespace} and the test class.
+"""
+    sections = [batch_section(c, root_namespace, i + 1) for i, c in enumerate(classes)]
+    return header + "".join(sections)
+
+def batch_section(class_info, root_namespace: str, index: int = 1) -> str:
+    """
+    one class's part of a batched prompt; its estimated size decides whether the class is batched.
+    """
+    class_name = class_info["ClassName"]
+    source = class_info.get("ClassSourceCode") or class_info["FullSourceCode"]
+    usings = class_info.get("UsingDirectivesInFile") or []
+    return (
+        f"\n### {index}. {class_name} (namespace {class_info.get('NamespaceName') or 'Global'})\n"
+        + ("Usings in the file:\n" + "\n".join(usings) + "\n" if usings else "")
+        + f"Source:\n```\n{source}\n```\n"
+        + f"Its test class must be named {class_name}Tests in namespace {root_namespace}, "
+        + f"marked `// === {class_name}Tests ===`.\n"
+    )
+
+def _class_outline(class_info) -> str:
+    lines = [f"class {class_info['ClassName']}", "{"]
+    lines += [f"    {c['Signature']};" for c in class_info.get("Constructors") or []]
+    lines += [f"    {m['Signature']};" for m in class_info.get("PublicMethods") or []]
+    lines.append("}")
+    return "\n".join(lines)
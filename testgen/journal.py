@@ -0,0 +1,248 @@
+import os
+import time
+import socket
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from .cache import (
+    CacheConn, start_run, resume_run, set_run_status, touch_run, get_runs, find_resumable_run, set_run_file_state,
+    set_run_item_state, get_run_file_states, get_run_item_states, count_run_states, prune_runs, compute_sha256_hash
+)
+
+logger = logging.getLogger(__name__)
+
+# a run whose journal has not moved for this long is taken for dead even if its pid still exists
+STALE_AFTER_SEC = 30 * 60
+HEARTBEAT_SEC = 5.0
+KEEP_RUNS = 20
+
+# states of a source file / class in the journal
+PENDING, WRITTEN, DONE, CACHED, FAILED, GAVE_UP = "pending", "written", "done", "cached", "failed", "gave_up"
+
+def config_hash(**settings: Any) -> str:
+    """
+    fingerprint of the settings that decide what a run produces; a run is only resumed under the same one.
+    """
+    return compute_sha256_hash(repr(sorted(settings.items())))[:16]
+
+def run_is_active(run: Dict[str, Any]) -> bool:
+    """
+    whether the process that owns a `running` run is still at work on this machine.
+    """
+    if run["status"] != "running" or run["pid"] == os.getpid():
+        return False
+    if time.time() - (run["updated_at"] or 0) > STALE_AFTER_SEC:
+        return False
+    return run["host"] == socket.gethostname() and _pid_alive(run["pid"])
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if os.name == "nt":
+        # os.kill would terminate it there; the heartbeat has to do
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+class RunJournal:
+    """
+    durable record of one run in test_cache.db: every source file and class it meets, with its
+    state and attempts. a run that dies (crash, kill, reboot) is picked up by the next one on the
+    same commit and settings: written files are skipped, failed classes are retried until they
+    have had `max_attempts`, and the rest carries on where it stopped. writes are queued on the
+    cache store like every other cache write; the journal keeps its own copy to answer lookups.
+    """
+
+    def __init__(self, conn: CacheConn, run_id: str, max_attempts: int = 3,
+                 files: Optional[Dict[str, Any]] = None, items: Optional[Dict[str, Any]] = None, resumed: bool = False):
+        self.conn = conn
+        self.run_id = run_id
+        self.max_attempts = max_attempts
+        self.resumed = resumed
+        self._files: Dict[str, List] = {rel: list(v) for rel, v in (files or {}).items()}  # rel -> [state, attempts]
+        self._items: Dict[str, List] = {key: list(v) for key, v in (items or {}).items()}
+        self._lock = threading.Lock()
+        self._last_touch = time.monotonic()
+
+    @classmethod
+    def open(cls, conn: CacheConn, repo_url: str, branch: str, head_sha: str, settings_hash: str, clone_dir: str,
+             max_attempts: int = 3, previous: Optional[Dict[str, Any]] = None) -> "RunJournal":
+        """
+        resume `previous` (default: the latest unfinished run of the repo and branch) if it was on
+        the same commit and settings, otherwise start a new run.
+        """
+        if previous is None:
+            previous = find_resumable_run(conn, repo_url, branch)
+        host, pid = socket.gethostname(), os.getpid()
+        if previous and previous["head_sha"] == head_sha and previous["config_hash"] == settings_hash:
+            resume_run(conn, previous["run_id"], host, pid)
+            journal = cls(conn, previous["run_id"], max_attempts, get_run_file_states(conn, previous["run_id"]),
+                          get_run_item_states(conn, previous["run_id"]), resumed=True)
+            written = sum(state == WRITTEN for state, _ in journal._files.values())
+            logger.info(f"Resuming run {journal.run_id} ({written} files already written)")
+            return journal
+        if previous:
+            logger.info(f"Not resuming run {previous['run_id']}: the commit or settings changed")
+            set_run_status(conn, previous["run_id"], "abandoned", finished=True)
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+        start_run(conn, run_id, repo_url, branch, head_sha, settings_hash, clone_dir, host, pid)
+        prune_runs(conn, KEEP_RUNS)
+        logger.info(f"Started run {run_id}")
+        return cls(conn, run_id, max_attempts)
+
+    # ---------------- files ----------------
+
+    def wants_file(self, rel_path: str) -> bool:
+        """
+        whether a discovered source file is still to be processed: False if it was already written
+        in this run or has used up its attempts. counts no attempt, so files queued behind a crash keep theirs.
+        """
+        with self._lock:
+            entry = self._files.get(rel_path)
+            if entry is None:
+                self._files[rel_path] = [PENDING, 0]
+            elif entry[0] == WRITTEN or entry[0] == GAVE_UP:
+                return False
+            elif entry[1] >= self.max_attempts:
+                entry[0] = GAVE_UP
+            else:
+                return True
+        if entry is None:
+            set_run_file_state(self.conn, self.run_id, rel_path, PENDING)
+            return True
+        set_run_file_state(self.conn, self.run_id, rel_path, GAVE_UP)
+        logger.warning(f"Giving up on {rel_path} after {self.max_attempts} attempts in this run")
+        return False
+
+    def begin_file(self, rel_path: str) -> None:
+        """
+        count an attempt at a source file, as its extraction starts.
+        """
+        with self._lock:
+            entry = self._files.setdefault(rel_path, [PENDING, 0])
+            entry[1] += 1
+        set_run_file_state(self.conn, self.run_id, rel_path, entry[0], attempt=True)
+
+    def file_written(self, rel_path: str) -> None:
+        with self._lock:
+            self._files.setdefault(rel_path, [PENDING, 0])[0] = WRITTEN
+        set_run_file_state(self.conn, self.run_id, rel_path, WRITTEN)
+        self._heartbeat()
+
+    def reopen_files(self, rel_paths: Iterable[str]) -> None:
+        """
+        process these files again if the run is resumed (their tests were dropped after it wrote them).
+        """
+        for rel in dict.fromkeys(rel_paths):
+            with self._lock:
+                self._files[rel] = [PENDING, 0]
+            set_run_file_state(self.conn, self.run_id, rel, PENDING)
+
+    # ---------------- classes ----------------
+
+    def class_seen(self, key: str) -> None:
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = [PENDING, 0]
+        set_run_item_state(self.conn, self.run_id, key, PENDING)
+
+    def class_done(self, key: str, cached: bool = False) -> None:
+        with self._lock:
+            entry = self._items.setdefault(key, [PENDING, 0])
+            if entry[0] in (DONE, CACHED):
+                return
+            entry[0] = CACHED if cached else DONE
+        set_run_item_state(self.conn, self.run_id, key, entry[0])
+        self._heartbeat()
+
+    def class_failed(self, key: str, reason: str) -> None:
+        with self._lock:
+            entry = self._items.setdefault(key, [PENDING, 0])
+            entry[0] = FAILED
+            entry[1] += 1
+        set_run_item_state(self.conn, self.run_id, key, FAILED, error=reason, attempt=True)
+        self._heartbeat()
+
+    def is_done(self, key: str) -> bool:
+        with self._lock:
+            return self._items.get(key, [PENDING])[0] in (DONE, CACHED)
+
+    def gave_up(self, key: str) -> bool:
+        """
+        whether a class has failed `max_attempts` times in this run and is not to be tried again.
+        """
+        with self._lock:
+            entry = self._items.get(key)
+            if not entry or entry[0] in (DONE, CACHED) or entry[1] < self.max_attempts:
+                return False
+            if entry[0] == GAVE_UP:
+                return True
+            entry[0] = GAVE_UP
+        set_run_item_state(self.conn, self.run_id, key, GAVE_UP, error=f"failed {entry[1]} times")
+        logger.warning(f"Giving up on {key} after {entry[1]} failed attempts in this run")
+        return True
+
+    # ---------------- run ----------------
+
+    def finish(self, status: str) -> None:
+        """
+        `completed`, or `incomplete` / `interrupted` for a run the next one should resume.
+        """
+        set_run_status(self.conn, self.run_id, status, finished=status == "completed")
+        logger.info(f"Run {self.run_id} {status}")
+
+    def _heartbeat(self) -> None:
+        now = time.monotonic()
+        if now - self._last_touch >= HEARTBEAT_SEC:
+            self._last_touch = now
+            touch_run(self.conn, self.run_id)
+
+def describe_runs(conn: CacheConn, repo_url: Optional[str] = None, branch: Optional[str] = None,
+                  limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    the latest runs with their progress: file and class counts by state, whether the owning
+    process is still alive and, for an active run, an estimate of the time left.
+    """
+    runs = []
+    for run in get_runs(conn, repo_url, branch, limit=limit):
+        run.update(count_run_states(conn, run["run_id"]))
+        run["active"] = run_is_active(run) or (run["status"] == "running" and run["pid"] == os.getpid())
+        if run["status"] == "running" and not run["active"]:
+            run["status"] = "interrupted"
+        run["eta_sec"] = _eta(run) if run["active"] else None
+        runs.append(run)
+    return runs
+
+def _eta(run: Dict[str, Any]) -> Optional[float]:
+    # by files: their classes are known only once extracted, the files once discovered
+    files = run["files"]
+    total = sum(files.values())
+    finished = total - files.get(PENDING, 0)
+    elapsed = time.time() - run["started_at"]
+    if not finished or elapsed <= 0:
+        return None
+    return files.get(PENDING, 0) * elapsed / finished
+
+def format_run_status(run: Dict[str, Any]) -> List[str]:
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started_at"]))
+    lines = [
+        f"run {run['run_id']}: {run['status']}{' (pid %d on %s)' % (run['pid'], run['host']) if run['active'] else ''}",
+        f"  {run['repo_url']}@{run['branch']} {(run['head_sha'] or '')[:12]}, started {started}"
+        + (f", resumed {run['resumes']}x" if run["resumes"] else ""),
+    ]
+    for kind in ("files", "items"):
+        counts = run[kind]
+        detail = ", ".join(f"{n} {state}" for state, n in sorted(counts.items())) or "none yet"
+        lines.append(f"  {'classes' if kind == 'items' else 'files'}: {sum(counts.values())} ({detail})")
+    if run["eta_sec"] is not None:
+        lines.append(f"  about {run['eta_sec'] / 60:.0f} min left")
+    return lines
@@ -0,0 +1,110 @@
+import logging
+from typing import Dict, List, Optional
+
+from .cache import CacheConn, compute_sha256_hash, lookup_cached_test, cache_test
+from .csharp_merge import split_test_class, extract_test_methods, merge_test_class
+
+logger = logging.getLogger(__name__)
+
+def method_hashes(cls) -> Dict[str, str]:
+    """
+    hash of every public method's source, overloads hashed together under their shared name.
+    """
+    sources: Dict[str, List[str]] = {}
+    for m in cls.get("PublicMethods") or []:
+        sources.setdefault(m["Name"], []).append(m.get("SourceCode") or m["Signature"])
+    return {name: compute_sha256_hash("\n".join(parts)) for name, parts in sources.items()}
+
+def class_shell_hash(cls) -> str:
+    """
+    hash of the class with its public methods cut out: constructors, fields, usings and referenced
+    types. when it changes every test may be affected, so the whole class is regenerated.
+    """
+    shell = cls.get("ClassSourceCode") or cls["FullSourceCode"]
+    for m in cls.get("PublicMethods") or []:
+        if m.get("SourceCode"):
+            shell = shell.replace(m["SourceCode"], "")
+    parts = [shell, *cls.get("UsingDirectivesInFile", [])]
+    parts += [ref["Signature"] for ref in cls.get("ReferencedTypes", [])]
+    return compute_sha256_hash("\n".join(parts))
+
+class MethodParts:
+    """
+    a test class kept as a skeleton (usings, fixture, setup, tests not named after a method) plus
+    the tests of each public method, so an edited method only needs its own tests regenerated.
+    """
+
+    def __init__(self, key: str, cls, prompt_version: str):
+        self.key = key
+        self.class_name = cls["ClassName"]
+        self.shell_hash = class_shell_hash(cls)
+        self.hashes = method_hashes(cls)
+        self.names = list(self.hashes)
+        self.skeleton: Optional[str] = None
+        self.tests: Dict[str, str] = {}
+        self.fresh: List[str] = []  # methods generated in this run
+        self.fresh_skeleton = False
+        self._skeleton_version = f"{prompt_version}:skeleton"
+        self._method_version = f"{prompt_version}:method"
+
+    @property
+    def missing(self) -> List[str]:
+        return [n for n in self.names if n not in self.tests]
+
+    @property
+    def complete(self) -> bool:
+        return self.skeleton is not None and not self.missing
+
+    def probe(self, conn: CacheConn, model: str) -> int:
+        """
+        load the cached skeleton and method tests; returns how many methods were found.
+        method tests are only usable with the skeleton they were generated against.
+        """
+        self.skeleton = lookup_cached_test(conn, self.key, self.shell_hash, model, self._skeleton_version)[0]
+        if self.skeleton is None:
+            return 0
+        for name in self.names:
+            code = lookup_cached_test(conn, self._method_key(name), self.hashes[name], model, self._method_version)[0]
+            if code is not None:
+                self.tests[name] = code
+        return len(self.tests)
+
+    def absorb_class(self, code: str) -> bool:
+        """
+        split a freshly generated full test class into skeleton and per-method tests.
+        """
+        split = split_test_class(code, self.names, f"{self.class_name}Tests")
+        if split is None:
+            return False
+        self.skeleton, groups = split
+        self.tests = {name: "\n\n".join(groups[name]) for name in self.names}
+        self.fresh = list(self.names)
+        self.fresh_skeleton = True
+        return True
+
+    def absorb_method(self, name: str, code: str) -> bool:
+        """
+        take the tests of `name` from a test class generated for that method alone.
+        """
+        split = split_test_class(code, [name], f"{self.class_name}Tests")
+        if split is None:
+            return False
+        tests = split[1][name] or extract_test_methods(code, f"{self.class_name}Tests")
+        self.tests[name] = "\n\n".join(tests)
+        self.fresh.append(name)
+        return True
+
+    def merged(self) -> str:
+        return merge_test_class(self.skeleton, [self.tests[n] for n in self.names if self.tests.get(n)])
+
+    def store(self, conn: CacheConn, model: str, compression: Optional[str] = None) -> None:
+        if self.fresh_skeleton:
+            cache_test(conn, self.key, self.shell_hash, model, self.skeleton,
+                       compression=compression, prompt_version=self._skeleton_version)
+        for name in self.fresh:
+            cache_test(conn, self._method_key(name), self.hashes[name], model, self.tests[name],
+                       compression=compression, prompt_version=self._method_version)
+
+    def _method_key(self, name: str) -> str:
+        # `relpath::Class.Method`: moves and deletes of the file take method rows along
+        return f"{self.key}.{name}"
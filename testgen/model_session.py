@@ -0,0 +1,97 @@
+import time
+import asyncio
+import logging
+from typing import Any, Optional
+
+from .generator import prompt_prefix
+from .ollama_client import OllamaClient, OllamaError
+from .stats import RunStats
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+WARM_TIMEOUT_SEC = 600  # loading a large model from a cold disk can take minutes
+
+class ModelSession:
+    """
+    one model kept resident in Ollama for a run. `start` (or the first `ready`) loads it with an
+    empty prompt (pinned by the client's `keep_alive`), then sends the shared prompt prefix
+    `warm_requests` times at once with a one-token answer, so each of the server's parallel slots
+    holds that prefix in its KV cache before the first class arrives. `close` hands the model back to the server's idle timeout
+    (`keep_alive_after`; 0 unloads it, None leaves the run's keep_alive in place).
+    a server that cannot be reached is only logged: generation then pays the cold start itself.
+    """
+
+    def __init__(
+        self,
+        client: OllamaClient,
+        model: str,
+        few_shot: Optional[str] = None,
+        warm_requests: int = 1,
+        keep_alive_after: Optional[Any] = "5m",
+        stats: Optional[RunStats] = None,
+    ):
+        self.client = client
+        self.model = model
+        self.prefix = prompt_prefix(few_shot)
+        self.warm_requests = max(0, warm_requests)
+        self.keep_alive_after = keep_alive_after
+        self.stats = stats
+        self.loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ModelSession":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def ready(self) -> bool:
+        """
+        wait until the model is loaded and warm, starting that on the first call. a run with every
+        test cached never calls it, so it never loads the model.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.start())
+        return await asyncio.shield(self._task)
+
+    async def start(self) -> bool:
+        started = time.monotonic()
+        try:
+            with span("model.load", model=self.model) as s:
+                reply = await self.client.generate(self.model, "", timeout_sec=WARM_TIMEOUT_SEC)
+                s.set(load_ms=round(reply.get("load_duration", 0) / 1e6, 1))
+            loaded = time.monotonic()
+            if self.warm_requests:
+                with span("model.warm", model=self.model, requests=self.warm_requests):
+                    await asyncio.gather(*(
+                        self.client.generate(self.model, self.prefix, options={"num_predict": 1},
+                                             timeout_sec=WARM_TIMEOUT_SEC)
+                        for _ in range(self.warm_requests)
+                    ))
+        except (asyncio.TimeoutError, OllamaError, OSError) as e:
+            logger.warning(f"Could not preload {self.model}: {e or type(e).__name__}")
+            if self.stats:
+                self.stats.incr("model.preload_failed")
+            return False
+        self.loaded = True
+        logger.info(f"{self.model} loaded in {loaded - started:.1f}s and warmed in {time.monotonic() - loaded:.1f}s")
+        if self.stats:
+            self.stats.observe("model.load_sec", loaded - started)
+            self.stats.observe("model.warm_sec", time.monotonic() - loaded)
+        return True
+
+    async def close(self) -> None:
+        if self._task:
+            if not self._task.done():
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if not self.loaded or self.keep_alive_after is None:
+            return
+        try:
+            await self.client.generate(self.model, "", keep_alive=self.keep_alive_after, timeout_sec=30)
+        except (asyncio.TimeoutError, OllamaError, OSError) as e:
+            logger.debug(f"Could not release {self.model}: {e or type(e).__name__}")
+        self.loaded = False
@@ -0,0 +1,280 @@
+import json
+import asyncio
+import logging
+import urllib.parse
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .tracing import span, annotate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+class OllamaError(Exception):
+    """
+    non-200 answer or protocol error from the Ollama server.
+    """
+
+class OllamaClient:
+    """
+    small asyncio client for the Ollama REST API.
+    keeps a pool of keep-alive HTTP/1.1 connections, caps the number of in-flight requests
+    and applies a per-request timeout. a cancelled or timed-out request closes its connection,
+    which makes Ollama stop generating for it. `keep_alive` (seconds, a duration such as "30m",
+    or -1 for as long as the server runs) is sent with every request, so the model is not unloaded
+    between them.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_OLLAMA_URL,
+        max_inflight: int = 4,
+        timeout_sec: float = 300,
+        keep_alive: Optional[Any] = None,
+    ):
+        url = urllib.parse.urlsplit(base_url)
+        if url.scheme != "http":
+            raise ValueError(f"only plain http Ollama endpoints are supported, got {base_url!r}")
+        self._host = url.hostname or "localhost"
+        self._port = url.port or 80
+        self._base_path = url.path.rstrip("/")
+        self._timeout = timeout_sec
+        self.keep_alive = keep_alive
+        self._max_inflight = max(1, max_inflight)
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._closed = False
+
+    async def __aenter__(self) -> "OllamaClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        timeout_sec: Optional[float] = None,
+        **extra: Any,
+    ) -> Dict[str, Any]:
+        """
+        POST /api/generate without streaming and return the decoded reply
+        (`response` holds the completion text).
+        raises OllamaError, asyncio.TimeoutError or asyncio.CancelledError.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": False, **self._keep_alive(), **extra}
+        if options:
+            payload["options"] = options
+        with span("ollama.generate", model=model, prompt_chars=len(prompt)) as s:
+            async with self._slot():
+                reply = await asyncio.wait_for(
+                    self._post_json("/api/generate", payload),
+                    timeout_sec if timeout_sec is not None else self._timeout
+                )
+            s.set(prompt_tokens=reply.get("prompt_eval_count"), completion_tokens=reply.get("eval_count"))
+            return reply
+
+    async def stream_generate(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        timeout_sec: Optional[float] = None,
+        **extra: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST /api/generate with streaming and yield every NDJSON message as it arrives
+        (`response` holds the next token, the last message has `done: true` and the counts).
+        the timeout covers the whole stream. closing the iterator early (`aclosing`, `break`)
+        drops the connection, which cancels the generation on the server.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True, **self._keep_alive(), **extra}
+        if options:
+            payload["options"] = options
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout_sec if timeout_sec is not None else self._timeout)
+        async with self._slot():
+            async with aclosing(self._request("POST", "/api/generate", payload)) as chunks:
+                buf = b""
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    buf += chunk
+                    *lines, buf = buf.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            yield _decode_message(line)
+                if buf.strip():
+                    yield _decode_message(buf)
+
+    async def close(self) -> None:
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            await _close_writer(writer)
+
+    # ---------------- internals ----------------
+
+    def _keep_alive(self) -> Dict[str, Any]:
+        return {"keep_alive": self.keep_alive} if self.keep_alive is not None else {}
+
+    def _slot(self) -> asyncio.Semaphore:
+        # created lazily so the semaphore belongs to the loop that actually uses the client
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._max_inflight)
+        return self._sem
+
+    async def _post_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async with aclosing(self._request("POST", path, payload)) as chunks:
+            body = b"".join([chunk async for chunk in chunks])
+        try:
+            return json.loads(body)
+        except json.JSONDecodeError as e:
+            raise OllamaError(f"invalid JSON from {path}: {e}") from e
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]]) -> AsyncIterator[bytes]:
+        """
+        send one request and yield the response body as it arrives.
+        the connection goes back to the pool only if the body was read to the end.
+        """
+        if self._closed:
+            raise OllamaError("client is closed")
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = (
+            f"{method} {self._base_path}{path} HTTP/1.1\r\n"
+            f"Host: {self._host}:{self._port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+
+        reader, writer, status, headers = await self._send(head + body)
+        reusable = False
+        try:
+            if status != 200:
+                text = (await _read_body(reader, headers)).decode("utf-8", "replace")
+                reusable = headers.get("connection", "").lower() != "close"
+                raise OllamaError(f"{method} {path} returned HTTP {status}: {text.strip()[:500]}")
+            async for chunk in _iter_body(reader, headers):
+                yield chunk
+            reusable = headers.get("connection", "").lower() != "close" and (
+                "content-length" in headers or "chunked" in headers.get("transfer-encoding", "")
+            )
+        finally:
+            if reusable and not self._closed:
+                self._idle.append((reader, writer))
+            else:
+                await _close_writer(writer)
+
+    async def _send(self, data: bytes):
+        # a pooled connection may have been closed by the server while idle. that shows as the
+        # connection failing before any response byte arrives, and only then is the request sent
+        # again (on the next pooled connection or a fresh one): after that the server may be at work on it
+        retries = 0
+        try:
+            while self._idle:
+                reader, writer = self._idle.pop()
+                if reader.at_eof() or writer.is_closing():
+                    await _close_writer(writer)
+                    continue
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                    status_line = await reader.readuntil(b"\r\n")
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    await _close_writer(writer)
+                    if getattr(e, "partial", b""):
+                        raise OllamaError(f"connection lost in the response status line: {e!r}") from e
+                    retries += 1
+                    continue
+                except BaseException:
+                    await _close_writer(writer)
+                    raise
+                try:
+                    status, headers = await _read_head(reader, status_line)
+                except BaseException:
+                    await _close_writer(writer)
+                    raise
+                return reader, writer, status, headers
+            reader, writer = await asyncio.open_connection(self._host, self._port)
+            try:
+                writer.write(data)
+                await writer.drain()
+                status, headers = await _read_head(reader)
+            except BaseException:
+                await _close_writer(writer)
+                raise
+            return reader, writer, status, headers
+        finally:
+            if retries:
+                annotate(retries=retries)
+
+def _decode_message(line: bytes) -> Dict[str, Any]:
+    try:
+        msg = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise OllamaError(f"invalid NDJSON message in stream: {e}") from e
+    if "error" in msg:
+        raise OllamaError(f"Ollama reported an error mid-stream: {msg['error']}")
+    return msg
+
+async def _read_head(reader: asyncio.StreamReader, status_line: Optional[bytes] = None) -> Tuple[int, Dict[str, str]]:
+    if status_line is None:
+        status_line = await reader.readuntil(b"\r\n")
+    parts = status_line.decode("latin-1").split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise OllamaError(f"bad HTTP status line: {status_line!r}")
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return int(parts[1]), headers
+
+async def _iter_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> AsyncIterator[bytes]:
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # trailers, if any, end with an empty line
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return
+            chunk = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield chunk
+    elif "content-length" in headers:
+        remaining = int(headers["content-length"])
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, 65536))
+            if not chunk:
+                raise OllamaError("connection closed before the response body was complete")
+            remaining -= len(chunk)
+            yield chunk
+    else:
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            yield chunk
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+    return b"".join([chunk async for chunk in _iter_body(reader, headers)])
+
+async def _close_writer(writer: asyncio.StreamWriter) -> None:
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
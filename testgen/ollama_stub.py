@@ -0,0 +1,322 @@
+"""
+deterministic stand-in for the Ollama `/api/generate` endpoint, used by the tests and benchmarks.
+
+    python -m testgen.ollama_stub --port 11434 --latency 0.5 --load 2 --prompt-token-latency 0.001
+"""
+import re
+import json
+import time
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\s*(?:\w+|[^\w\s])")
+_DURATION_RE = re.compile(r"^(-?[\d.]+)(ms|s|m|h)?$")
+_UNIT_SEC = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+
+def nunit_responder(payload: Dict[str, Any]) -> str:
+    """
+    answer every prompt with a small but valid NUnit test class for the class it names;
+    a batched prompt naming several classes gets one marked block per class.
+    """
+    names = re.findall(r"must be named (\w+)Tests", payload.get("prompt", "")) or ["Unknown"]
+    if len(names) == 1:
+        return _test_block(names[0])
+    return "\n\n".join(_test_block(name, marker=f"// === {name}Tests ===\n") for name in names)
+
+def _test_block(name: str, marker: str = "") -> str:
+    return (
+        "```csharp\n"
+        f"{marker}"
+        "using NUnit.Framework;\n\n"
+        "namespace GeneratedTests;\n\n"
+        "[TestFixture]\n"
+        f"public class {name}Tests\n"
+        "{\n"
+        "    [Test]\n"
+        "    public void Placeholder_Passes()\n"
+        "    {\n"
+        "        Assert.Pass();\n"
+        "    }\n"
+        "}\n"
+        "```"
+    )
+
+class OllamaStub:
+    """
+    threaded HTTP/1.1 keep-alive server mimicking `/api/generate`.
+    `latency_sec` is slept per request and `token_latency_sec` per streamed token;
+    `responder(payload)` produces the completion text. counts requests, TCP connections,
+    the peak number of concurrent requests, streamed tokens and streams the client hung up on.
+    like Ollama, the model is loaded on demand (`load_sec`, counted in `loads`) and unloaded once it
+    has been idle for the request's `keep_alive` (default `default_keep_alive_sec`); an empty prompt
+    only loads it, or unloads it with `keep_alive` 0. prompts cost `prompt_token_latency_sec` per
+    token (4 characters) not shared with one of the last `parallel` prompts, whose KV cache is kept.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_sec: float = 0.0,
+        responder: Callable[[Dict[str, Any]], str] = nunit_responder,
+        token_latency_sec: float = 0.0,
+        load_sec: float = 0.0,
+        default_keep_alive_sec: float = 300.0,
+        prompt_token_latency_sec: float = 0.0,
+        parallel: int = 4,
+    ):
+        self.latency_sec = latency_sec
+        self.token_latency_sec = token_latency_sec
+        self.load_sec = load_sec
+        self.default_keep_alive_sec = default_keep_alive_sec
+        self.prompt_token_latency_sec = prompt_token_latency_sec
+        self.parallel = max(1, parallel)
+        self.loads = 0
+        self.prompt_tokens_evaluated = 0
+        self.prompt_tokens_reused = 0
+        self.responder = responder
+        self.tokens_sent = 0
+        self.disconnects = 0
+        self.requests = 0
+        self.connections = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._busy = 0
+        self._expires = 0.0
+        self._slots: List[str] = []  # prompts whose KV cache is still held, oldest first
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OllamaStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def __enter__(self) -> "OllamaStub":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self.inflight -= 1
+
+    def _admit(self, payload: Dict[str, Any]) -> Tuple[float, int]:
+        """
+        load the model unless it is resident, then evaluate the prompt past its cached prefix.
+        returns (seconds spent loading, prompt tokens evaluated).
+        """
+        loaded_for = 0.0
+        if not payload.get("prompt") and _keep_alive_sec(payload.get("keep_alive"), 1) == 0:
+            with self._lock:
+                self._busy += 1  # an unload request does not load the model first
+            return loaded_for, 0
+        with self._load_lock:
+            with self._lock:
+                expired = not self._loaded or (not self._busy and time.monotonic() >= self._expires)
+                if expired:
+                    self._slots.clear()
+            if expired:
+                if self.load_sec:
+                    time.sleep(self.load_sec)
+                loaded_for = self.load_sec
+            with self._lock:
+                if expired:
+                    self.loads += 1
+                self._loaded = True
+                self._busy += 1
+        prompt = payload.get("prompt", "")
+        if not prompt:
+            return loaded_for, 0
+        with self._lock:
+            reused = max((_common_prefix(prompt, p) for p in self._slots), default=0) // 4
+            self._slots = [p for p in self._slots if p != prompt][-(self.parallel - 1):] if self.parallel > 1 else []
+            self._slots.append(prompt)
+            evaluated = len(prompt) // 4 - reused
+            self.prompt_tokens_reused += reused
+            self.prompt_tokens_evaluated += evaluated
+        if self.prompt_token_latency_sec:
+            time.sleep(evaluated * self.prompt_token_latency_sec)
+        return loaded_for, evaluated
+
+    def _release(self, payload: Dict[str, Any]) -> None:
+        keep = _keep_alive_sec(payload.get("keep_alive"), self.default_keep_alive_sec)
+        with self._lock:
+            self._busy -= 1
+            if keep == 0 and not self._busy:
+                self._loaded = False
+                self._slots.clear()
+            self._expires = time.monotonic() + keep
+
+def _keep_alive_sec(value: Any, default: float) -> float:
+    # Ollama takes seconds or a duration string; any negative value keeps the model loaded
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        m = _DURATION_RE.match(str(value).strip())
+        if not m:
+            return default
+        seconds = float(m.group(1)) * _UNIT_SEC[m.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def _make_handler(stub: OllamaStub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with stub._lock:
+                stub.connections += 1
+
+        def log_message(self, fmt, *args):
+            logger.debug(fmt % args)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid JSON"})
+                return
+            if self.path != "/api/generate":
+                self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+                return
+            stub._enter()
+            try:
+                if stub.latency_sec:
+                    time.sleep(stub.latency_sec)
+                loaded_for, evaluated = stub._admit(payload)
+                try:
+                    if not payload.get("prompt"):
+                        # Ollama's way to load (or, with keep_alive 0, unload) a model
+                        unload = _keep_alive_sec(payload.get("keep_alive"), 1) == 0
+                        self._send_json(200, {
+                            "model": payload.get("model", ""), "response": "", "done": True,
+                            "done_reason": "unload" if unload else "load", "load_duration": int(loaded_for * 1e9),
+                        })
+                        return
+                    text = stub.responder(payload)
+                    if payload.get("stream", True):
+                        self._stream(payload, text, loaded_for, evaluated)
+                        return
+                    self._send_json(200, {
+                        "model": payload.get("model", ""),
+                        "response": text,
+                        "done": True,
+                        "load_duration": int(loaded_for * 1e9),
+                        "prompt_eval_count": evaluated,
+                        "eval_count": len(text) // 4,
+                    })
+                finally:
+                    stub._release(payload)
+            finally:
+                stub._leave()
+
+        def _stream(self, payload: Dict[str, Any], text: str, loaded_for: float, evaluated: int) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            tokens = _TOKEN_RE.findall(text)
+            try:
+                for tok in tokens:
+                    if stub.token_latency_sec:
+                        time.sleep(stub.token_latency_sec)
+                    self._chunk({"model": payload.get("model", ""), "response": tok, "done": False})
+                    with stub._lock:
+                        stub.tokens_sent += 1
+                self._chunk({
+                    "model": payload.get("model", ""), "response": "", "done": True, "done_reason": "stop",
+                    "load_duration": int(loaded_for * 1e9), "prompt_eval_count": evaluated,
+                    "eval_count": len(tokens),
+                })
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                with stub._lock:
+                    stub.disconnects += 1
+                self.close_connection = True
+
+        def _chunk(self, obj: Dict[str, Any]) -> None:
+            data = json.dumps(obj).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, obj: Dict[str, Any]) -> None:
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            try:
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                with stub._lock:
+                    stub.disconnects += 1
+                self.close_connection = True
+
+    return Handler
+
+def main():
+    ap = argparse.ArgumentParser(description="Deterministic stub for the Ollama /api/generate endpoint.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds slept per request")
+    ap.add_argument("--token-latency", type=float, default=0.0, help="seconds slept per streamed token")
+    ap.add_argument("--load", type=float, default=0.0, help="seconds to load the model when it is not resident")
+    ap.add_argument("--keep-alive", type=float, default=300.0, help="default seconds an idle model stays loaded")
+    ap.add_argument("--prompt-token-latency", type=float, default=0.0,
+                    help="seconds per prompt token outside a cached prefix")
+    ap.add_argument("--parallel", type=int, default=4, help="prompts whose prefix cache is kept")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    stub = OllamaStub(
+        args.host, args.port, latency_sec=args.latency, token_latency_sec=args.token_latency, load_sec=args.load,
+        default_keep_alive_sec=args.keep_alive, prompt_token_latency_sec=args.prompt_token_latency,
+        parallel=args.parallel,
+    )
+    logger.info(f"Ollama stub listening on {stub.url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import time
+import asyncio
+import logging
+import inspect
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # end-of-stream marker, one per downstream worker
+
+class Stage:
+    """
+    one pipeline stage. `workers` coroutines take items from the stage's bounded input queue,
+    run `fn(item)` and hand the result to the next stage. blocking functions run on a thread
+    pool owned by this stage, coroutine functions are awaited directly.
+    `fn` returns the item to pass on, None to drop it, or an iterable of items if `fan_out`.
+    items for which `skip(item)` is true bypass `fn` (e.g. cache hits skipping generation).
+    a stage that holds items back (batching) returns them from `flush()`, called once its input
+    is exhausted; they are passed on before the next stage sees end-of-stream.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        queue_size: int = 64,
+        fan_out: bool = False,
+        skip: Optional[Callable[[Any], bool]] = None,
+        flush: Optional[Callable[[], Iterable[Any]]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.fan_out = fan_out
+        self.skip = skip
+        self.flush = flush
+        self.is_async = inspect.iscoroutinefunction(fn)
+        # metrics
+        self.items_in = 0
+        self.items_out = 0
+        self.skipped = 0
+        self.errors = 0
+        self.busy_sec = 0.0
+        self.put_wait_sec = 0.0
+        self.max_depth = 0
+        self._depth_sum = 0
+        self._depth_samples = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def record_depth(self, depth: int) -> None:
+        self.max_depth = max(self.max_depth, depth)
+        self._depth_sum += depth
+        self._depth_samples += 1
+
+    @property
+    def mean_depth(self) -> float:
+        return self._depth_sum / self._depth_samples if self._depth_samples else 0.0
+
+    @property
+    def wall_sec(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def utilisation(self) -> float:
+        wall = self.wall_sec
+        return self.busy_sec / (self.workers * wall) if wall > 0 else 0.0
+
+class Pipeline:
+    """
+    runs stages connected by bounded asyncio queues. a full queue blocks the upstream worker,
+    so a slow stage applies backpressure instead of buffering the whole repo, while every
+    stage keeps working on its own pool (extraction of file N+1 overlaps generation of file N).
+    """
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        self.stages = stages
+        self.results: List[Any] = []
+        self.wall_sec = 0.0
+
+    async def run(self, inputs: Iterable[Any]) -> List[Any]:
+        """
+        push `inputs` through every stage and return what the last stage emitted.
+        """
+        queues = [asyncio.Queue(maxsize=s.queue_size) for s in self.stages]
+        pools = [ThreadPoolExecutor(max_workers=s.workers, thread_name_prefix=f"stage-{s.name}")
+                 if not s.is_async else None for s in self.stages]
+        started = time.monotonic()
+        try:
+            tasks = []
+            for idx, stage in enumerate(self.stages):
+                out_q = queues[idx + 1] if idx + 1 < len(queues) else None
+                workers = [asyncio.create_task(self._worker(stage, queues[idx], out_q, pools[idx]))
+                           for _ in range(stage.workers)]
+                tasks.append(workers)
+            await self._feed(self.stages[0], queues[0], inputs)
+            for idx, workers in enumerate(tasks):
+                await asyncio.gather(*workers)
+                stage = self.stages[idx]
+                if stage.flush:
+                    await self._emit(stage, stage.flush(), queues[idx + 1] if idx + 1 < len(queues) else None)
+                stage.finished = time.monotonic()
+                if idx + 1 < len(queues):
+                    for _ in range(self.stages[idx + 1].workers):
+                        await queues[idx + 1].put(_DONE)
+        finally:
+            for pool in pools:
+                if pool:
+                    pool.shutdown(wait=False)
+            self.wall_sec = time.monotonic() - started
+        return self.results
+
+    def report_lines(self) -> List[str]:
+        lines = [f"pipeline wall time {self.wall_sec:.2f}s"]
+        for s in self.stages:
+            lines.append(
+                f"stage {s.name:<9} workers={s.workers:<2} in={s.items_in:<5} out={s.items_out:<5} "
+                f"skipped={s.skipped:<5} errors={s.errors:<3} busy={s.busy_sec:7.2f}s "
+                f"util={s.utilisation:6.1%} queue(max={s.max_depth}, mean={s.mean_depth:.1f}) "
+                f"blocked_on_downstream={s.put_wait_sec:.2f}s"
+            )
+        return lines
+
+    async def _feed(self, stage: Stage, queue: asyncio.Queue, inputs: Iterable[Any]) -> None:
+        for item in inputs:
+            await queue.put(item)
+            stage.record_depth(queue.qsize())
+        for _ in range(stage.workers):
+            await queue.put(_DONE)
+
+    async def _worker(self, stage: Stage, in_q: asyncio.Queue, out_q: Optional[asyncio.Queue],
+                      pool: Optional[ThreadPoolExecutor]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await in_q.get()
+            if item is _DONE:
+                return
+            if stage.started is None:
+                stage.started = time.monotonic()
+            stage.items_in += 1
+            if stage.skip and stage.skip(item):
+                stage.skipped += 1
+                outputs = [item]
+            else:
+                t0 = time.monotonic()
+                try:
+                    with span(f"stage.{stage.name}", item=item):
+                        if stage.is_async:
+                            result = await stage.fn(item)
+                        else:
+                            # the context carries the stage span into the pool thread
+                            result = await loop.run_in_executor(pool, contextvars.copy_context().run, stage.fn, item)
+                except Exception as e:
+                    stage.errors += 1
+                    logger.error(f"Stage {stage.name} failed on {item!r}: {e!r}")
+                    result = None
+                finally:
+                    stage.busy_sec += time.monotonic() - t0
+                if result is None:
+                    continue
+                outputs = list(result) if stage.fan_out else [result]
+            await self._emit(stage, outputs, out_q)
+
+    async def _emit(self, stage: Stage, outputs: Iterable[Any], out_q: Optional[asyncio.Queue]) -> None:
+        next_stage = self.stages[self.stages.index(stage) + 1] if out_q is not None else None
+        for out in outputs:
+            stage.items_out += 1
+            if out_q is None:
+                self.results.append(out)
+                continue
+            t0 = time.monotonic()
+            await out_q.put(out)
+            stage.put_wait_sec += time.monotonic() - t0
+            next_stage.record_depth(out_q.qsize())
@@ -1,37 +1,260 @@
 import os
+import re
+import time
 import shutil
+import hashlib
 import logging
-from git import Repo, GitCommandError, InvalidGitRepositoryError, NoSuchPathError
-from typing import Generator, Tuple
+from git import Git, Repo, GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+from typing import Generator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-def get_repo(local_dir: str, repo_url: str, branch: str = "main") -> Repo:
+# what a sparse checkout keeps: C# sources and what describes the projects
+SPARSE_PATTERNS = (
+    "*.cs", "*.csproj", "*.sln", "*.props", "*.targets", "global.json", "nuget.config", "NuGet.Config", ".editorconfig",
+)
+
+class CloneStrategy:
+    """
+    how `sync_repo` gets a working tree. with `mirror_dir`, every remote is kept there as a bare
+    mirror shared by all runs and repos, and the working tree borrows its objects through
+    `git clone --reference` ("reference") or is a `git worktree` of the mirror ("worktree"), so
+    a run only downloads what is new. `depth` (e.g. 1) and `blobless` (--filter=blob:none) make
+    partial clones; `sparse` checks out only SPARSE_PATTERNS.
+    """
+    __slots__ = ("mirror_dir", "link", "depth", "blobless", "sparse")
+
+    def __init__(self, mirror_dir: Optional[str] = None, link: str = "reference", depth: Optional[int] = None,
+                 blobless: bool = False, sparse: bool = False):
+        if link not in ("reference", "worktree"):
+            raise ValueError(f"unknown clone link {link!r}")
+        self.mirror_dir = mirror_dir
+        self.link = link
+        self.depth = depth
+        self.blobless = blobless
+        self.sparse = sparse
+
+    @property
+    def name(self) -> str:
+        parts = [f"mirror+{self.link}"] if self.mirror_dir else []
+        parts += [f"depth{self.depth}"] * bool(self.depth) + ["blobless"] * self.blobless + ["sparse"] * self.sparse
+        return "+".join(parts) or "full"
+
+class CloneReport:
+    """
+    what one `sync_repo` call cost. `bytes_fetched` is the growth of the object stores involved
+    (mirror and clone), about the pack data received; `checkout_bytes` is the working tree.
+    """
+    __slots__ = ("strategy", "action", "wall_sec", "bytes_fetched", "checkout_bytes")
+
+    def __init__(self, strategy: str, action: str, wall_sec: float, bytes_fetched: int, checkout_bytes: int):
+        self.strategy = strategy
+        self.action = action  # "clone" or "update"
+        self.wall_sec = wall_sec
+        self.bytes_fetched = bytes_fetched
+        self.checkout_bytes = checkout_bytes
+
+    def __repr__(self):
+        return (f"CloneReport({self.strategy} {self.action}: {self.wall_sec:.2f}s, "
+                f"{self.bytes_fetched} bytes fetched, {self.checkout_bytes} bytes checked out)")
+
+def get_repo(local_dir: str, repo_url: str, branch: str = "main", strategy: Optional[CloneStrategy] = None) -> Repo:
     """
     just clone or update a Git repository.
     returns a GitPython Repo object.
     """
+    return sync_repo(local_dir, repo_url, branch, strategy)[0]
+
+def sync_repo(
+    local_dir: str, repo_url: str, branch: str = "main", strategy: Optional[CloneStrategy] = None
+) -> Tuple[Repo, CloneReport]:
+    """
+    clone `repo_url` into `local_dir`, or bring an existing clone up to date, as `strategy` says
+    (default: a plain full clone).
+    """
+    strategy = strategy or CloneStrategy()
+    started = time.monotonic()
+    mirror = mirror_path(strategy.mirror_dir, repo_url) if strategy.mirror_dir else None
+    stores = [p for p in (mirror, os.path.join(local_dir, ".git")) if p]
+    before = sum(_dir_size(p) for p in stores)
     try:
+        if mirror:
+            _sync_mirror(mirror, repo_url, strategy.blobless)
+        repo = None
         if os.path.isdir(local_dir) and os.listdir(local_dir):
             logger.info(f"Opening existing repo in {local_dir}")
             repo = Repo(local_dir)
             if repo.remotes.origin.url != repo_url:
                 logger.warning("Origin URL mismatch; recloning.")
                 shutil.rmtree(local_dir)
-                repo = Repo.clone_from(repo_url, local_dir, branch=branch)
-            else:
-                repo.git.fetch(prune=True)
-                repo.git.checkout(branch)
-                repo.remotes.origin.pull()
+                repo = None
+        if repo is not None:
+            _update(repo, branch, mirror, strategy)
+            action = "update"
         else:
-            logger.info(f"Cloning {repo_url} into {local_dir}")
-            os.makedirs(local_dir, exist_ok=True)
-            repo = Repo.clone_from(repo_url, local_dir, branch=branch)
+            logger.info(f"Cloning {repo_url} into {local_dir} ({strategy.name})")
+            repo = _clone(local_dir, repo_url, branch, mirror, strategy)
+            action = "clone"
         logger.info(f"Repo ready at {local_dir} on branch {branch}")
-        return repo
     except (GitCommandError, InvalidGitRepositoryError, NoSuchPathError) as e:
         logger.error(f"Git error: {e}")
         raise
+    report = CloneReport(
+        strategy.name, action, time.monotonic() - started,
+        max(0, sum(_dir_size(p) for p in stores) - before), _dir_size(local_dir, skip=".git")
+    )
+    logger.info(f"{report.action} took {report.wall_sec:.1f}s, fetched ~{report.bytes_fetched / 1e6:.1f} MB, "
+                f"checked out {report.checkout_bytes / 1e6:.1f} MB ({report.strategy})")
+    return repo, report
+
+def mirror_path(mirror_dir: str, repo_url: str) -> str:
+    """
+    where the bare mirror of a remote lives: readable name plus a hash of the full URL.
+    """
+    name = os.path.basename(repo_url.rstrip("/"))
+    tail = re.sub(r"[^\w.-]+", "_", name[:-4] if name.endswith(".git") else name)
+    digest = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(mirror_dir, f"{tail}-{digest}.git")
+
+def _sync_mirror(path: str, repo_url: str, blobless: bool) -> None:
+    if os.path.isdir(path):
+        logger.info(f"Updating mirror {path}")
+        # plain `git` in the mirror: once a sparse worktree moved core.bare out of its config,
+        # GitPython no longer recognises it as bare
+        Git(path).fetch("--prune", "origin")
+        return
+    logger.info(f"Creating mirror of {repo_url} in {path}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Repo.clone_from(repo_url, path, mirror=True, **({"filter": "blob:none"} if blobless else {}))
+
+def _partial_options(strategy: CloneStrategy) -> dict:
+    options = {}
+    if strategy.depth:
+        options["depth"] = strategy.depth
+    if strategy.blobless:
+        options["filter"] = "blob:none"
+    return options
+
+def _clone(local_dir: str, repo_url: str, branch: str, mirror: Optional[str], strategy: CloneStrategy) -> Repo:
+    os.makedirs(local_dir, exist_ok=True)
+    if mirror and strategy.link == "worktree":
+        mirror_git = Git(mirror)
+        mirror_git.worktree("prune")
+        mirror_git.worktree("add", "--detach", "--no-checkout", os.path.abspath(local_dir), f"refs/heads/{branch}")
+        repo = Repo(local_dir)
+    else:
+        options = _partial_options(strategy)
+        if mirror:
+            options["reference"] = mirror
+        # a local path is otherwise copied as is, ignoring partial clone options and the reference
+        source = _transport_url(repo_url) if mirror or strategy.depth or strategy.blobless else repo_url
+        repo = Repo.clone_from(source, local_dir, branch=branch, no_checkout=True, **options)
+        if source != repo_url:
+            repo.git.remote("set-url", "origin", repo_url)
+    if strategy.sparse:
+        repo.git.sparse_checkout("set", "--no-cone", *SPARSE_PATTERNS)
+    if mirror and strategy.link == "worktree":
+        repo.git.checkout("--detach", "--force", f"refs/heads/{branch}")
+    else:
+        repo.git.checkout(branch)
+    return repo
+
+def _update(repo: Repo, branch: str, mirror: Optional[str], strategy: CloneStrategy) -> None:
+    if strategy.sparse and repo.git.config("--get", "core.sparseCheckout", with_exceptions=False) != "true":
+        repo.git.sparse_checkout("set", "--no-cone", *SPARSE_PATTERNS)
+    if os.path.isfile(os.path.join(repo.working_tree_dir, ".git")) and mirror:
+        # a worktree of the mirror: the mirror's refs are already up to date
+        repo.git.checkout("--detach", "--force", f"refs/heads/{branch}")
+        return
+    source = _transport_url(mirror) if mirror else "origin"
+    options = [f"--depth={strategy.depth}"] if strategy.depth else []
+    repo.git.fetch(*options, "--prune", source, f"+refs/heads/{branch}:refs/remotes/origin/{branch}")
+    repo.git.checkout("--force", "-B", branch, f"origin/{branch}")
+
+def _transport_url(repo_url: str) -> str:
+    if "://" not in repo_url and not re.match(r"^[\w.-]+@[\w.-]+:", repo_url) and os.path.exists(repo_url):
+        return "file://" + os.path.abspath(repo_url)
+    return repo_url
+
+def _dir_size(path: str, skip: Optional[str] = None) -> int:
+    total = 0
+    for root, dirs, files in os.walk(path):
+        if skip:
+            dirs[:] = [d for d in dirs if d != skip]
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+class CsChanges:
+    """
+    .cs files that changed between two commits, as paths relative to the repo root.
+    """
+
+    def __init__(self):
+        self.changed: List[str] = []                 # added, modified or type-changed
+        self.deleted: List[str] = []
+        self.renamed: List[Tuple[str, str]] = []     # (old, new)
+
+    def __repr__(self):
+        return f"CsChanges(changed={len(self.changed)}, deleted={len(self.deleted)}, renamed={len(self.renamed)})"
+
+def diff_cs_files(
+    repo: Repo,
+    old_sha: str,
+    new_sha: str = "HEAD",
+    exclude_dirs: Tuple[str, ...] = ("bin", "obj", ".git")
+) -> Optional[CsChanges]:
+    """
+    classify the .cs files that differ between `old_sha` and `new_sha` (renames detected).
+    returns None if `old_sha` is no longer reachable (e.g. after a force push) so the caller
+    can fall back to a full run.
+    """
+    try:
+        repo.git.cat_file("-e", f"{old_sha}^{{commit}}")
+    except GitCommandError:
+        logger.warning(f"Last processed commit {old_sha} not found; falling back to a full run")
+        return None
+    out = repo.git.diff("--name-status", "-M", "-z", old_sha, new_sha)
+    fields = out.split("\0")
+    changes = CsChanges()
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i]
+        if status[0] in "RC":
+            old, new = fields[i + 1], fields[i + 2]
+            i += 3
+        else:
+            old = new = fields[i + 1]
+            i += 2
+        old_ok = _is_source_path(old, exclude_dirs)
+        new_ok = _is_source_path(new, exclude_dirs)
+        if status[0] == "R" and old_ok and new_ok:
+            changes.renamed.append((old, new))
+        elif status[0] == "D" or (status[0] == "R" and old_ok and not new_ok):
+            if old_ok:
+                changes.deleted.append(old)
+        elif new_ok:
+            changes.changed.append(new)
+    return changes
+
+def recently_changed_files(repo: Repo, commits: int, exclude_dirs: Tuple[str, ...] = ("bin", "obj", ".git")) -> List[str]:
+    """
+    .cs files touched by the last `commits` commits, most recently touched first.
+    """
+    try:
+        out = repo.git.log(f"-n{commits}", "--name-only", "--pretty=format:", "--no-renames")
+    except GitCommandError as e:
+        logger.warning(f"Could not read recent history: {e}")
+        return []
+    paths = [line.strip() for line in out.splitlines() if line.strip()]
+    return [p for p in dict.fromkeys(paths) if _is_source_path(p, exclude_dirs)]
+
+def _is_source_path(rel_path: str, exclude_dirs: Tuple[str, ...]) -> bool:
+    parts = rel_path.split("/")
+    return rel_path.endswith(".cs") and not any(p in exclude_dirs or p.startswith(".") for p in parts[:-1])
 
 def find_cs_files(path: str, exclude_dirs: Tuple[str, ...] = ("bin", "obj", ".git")) -> Generator[str, None, None]:
     """
@@ -0,0 +1,111 @@
+import re
+import heapq
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEC_PER_METHOD = 5.0  # generation seconds per public method (+1 for the class) without history
+CACHED_CLASS_SEC = 0.05       # a class whose tests are cached costs a lookup
+
+# a non-private method declaration: accessibility, modifiers and return type, name, "("
+_METHOD_RE = re.compile(r"^[ \t]*(?:public|internal|protected)\s+(?:[\w<>\[\],.?]+\s+)+?\w+\s*(?:<[^>()]*>)?\s*\(", re.M)
+_TYPE_DECL_RE = re.compile(r"\b(?:class|record|struct|interface|enum|delegate)\b")
+_CLASS_RE = re.compile(r"\b(?:class|record|struct)\s+\w+")
+
+def count_methods(source: str) -> int:
+    """
+    rough number of non-private methods declared in C# source, for files not extracted yet.
+    """
+    return sum(1 for m in _METHOD_RE.finditer(source) if not _TYPE_DECL_RE.search(m.group(0)))
+
+class CostModel:
+    """
+    expected generation seconds of a class: what it took last time (`history`, key -> (seconds,
+    methods)), otherwise its method count times the seconds per method seen over the history.
+    """
+
+    def __init__(self, history: Optional[Dict[str, Tuple[float, int]]] = None):
+        self.history = history or {}
+        seconds = sum(sec for sec, _ in self.history.values())
+        units = sum(methods + 1 for _, methods in self.history.values())
+        self.sec_per_method = seconds / units if units and seconds > 0 else DEFAULT_SEC_PER_METHOD
+        self._by_file: Dict[str, float] = {}
+        for key, (sec, _) in self.history.items():
+            rel = key.split("::", 1)[0]
+            self._by_file[rel] = self._by_file.get(rel, 0.0) + sec
+
+    def class_cost(self, key: str, methods: int) -> Tuple[float, str]:
+        """
+        (seconds, basis) where basis is "history" or "estimate".
+        """
+        if key in self.history:
+            return self.history[key][0], "history"
+        return (methods + 1) * self.sec_per_method, "estimate"
+
+    def file_history(self, rel_path: str) -> Optional[float]:
+        return self._by_file.get(rel_path)
+
+    def source_cost(self, source: str) -> float:
+        # a file nothing is known about: one unit per class and per method
+        return (len(_CLASS_RE.findall(source)) + count_methods(source)) * self.sec_per_method
+
+class ScheduledFile:
+    """
+    one source file with its predicted cost and priority (higher goes first).
+    """
+    __slots__ = ("path", "cost_sec", "priority", "basis")
+
+    def __init__(self, path: str, cost_sec: float, priority: int = 0, basis: str = "estimate"):
+        self.path = path
+        self.cost_sec = cost_sec
+        self.priority = priority
+        self.basis = basis  # "history", "estimate", "cached" or "size"
+
+    def __repr__(self):
+        return f"ScheduledFile({self.path}, {self.cost_sec:.1f}s, p{self.priority})"
+
+def order_longest_first(work: Iterable[ScheduledFile]) -> List[ScheduledFile]:
+    """
+    higher priority first, then longest first within a priority: a long file started last is
+    what keeps one worker busy after the others have run dry.
+    """
+    return sorted(work, key=lambda w: (-w.priority, -w.cost_sec, w.path))
+
+def predict_makespan(costs: Sequence[float], workers: int) -> float:
+    """
+    wall time of handing `costs` out in this order, each to the worker that frees up first.
+    """
+    loads = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heappush(loads, heapq.heappop(loads) + cost)
+    return max(loads)
+
+def estimate_file(
+    path: str, model: CostModel, classes: Optional[List[Tuple[str, int, bool]]] = None, rel_path: Optional[str] = None
+) -> ScheduledFile:
+    """
+    cost of a source file from its classes, (key, methods, cached) when its extraction is known,
+    else from what its classes took last time (by `rel_path`), else from a text scan of its source.
+    """
+    if classes is not None:
+        total, bases = 0.0, set()
+        for key, methods, cached in classes:
+            if cached:
+                total += CACHED_CLASS_SEC
+                bases.add("cached")
+            else:
+                cost, basis = model.class_cost(key, methods)
+                total += cost
+                bases.add(basis)
+        basis = "history" if "history" in bases else "estimate" if "estimate" in bases else "cached"
+        return ScheduledFile(path, total, basis=basis)
+    seconds = model.file_history(rel_path) if rel_path else None
+    if seconds is not None:
+        return ScheduledFile(path, seconds, basis="history")
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            source = f.read()
+    except OSError:
+        return ScheduledFile(path, model.sec_per_method, basis="size")
+    return ScheduledFile(path, model.source_cost(source), basis="size")
@@ -0,0 +1,53 @@
+import threading
+from typing import Dict, List
+
+class RunStats:
+    """
+    thread-safe counters and value samples collected during a run and logged as a summary at the end.
+    counters: `incr("generations.aborted")`; samples: `observe("generation.time_to_abort_sec", 1.2)`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._samples: Dict[str, List[float]] = {}
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self._samples.setdefault(name, []).append(value)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def samples(self, name: str) -> List[float]:
+        with self._lock:
+            return list(self._samples.get(name, []))
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def sample_names(self) -> List[str]:
+        with self._lock:
+            return list(self._samples)
+
+    def summary_lines(self) -> List[str]:
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+        lines = [f"{name}: {_fmt(value)}" for name, value in sorted(counters.items())]
+        for name, values in sorted(samples.items()):
+            n = len(values)
+            lines.append(
+                f"{name}: n={n} mean={_fmt(sum(values) / n)} p50={_fmt(values[n // 2])} "
+                f"p95={_fmt(values[min(n - 1, int(n * 0.95))])} max={_fmt(values[-1])}"
+            )
+        return lines
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.3f}"
@@ -1,7 +1,7 @@
 import os
 import tempfile
 import pytest
-from testgen.cache import init_cache, compute_sha256_hash, get_cached_test, cache_test
+from testgen.cache import init_cache, compute_sha256_hash, get_cached_test, cache_test, lookup_cached_test
 
 @pytest.fixture
 def cache_conn():
@@ -27,3 +27,129 @@ def test_cache_roundtrip(cache_conn):
     cache_test(cache_conn, key, src_hash, model, code)
     retrieved = get_cached_test(cache_conn, key, src_hash, model)
     assert retrieved == code
+
+def test_last_processed_sha_roundtrip(cache_conn):
+    from testgen.cache import get_last_processed_sha, set_last_processed_sha
+    assert get_last_processed_sha(cache_conn, "url", "main") is None
+    set_last_processed_sha(cache_conn, "url", "main", "abc")
+    set_last_processed_sha(cache_conn, "url", "main", "def")
+    assert get_last_processed_sha(cache_conn, "url", "main") == "def"
+
+def test_move_and_delete_file_keys(cache_conn):
+    from testgen.cache import move_cached_file_keys, delete_cached_file_keys
+    cache_test(cache_conn, "src/A.cs::A", "ha", "m", "a")
+    cache_test(cache_conn, "src/A.cs::B", "hb", "m", "b")
+    cache_test(cache_conn, "src/A.cs.bak::A", "hx", "m", "x")
+    assert move_cached_file_keys(cache_conn, "src/A.cs", "lib/A.cs") == 2
+    assert lookup_cached_test(cache_conn, "lib/A.cs::B", "hb", "m") == ("b", False)
+    assert get_cached_test(cache_conn, "src/A.cs.bak::A", "hx", "m") == "x"
+    assert delete_cached_file_keys(cache_conn, "lib/A.cs") == 2
+    assert cache_conn.execute("SELECT COUNT(*) FROM test_cache WHERE key LIKE 'lib/%'").fetchone()[0] == 0
+
+def test_cache_store_concurrent_writers(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from testgen.cache import CacheStore, move_cached_file_keys
+    store = CacheStore(str(tmp_path / "cache.db"))
+    try:
+        with ThreadPoolExecutor(max_workers=16) as exe:
+            list(exe.map(lambda i: cache_test(store, f"src/F{i}.cs::C", f"h{i}", "m", f"code{i}"), range(200)))
+        store.flush()
+        with ThreadPoolExecutor(max_workers=16) as exe:
+            found = list(exe.map(lambda i: get_cached_test(store, f"src/F{i}.cs::C", f"h{i}", "m"), range(200)))
+        assert found == [f"code{i}" for i in range(200)]
+        assert store.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        # writes that return a rowcount wait for their own commit
+        assert move_cached_file_keys(store, "src/F1.cs", "lib/F1.cs") == 1
+    finally:
+        store.close()
+    reopened = init_cache(str(tmp_path / "cache.db"))
+    assert get_cached_test(reopened, "lib/F1.cs::C", "h1", "m") == "code1"
+    reopened.close()
+
+def test_cache_store_closes_connections_of_finished_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from testgen.cache import CacheStore
+    store = CacheStore(str(tmp_path / "cache.db"))
+    try:
+        cache_test(store, "a", "ha", "m", "a")
+        store.flush()
+        for _ in range(20):  # e.g. one pipeline run, with fresh stage pools, per batch of saves in watch mode
+            with ThreadPoolExecutor(max_workers=4) as exe:
+                assert set(exe.map(lambda _: get_cached_test(store, "a", "ha", "m"), range(16))) == {"a"}
+        assert store.open_connections <= 4
+    finally:
+        store.close()
+    assert store.open_connections == 0
+
+def test_cache_store_bad_write_does_not_drop_batch(tmp_path):
+    import sqlite3
+    from testgen.cache import CacheStore
+    store = CacheStore(str(tmp_path / "cache.db"), flush_interval_sec=0.2)
+    try:
+        cache_test(store, "a", "ha", "m", "a")
+        store.execute_write("INSERT INTO no_such_table VALUES (1)")
+        cache_test(store, "b", "hb", "m", "b")
+        with pytest.raises(sqlite3.OperationalError):
+            store.execute_write("INSERT INTO no_such_table VALUES (2)", wait=True)
+        store.flush()
+        assert get_cached_test(store, "a", "ha", "m") == "a"
+        assert get_cached_test(store, "b", "hb", "m") == "b"
+    finally:
+        store.close()
+
+def test_content_addressed_reuse(cache_conn):
+    cache_test(cache_conn, "projA/Foo.cs::Foo", "h", "m", "foo tests", prompt_version="2")
+    # same class in another project / after a move: found by content and indexed under the new path
+    assert lookup_cached_test(cache_conn, "projB/Foo.cs::Foo", "h", "m", "2") == ("foo tests", True)
+    assert lookup_cached_test(cache_conn, "projB/Foo.cs::Foo", "h", "m", "2") == ("foo tests", False)
+    # a new prompt version or model is a different test
+    assert get_cached_test(cache_conn, "projA/Foo.cs::Foo", "h", "m", "3") is None
+    assert get_cached_test(cache_conn, "projA/Foo.cs::Foo", "h", "other", "2") is None
+    assert cache_conn.execute("SELECT COUNT(*) FROM generated_tests").fetchone()[0] == 1
+
+def test_inline_rows_migrate_to_content_table(tmp_path):
+    import sqlite3
+    db = str(tmp_path / "old.db")
+    legacy = sqlite3.connect(db)
+    legacy.execute("""
+        CREATE TABLE test_cache (key TEXT PRIMARY KEY, source_hash TEXT, model_name TEXT,
+                                 generated_code TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)
+    """)
+    legacy.execute("INSERT INTO test_cache (key, source_hash, model_name, generated_code) VALUES ('a::A', 'h', 'm', 'code')")
+    legacy.commit()
+    legacy.close()
+    conn = init_cache(db)
+    assert lookup_cached_test(conn, "a::A", "h", "m") == ("code", False)
+    assert lookup_cached_test(conn, "moved/a::A", "h", "m") == ("code", True)
+    conn.close()
+
+def test_test_results_quarantine_and_eviction(cache_conn):
+    from testgen.cache import (
+        replace_test_results, get_test_class_durations, get_failing_source_keys, get_test_class_sources,
+        quarantine_test_classes, release_quarantine, evict_cached_keys, move_cached_file_keys
+    )
+    cache_test(cache_conn, "src/A.cs::A", "ha", "m", "a")
+    cache_test(cache_conn, "src/A.cs::A.Run", "hr", "m", "run")
+    cache_test(cache_conn, "src/A.cs::AB", "hb", "m", "ab")
+    replace_test_results(cache_conn, ["T.ATests", "T.ABTests"], [
+        ("T.ATests.Ok", "T.ATests", "src/A.cs::A", "Passed", 0.5, None),
+        ("T.ATests.Bad", "T.ATests", "src/A.cs::A", "Failed", 1.5, "boom"),
+        ("T.ABTests.Ok", "T.ABTests", "src/A.cs::AB", "Passed", 0.25, None),
+    ])
+    assert get_test_class_durations(cache_conn) == {"T.ATests": 2.0, "T.ABTests": 0.25}
+    assert get_failing_source_keys(cache_conn) == ["src/A.cs::A"]
+    # a later run replaces everything recorded for the classes it ran
+    replace_test_results(cache_conn, ["T.ABTests"], [])
+    assert "T.ABTests" not in get_test_class_durations(cache_conn)
+
+    move_cached_file_keys(cache_conn, "src/A.cs", "lib/A.cs")
+    assert get_test_class_sources(cache_conn) == {"T.ATests": "lib/A.cs::A"}
+    quarantine_test_classes(cache_conn, [("T.ATests", "lib/A.cs::A", "1 failed")])
+    assert get_failing_source_keys(cache_conn) == []
+    release_quarantine(cache_conn, "lib/A.cs::A")
+    assert get_failing_source_keys(cache_conn) == ["lib/A.cs::A"]
+
+    # the class and its method rows go, its neighbour with a longer name stays
+    assert evict_cached_keys(cache_conn, ["lib/A.cs::A"]) == 2
+    assert lookup_cached_test(cache_conn, "x/A.cs::A", "ha", "m") == (None, False)
+    assert get_cached_test(cache_conn, "lib/A.cs::AB", "hb", "m") == "ab"
@@ -0,0 +1,63 @@
+import sqlite3
+from testgen.cache import init_cache, cache_test, get_cached_test
+from testgen.cache_maint import maintain_cache, evict_to_budget, payload_bytes
+
+def _set_access(conn, key, when):
+    conn.execute("UPDATE test_cache SET last_access=? WHERE key=?", (when, key))
+    conn.execute(
+        "UPDATE generated_tests SET last_access=? WHERE content_key=(SELECT content_key FROM test_cache WHERE key=?)",
+        (when, key)
+    )
+    conn.commit()
+
+def test_eviction_by_age_model_and_unseen(tmp_path):
+    db = str(tmp_path / "cache.db")
+    conn = init_cache(db, allow_threads=False)
+    for key in ("old", "fresh", "gone"):
+        cache_test(conn, key, f"h-{key}", "m", key)
+    cache_test(conn, "other", "h-other", "legacy-model", "x")
+    _set_access(conn, "old", 1.0)
+    _set_access(conn, "gone", 2000000000.0 - 50)
+    _set_access(conn, "fresh", 2000000000.0)
+    _set_access(conn, "other", 2000000000.0)
+    conn.close()
+
+    report = maintain_cache(db, max_age_days=30, keep_models=["m"], seen_since=2000000000.0 - 10)
+    assert report["unseen"] == 2  # "old" and "gone" were not touched by the full run
+    assert report["other_models"] == 1
+    conn = init_cache(db)
+    assert [r[0] for r in conn.execute("SELECT key FROM test_cache")] == ["fresh"]
+    assert report["vacuumed"] == 1
+    conn.close()
+
+def test_budget_evicts_least_recently_used(tmp_path):
+    conn = init_cache(str(tmp_path / "cache.db"), allow_threads=False)
+    for i in range(10):
+        cache_test(conn, f"k{i}", f"h{i}", "m", "x" * 100)
+        _set_access(conn, f"k{i}", float(i))
+    # a test costs 164 bytes (content key and code), so 5 of them fit in 900
+    assert evict_to_budget(conn, 900) == 5
+    assert {r[0] for r in conn.execute("SELECT key FROM test_cache")} == {"k5", "k6", "k7", "k8", "k9"}
+    assert payload_bytes(conn) == 820
+    conn.close()
+
+def test_compression_roundtrip_and_migration(tmp_path):
+    db = str(tmp_path / "cache.db")
+    legacy = sqlite3.connect(db)
+    legacy.execute("""
+        CREATE TABLE test_cache (key TEXT PRIMARY KEY, source_hash TEXT, model_name TEXT,
+                                 generated_code TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)
+    """)
+    legacy.execute("INSERT INTO test_cache (key, source_hash, model_name, generated_code) VALUES ('a', 'h', 'm', ?)",
+                   ("class ATests {}\n" * 50,))
+    legacy.commit()
+    legacy.close()
+
+    report = maintain_cache(db, compression="zlib")
+    assert report["recompressed"] == 1
+    conn = init_cache(db, allow_threads=False)
+    assert conn.execute("SELECT typeof(generated_code) FROM generated_tests").fetchone()[0] == "blob"
+    assert get_cached_test(conn, "a", "h", "m") == "class ATests {}\n" * 50
+    cache_test(conn, "b", "hb", "m", "plain")
+    conn.close()
+    assert maintain_cache(db, compression=None)["recompressed"] == 1
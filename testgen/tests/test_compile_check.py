@@ -0,0 +1,146 @@
+import sys
+import json
+import textwrap
+from testgen.compile_check import (
+    CompileChecker, format_diagnostics, merge_references, project_package_references, project_global_usings,
+    source_project_references
+)
+
+# stands in for `dotnet <extractor> --check-server <manifest>`: code containing "Missing" fails to compile,
+# and sources containing "Unresolved" have declaration errors
+FAKE_CHECK_SERVER = textwrap.dedent("""
+    import os, sys, json
+    manifest = json.load(open(sys.argv[1]))
+    sources = {f: open(f).read() for f in manifest["SourceFiles"]}
+    for line in sys.stdin:
+        req = json.loads(line)
+        for f in req.get("Update") or []:
+            if os.path.isfile(f):
+                sources[f] = open(f).read()
+            else:
+                sources.pop(f, None)
+        source_errors = sum("Unresolved" in text for text in sources.values())
+        diags = [{"Id": "CS0103", "Line": 3, "Column": 9, "Message": "The name 'Missing' does not exist"}] \\
+            if "Missing" in req.get("Code", "") else []
+        print(json.dumps({"Name": req.get("Name", ""), "Ok": True, "Diagnostics": diags,
+                          "SourceErrors": source_errors, "ElapsedMs": len(manifest["SourceFiles"])}), flush=True)
+""")
+
+def test_checker_reports_errors_of_checked_code(tmp_path):
+    src = tmp_path / "Calc.cs"
+    src.write_text("public class Calc {}")
+    work = tmp_path / "check"
+    with CompileChecker("unused.dll", str(work), [str(src)], ["/x/nunit.framework.dll"],
+                        global_usings="global using global::NUnit.Framework;\n",
+                        command=[sys.executable, "-c", FAKE_CHECK_SERVER, str(work / "manifest.json")]) as checker:
+        assert checker.check("public class CalcTests {}", "CalcTests") == []
+        errors = checker.check("public class CalcTests { int x = Missing; }", "CalcTests")
+    assert [e["Id"] for e in errors] == ["CS0103"]
+    assert "CS0103 (line 3)" in format_diagnostics(errors)
+    manifest = json.loads((work / "manifest.json").read_text())
+    assert manifest["References"] == ["/x/nunit.framework.dll"]
+    assert manifest["SourceFiles"][-1].endswith("GlobalUsings.g.cs")
+
+def test_source_errors_are_remembered(tmp_path):
+    src = tmp_path / "Api.cs"
+    src.write_text("public class Api : Unresolved {}")
+    work = tmp_path / "check"
+    with CompileChecker("unused.dll", str(work), [str(src)], [],
+                        command=[sys.executable, "-c", FAKE_CHECK_SERVER, str(work / "manifest.json")]) as checker:
+        assert checker.source_errors == 0
+        checker.check("public class ApiTests { int x = Missing; }", "ApiTests")
+        assert checker.source_errors == 1
+
+def test_update_swaps_edited_sources_in_running_workers(tmp_path):
+    api, dto = tmp_path / "Api.cs", tmp_path / "Dto.cs"
+    api.write_text("public class Api : Unresolved {}")
+    dto.write_text("public class Dto {}")
+    work = tmp_path / "check"
+    command = [sys.executable, "-c", FAKE_CHECK_SERVER, str(work / "manifest.json")]
+    with CompileChecker("unused.dll", str(work), [str(api), str(dto)], [], workers=2, command=command) as checker:
+        checker.check("public class ApiTests {}", "ApiTests")
+        assert checker.source_errors == 1
+        api.write_text("public class Api {}")
+        dto.unlink()
+        (tmp_path / "New.cs").write_text("public class New : Unresolved {}")
+        checker.update([str(api), str(dto), str(tmp_path / "New.cs")])
+        checker.check("public class ApiTests {}", "ApiTests")
+        assert checker.source_errors == 1  # only New.cs now
+        (tmp_path / "New.cs").write_text("public class New {}")
+        checker.update([str(tmp_path / "New.cs")])
+        checker.check("public class ApiTests {}", "ApiTests")
+        assert checker.source_errors == 0
+    manifest = json.loads((work / "manifest.json").read_text())
+    assert manifest["SourceFiles"] == [str(api), str(tmp_path / "New.cs")]
+
+def _assets(proj, packages, libraries, frameworks=None):
+    # a minimal obj/project.assets.json: one target framework, each library with one compile asset
+    (proj / "obj").mkdir(parents=True)
+    (proj / "obj" / "project.assets.json").write_text(json.dumps({
+        "packageFolders": {str(packages) + "/": {}},
+        "libraries": {lib: {"path": path} for lib, (path, _) in libraries.items()},
+        "targets": {"net8.0": {lib: {"compile": {asset: {}}} for lib, (_, asset) in libraries.items()}},
+        "project": {"frameworks": {"net8.0": {"frameworkReferences": frameworks or {}}}},
+    }))
+
+def test_source_project_references(tmp_path, monkeypatch):
+    packages = tmp_path / "packages"
+    ef = packages / "microsoft.entityframeworkcore" / "8.0.0" / "lib" / "net8.0" / "Microsoft.EntityFrameworkCore.dll"
+    ef.parent.mkdir(parents=True)
+    ef.write_text("")
+    dotnet_root = tmp_path / "dotnet"
+    for version in ("6.0.0", "8.0.1", "8.0.10"):
+        pack = dotnet_root / "packs" / "Microsoft.AspNetCore.App.Ref" / version / "ref" / f"net{version[0]}.0"
+        pack.mkdir(parents=True)
+        (pack / "Microsoft.AspNetCore.Mvc.Core.dll").write_text("")
+    monkeypatch.setenv("DOTNET_ROOT", str(dotnet_root))
+
+    repo = tmp_path / "repo"
+    (repo / "src" / "Api").mkdir(parents=True)
+    (repo / "src" / "Api" / "Api.csproj").write_text('<Project Sdk="Microsoft.NET.Sdk.Web" />')
+    _assets(repo / "src" / "Api", packages,
+            {"Microsoft.EntityFrameworkCore/8.0.0": ("microsoft.entityframeworkcore/8.0.0",
+                                                     "lib/net8.0/Microsoft.EntityFrameworkCore.dll")},
+            frameworks={"Microsoft.AspNetCore.App": {}, "Microsoft.NETCore.App": {}})
+    (repo / "tests" / "Api.Tests").mkdir(parents=True)
+    (repo / "tests" / "Api.Tests" / "Api.Tests.csproj").write_text(
+        '<Project><ItemGroup><PackageReference Include="Microsoft.NET.Test.Sdk" /></ItemGroup></Project>'
+    )
+    _assets(repo / "tests" / "Api.Tests", packages, {"Other/1.0.0": ("other/1.0.0", "lib/net8.0/Other.dll")})
+    (repo / "src" / "Unrestored").mkdir()
+    (repo / "src" / "Unrestored" / "Unrestored.csproj").write_text("<Project />")
+
+    references = source_project_references(str(repo))
+    mvc = dotnet_root / "packs" / "Microsoft.AspNetCore.App.Ref" / "8.0.10" / "ref" / "net8.0"
+    mvc = mvc / "Microsoft.AspNetCore.Mvc.Core.dll"
+    assert references == [str(ef), str(mvc)]  # the newest net8.0 pack; test projects are left out
+
+    test_copy = tmp_path / "nunit" / "Microsoft.EntityFrameworkCore.dll"
+    assert merge_references([str(test_copy)], references) == [str(test_copy), str(mvc)]
+
+def test_package_references_and_global_usings(tmp_path):
+    proj = tmp_path / "GeneratedTests"
+    (proj / "obj").mkdir(parents=True)
+    packages = tmp_path / "packages"
+    dll = packages / "nunit" / "4.1.0" / "lib" / "net6.0" / "nunit.framework.dll"
+    dll.parent.mkdir(parents=True)
+    dll.write_text("")
+    (proj / "obj" / "project.assets.json").write_text(json.dumps({
+        "packageFolders": {str(packages) + "/": {}},
+        "libraries": {"NUnit/4.1.0": {"path": "nunit/4.1.0"}, "Moq/4.20.70": {"path": "moq/4.20.70"},
+                      "Microsoft.NET.Test.Sdk/17.9.0": {"path": "microsoft.net.test.sdk/17.9.0"}},
+        "targets": {"net8.0": {
+            "NUnit/4.1.0": {"compile": {"lib/net6.0/nunit.framework.dll": {}}},
+            "Moq/4.20.70": {"compile": {"lib/net6.0/Moq.dll": {}}},  # not restored here: skipped
+            "Microsoft.NET.Test.Sdk/17.9.0": {"compile": {"lib/netcoreapp3.1/_._": {}}},
+        }},
+    }))
+    assert project_package_references(str(proj)) == [str(dll)]
+
+    (proj / "GeneratedTests.csproj").write_text(
+        "<Project><PropertyGroup><ImplicitUsings>enable</ImplicitUsings></PropertyGroup>"
+        '<ItemGroup><Using Include="NUnit.Framework" /></ItemGroup></Project>'
+    )
+    usings = project_global_usings(str(proj))
+    assert "global using global::System.Linq;" in usings
+    assert usings.rstrip().endswith("global using global::NUnit.Framework;")
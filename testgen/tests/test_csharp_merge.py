@@ -0,0 +1,87 @@
+from testgen.cache import init_cache
+from testgen.csharp_merge import split_test_class, merge_test_class, extract_test_methods, TESTS_PLACEHOLDER
+from testgen.method_tests import MethodParts
+
+GENERATED = '''using NUnit.Framework;
+
+namespace GeneratedTests;
+
+[TestFixture]
+public class CalcTests
+{
+    private Calc _calc = null!; // "not a } brace"
+
+    [SetUp]
+    public void SetUp() { _calc = new Calc(); }
+
+    /// <summary>adds</summary>
+    [Test]
+    public void Add_TwoNumbers_ReturnsSum()
+    {
+        var text = $"{1 + 1}}}";
+        Assert.That(_calc.Add(1, 1), Is.EqualTo(2));
+    }
+
+    [TestCase(1, 2)]
+    public void AddRange_Values_Works(int a, int b) => Assert.Pass('}'.ToString());
+
+    [Test]
+    public void Constructor_Creates() { Assert.That(_calc, Is.Not.Null); }
+}
+'''
+
+def test_split_and_merge_roundtrip():
+    skeleton, groups = split_test_class(GENERATED, ["Add", "AddRange", "Sub"], "CalcTests")
+    assert [t.splitlines()[-1] for t in groups["AddRange"]] == [
+        "public void AddRange_Values_Works(int a, int b) => Assert.Pass('}'.ToString());"
+    ]
+    assert groups["Add"][0].startswith("/// <summary>adds</summary>\n[Test]")
+    assert groups["Sub"] == []
+    assert TESTS_PLACEHOLDER in skeleton and "Constructor_Creates" in skeleton and "Add_TwoNumbers" not in skeleton
+    merged = merge_test_class(skeleton, groups["Add"] + groups["AddRange"])
+    assert sorted(extract_test_methods(merged)) == sorted(extract_test_methods(GENERATED))
+    assert merged.count("{") - merged.count("}") == GENERATED.count("{") - GENERATED.count("}")
+
+def _cls(add_body):
+    return {
+        "ClassName": "Calc", "FullSourceCode": "", "ClassSourceCode": f"public class Calc {{ {add_body} public int Sub() => 0; }}",
+        "PublicMethods": [{"Name": "Add", "Signature": "public int Add()", "SourceCode": add_body},
+                          {"Name": "Sub", "Signature": "public int Sub()", "SourceCode": "public int Sub() => 0;"}],
+    }
+
+def test_method_parts_regenerate_only_changed_method(tmp_path):
+    conn = init_cache(str(tmp_path / "cache.db"))
+    parts = MethodParts("src/Calc.cs::Calc", _cls("public int Add() => 1;"), "3")
+    assert parts.probe(conn, "m") == 0 and parts.skeleton is None
+    full = GENERATED.replace("AddRange_Values_Works", "Sub_Values_Works")
+    assert parts.absorb_class(full)
+    parts.store(conn, "m")
+
+    edited = MethodParts("src/Calc.cs::Calc", _cls("public int Add() => 2;"), "3")
+    assert edited.probe(conn, "m") == 1
+    assert edited.missing == ["Add"]
+    focused = GENERATED.replace("Add_TwoNumbers_ReturnsSum", "Add_Edited_ReturnsTwo")
+    assert edited.absorb_method("Add", focused)
+    merged = edited.merged()
+    assert "Add_Edited_ReturnsTwo" in merged and "Sub_Values_Works" in merged and "Add_TwoNumbers" not in merged
+    edited.store(conn, "m")
+
+    again = MethodParts("src/Calc.cs::Calc", _cls("public int Add() => 2;"), "3")
+    assert again.probe(conn, "m") == 2 and again.complete
+    assert again.merged() == merged
+    conn.close()
+
+def test_combine_compilation_units():
+    from testgen.csharp_merge import combine_compilation_units
+    a = "using System;\nusing NUnit.Framework;\n\nnamespace GeneratedTests;\n\npublic class ATests\n{\n}\n"
+    b = "using NUnit.Framework;\nusing Moq;\nnamespace GeneratedTests;\npublic class BTests {}\n"
+    c = "global using Xunit;\nnamespace Other\n{\n    public class CTests {}\n}\n"
+    assert combine_compilation_units([a]) == a
+    assert combine_compilation_units([a, b]) == (
+        "using System;\nusing NUnit.Framework;\nusing Moq;\n\nnamespace GeneratedTests;\n\n"
+        "public class ATests\n{\n}\n\npublic class BTests {}\n"
+    )
+    mixed = combine_compilation_units([a, c])
+    assert mixed.startswith("global using Xunit;\nusing System;")
+    assert "namespace GeneratedTests\n{\n    public class ATests\n    {\n    }\n}" in mixed
+    assert mixed.count("namespace") == 2
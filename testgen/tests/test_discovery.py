@@ -0,0 +1,58 @@
+import os
+import subprocess
+import pytest
+from testgen.discovery import Discovery, glob_to_regex
+
+FILES = {
+    "src/App/Services/OrderService.cs": "namespace App; public class OrderService { public int Count() => 1; }",
+    "src/App/Data/Migrations/20240101_Init.cs": '[DbContext(typeof(TodoDb))]\n[Migration("20240101_Init")]\n'
+                                                "public partial class Init : Migration { }",
+    "src/App/Data/Migrations/TodoDbContextModelSnapshot.cs": "class TodoDbContextModelSnapshot : ModelSnapshot { }",
+    "src/App/Forms/Main.Designer.cs": "partial class Main { }",
+    "src/App/Api.g.cs": "class Api { }",
+    "src/App/Properties/AssemblyInfo.cs": "[assembly: AssemblyTitle(\"App\")]",
+    "src/App/Auto.cs": "// <auto-generated />\npublic class Auto { }",
+    "src/App/Client.cs": "[System.CodeDom.Compiler.GeneratedCode(\"NSwag\", \"14\")]\npublic class Client { }",
+    "src/App/ignored/Secret.cs": "public class Secret { }",
+    "src/App/App.csproj": "<Project Sdk=\"Microsoft.NET.Sdk\" />",
+    "tests/App.Tests/OrderServiceTests.cs": "public class OrderServiceTests { }",
+    "tests/App.Tests/App.Tests.csproj": '<Project><ItemGroup><PackageReference Include="Microsoft.NET.Test.Sdk" />'
+                                        "</ItemGroup></Project>",
+    ".gitignore": "ignored/\n",
+}
+
+@pytest.fixture
+def repo_root(tmp_path):
+    for rel, text in FILES.items():
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return tmp_path
+
+def _discover(root, **options):
+    discovery = Discovery(str(root), **options)
+    files = sorted(os.path.relpath(f, root).replace(os.sep, "/") for f in discovery.discover())
+    return files, {reason: files for reason, (files, _) in discovery.report.skipped.items()}
+
+@pytest.mark.parametrize("use_git", [True, False])
+def test_discovery_skips_generated_files_and_test_projects(repo_root, use_git):
+    if use_git:
+        subprocess.run(["git", "init", "-q", str(repo_root)], check=True)
+    files, skipped = _discover(repo_root, use_git=use_git)
+    assert files == ["src/App/Services/OrderService.cs"]
+    assert skipped == {
+        "gitignored": 1, "EF Core migration": 1, "excluded **/*ModelSnapshot.cs": 1,
+        "excluded **/*.Designer.cs": 1, "excluded **/*.g.cs": 1, "excluded **/AssemblyInfo.cs": 1,
+        "auto-generated header": 1, "[GeneratedCode]": 1, "test project": 1,
+    }
+
+def test_include_and_exclude_globs(repo_root):
+    files, skipped = _discover(repo_root, include=["src/**"], exclude=["**/Services/*.cs"], skip_generated=False,
+                               use_git=False)
+    assert "src/App/Services/OrderService.cs" not in files and "src/App/Auto.cs" in files
+    assert skipped["not included"] == 1  # the test project's file
+
+def test_glob_to_regex():
+    assert glob_to_regex("**/*.g.cs").match("a/b/c.g.cs") and glob_to_regex("**/*.g.cs").match("c.g.cs")
+    assert not glob_to_regex("src/*.cs").match("src/a/b.cs")
+    assert glob_to_regex("src/**").match("src/a/b.cs")
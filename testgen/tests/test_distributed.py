@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import asyncio
+import subprocess
+import urllib.error
+import urllib.request
+import pytest
+from testgen.distributed import Coordinator
+from testgen.ollama_stub import OllamaStub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SETTINGS = {"model": "m", "namespace": "GeneratedTests", "stream": True, "warm": True}
+
+def _cls(name):
+    return {"ClassName": name, "NamespaceName": "Demo", "FullSourceCode": f"public class {name} {{ }}"}
+
+def _spawn_worker(coordinator, stub, name, token=None):
+    return subprocess.Popen(
+        [sys.executable, "run.py", "worker", "--coordinator", coordinator.url, "--ollama-url", stub.url,
+         "--inflight", "2", "--id", name, "--connect-timeout", "10"] + (["--token", token] if token else []),
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def _post(url, payload, headers=None):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST",
+                                     headers={"Content-Type": "application/json", **(headers or {})})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+@pytest.fixture
+def coordinator():
+    c = Coordinator(port=0, settings=SETTINGS, lease_sec=0.5).start()
+    yield c
+    c.stop()
+
+def test_worker_processes_share_the_tasks(coordinator):
+    with OllamaStub(latency_sec=0.05) as stub_a, OllamaStub(latency_sec=0.05) as stub_b:
+        workers = [_spawn_worker(coordinator, stub_a, "a"), _spawn_worker(coordinator, stub_b, "b")]
+        try:
+            async def go():
+                classes = asyncio.gather(*(coordinator.submit("class", cls=_cls(f"C{i}")) for i in range(12)))
+                batch = coordinator.submit("batch", classes=[_cls("Dto1"), _cls("Dto2")])
+                return await asyncio.wait_for(asyncio.gather(classes, batch), 30)
+            codes, batched = asyncio.run(go())
+        finally:
+            coordinator.stop()
+            for w in workers:
+                assert w.wait(timeout=15) == 0  # told the run is over
+    assert all(f"class C{i}Tests" in code for i, code in enumerate(codes))
+    assert "class Dto1Tests" in batched["Dto1"] and "class Dto2Tests" in batched["Dto2"]
+    assert coordinator.workers["a"]["done"] > 0 and coordinator.workers["b"]["done"] > 0
+    assert stub_a.loads == 1 and stub_b.loads == 1  # every worker loads its own model once
+
+def test_expired_lease_goes_to_another_worker(coordinator):
+    async def go():
+        task = asyncio.ensure_future(coordinator.submit("class", cls=_cls("Orders")))
+        # a worker takes the task and dies without renewing its lease
+        lease = await asyncio.to_thread(_post, coordinator.url + "/lease", {"worker": "dead", "wait": 5})
+        assert lease["task"]
+        with OllamaStub() as stub:
+            worker = _spawn_worker(coordinator, stub, "alive")
+            try:
+                return await asyncio.wait_for(task, 30)
+            finally:
+                worker.kill()
+                worker.wait()
+    code = asyncio.run(go())
+    assert "class OrdersTests" in code
+    assert coordinator.workers["dead"]["expired"] == 1 and coordinator.workers["alive"]["done"] == 1
+
+def test_token_is_required():
+    c = Coordinator(port=0, settings=SETTINGS, token="s3cret").start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            _post(c.url + "/lease", {"worker": "w", "wait": 0})
+        assert e.value.code == 403
+        assert _post(c.url + "/lease", {"worker": "w", "wait": 0}, {"X-Testgen-Token": "s3cret"}) == {"task": None}
+        with OllamaStub() as stub:
+            worker = _spawn_worker(c, stub, "w", token="s3cret")
+            try:
+                code = asyncio.run(asyncio.wait_for(c.submit("class", cls=_cls("Orders")), 30))
+            finally:
+                c.stop()
+                assert worker.wait(timeout=15) == 0
+        assert "class OrdersTests" in code
+    finally:
+        c.stop()
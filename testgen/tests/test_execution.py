@@ -0,0 +1,73 @@
+import re
+from testgen.execution import plan_shards, shard_filters, parse_trx, discover_test_classes
+
+SAMPLE_TRX = """<?xml version="1.0" encoding="utf-8"?>
+<TestRun xmlns="http://microsoft.com/schemas/VisualStudio/TeamTest/2010">
+  <Results>
+    <UnitTestResult testId="1" testName="Add_ReturnsSum" outcome="Passed" duration="00:00:00.1250000" />
+    <UnitTestResult testId="2" testName="Divide_ByZero_Throws" outcome="Failed" duration="00:00:01.5000000">
+      <Output><ErrorInfo><Message>  Expected: DivideByZeroException
+  But was: null</Message></ErrorInfo></Output>
+    </UnitTestResult>
+  </Results>
+  <TestDefinitions>
+    <UnitTest id="1" name="Add_ReturnsSum"><TestMethod className="GeneratedTests.CalcTests" name="Add_ReturnsSum" /></UnitTest>
+    <UnitTest id="2" name="Divide_ByZero_Throws"><TestMethod className="GeneratedTests.CalcTests" name="Divide_ByZero_Throws" /></UnitTest>
+  </TestDefinitions>
+</TestRun>
+"""
+
+def test_plan_shards_balances_by_duration():
+    durations = {"A": 8.0, "B": 5.0, "C": 4.0, "D": 3.0}
+    groups = plan_shards(["A", "B", "C", "D", "E"], durations, shards=2)
+    loads = [sum(durations.get(c, 4.0) for c in g) for g in groups]  # E counts as the median, 4s
+    assert sorted(c for g in groups for c in g) == ["A", "B", "C", "D", "E"]
+    assert max(loads) - min(loads) <= 2.0
+    assert plan_shards(["A"], {}, shards=4) == [["A"]]
+
+def test_last_shard_runs_everything_else():
+    filters = shard_filters([["Ns.A"], ["Ns.B", "Ns.C"], ["Ns.D"]], exclude=["Ns.Q"])
+    assert filters[0] == "FullyQualifiedName~Ns.A."
+    assert filters[1] == "FullyQualifiedName~Ns.B.|FullyQualifiedName~Ns.C."
+    assert filters[2] == ("FullyQualifiedName!~Ns.A.&FullyQualifiedName!~Ns.B.&FullyQualifiedName!~Ns.C."
+                          "&FullyQualifiedName!~Ns.Q.")
+    assert shard_filters([["Ns.A"]]) == [None]
+    # only the given classes (watch mode): no catch-all shard
+    assert shard_filters([["Ns.A"], ["Ns.B"]], rest=False) == ["FullyQualifiedName~Ns.A.", "FullyQualifiedName~Ns.B."]
+
+def _selects(test_filter, name):
+    # evaluates the subset of the `--filter` grammar shard_filters emits
+    if test_filter is None:
+        return True
+    expr = re.sub(r"FullyQualifiedName(!?)~([\w.]+)", lambda m: f"({m.group(2)!r} {'not ' * bool(m.group(1))}in n)",
+                  test_filter)
+    return eval(expr.replace("&", " and ").replace("|", " or "), {"n": name})
+
+def test_contains_matches_are_carved_out():
+    # `FooTests.` is contained in `Ns.BarFooTests.Add`
+    classes = ["FooTests", "Ns.BarFooTests", "Ns.Other"]
+    tests = ["FooTests.Add", "Ns.BarFooTests.Add", "Ns.Other.Add", "Ns.Unknown.Add"]
+    for filters in (shard_filters([["FooTests"], ["Ns.BarFooTests"], ["Ns.Other"]]),
+                    shard_filters([["Ns.BarFooTests"], ["FooTests"], ["Ns.Other"]])):
+        assert all(sum(_selects(f, t) for f in filters) == 1 for t in tests)
+    only = shard_filters([["FooTests"]], rest=False, known=classes)
+    assert [t for t in tests if _selects(only[0], t)] == ["FooTests.Add"]
+
+def test_parse_trx(tmp_path):
+    trx = tmp_path / "shard0.trx"
+    trx.write_text(SAMPLE_TRX)
+    passed, failed = parse_trx(str(trx))
+    assert (passed.name, passed.test_class, passed.outcome) == \
+        ("GeneratedTests.CalcTests.Add_ReturnsSum", "GeneratedTests.CalcTests", "Passed")
+    assert passed.duration_sec == 0.125
+    assert failed.outcome == "Failed" and failed.duration_sec == 1.5
+    assert failed.message.startswith("Expected: DivideByZeroException")
+
+def test_discover_test_classes(tmp_path):
+    (tmp_path / "Calc").mkdir()
+    (tmp_path / "Calc" / "CalcTests.cs").write_text(
+        "namespace GeneratedTests.Calc\n{\n    [TestFixture]\n    public class CalcTests { [Test] public void A() {} }\n}\n")
+    (tmp_path / "Helpers.cs").write_text("namespace GeneratedTests;\npublic static class Helpers {}\n")
+    (tmp_path / "obj").mkdir()
+    (tmp_path / "obj" / "Gen.cs").write_text("namespace X { [Test] class Gen {} }")
+    assert discover_test_classes(str(tmp_path)) == ["GeneratedTests.Calc.CalcTests"]
@@ -0,0 +1,249 @@
+import os
+import re
+import sys
+import shutil
+import textwrap
+import threading
+import subprocess
+import pytest
+from testgen.cache import init_cache
+from testgen.compile_check import CompileChecker
+from testgen.extractor import (
+    ExtractorPool, ExtractionCache, ExtractionError, ensure_extractor_tool, extract_classes_info_from_cs_file,
+    extract_project, group_classes_by_file, _roslyn_extractor_cs
+)
+
+requires_dotnet = pytest.mark.skipif(shutil.which("dotnet") is None, reason="needs the .NET SDK")
+
+# stands in for `dotnet <extractor> --server`: one JSON line per path, dies on "crash", dawdles on "slow"
+FAKE_SERVER = textwrap.dedent("""
+    import sys, json, os, time
+    for line in sys.stdin:
+        path = line.strip()
+        if path.endswith("crash.cs"):
+            sys.exit(3)
+        if path.endswith("slow.cs"):
+            time.sleep(0.5)
+        cls = {"ClassName": os.path.basename(path)[:-3], "FilePath": path}
+        print(json.dumps({"Path": path, "Ok": True, "Error": "", "Classes": [cls]}), flush=True)
+""")
+
+def _pool(size=1):
+    return ExtractorPool("unused.dll", size=size, command=[sys.executable, "-c", FAKE_SERVER])
+
+def test_pool_serves_many_files_per_worker(tmp_path):
+    files = []
+    for name in ("A", "B", "C"):
+        f = tmp_path / f"{name}.cs"
+        f.write_text("class X{}")
+        files.append(str(f))
+    with _pool() as pool:
+        names = [pool.extract(f)[0]["ClassName"] for f in files]
+    assert names == ["A", "B", "C"]
+
+def test_pool_respawns_dead_worker(tmp_path):
+    bad = tmp_path / "crash.cs"
+    good = tmp_path / "Good.cs"
+    bad.write_text("")
+    good.write_text("")
+    with _pool() as pool:
+        assert pool.extract(str(bad)) == []
+        assert pool.extract(str(good))[0]["ClassName"] == "Good"
+
+def test_pool_skips_missing_file(tmp_path):
+    with _pool() as pool:
+        assert pool.extract(str(tmp_path / "missing.cs")) == []
+
+def test_broadcast_reaches_every_started_worker(tmp_path):
+    with _pool(size=3) as pool:
+        assert pool.broadcast("None.cs") == []  # no worker started yet
+        slow = threading.Thread(target=pool.request, args=("slow.cs",))
+        slow.start()
+        while not pool._spawned:
+            pass
+        assert pool.request("A.cs")["Classes"][0]["ClassName"] == "A"  # a second worker, the first is busy
+        replies = pool.broadcast("Ping.cs")  # waits for the slow one
+        slow.join()
+        assert [r["Classes"][0]["ClassName"] for r in replies] == ["Ping", "Ping"]
+        assert pool.broadcast("crash.cs") == [None, None]
+        assert len(pool.broadcast("Ping.cs")) == 2  # both were restarted
+
+def _write_script(path):
+    path.write_text(f"#!/bin/sh\nexec {sys.executable} -c '{FAKE_SERVER}'\n")
+    path.chmod(0o755)
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the stand-in server is a shell script")
+def test_pool_survives_a_worker_that_cannot_be_restarted(tmp_path):
+    server = tmp_path / "server.sh"
+    _write_script(server)
+    good = tmp_path / "Good.cs"
+    bad = tmp_path / "crash.cs"
+    good.write_text("")
+    bad.write_text("")
+    with ExtractorPool("unused.dll", size=1, command=[str(server)]) as pool:
+        assert pool.extract(str(good))[0]["ClassName"] == "Good"
+        server.unlink()  # e.g. the extractor dll was deleted
+        assert pool.extract(str(bad)) == []
+        # the slot is still there: every request tries to start a worker in it instead of blocking
+        assert pool.extract(str(good)) == []
+        with pytest.raises(ExtractionError):
+            pool.extract(str(good), strict=True)
+        _write_script(server)
+        assert pool.extract(str(good))[0]["ClassName"] == "Good"
+
+def test_project_responses_keep_failed_files_out(tmp_path):
+    a, b, c = (str(tmp_path / f"{n}.cs") for n in "ABC")
+    by_file = group_classes_by_file([
+        {"Path": a, "Ok": True, "Error": "", "Classes": [{"ClassName": "A", "FilePath": a}]},
+        {"Path": b, "Ok": True, "Error": "", "Classes": []},  # e.g. only interfaces
+        {"Path": c, "Ok": False, "Error": "Error reading file", "Classes": []},
+    ])
+    assert by_file == {a: [{"ClassName": "A", "FilePath": a}], b: []}  # C.cs must not look classless
+
+def test_extraction_cache_skips_unchanged_files(tmp_path):
+    conn = init_cache(str(tmp_path / "c.db"), allow_threads=False)
+    src = tmp_path / "A.cs"
+    src.write_text("public class A {}")
+    calls = []
+
+    def fake_extract(path):
+        calls.append(path)
+        if path.endswith("Broken.cs"):
+            raise ExtractionError("boom")
+        return [{"ClassName": "A", "FilePath": path}]
+
+    extract = ExtractionCache(conn, version="v1").wrap(fake_extract)
+    assert extract(str(src))[0]["ClassName"] == "A"
+    assert extract(str(src))[0]["ClassName"] == "A"
+    assert len(calls) == 1
+
+    # same content under another path (fresh clone, moved file): content-hash hit, path fixed up
+    other = tmp_path / "sub" / "A.cs"
+    other.parent.mkdir()
+    shutil.copy(src, other)
+    assert extract(str(other))[0]["FilePath"] == os.path.abspath(other)
+    assert len(calls) == 1
+
+    src.write_text("public class A { int x; }")
+    extract(str(src))
+    assert len(calls) == 2
+
+    # a different extractor build never sees the old results
+    ExtractionCache(conn, version="v2").wrap(fake_extract)(str(src))
+    assert len(calls) == 3
+
+    # failures propagate and are not cached
+    broken = tmp_path / "Broken.cs"
+    broken.write_text("class")
+    for _ in range(2):
+        with pytest.raises(ExtractionError):
+            extract(str(broken))
+    assert len(calls) == 5
+    conn.close()
+
+# the JSON contract with the C# side: the properties the Python code reads, per C# class
+READ_PROPERTIES = {
+    "ClassInfo": {"FilePath", "ClassName", "NamespaceName", "PublicMethods", "FullSourceCode",
+                  "UsingDirectivesInFile", "IsStatic", "IsAbstract", "Constructors", "Dependencies",
+                  "ClassSourceCode", "ReferencedTypes"},
+    "TypeSignature": {"Name", "Kind", "Signature"},
+    "MethodInfo": {"Name", "ReturnType", "Parameters", "Signature", "IsStatic", "IsAbstract", "IsAsync", "SourceCode"},
+    "ConstructorInfo": {"Signature", "Parameters"},
+    "ServerResponse": {"Path", "Ok", "Error", "Classes"},
+    "CheckManifest": {"SourceFiles", "References"},
+    "CheckRequest": {"Name", "Code", "Update"},
+    "CheckDiagnostic": {"Id", "Line", "Column", "Message"},
+    "CheckResponse": {"Name", "Ok", "Error", "Diagnostics", "SourceErrors", "ElapsedMs"},
+}
+
+def test_csharp_records_have_the_properties_python_reads():
+    source = _roslyn_extractor_cs()
+    declared = {
+        name: set(re.findall(r"public [\w<>?]+ (\w+) \{ get; set; \}", body))
+        for name, body in re.findall(r"^public class (\w+)\s*\{(.*?)^\}", source, re.M | re.S)
+    }
+    for name, properties in READ_PROPERTIES.items():
+        assert properties <= declared.get(name, set()), f"{name} lacks {properties - declared.get(name, set())}"
+    # serialized under their C# names: a naming policy would break every key above
+    assert "PropertyNamingPolicy" not in source
+
+# ---------------- the real tool, built once per module ----------------
+
+SHOP_SOURCES = {
+    "IRepo.cs": "namespace Shop;\npublic interface IRepo { int Count(); }\n",
+    "Calculator.cs": textwrap.dedent("""
+        namespace Shop;
+        public class Calculator
+        {
+            // braces in comments and strings: { "}"
+            public int Add(int a, int b) => a + b;
+        }
+    """),
+    "OrderService.cs": textwrap.dedent("""
+        using System.Threading.Tasks;
+        namespace Shop;
+        public class OrderService
+        {
+            private readonly IRepo _repo;
+            public OrderService(IRepo repo) { _repo = repo; }
+            public async Task<int> CountAsync() { await Task.Yield(); return _repo.Count(); }
+        }
+    """),
+}
+
+@pytest.fixture(scope="module")
+def extractor_dll(tmp_path_factory):
+    try:
+        dll, _ = ensure_extractor_tool(str(tmp_path_factory.mktemp("tools")))
+    except subprocess.CalledProcessError as e:
+        if "package" in e.cmd:
+            pytest.skip("cannot add the Roslyn package (no NuGet feed)")
+        raise  # the embedded C# does not build
+    return dll
+
+@pytest.fixture
+def shop(tmp_path):
+    for name, text in SHOP_SOURCES.items():
+        (tmp_path / name).write_text(text)
+    return tmp_path
+
+@requires_dotnet
+def test_single_file_and_server_modes_agree(extractor_dll, shop):
+    path = str(shop / "Calculator.cs")
+    [cls] = extract_classes_info_from_cs_file(path, extractor_dll, strict=True)
+    assert (cls["NamespaceName"], cls["ClassName"]) == ("Shop", "Calculator")
+    assert [m["Name"] for m in cls["PublicMethods"]] == ["Add"]
+    with ExtractorPool(extractor_dll, size=1) as pool:
+        assert pool.extract(path, strict=True) == [cls]
+        assert pool.request(str(shop / "Missing.cs"))["Ok"] is False
+
+@requires_dotnet
+def test_project_mode_resolves_types_across_files(extractor_dll, shop):
+    missing = str(shop / "Missing.cs")
+    responses = list(extract_project(extractor_dll, cs_files=sorted(map(str, shop.iterdir())) + [missing]))
+    assert {r["Path"]: r["Ok"] for r in responses} == {**{str(f): True for f in shop.iterdir()}, missing: False}
+    by_file = group_classes_by_file(responses)
+    assert by_file[str(shop / "IRepo.cs")] == [] and missing not in by_file
+    classes = {c["ClassName"]: c for file_classes in by_file.values() for c in file_classes}
+    assert {"Calculator", "OrderService"} <= set(classes)
+    service = classes["OrderService"]
+    assert any("IRepo" in d for d in service["Dependencies"])
+    assert any(t["Name"].endswith("IRepo") for t in service["ReferencedTypes"])
+    assert [m["IsAsync"] for m in service["PublicMethods"]] == [True]
+
+@requires_dotnet
+def test_check_server_reports_errors_and_takes_updates(extractor_dll, shop, tmp_path_factory):
+    work = tmp_path_factory.mktemp("check")
+    sources = [str(shop / name) for name in SHOP_SOURCES]
+    with CompileChecker(extractor_dll, str(work), sources, []) as checker:
+        ok = "namespace Shop.Tests; public class CalculatorTests { int X() => new Shop.Calculator().Add(1, 2); }"
+        assert checker.check(ok, "CalculatorTests") == []
+        assert checker.source_errors == 0
+        uses_sub = ok.replace("Add(1, 2)", "Sub(1, 2)")
+        [error] = checker.check(uses_sub, "CalculatorTests")
+        assert error["Id"] == "CS1061" and error["Line"] == 1 and error["Column"] > 1
+        (shop / "Calculator.cs").write_text(
+            "namespace Shop; public class Calculator { public int Sub(int a, int b) => a - b; }"
+        )
+        checker.update([str(shop / "Calculator.cs")])
+        assert checker.check(uses_sub, "CalculatorTests") == []
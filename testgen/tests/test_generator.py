@@ -0,0 +1,140 @@
+import asyncio
+import time
+from testgen.generator import StreamValidator, STREAM_COMPLETE, astream_nunit_test_class, _clean_and_validate
+from testgen.ollama_client import OllamaClient
+from testgen.ollama_stub import OllamaStub, nunit_responder, _TOKEN_RE
+from testgen.stats import RunStats
+
+CLS = {"ClassName": "Calculator", "NamespaceName": "Demo", "FullSourceCode": "public class Calculator {}"}
+
+def _feed_all(validator, text):
+    for tok in _TOKEN_RE.findall(text):
+        verdict = validator.feed(tok)
+        if verdict:
+            return verdict
+    return None
+
+def test_validator_completes_on_closed_block():
+    text = nunit_responder({"prompt": "must be named CalculatorTests"}) + "\nThis test class covers..." * 50
+    v = StreamValidator("Calculator")
+    assert _feed_all(v, text) == STREAM_COMPLETE
+    assert "covers" not in v.text
+
+def test_validator_rejects_wrong_class_name():
+    text = "```csharp\nusing NUnit.Framework;\n[TestFixture]\npublic class CalcTests\n{\n"
+    assert _feed_all(StreamValidator("Calculator"), text) == "wrong test class name"
+
+def test_validator_rejects_prose_and_runaway():
+    assert _feed_all(StreamValidator("Calculator"), "Sure! Let me explain testing. " * 40) == "prose-only output"
+    code = "public class CalculatorTests {\n" + "    // filler line\n" * 100
+    assert _feed_all(StreamValidator("Calculator", max_chars=500), code) == "runaway length"
+
+def test_validator_rejects_unbalanced_block():
+    text = "```csharp\n[TestFixture]\npublic class CalculatorTests\n{\n    [Test]\n    public void A() {\n```\n"
+    assert _feed_all(StreamValidator("Calculator"), text) == "fence/brace imbalance"
+
+def test_validator_ignores_braces_in_literals_and_comments():
+    body = ("public class CalculatorTests\n{\n    // closes with }\n    /* { */\n"
+            "    [Test]\n    public void A() { Assert.That(\"{\" + @\"\"\"}\" + $\"{1}}}\", Is.Not.Empty); "
+            "Assert.That('{', Is.EqualTo('{')); }\n}\n")
+    fenced = StreamValidator("Calculator")
+    assert _feed_all(fenced, "Here's the class:\n```csharp\n" + body + "```\nIt covers A.") == STREAM_COMPLETE
+    assert fenced.text.endswith("```")
+    # unfenced: complete exactly when the class's own closing brace arrives
+    unfenced = StreamValidator("Calculator")
+    verdicts = [unfenced.feed(c) for c in body]
+    assert verdicts.index(STREAM_COMPLETE) == len(body.rstrip()) - 1
+
+def test_clean_keeps_only_test_block():
+    text = "Here you go:\n" + nunit_responder({"prompt": "must be named CalculatorTests"}) + "\nEnjoy!"
+    code = _clean_and_validate(text, "Calculator")
+    assert code.startswith("using NUnit.Framework;")
+    assert code.rstrip().endswith("}")
+
+def test_stream_aborts_early_and_cancels_request():
+    bad = "Certainly! Testing is important because " + "it matters a lot, " * 300
+    stats = RunStats()
+    with OllamaStub(responder=lambda p: bad, token_latency_sec=0.001) as stub:
+        async def go():
+            async with OllamaClient(stub.url) as client:
+                return await astream_nunit_test_class(CLS, "m", "GeneratedTests", client, stats=stats)
+        assert asyncio.run(go()) is None
+        deadline = time.time() + 2
+        while stub.disconnects == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert stub.disconnects == 1
+        assert stub.tokens_sent < len(_TOKEN_RE.findall(bad))
+    assert stats.counter("generation.aborted") == 1
+    assert stats.counter("generation.tokens_saved") > 0
+    assert len(stats.samples("generation.time_to_abort_sec")) == 1
+
+def test_stream_returns_valid_code():
+    with OllamaStub() as stub:
+        async def go():
+            async with OllamaClient(stub.url) as client:
+                return await astream_nunit_test_class(CLS, "m", "GeneratedTests", client)
+        code = asyncio.run(go())
+    assert "public class CalculatorTests" in code
+
+def test_prompt_uses_class_span_and_drops_context_over_budget():
+    from testgen.generator import _build_prompt, estimate_tokens
+    other = "public class Other { " + "int x; " * 500 + "}"
+    cls = {
+        "ClassName": "Calculator", "NamespaceName": "Demo",
+        "FullSourceCode": "public class Calculator { public int Add(int a, int b) => a + b; }\n" + other,
+        "ClassSourceCode": "public class Calculator { public int Add(int a, int b) => a + b; }",
+        "UsingDirectivesInFile": ["using System;"],
+        "ReferencedTypes": [
+            {"Name": "global::Demo.IClock", "Signature": "interface IClock {\n    DateTime Now { get; }\n}"},
+            {"Name": "global::Demo.Big", "Signature": "class Big {" + " void M();" * 400 + " }"},
+        ],
+    }
+    stats = RunStats()
+    prompt = _build_prompt(cls, "GeneratedTests", None, token_budget=300, stats=stats)
+    assert "Other" not in prompt and "interface IClock" in prompt and "class Big" not in prompt
+    assert "must be named CalculatorTests" in prompt
+    assert estimate_tokens(prompt) <= 300
+    assert stats.counter("prompt.dropped[referenced type]") == 1
+    assert stats.samples("prompt.tokens")[0] < stats.samples("prompt.tokens_full_file")[0]
+
+def test_prompt_outlines_class_larger_than_budget():
+    from testgen.generator import _build_prompt
+    cls = {
+        "ClassName": "Huge", "NamespaceName": "Demo",
+        "FullSourceCode": "public class Huge { " + "void F() { int y = 1; } " * 500 + "}",
+        "PublicMethods": [{"Signature": "public int Get(int id)"}],
+        "Constructors": [{"Signature": "public Huge(IRepo repo)"}],
+    }
+    stats = RunStats()
+    prompt = _build_prompt(cls, "GeneratedTests", None, token_budget=200, stats=stats)
+    assert "public int Get(int id);" in prompt and "int y = 1" not in prompt
+    assert stats.counter("prompt.outlined") == 1
+
+def _small(name):
+    return {"ClassName": name, "NamespaceName": "Demo", "FullSourceCode": f"public record {name}(int Id);"}
+
+def test_split_batch_completion_validates_each_class():
+    from testgen.generator import split_batch_completion
+    good = nunit_responder({"prompt": "must be named ATests must be named BTests"})
+    broken = good.replace("public class BTests\n{", "public class BTests\n{{")
+    codes = split_batch_completion(broken, ["A", "B", "C"])
+    assert codes["A"].startswith("using NUnit.Framework;") and "```" not in codes["A"] and "BTests" not in codes["A"]
+    assert codes["B"] is None and codes["C"] is None
+
+def test_batch_request_generates_several_classes_in_one_call():
+    from testgen.generator import agenerate_nunit_test_batch
+    with OllamaStub() as stub:
+        async def go():
+            async with OllamaClient(stub.url) as client:
+                return await agenerate_nunit_test_batch([_small("A"), _small("B")], "m", "GeneratedTests", client)
+        codes = asyncio.run(go())
+        assert stub.requests == 1
+    assert "public class ATests" in codes["A"] and "public class BTests" in codes["B"]
+
+def test_repair_prompt_quotes_errors_and_failing_code():
+    from testgen.generator import _build_repair_prompt
+    errors = [{"Id": "CS0103", "Line": 7, "Column": 5, "Message": "The name 'calc' does not exist"}]
+    prompt = _build_repair_prompt(CLS, "GeneratedTests", "public class CalculatorTests { }", errors)
+    assert "CS0103 (line 7): The name 'calc' does not exist" in prompt
+    assert "public class CalculatorTests { }" in prompt and "public class Calculator {}" in prompt
+    assert "named CalculatorTests in namespace GeneratedTests" in prompt
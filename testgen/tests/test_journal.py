@@ -0,0 +1,77 @@
+import os
+import tempfile
+import pytest
+from testgen.cache import init_cache, get_run_file_states, set_run_status
+from testgen.journal import RunJournal, describe_runs
+
+@pytest.fixture
+def cache_conn():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    conn = init_cache(path, allow_threads=False)
+    yield conn
+    conn.close()
+    os.remove(path)
+
+def _open(conn, sha="abc", settings="s1"):
+    return RunJournal.open(conn, "url", "main", sha, settings, "/tmp/clone", max_attempts=2)
+
+def test_interrupted_run_resumes_where_it_stopped(cache_conn):
+    journal = _open(cache_conn)
+    assert journal.wants_file("A.cs") and journal.wants_file("B.cs")
+    journal.begin_file("A.cs")
+    journal.begin_file("B.cs")
+    journal.class_seen("A.cs::A")
+    journal.class_done("A.cs::A")
+    journal.file_written("A.cs")
+    journal.class_seen("B.cs::B")
+    journal.class_failed("B.cs::B", "does not compile")
+    # the process dies here: the run stays `running`
+
+    resumed = _open(cache_conn)
+    assert resumed.resumed and resumed.run_id == journal.run_id
+    assert not resumed.wants_file("A.cs")
+    assert resumed.wants_file("B.cs")
+    resumed.begin_file("B.cs")
+    assert resumed.is_done("A.cs::A") and not resumed.gave_up("B.cs::B")
+    resumed.class_failed("B.cs::B", "does not compile")
+    assert resumed.gave_up("B.cs::B")
+    assert not resumed.wants_file("B.cs")  # out of attempts
+    resumed.finish("incomplete")
+
+    (info,) = describe_runs(cache_conn, "url", "main")
+    assert info["status"] == "incomplete" and info["resumes"] == 1
+    assert info["files"] == {"written": 1, "gave_up": 1}
+    assert info["items"] == {"done": 1, "gave_up": 1}
+
+def test_new_commit_or_settings_start_a_new_run(cache_conn):
+    first = _open(cache_conn)
+    second = _open(cache_conn, sha="def")
+    assert not second.resumed and second.run_id != first.run_id
+    assert second.wants_file("A.cs")
+    second.finish("completed")
+    third = _open(cache_conn, sha="def")
+    assert not third.resumed  # a completed run is not resumed
+    statuses = {r["run_id"]: r["status"] for r in describe_runs(cache_conn, "url", "main", limit=10)}
+    assert statuses[first.run_id] == "abandoned"
+    assert statuses[second.run_id] == "completed"
+
+def test_reopened_files_are_processed_again(cache_conn):
+    journal = _open(cache_conn)
+    journal.wants_file("A.cs")
+    journal.begin_file("A.cs")
+    journal.file_written("A.cs")
+    journal.reopen_files(["A.cs"])
+    set_run_status(cache_conn, journal.run_id, "incomplete")
+    assert _open(cache_conn).wants_file("A.cs")
+
+def test_files_never_started_keep_their_attempts(cache_conn):
+    files = ["A.cs", "B.cs", "C.cs"]
+    for _ in range(2):  # two runs die while A.cs is extracted and the other files wait behind it
+        journal = _open(cache_conn)
+        assert all(journal.wants_file(f) for f in files)
+        journal.begin_file("A.cs")
+    resumed = _open(cache_conn)
+    assert [resumed.wants_file(f) for f in files] == [False, True, True]  # only A.cs is out of attempts
+    attempts = {rel: n for rel, (_, n) in get_run_file_states(cache_conn, resumed.run_id).items()}
+    assert attempts == {"A.cs": 2, "B.cs": 0, "C.cs": 0}
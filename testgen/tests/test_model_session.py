@@ -0,0 +1,53 @@
+import asyncio
+import time
+from testgen.generator import PROMPT_PREFIX, _build_prompt, build_batch_prompt, _build_repair_prompt
+from testgen.model_session import ModelSession
+from testgen.ollama_client import OllamaClient
+from testgen.ollama_stub import OllamaStub
+from testgen.stats import RunStats
+
+def _cls(name):
+    return {"ClassName": name, "NamespaceName": "Demo", "FullSourceCode": f"public class {name} {{ }}"}
+
+def test_every_prompt_starts_with_the_shared_prefix():
+    prompts = [
+        _build_prompt(_cls("Orders"), "GeneratedTests", None),
+        _build_prompt(_cls("Invoices"), "GeneratedTests", None, focus_method="Get"),
+        _build_repair_prompt(_cls("Carts"), "GeneratedTests", "public class CartsTests { }", []),
+        build_batch_prompt([_cls("Users"), _cls("Roles")], "GeneratedTests"),
+    ]
+    assert all(p.startswith(PROMPT_PREFIX) for p in prompts)
+    assert "GeneratedTests" not in PROMPT_PREFIX
+    few_shot = _build_prompt(_cls("A"), "GeneratedTests", "[TestFixture] public class SampleTests { }")
+    assert few_shot.startswith(PROMPT_PREFIX + "\n[TestFixture] public class SampleTests { }")
+
+def test_session_preloads_pins_and_warms_the_model():
+    stats = RunStats()
+    with OllamaStub(load_sec=0.2, default_keep_alive_sec=0.1) as stub:
+        async def go():
+            async with OllamaClient(stub.url, keep_alive=-1) as client:
+                session = ModelSession(client, "m", warm_requests=2, stats=stats)
+                assert await session.ready()
+                warmed = stub.prompt_tokens_evaluated
+                await asyncio.sleep(0.2)  # longer than the stub's own keep-alive
+                started = time.monotonic()
+                await client.generate("m", _build_prompt(_cls("A"), "GeneratedTests", None))
+                first = time.monotonic() - started
+                await session.close()
+                return warmed, first
+        warmed, first = asyncio.run(go())
+        assert stub.loads == 1 and first < 0.2  # still resident: no second load
+        assert warmed == len(PROMPT_PREFIX) // 4
+        assert stub.prompt_tokens_reused >= len(PROMPT_PREFIX) // 4
+        assert stub.requests == 1 + 2 + 1 + 1  # load, warm-up, the class, release
+    assert stats.samples("model.load_sec")[0] >= 0.2
+
+def test_idle_model_is_unloaded_without_keep_alive():
+    with OllamaStub(load_sec=0.05, default_keep_alive_sec=0.05) as stub:
+        async def go():
+            async with OllamaClient(stub.url) as client:
+                await client.generate("m", "p")
+                await asyncio.sleep(0.1)
+                await client.generate("m", "p")
+        asyncio.run(go())
+        assert stub.loads == 2
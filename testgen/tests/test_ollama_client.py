@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from testgen.ollama_client import OllamaClient, OllamaError
+from testgen.ollama_stub import OllamaStub
+from testgen.generator import agenerate_nunit_test_class
+from testgen.tracing import Tracer, set_tracer
+
+@pytest.fixture
+def stub():
+    with OllamaStub(latency_sec=0.05) as s:
+        yield s
+
+def test_generate_roundtrip(stub):
+    async def go():
+        async with OllamaClient(stub.url) as client:
+            return await client.generate("m", "Your test class must be named FooTests")
+    reply = asyncio.run(go())
+    assert "class FooTests" in reply["response"]
+    assert reply["done"] is True
+
+def test_inflight_limit_and_connection_reuse(stub):
+    async def go():
+        async with OllamaClient(stub.url, max_inflight=3) as client:
+            await asyncio.gather(*(client.generate("m", f"p{i}") for i in range(12)))
+    asyncio.run(go())
+    assert stub.requests == 12
+    assert stub.max_inflight <= 3
+    # keep-alive: connections are pooled, not opened per request
+    assert stub.connections <= 3
+
+def test_timeout_raises(stub):
+    stub.latency_sec = 0.5
+    async def go():
+        async with OllamaClient(stub.url) as client:
+            await client.generate("m", "p", timeout_sec=0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(go())
+
+def test_http_error_raises(stub):
+    async def go():
+        async with OllamaClient(stub.url + "/nope") as client:
+            await client.generate("m", "p")
+    with pytest.raises(OllamaError):
+        asyncio.run(go())
+
+def test_agenerate_validates_output(stub):
+    cls = {"ClassName": "Calculator", "NamespaceName": "Demo", "FullSourceCode": "public class Calculator {}"}
+    async def go():
+        async with OllamaClient(stub.url) as client:
+            return await agenerate_nunit_test_class(cls, "m", "GeneratedTests", client)
+    code = asyncio.run(go())
+    assert code.startswith("using NUnit.Framework;")
+    assert "class CalculatorTests" in code
+
+class _ScriptedServer:
+    """
+    raw HTTP server answering the n-th request with `script[n]`: "ok", "drop" (close without a
+    byte, like an idle keep-alive timeout), "partial" (half a status line, then close),
+    "garbage" (a bad status line) or "hang".
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+        self.connections = 0
+        self.closed = 0  # connections the client closed
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+                await reader.readexactly(length)
+                action = self.script[self.requests]
+                self.requests += 1
+                if action == "ok":
+                    body = b'{"response": "ok", "done": true}'
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+                elif action == "garbage":
+                    writer.write(b"SPAM\r\n")
+                elif action == "partial":
+                    writer.write(b"HTTP/1.1 2")
+                if action in ("drop", "partial"):
+                    writer.close()
+                    return
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed += 1
+            writer.close()
+
+async def _pooled(server, *actions):
+    # one request to pool a connection, then the given ones on it
+    async with OllamaClient(server.url) as client:
+        await client.generate("m", "warm")
+        results = []
+        for action in actions:
+            try:
+                results.append((await client.generate("m", action, timeout_sec=0.3))["response"])
+            except (OllamaError, asyncio.TimeoutError) as e:
+                results.append(type(e).__name__)
+            await asyncio.sleep(0.05)
+        return results, len(client._idle)
+
+def test_stale_pooled_connection_is_retried_and_recorded():
+    tracer = Tracer()
+    previous = set_tracer(tracer)
+    async def go():
+        async with _ScriptedServer(["ok", "ok", "drop", "ok"]) as server:
+            async with OllamaClient(server.url) as client:
+                await asyncio.gather(client.generate("m", "a"), client.generate("m", "b"))  # two pooled connections
+                reply = await client.generate("m", "again")
+                return reply["response"], server.requests, server.connections
+    try:
+        reply, requests, connections = asyncio.run(go())
+    finally:
+        set_tracer(previous)
+    # the dropped request went out again on the other pooled connection
+    assert (reply, requests, connections) == ("ok", 4, 2)
+    assert [s.attrs.get("retries") for s in tracer.spans if s.name == "ollama.generate"] == [None, None, 1]
+
+def test_pooled_connection_is_not_resent_after_response_bytes():
+    async def go():
+        async with _ScriptedServer(["ok", "partial", "ok"]) as server:
+            return await _pooled(server, "once"), server.requests
+    (results, _), requests = asyncio.run(go())
+    assert results == ["OllamaError"] and requests == 2
+
+@pytest.mark.parametrize("action, error", [("garbage", "OllamaError"), ("hang", "TimeoutError")])
+def test_failed_pooled_connection_is_closed(action, error):
+    async def go():
+        async with _ScriptedServer(["ok", action]) as server:
+            results = await _pooled(server, action)
+            return results, server.closed
+    (results, idle), closed = asyncio.run(go())
+    assert results == [error] and idle == 0 and closed == 1
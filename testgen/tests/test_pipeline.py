@@ -0,0 +1,66 @@
+import asyncio
+import time
+from testgen.pipeline import Pipeline, Stage
+
+def test_pipeline_fan_out_skip_and_errors():
+    def split(n):
+        return list(range(n))
+
+    def square(x):
+        if x == 3:
+            raise ValueError("boom")
+        return x * x
+
+    async def plus_one(x):
+        return x + 1
+
+    p = Pipeline([
+        Stage("split", split, fan_out=True),
+        Stage("square", square, workers=3, queue_size=2),
+        Stage("plus", plus_one, workers=2, skip=lambda x: x == 0),
+    ])
+    results = asyncio.run(p.run([5]))
+    # 3 failed and was dropped, 0 skipped the last stage
+    assert sorted(results) == [0, 2, 5, 17]
+    square_stage, plus_stage = p.stages[1], p.stages[2]
+    assert square_stage.errors == 1
+    assert plus_stage.skipped == 1
+    assert square_stage.max_depth <= 2
+
+def test_stages_overlap():
+    def slow(x):
+        time.sleep(0.05)
+        return x
+
+    async def slow_async(x):
+        await asyncio.sleep(0.05)
+        return x
+
+    p = Pipeline([Stage("a", slow, workers=1), Stage("b", slow_async, workers=1)])
+    start = time.monotonic()
+    asyncio.run(p.run(range(6)))
+    # sequential would take 12 * 0.05s; overlapping stages take about 7 * 0.05s
+    assert time.monotonic() - start < 0.5
+    assert len(p.results) == 6
+    assert all("util=" in line for line in p.report_lines()[1:])
+
+def test_flush_emits_held_items_before_end_of_stream():
+    held = []
+
+    def hold(x):
+        held.append(x)
+        if len(held) == 3:
+            out = [tuple(held)]
+            held.clear()
+            return out
+        return []
+
+    def flush():
+        return [tuple(held)] if held else []
+
+    p = Pipeline([
+        Stage("batch", hold, fan_out=True, flush=flush),
+        Stage("size", len, workers=2),
+    ])
+    assert sorted(asyncio.run(p.run(range(7)))) == [1, 3, 3]
+    assert p.stages[0].items_out == 3
@@ -4,7 +4,7 @@ from testgen.repo import find_cs_files
 def test_find_cs_files(tmp_path):
     # create some .cs files and some excluded dirs
     src = tmp_path / "proj"
-    (src / "bin").mkdir()
+    (src / "bin").mkdir(parents=True)
     (src / "Controllers").mkdir(parents=True)
     f1 = src / "Program.cs"
     f1.write_text("class C{}")
@@ -13,3 +13,65 @@ def test_find_cs_files(tmp_path):
     fs = list(find_cs_files(str(src)))
     # should find exactly two .cs files
     assert sorted(os.path.basename(p) for p in fs) == ["HomeController.cs", "Program.cs"]
+
+def test_diff_cs_files_classifies_changes(tmp_path):
+    from git import Repo
+    from testgen.repo import diff_cs_files
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as cw:
+        cw.set_value("user", "name", "t")
+        cw.set_value("user", "email", "t@example.com")
+    body = "public class C { public int A() { return 1; } public int B() { return 2; } }\n" * 5
+    (tmp_path / "Keep.cs").write_text("class K{}")
+    (tmp_path / "Gone.cs").write_text("class G{}")
+    (tmp_path / "Old.cs").write_text(body)
+    (tmp_path / "obj").mkdir()
+    (tmp_path / "obj" / "Gen.cs").write_text("class X{}")
+    repo.index.add(["Keep.cs", "Gone.cs", "Old.cs", "obj/Gen.cs"])
+    base = repo.index.commit("base").hexsha
+
+    (tmp_path / "Keep.cs").write_text("class K{ int x; }")
+    repo.index.remove(["Gone.cs"], working_tree=True)
+    repo.index.move(["Old.cs", "New.cs"])
+    (tmp_path / "obj" / "Gen.cs").write_text("class Y{}")
+    (tmp_path / "Added.cs").write_text("class A{}")
+    repo.index.add(["Keep.cs", "Added.cs", "obj/Gen.cs"])
+    repo.index.commit("change")
+
+    changes = diff_cs_files(repo, base)
+    assert sorted(changes.changed) == ["Added.cs", "Keep.cs"]
+    assert changes.deleted == ["Gone.cs"]
+    assert changes.renamed == [("Old.cs", "New.cs")]
+    assert diff_cs_files(repo, "0" * 40) is None
+
+def test_sync_repo_through_a_mirror_with_sparse_checkout(tmp_path):
+    import subprocess
+    from git import Repo
+    from testgen.repo import CloneStrategy, sync_repo
+    src = tmp_path / "src"
+    repo = Repo.init(src, initial_branch="main")
+    with repo.config_writer() as cw:
+        cw.set_value("user", "name", "t")
+        cw.set_value("user", "email", "t@example.com")
+    (src / "App.cs").write_text("class App{}")
+    (src / "App.csproj").write_text("<Project />")
+    (src / "logo.png").write_bytes(b"\0" * 1000)
+    repo.index.add(["App.cs", "App.csproj", "logo.png"])
+    repo.index.commit("base")
+    origin = str(tmp_path / "origin.git")
+    subprocess.run(["git", "clone", "-q", "--bare", str(src), origin], check=True)
+
+    for link in ("reference", "worktree"):
+        strategy = CloneStrategy(mirror_dir=str(tmp_path / "mirrors"), link=link, sparse=True)
+        work = tmp_path / link
+        clone, report = sync_repo(str(work), origin, "main", strategy)
+        assert report.action == "clone" and clone.remotes.origin.url == origin
+        assert (work / "App.cs").exists() and (work / "App.csproj").exists() and not (work / "logo.png").exists()
+
+        (src / "App.cs").write_text(f"class App{{ int {link}; }}")
+        repo.index.add(["App.cs"])
+        head = repo.index.commit(f"edit for {link}").hexsha
+        subprocess.run(["git", "-C", str(src), "push", "-q", origin, "main"], check=True)
+        clone, report = sync_repo(str(work), origin, "main", strategy)
+        assert report.action == "update" and clone.head.commit.hexsha == head
+        assert link in (work / "App.cs").read_text()
@@ -0,0 +1,35 @@
+from testgen.scheduling import (
+    CostModel, ScheduledFile, count_methods, estimate_file, order_longest_first, predict_makespan
+)
+
+def test_count_methods_skips_types_constructors_and_private_members():
+    source = """namespace App;
+public class OrderService(IRepo repo)
+{
+    public OrderService(int x) { }
+    public Order Get(int id) => repo.Find(id);
+    public static async Task<Dictionary<string, int>> CountAsync(string status) { return null; }
+    private void Hidden() { }
+    internal T Map<T>(object o) => default;
+    public record Line(int Qty);
+}"""
+    assert count_methods(source) == 3
+
+def test_longest_first_beats_walk_order_with_a_big_file_last():
+    walk = [ScheduledFile(f"f{i}.cs", 10.0) for i in range(8)] + [ScheduledFile("Huge.cs", 40.0)]
+    ordered = order_longest_first(walk)
+    assert ordered[0].path == "Huge.cs"
+    assert predict_makespan([w.cost_sec for w in walk], 4) == 60.0
+    assert predict_makespan([w.cost_sec for w in ordered], 4) == 40.0
+
+def test_priority_goes_before_cost():
+    work = [ScheduledFile("big.cs", 50.0), ScheduledFile("recent.cs", 1.0, priority=1)]
+    assert [w.path for w in order_longest_first(work)] == ["recent.cs", "big.cs"]
+
+def test_cost_model_uses_history_and_calibrates_unknown_classes():
+    model = CostModel({"A.cs::A": (12.0, 3), "B.cs::B": (4.0, 1)})
+    assert model.sec_per_method == 16.0 / 6
+    assert model.class_cost("A.cs::A", 3) == (12.0, "history")
+    assert model.class_cost("C.cs::C", 2) == (8.0, "estimate")
+    cached = estimate_file("A.cs", model, [("A.cs::A", 3, True)])
+    assert cached.basis == "cached" and cached.cost_sec < 1
@@ -0,0 +1,64 @@
+import json
+import asyncio
+from testgen.stats import RunStats
+from testgen.tracing import Tracer, set_tracer, span, annotate, write_prometheus_textfile, NOOP_SPAN
+
+def test_disabled_tracing_records_nothing():
+    previous = set_tracer(Tracer(enabled=False))
+    try:
+        assert span("stage.probe", item="x") is NOOP_SPAN
+        with span("stage.probe") as s:
+            s.set(cache="hit")
+            annotate(tokens=3)
+    finally:
+        set_tracer(previous)
+
+def test_spans_nest_across_tasks_and_export(tmp_path):
+    tracer = Tracer()
+    previous = set_tracer(tracer)
+
+    async def request(i):
+        with span("ollama.generate", target=f"C{i}"):
+            annotate(completion_tokens=i)
+            await asyncio.sleep(0.01)
+
+    async def stage():
+        with span("stage.generate", item=object()):
+            await asyncio.gather(request(1), request(2))
+
+    try:
+        asyncio.run(stage())
+    finally:
+        set_tracer(previous)
+    parent, = [s for s in tracer.spans if s.name == "stage.generate"]
+    children = [s for s in tracer.spans if s.name == "ollama.generate"]
+    assert {s.parent_id for s in children} == {parent.span_id}
+    assert sorted(s.attrs["completion_tokens"] for s in children) == [1, 2]
+    assert isinstance(parent.attrs["item"], str)  # made serialisable when the span ends
+    # gathered requests run side by side, so each gets its own lane
+    assert len({s.lane for s in children} | {parent.lane}) == 3
+
+    tracer.write_trace(str(tmp_path / "trace.json"))
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert sorted(e["name"] for e in events if e["ph"] == "X") == ["ollama.generate", "ollama.generate", "stage.generate"]
+    tracer.write_trace(str(tmp_path / "otlp.json"), fmt="otlp")
+    spans = json.loads((tmp_path / "otlp.json").read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {s["parentSpanId"] for s in spans if s["name"] == "ollama.generate"} == {parent.span_id}
+    assert {"key": "completion_tokens", "value": {"intValue": "1"}} in spans[0]["attributes"] + spans[1]["attributes"]
+
+def test_prometheus_textfile(tmp_path):
+    tracer = Tracer()
+    with tracer.span("sqlite.commit"):
+        pass
+    stats = RunStats()
+    stats.incr("cache.hits", 3)
+    stats.incr("cache.evicted[unseen]", 2)
+    for v in (1, 2, 3):
+        stats.observe("prompt.tokens", v)
+    path = tmp_path / "testgen.prom"
+    write_prometheus_textfile(str(path), stats, tracer)
+    text = path.read_text()
+    assert "testgen_cache_hits 3\n" in text
+    assert 'testgen_cache_evicted{kind="unseen"} 2\n' in text
+    assert 'testgen_prompt_tokens{quantile="0.5"} 2\n' in text and "testgen_prompt_tokens_count 3\n" in text
+    assert 'testgen_span_duration_seconds_bucket{span="sqlite.commit",le="+Inf"} 1\n' in text
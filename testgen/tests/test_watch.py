@@ -0,0 +1,61 @@
+import os
+import time
+import threading
+import pytest
+from testgen.watch import InotifyWatcher, PollingWatcher, debounced, open_watcher
+
+def _watcher(root, kind):
+    if kind == "polling":
+        return PollingWatcher(str(root), interval_sec=0.02)
+    try:
+        return InotifyWatcher(str(root))
+    except OSError:
+        pytest.skip("inotify is not available")  # not Linux: the polling fallback is all there is
+
+@pytest.mark.parametrize("kind", ["polling", "inotify"])
+def test_a_burst_of_saves_is_one_batch(tmp_path, kind):
+    (tmp_path / "src" / "obj").mkdir(parents=True)
+    (tmp_path / "src" / "Old.cs").write_text("class Old { }")
+    watcher = _watcher(tmp_path, kind)
+
+    def save():
+        time.sleep(0.05)
+        (tmp_path / "src" / "A.cs").write_text("class A { }")
+        (tmp_path / "src" / "obj" / "B.cs").write_text("class B { }")  # build output: ignored
+        (tmp_path / "src" / "notes.txt").write_text("not C#")
+        (tmp_path / "src" / "new").mkdir()
+        (tmp_path / "src" / "new" / "C.cs").write_text("class C { }")
+        time.sleep(0.1)
+        (tmp_path / "src" / "Old.cs").unlink()
+
+    with watcher:
+        thread = threading.Thread(target=save)
+        thread.start()
+        batch = debounced(watcher, quiet_sec=0.3, max_delay_sec=5, timeout=5)
+        thread.join()
+        assert {os.path.relpath(p, tmp_path) for p in batch} == {
+            os.path.join("src", "A.cs"), os.path.join("src", "new", "C.cs"), os.path.join("src", "Old.cs")
+        }
+        assert debounced(watcher, quiet_sec=0.05, timeout=0.1) == set()
+
+def test_max_delay_caps_a_never_ending_burst(tmp_path):
+    stop = threading.Event()
+
+    def keep_saving():
+        n = 0
+        while not stop.is_set():
+            (tmp_path / f"F{n % 3}.cs").write_text(str(n))
+            n += 1
+            time.sleep(0.02)
+
+    with open_watcher(str(tmp_path), poll_sec=0.02) as watcher:
+        thread = threading.Thread(target=keep_saving)
+        thread.start()
+        try:
+            started = time.monotonic()
+            batch = debounced(watcher, quiet_sec=0.2, max_delay_sec=0.4, timeout=5)
+            waited = time.monotonic() - started
+        finally:
+            stop.set()
+            thread.join()
+    assert batch and waited < 1.5
@@ -0,0 +1,38 @@
+import os
+from testgen.writer import write_test_file, move_test_file, remove_orphaned_test_files, generated_test_files
+
+A_TESTS = "using NUnit.Framework;\n\nnamespace GeneratedTests;\n\n[TestFixture]\npublic class ATests { [Test] public void T() {} }\n"
+B_TESTS = "using Moq;\nusing NUnit.Framework;\n\nnamespace GeneratedTests;\n\npublic class BTests { [Test] public void T() {} }\n"
+
+def test_unchanged_file_is_not_rewritten(tmp_path):
+    repo, proj = tmp_path / "repo", tmp_path / "proj"
+    (repo / "src").mkdir(parents=True)
+    (repo / "src" / "A.cs").write_text("class A {} class B {}")
+    src = str(repo / "src" / "A.cs")
+    dest = write_test_file(str(proj), src, str(repo), [A_TESTS, B_TESTS])
+    assert dest == str(proj / "src" / "ATests.cs")
+    text = open(dest).read()
+    assert text.startswith("// Generated by testgen from src/A.cs;")
+    assert text.count("using NUnit.Framework;") == 1 and "class ATests" in text and "class BTests" in text
+    os.utime(dest, ns=(1, 1))
+    assert write_test_file(str(proj), src, str(repo), [A_TESTS, B_TESTS]) is None
+    assert os.stat(dest).st_mtime_ns == 1
+    assert write_test_file(str(proj), src, str(repo), A_TESTS) == dest
+    assert "BTests" not in open(dest).read()
+    assert os.listdir(proj / "src") == ["ATests.cs"]  # no temp files left behind
+
+def test_orphaned_files_are_removed(tmp_path):
+    repo, proj = tmp_path / "repo", tmp_path / "proj"
+    for name in ("Keep", "Gone", "Empty", "Moved"):
+        (repo / name).mkdir(parents=True)
+        (repo / name / f"{name}.cs").write_text("class X {}")
+        write_test_file(str(proj), str(repo / name / f"{name}.cs"), str(repo), A_TESTS)
+    (proj / "UnitTest1.cs").write_text("public class UnitTest1 {}")
+    os.remove(repo / "Gone" / "Gone.cs")
+    os.rename(repo / "Moved" / "Moved.cs", repo / "Moved" / "Renamed.cs")
+    move_test_file(str(proj), "Moved/Moved.cs", "Moved/Renamed.cs")
+
+    removed = remove_orphaned_test_files(str(proj), str(repo), untestable=["Empty/Empty.cs"])
+    assert sorted(os.path.relpath(p, proj) for p in removed) == ["Empty/EmptyTests.cs", "Gone/GoneTests.cs"]
+    assert sorted(generated_test_files(str(proj)).values()) == ["Keep/Keep.cs", "Moved/Renamed.cs"]
+    assert (proj / "UnitTest1.cs").exists() and not (proj / "Gone").exists()
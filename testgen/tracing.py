@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import time
+import asyncio
+import tempfile
+import threading
+import contextvars
+from typing import Any, Dict, List, Optional, Tuple
+
+from .stats import RunStats
+
+# upper bounds (seconds) of the span latency histograms in the Prometheus textfile
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("testgen_span", default=None)
+_METRIC_RE = re.compile(r"^([\w.]+)\[(.+)\]$")
+
+class Span:
+    """
+    one timed operation. attributes (file, class key, cache hit, token counts, retries...) are
+    set when it starts or later with `set` / `annotate`.
+    """
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "lane", "start_ns", "end_ns", "_tracer", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = os.urandom(8).hex()
+        self.parent_id: Optional[str] = None
+        self.lane = 0
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent else None
+        self.lane = self._tracer._lane()
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.time_ns()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # closed from another context (an async generator finalised elsewhere)
+            pass
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._tracer._finish(self)
+        return False
+
+    @property
+    def duration_sec(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    """
+    collects the spans of one run and exports them as a Chrome trace (chrome://tracing, Perfetto),
+    OTLP/JSON, and latency histograms in a Prometheus textfile. each asyncio task and each thread
+    gets its own lane, so concurrent pipeline workers show up side by side.
+    """
+
+    def __init__(self, enabled: bool = True, service_name: str = "testgen"):
+        self.enabled = enabled
+        self.service_name = service_name
+        self.trace_id = os.urandom(16).hex()
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+        self._lanes: Dict[Tuple[str, int], Tuple[int, str]] = {}
+        self._histograms: Dict[str, List[float]] = {}  # span name -> bucket counts + [+Inf, sum]
+        self.started_ns = time.time_ns()
+
+    def span(self, name: str, **attrs: Any) -> Span:
+        return Span(self, name, attrs)
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def _lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = ("task", id(task)) if task else ("thread", threading.get_ident())
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                label = task.get_name() if task else threading.current_thread().name
+                lane = self._lanes[key] = (len(self._lanes) + 1, label)
+        return lane[0]
+
+    def _finish(self, span: Span) -> None:
+        for key, value in span.attrs.items():
+            if not isinstance(value, (str, int, float, bool)) and value is not None:
+                span.attrs[key] = str(value)
+        seconds = span.duration_sec
+        with self._lock:
+            self._spans.append(span)
+            hist = self._histograms.get(span.name)
+            if hist is None:
+                hist = self._histograms[span.name] = [0.0] * (len(LATENCY_BUCKETS) + 2)
+            for idx, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    hist[idx] += 1
+            hist[-2] += 1
+            hist[-1] += seconds
+
+    # ---------------- export ----------------
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        spans = self.spans
+        with self._lock:
+            lanes = list(self._lanes.values())
+        events: List[Dict[str, Any]] = [
+            {"ph": "M", "name": "thread_name", "pid": 1, "tid": tid, "args": {"name": label}} for tid, label in lanes
+        ]
+        events.append({"ph": "M", "name": "process_name", "pid": 1, "tid": 0, "args": {"name": self.service_name}})
+        for s in spans:
+            events.append({
+                "ph": "X", "name": s.name, "cat": s.name.split(".", 1)[0], "pid": 1, "tid": s.lane,
+                "ts": (s.start_ns - self.started_ns) / 1000, "dur": (s.end_ns - s.start_ns) / 1000,
+                "args": s.attrs,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp_json(self) -> Dict[str, Any]:
+        spans = [{
+            "traceId": self.trace_id,
+            "spanId": s.span_id,
+            **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in s.attrs.items() if v is not None],
+            "status": {"code": 2} if "error" in s.attrs else {},
+        } for s in self.spans]
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "testgen"}, "spans": spans}],
+        }]}
+
+    def write_trace(self, path: str, fmt: str = "chrome") -> None:
+        """
+        `fmt` is "chrome" (trace event JSON) or "otlp" (OTLP/JSON, as an OpenTelemetry collector's
+        file exporter writes it).
+        """
+        if fmt not in ("chrome", "otlp"):
+            raise ValueError(f"unknown trace format {fmt!r}")
+        data = self.chrome_trace() if fmt == "chrome" else self.otlp_json()
+        _atomic_write(path, json.dumps(data))
+
+    def prometheus_lines(self) -> List[str]:
+        with self._lock:
+            histograms = {name: list(h) for name, h in self._histograms.items()}
+        if not histograms:
+            return []
+        lines = ["# TYPE testgen_span_duration_seconds histogram"]
+        for name, hist in sorted(histograms.items()):
+            label = f'span="{_escape(name)}"'
+            for bound, count in zip(LATENCY_BUCKETS, hist):
+                lines.append(f'testgen_span_duration_seconds_bucket{{{label},le="{bound}"}} {int(count)}')
+            lines.append(f'testgen_span_duration_seconds_bucket{{{label},le="+Inf"}} {int(hist[-2])}')
+            lines.append(f"testgen_span_duration_seconds_sum{{{label}}} {hist[-1]:.6f}")
+            lines.append(f"testgen_span_duration_seconds_count{{{label}}} {int(hist[-2])}")
+        return lines
+
+_tracer = Tracer(enabled=False)
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """
+    make `tracer` the one `span` records into; returns the previous one.
+    """
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+def span(name: str, **attrs: Any):
+    """
+    `with span("extract.file", file=path) as s: ...` times the block on the current tracer.
+    with tracing disabled this returns a shared no-op span, so instrumented code pays one check.
+    """
+    tracer = _tracer
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return Span(tracer, name, attrs)
+
+def annotate(**attrs: Any) -> None:
+    """
+    add attributes to the innermost open span (cache hit, token counts, retries...).
+    """
+    if _tracer.enabled:
+        current = _current.get()
+        if current is not None:
+            current.attrs.update(attrs)
+
+def write_prometheus_textfile(path: str, stats: Optional[RunStats] = None, tracer: Optional[Tracer] = None) -> None:
+    """
+    the run's metrics in the Prometheus text format, for node_exporter's textfile collector:
+    RunStats counters as gauges (they describe the last run), RunStats samples as summaries and,
+    if tracing was on, span latency histograms.
+    """
+    lines = [
+        "# TYPE testgen_last_run_timestamp_seconds gauge",
+        f"testgen_last_run_timestamp_seconds {time.time():.3f}",
+    ]
+    if stats:
+        seen = set()
+        for name, value in sorted(stats.counters().items()):
+            metric, labels = _metric_name(name)
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{labels} {value:g}")
+        for name in sorted(stats.sample_names()):
+            values = sorted(stats.samples(name))
+            metric, labels = _metric_name(name)
+            lines.append(f"# TYPE {metric} summary")
+            for q in (0.5, 0.95):
+                q_label = f'quantile="{q}"'
+                merged = f"{{{labels[1:-1]},{q_label}}}" if labels else f"{{{q_label}}}"
+                lines.append(f"{metric}{merged} {values[min(len(values) - 1, int(len(values) * q))]:g}")
+            lines.append(f"{metric}_sum{labels} {sum(values):g}")
+            lines.append(f"{metric}_count{labels} {len(values)}")
+    tracer = tracer or _tracer
+    if tracer.enabled:
+        lines += tracer.prometheus_lines()
+    _atomic_write(path, "\n".join(lines) + "\n")
+
+def _metric_name(name: str) -> Tuple[str, str]:
+    # "cache.evicted[unseen]" -> ("testgen_cache_evicted", '{kind="unseen"}')
+    m = _METRIC_RE.match(name)
+    base, labels = (m.group(1), f'{{kind="{_escape(m.group(2))}"}}') if m else (name, "")
+    return "testgen_" + re.sub(r"[^a-zA-Z0-9_]", "_", base), labels
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+def _atomic_write(path: str, text: str) -> None:
+    # node_exporter may read the textfile at any moment; it must never see half of it
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,238 @@
+"""
+change notifications for .cs files under a working tree: inotify where the platform has it, a
+polling snapshot (mtime and size) everywhere else, and a debouncer that turns an editor's burst of
+writes, renames and deletes into one batch of paths.
+"""
+import os
+import abc
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+WATCH_EXCLUDED_DIRS = {"bin", "obj", "TestResults", "node_modules"}
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")
+
+# a batch holding this instead of file paths: events were lost, everything has to be looked at
+RESCAN = "*"
+
+class _Watcher(abc.ABC):
+    def __init__(self, root: str, ignore: Iterable[str] = ()):
+        self.root = os.path.abspath(root)
+        self.ignore = {os.path.abspath(p) for p in ignore}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @abc.abstractmethod
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        paths of .cs files created, changed or deleted since the last call, waiting up to `timeout`
+        seconds (None: until there are some) for the first one. may contain RESCAN.
+        """
+
+    def close(self) -> None:
+        pass
+
+    def _skip_dir(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return name in WATCH_EXCLUDED_DIRS or name.startswith(".") or path in self.ignore
+
+    def _dirs(self, top: str) -> Iterator[str]:
+        for root, dirs, _ in os.walk(top):
+            dirs[:] = [d for d in dirs if not self._skip_dir(os.path.join(root, d))]
+            yield root
+
+class PollingWatcher(_Watcher):
+    """
+    compares (mtime, size) of every .cs file with the previous walk, every `interval_sec`.
+    """
+
+    def __init__(self, root: str, ignore: Iterable[str] = (), interval_sec: float = 1.0):
+        super().__init__(root, ignore)
+        self.interval_sec = interval_sec
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory in self._dirs(self.root):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.endswith(".cs"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            old, self._snapshot = self._snapshot, snapshot
+            changed = {p for p in old.keys() | snapshot.keys() if old.get(p) != snapshot.get(p)}
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            pause = self.interval_sec if deadline is None else min(self.interval_sec, deadline - time.monotonic())
+            time.sleep(max(0.0, pause))
+
+class InotifyWatcher(_Watcher):
+    """
+    one inotify watch per directory of the tree (Linux only); directories created later are
+    watched as they appear, and the .cs files already in them are reported.
+    """
+
+    def __init__(self, root: str, ignore: Iterable[str] = ()):
+        super().__init__(root, ignore)
+        self._libc = _load_libc()
+        if self._libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs_by_wd: Dict[int, str] = {}
+        self._pending: Set[str] = set()
+        try:
+            for directory in self._dirs(self.root):
+                self._add(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # gone again before it could be watched
+            raise OSError(err, f"inotify_add_watch failed for {directory}" +
+                          (" (raise fs.inotify.max_user_watches)" if err == errno.ENOSPC else ""))
+        self._dirs_by_wd[wd] = directory
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._pending:
+            # events of other files and excluded directories wake us up too
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                break
+            ready, _, _ = select.select([self._fd], [], [], left)
+            if ready:
+                self._read()
+        changed, self._pending = self._pending, set()
+        return changed
+
+    def _read(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                self._pending.add(RESCAN)
+                continue
+            directory = self._dirs_by_wd.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                if mask & IN_IGNORED:
+                    self._dirs_by_wd.pop(wd, None)
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self._skip_dir(path):
+                    # files written before the watch was in place would be missed otherwise
+                    for sub in self._dirs(path):
+                        self._add(sub)
+                        self._pending.update(os.path.join(sub, f) for f in _listdir(sub) if f.endswith(".cs"))
+                elif mask & IN_MOVED_FROM:
+                    self._pending.add(RESCAN)  # every file below it is gone
+            elif path.endswith(".cs"):
+                # a file still being written is also closed within the debounce window
+                self._pending.add(path)
+
+    def close(self) -> None:
+        if getattr(self, "_fd", -1) >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+def _listdir(path: str) -> List[str]:
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+def _load_libc():
+    name = ctypes.util.find_library("c")
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+def open_watcher(root: str, ignore: Iterable[str] = (), poll_sec: float = 1.0, use_inotify: bool = True) -> _Watcher:
+    """
+    an inotify watcher if possible, else a polling one (other platforms, no free inotify watches,
+    or file systems that do not report changes, e.g. some network and container mounts).
+    """
+    if use_inotify:
+        try:
+            return InotifyWatcher(root, ignore)
+        except OSError as e:
+            logger.warning(f"Falling back to polling every {poll_sec}s: {e}")
+    return PollingWatcher(root, ignore, poll_sec)
+
+def debounced(watcher: _Watcher, quiet_sec: float = 0.3, max_delay_sec: float = 2.0,
+              timeout: Optional[float] = None) -> Set[str]:
+    """
+    the next batch of changed paths: waits for a first change, then collects more until nothing
+    has changed for `quiet_sec`, but hands the batch over at most `max_delay_sec` after its first
+    change. an empty set if nothing changed within `timeout` seconds (None: wait).
+    """
+    batch = watcher.wait(timeout)
+    if not batch:
+        return batch
+    first = time.monotonic()
+    while True:
+        left = first + max_delay_sec - time.monotonic()
+        if left <= 0:
+            return batch
+        more = watcher.wait(min(quiet_sec, left))
+        if not more:
+            return batch
+        batch |= more
@@ -1,7 +1,11 @@
 import os
+import re
+import tempfile
 import subprocess
 import logging
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from .csharp_merge import combine_compilation_units
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +14,11 @@ TEST_ADAPTER_VERSION = "4.5.0"
 TEST_SDK_VERSION = "17.9.0"
 MOQ_VERSION = "4.20.70"
 
+# first line of every test file this tool writes; it records the source file, so orphans can be found
+GENERATED_HEADER = "// Generated by testgen from {source}; edits are overwritten."
+_GENERATED_HEADER_RE = re.compile(r"^// Generated by testgen from (.+); edits are overwritten\.$")
+_EXCLUDED_DIRS = {"bin", "obj", "TestResults"}
+
 def init_nunit_project(base_dir: str, project_name: str) -> str:
     """
     scaffold a new `dotnet new nunit` project under base_dir.
@@ -40,29 +49,152 @@ def write_test_file(
     project_dir: str,
     original_cs: str,
     repo_root: str,
-    test_code: str,
+    test_code: Union[str, Sequence[str]],
     dry_run: bool = False
 ) -> Optional[str]:
     """
-    just write `test_code` to an appropriately named .cs file, mirroring original_cs path.
-    If dry_run, only print path + preview.
+    write the tests of one source file (one generated class, or several that are combined into one
+    file) to an appropriately named .cs file, mirroring original_cs path. a file that already has
+    this content is left alone, so its mtime stays and MSBuild can skip the compile; otherwise it is
+    replaced atomically. returns the path if it was (or in dry-run would be) written, else None.
     """
-    rel = os.path.relpath(original_cs, start=repo_root)
-    dest_dir = os.path.join(project_dir, os.path.dirname(rel))
-    os.makedirs(dest_dir, exist_ok=True)
-    base = os.path.splitext(os.path.basename(original_cs))[0] + "Tests.cs"
-    dest = os.path.join(dest_dir, base)
+    rel_source = os.path.relpath(original_cs, start=repo_root)
+    dest = test_file_path(project_dir, rel_source)
+    codes = [test_code] if isinstance(test_code, str) else list(test_code)
+    content = GENERATED_HEADER.format(source=rel_source.replace(os.sep, "/")) + "\n" + combine_compilation_units(codes)
+
+    if _read_text(dest) == content:
+        logger.debug(f"Test file {dest} is up to date")
+        return None
 
     if dry_run:
-        logger.info(f"[DRY RUN] Would write {len(test_code)} chars to {dest}")
-        logger.info(f"[DRY RUN] Preview:\n{test_code[:200].rstrip()}…")
+        logger.info(f"[DRY RUN] Would write {len(content)} chars to {dest}")
+        logger.info(f"[DRY RUN] Preview:\n{content[:200].rstrip()}…")
         return dest
 
-    with open(dest, "w", encoding="utf-8") as f:
-        f.write(test_code)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    _atomic_write(dest, content)
     logger.info(f"Wrote test file at {dest}")
     return dest
 
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+def _atomic_write(path: str, content: str) -> None:
+    # readers (and an interrupted run) see the old file or the new one, never half of it
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def generated_test_files(project_dir: str) -> Dict[str, str]:
+    """
+    test file -> source file (relative to the repo root) of every test file this tool wrote.
+    """
+    found = {}
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if d not in _EXCLUDED_DIRS and not d.startswith(".")]
+        for name in files:
+            if not name.endswith(".cs"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    m = _GENERATED_HEADER_RE.match(f.readline().rstrip("\r\n"))
+            except (OSError, UnicodeDecodeError):
+                continue
+            if m:
+                found[path] = m.group(1)
+    return found
+
+def remove_orphaned_test_files(
+    project_dir: str, repo_root: str, untestable: Iterable[str] = (), dry_run: bool = False
+) -> List[str]:
+    """
+    delete generated test files whose source file is gone, or is in `untestable` (relative paths
+    of sources that no longer declare any testable class). hand-written files are never touched.
+    """
+    untestable = {rel.replace(os.sep, "/") for rel in untestable}
+    removed = []
+    for path, rel_source in sorted(generated_test_files(project_dir).items()):
+        if rel_source not in untestable and os.path.isfile(os.path.join(repo_root, rel_source)):
+            continue
+        removed.append(path)
+        if dry_run:
+            logger.info(f"[DRY RUN] Would remove orphaned test file {path}")
+            continue
+        os.remove(path)
+        _prune_empty_dirs(os.path.dirname(path), project_dir)
+        logger.info(f"Removed orphaned test file {path}")
+    return removed
+
+def test_file_path(project_dir: str, rel_source_path: str) -> str:
+    """
+    where the tests for a source file (relative to the repo root) live in the test project.
+    """
+    base = os.path.splitext(os.path.basename(rel_source_path))[0] + "Tests.cs"
+    return os.path.join(project_dir, os.path.dirname(rel_source_path), base)
+
+def remove_test_file(project_dir: str, rel_source_path: str, dry_run: bool = False) -> Optional[str]:
+    """
+    delete the test file of a source file that no longer exists.
+    """
+    dest = test_file_path(project_dir, rel_source_path)
+    if not os.path.isfile(dest):
+        return None
+    if dry_run:
+        logger.info(f"[DRY RUN] Would remove {dest}")
+        return dest
+    os.remove(dest)
+    _prune_empty_dirs(os.path.dirname(dest), project_dir)
+    logger.info(f"Removed test file {dest}")
+    return dest
+
+def move_test_file(project_dir: str, old_rel_path: str, new_rel_path: str, dry_run: bool = False) -> Optional[str]:
+    """
+    follow a renamed/moved source file with its test file.
+    """
+    src = test_file_path(project_dir, old_rel_path)
+    dest = test_file_path(project_dir, new_rel_path)
+    if not os.path.isfile(src):
+        return None
+    if dry_run:
+        logger.info(f"[DRY RUN] Would move {src} -> {dest}")
+        return dest
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    content = _read_text(src)
+    header = content.split("\n", 1)[0] if content else ""
+    if _GENERATED_HEADER_RE.match(header.rstrip("\r")):
+        # the header names the source file; a stale one would make the moved file look orphaned
+        _atomic_write(dest, GENERATED_HEADER.format(source=new_rel_path.replace(os.sep, "/")) + content[len(header):])
+        os.remove(src)
+    else:
+        os.replace(src, dest)
+    _prune_empty_dirs(os.path.dirname(src), project_dir)
+    logger.info(f"Moved test file {src} -> {dest}")
+    return dest
+
+def _prune_empty_dirs(path: str, stop_at: str) -> None:
+    stop_at = os.path.abspath(stop_at)
+    path = os.path.abspath(path)
+    while path != stop_at and path.startswith(stop_at + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
 def run_and_verify_tests(project_dir: str, dry_run: bool = False) -> bool:
     """
     dotnet build & test. If dry_run, skip execution.